@@ -0,0 +1,310 @@
+"""
+PASO 6: API HTTP de ingesta
+Servicio asíncrono para subir facturas desde la aplicación Angular
+
+Las subidas se aceptan al momento (202) y se encolan; un pool de procesos
+extrae los PDFs con PDFExtractor y un único hilo escritor los guarda con
+DatabaseStorage, de modo que el bucle de eventos nunca queda bloqueado.
+
+Ejecutar con:
+    python api.py
+"""
+import asyncio
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
+from fastapi.middleware.cors import CORSMiddleware
+
+from config import config
+from models import DatabaseManager
+from extractors.pdf_extractor import extract_pdf
+from storage.database_storage import DatabaseStorage
+
+
+# Estados de un trabajo de ingesta
+ESTADO_EN_COLA = 'en_cola'
+ESTADO_PROCESANDO = 'procesando'
+ESTADO_COMPLETADO = 'completado'
+ESTADO_ERROR = 'error'
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class IngestionService:
+    """
+    Cola de ingesta de PDFs subidos
+
+    Los trabajos se guardan en memoria (los últimos ``max_jobs``); el
+    documento resultante queda en la base de datos con su ID.
+    """
+
+    def __init__(self, db_storage: DatabaseStorage, upload_dir: Path, workers: int = 2,
+                 queue_size: int = 1000, max_jobs: int = 10000):
+        """
+        Inicializa el servicio
+
+        Args:
+            db_storage: Almacenamiento en base de datos
+            upload_dir: Directorio donde se guardan los PDFs subidos
+            workers: Procesos de extracción
+            queue_size: Trabajos en cola como máximo antes de rechazar subidas
+            max_jobs: Trabajos cuyo estado se conserva en memoria
+        """
+        self.db_storage = db_storage
+        self.upload_dir = Path(upload_dir)
+        self.workers = max(1, workers)
+        self.max_jobs = max_jobs
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.jobs = OrderedDict()
+        self._extract_executor = None
+        self._db_executor = None
+        self._tasks = []
+
+    async def start(self):
+        """Arranca el pool de extracción y los consumidores de la cola"""
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self._extract_executor = ProcessPoolExecutor(max_workers=self.workers)
+        # Un único escritor en la base de datos, como en process_directory
+        self._db_executor = ThreadPoolExecutor(max_workers=1)
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Detiene los consumidores y los pools y borra los PDFs que quedaban en cola"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while not self.queue.empty():
+            job, pdf_path = self.queue.get_nowait()
+            pdf_path.unlink(missing_ok=True)
+            self._update(job, estado=ESTADO_ERROR, error='Servicio detenido antes de procesarlo')
+        self._extract_executor.shutdown(cancel_futures=True)
+        self._db_executor.shutdown()
+
+    def is_full(self) -> bool:
+        """Indica si la cola no admite más trabajos"""
+        return self.queue.full()
+
+    def submit(self, pdf_path: Path, nombre_archivo: str) -> Dict:
+        """
+        Encola un PDF ya guardado en disco
+
+        Args:
+            pdf_path: Ruta al PDF subido
+            nombre_archivo: Nombre original del archivo
+
+        Returns:
+            Dict con el estado del trabajo
+
+        Raises:
+            asyncio.QueueFull: Si la cola está llena
+        """
+        ahora = datetime.now().isoformat()
+        job = {
+            'id': uuid.uuid4().hex,
+            'estado': ESTADO_EN_COLA,
+            'nombre_archivo': nombre_archivo,
+            'documento_id': None,
+            'error': None,
+            'creado': ahora,
+            'actualizado': ahora
+        }
+        self.queue.put_nowait((job, pdf_path))
+        self.jobs[job['id']] = job
+        self._forget_old_jobs()
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Obtiene el estado de un trabajo"""
+        return self.jobs.get(job_id)
+
+    def _forget_old_jobs(self):
+        """Olvida los trabajos terminados más antiguos por encima de max_jobs"""
+        while len(self.jobs) > self.max_jobs:
+            job_id, job = next(iter(self.jobs.items()))
+            if job['estado'] not in (ESTADO_COMPLETADO, ESTADO_ERROR):
+                break
+            del self.jobs[job_id]
+
+    @staticmethod
+    def _update(job: Dict, **fields):
+        job.update(fields, actualizado=datetime.now().isoformat())
+
+    async def _consume(self):
+        """Consumidor de la cola: extrae en el pool y guarda en la BD"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            job, pdf_path = await self.queue.get()
+            self._update(job, estado=ESTADO_PROCESANDO)
+
+            try:
+                try:
+                    document = await loop.run_in_executor(self._extract_executor, extract_pdf, pdf_path)
+                finally:
+                    # El documento extraído ya está en memoria: el PDF subido no se conserva
+                    pdf_path.unlink(missing_ok=True)
+                # Sin archivo que localizar, las subidas repetidas se reconocen
+                # por el hash del contenido, no por la ruta
+                document['nombre_archivo'] = job['nombre_archivo']
+                document['ruta_archivo'] = f"subidas/{job['id']}/{job['nombre_archivo']}"
+                doc_id = await loop.run_in_executor(self._db_executor, self.db_storage.save_document, document)
+                self._update(job, estado=ESTADO_COMPLETADO, documento_id=doc_id)
+            except Exception as e:
+                self._update(job, estado=ESTADO_ERROR, error=str(e))
+            finally:
+                self.queue.task_done()
+
+
+async def save_upload(upload: UploadFile, destination: Path, max_bytes: int) -> int:
+    """
+    Guarda un archivo subido en disco por bloques
+
+    Args:
+        upload: Archivo recibido
+        destination: Ruta de destino
+        max_bytes: Tamaño máximo permitido
+
+    Returns:
+        int: Bytes escritos
+
+    Raises:
+        HTTPException: 413 si el archivo supera max_bytes
+    """
+    written = 0
+    with open(destination, 'wb') as file:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            written += len(chunk)
+            if written > max_bytes:
+                break
+            await asyncio.to_thread(file.write, chunk)
+
+    if written > max_bytes:
+        destination.unlink(missing_ok=True)
+        raise HTTPException(status_code=413, detail=f"El archivo supera {max_bytes // (1024 * 1024)} MB")
+    return written
+
+
+def create_app(database_url: str = None, upload_dir: Path = None, workers: int = None) -> FastAPI:
+    """
+    Crea la aplicación FastAPI
+
+    Args:
+        database_url: URL de la base de datos (default: Config.get_database_url())
+        upload_dir: Directorio de subidas (default: Config.API_UPLOAD_DIR)
+        workers: Procesos de extracción (default: Config.API_WORKERS)
+
+    Returns:
+        FastAPI: Aplicación lista para servir
+    """
+    max_bytes = config.API_MAX_UPLOAD_MB * 1024 * 1024
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        db_manager = DatabaseManager(database_url or config.get_database_url())
+        service = IngestionService(
+            DatabaseStorage(db_manager),
+            upload_dir or config.API_UPLOAD_DIR,
+            workers=workers or config.API_WORKERS,
+            queue_size=config.API_QUEUE_SIZE
+        )
+        await service.start()
+        app.state.service = service
+        try:
+            yield
+        finally:
+            await service.stop()
+            db_manager.engine.dispose()
+
+    app = FastAPI(title='Extracción de facturas', lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=config.API_CORS_ORIGINS,
+        allow_methods=['GET', 'POST'],
+        allow_headers=['*']
+    )
+
+    @app.post('/api/facturas', status_code=202)
+    async def upload_invoice(file: UploadFile = File(...)):
+        """Recibe un PDF y lo encola para su extracción"""
+        service = app.state.service
+
+        if not (file.filename or '').lower().endswith('.pdf'):
+            raise HTTPException(status_code=415, detail="Solo se admiten archivos PDF")
+        if service.is_full():
+            raise HTTPException(status_code=503, detail="Cola de ingesta llena, reintenta más tarde")
+
+        destination = service.upload_dir / f"{uuid.uuid4().hex}.pdf"
+        await save_upload(file, destination, max_bytes)
+
+        try:
+            job = service.submit(destination, Path(file.filename).name)
+        except asyncio.QueueFull:
+            destination.unlink(missing_ok=True)
+            raise HTTPException(status_code=503, detail="Cola de ingesta llena, reintenta más tarde")
+        return job
+
+    @app.get('/api/facturas/{job_id}')
+    async def invoice_status(job_id: str):
+        """Estado de un trabajo de ingesta"""
+        job = app.state.service.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+        return job
+
+    @app.get('/api/facturas/{job_id}/resultado')
+    async def invoice_result(job_id: str):
+        """Documento extraído de un trabajo completado"""
+        service = app.state.service
+        job = service.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+        if job['estado'] != ESTADO_COMPLETADO:
+            raise HTTPException(status_code=409, detail=f"El trabajo está en estado '{job['estado']}'")
+
+        document = await asyncio.to_thread(service.db_storage.get_document, job['documento_id'])
+        if document is None:
+            raise HTTPException(status_code=404, detail="Documento no encontrado")
+        return document
+
+    @app.get('/api/documentos')
+    async def list_documents(limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None,
+                             desde: Optional[date] = None, hasta: Optional[date] = None,
+                             autor: Optional[str] = None, titulo: Optional[str] = None,
+                             min_paginas: Optional[int] = None, max_paginas: Optional[int] = None):
+        """Página de documentos guardados; 'siguiente' es el cursor de la próxima"""
+        try:
+            return await asyncio.to_thread(
+                app.state.service.db_storage.list_documents_page,
+                limit=limit, cursor=cursor, desde=desde, hasta=hasta, autor=autor,
+                titulo=titulo, min_paginas=min_paginas, max_paginas=max_paginas
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.get('/api/resumen')
+    async def monthly_summary(hogar: Optional[str] = Query(None, max_length=22),
+                              desde: Optional[date] = None, hasta: Optional[date] = None):
+        """Totales mensuales de las facturas (de un hogar o de todos) con su desglose"""
+        if desde and hasta and desde > hasta:
+            raise HTTPException(status_code=400, detail="'desde' es posterior a 'hasta'")
+        return await asyncio.to_thread(
+            app.state.service.db_storage.monthly_summary, hogar=hogar, desde=desde, hasta=hasta
+        )
+
+    return app
+
+
+app = create_app()
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host=config.API_HOST, port=config.API_PORT)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark: prueba de carga de la API HTTP de ingesta
+Lanza una instancia local de api.py (o usa --url) y mide peticiones/s y
+latencias p50/p99 de la subida de facturas y de la consulta de estado
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(BACKEND_DIR))
+
+from profiling import percentile
+
+
+async def run_load(func, total: int, concurrency: int) -> dict:
+    """
+    Ejecuta func(i) total veces con la concurrencia indicada
+
+    Returns:
+        Dict con peticiones/s, latencias p50/p99 en ms, errores y resultados
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencias = []
+    resultados = []
+    errores = 0
+
+    async def one(i):
+        nonlocal errores
+        async with semaphore:
+            inicio = time.perf_counter()
+            response = await func(i)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            if response.status_code >= 400:
+                errores += 1
+            else:
+                resultados.append(response.json())
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    duracion = time.perf_counter() - inicio
+
+    return {
+        'peticiones_por_segundo': total / duracion,
+        'p50': statistics.median(latencias),
+        'p99': percentile(latencias, 99),
+        'errores': errores,
+        'resultados': resultados
+    }
+
+
+def start_server(port: int, workers: int, temp_dir: Path) -> subprocess.Popen:
+    """Arranca api.py con base de datos y subidas temporales"""
+    env = dict(
+        os.environ,
+        API_PORT=str(port),
+        API_WORKERS=str(workers),
+        API_UPLOAD_DIR=str(temp_dir / 'uploads'),
+        DATABASE_TYPE='sqlite',
+        DATABASE_PATH=str(temp_dir / 'bench.db')
+    )
+    return subprocess.Popen(
+        [sys.executable, 'api.py'], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 30):
+    """Espera a que la API responda"""
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            await client.get('/api/facturas/ping')
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError('La API no arrancó a tiempo')
+
+
+async def benchmark(url: str, pdf_bytes: bytes, uploads: int, polls: int, concurrency: int):
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        await wait_until_ready(client)
+
+        subida = await run_load(
+            lambda i: client.post('/api/facturas', files={'file': (f'factura_{i}.pdf', pdf_bytes, 'application/pdf')}),
+            uploads, concurrency
+        )
+        job_ids = [job['id'] for job in subida['resultados']]
+
+        estado = await run_load(
+            lambda i: client.get(f'/api/facturas/{random.choice(job_ids)}'),
+            polls, concurrency
+        )
+
+        # Tiempo hasta que todas las subidas están extraídas y guardadas
+        inicio = time.perf_counter()
+        pendientes = set(job_ids)
+        while pendientes:
+            for job_id in list(pendientes):
+                job = (await client.get(f'/api/facturas/{job_id}')).json()
+                if job['estado'] in ('completado', 'error'):
+                    pendientes.discard(job_id)
+            if pendientes:
+                await asyncio.sleep(0.1)
+        drenado = time.perf_counter() - inicio
+
+    print(f"{'endpoint':>10} {'peticiones':>10} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errores':>8}")
+    for nombre, total, result in [('subida', uploads, subida), ('estado', polls, estado)]:
+        print(
+            f"{nombre:>10} {total:>10} {result['peticiones_por_segundo']:>10.1f} "
+            f"{result['p50']:>10.2f} {result['p99']:>10.2f} {result['errores']:>8}"
+        )
+    print(f"\n✓ Cola vaciada {drenado:.2f} s después de la última subida")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga de la API de ingesta')
+    parser.add_argument('--url', type=str, default=None,
+                        help='URL de una API ya arrancada (default: instancia local temporal)')
+    parser.add_argument('--port', type=int, default=8765, help='Puerto de la instancia local')
+    parser.add_argument('--workers', type=int, default=2, help='Procesos de extracción de la instancia local')
+    parser.add_argument('--uploads', type=int, default=500, help='Número de subidas')
+    parser.add_argument('--polls', type=int, default=5000, help='Número de consultas de estado')
+    parser.add_argument('--concurrency', type=int, default=50, help='Peticiones simultáneas')
+    parser.add_argument('--pdf', type=str, default=str(BACKEND_DIR / 'pdfs' / 'Naturgy_01_25.pdf'),
+                        help='PDF que se sube')
+    args = parser.parse_args()
+
+    pdf_bytes = Path(args.pdf).read_bytes()
+    server = None
+    temp_dir = None
+    url = args.url
+
+    if url is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        server = start_server(args.port, args.workers, Path(temp_dir.name))
+        url = f'http://127.0.0.1:{args.port}'
+
+    try:
+        asyncio.run(benchmark(url, pdf_bytes, args.uploads, args.polls, args.concurrency))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        if temp_dir:
+            temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
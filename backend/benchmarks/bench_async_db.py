@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark: almacenamiento en BD síncrono con hilos frente a asíncrono con tareas
+Guarda el mismo corpus con DatabaseStorage repartido entre N hilos y con
+AsyncDatabaseStorage repartido entre N tareas de asyncio, y compara los
+documentos por segundo y las latencias. Con --url se puede medir contra
+PostgreSQL (psycopg2 frente a asyncpg)
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models import DatabaseManager, create_database_engine
+from storage.database_storage import DatabaseStorage
+from storage.async_database_storage import AsyncDatabaseStorage
+from benchmarks.bench_db_batch import make_documents
+from profiling import percentile
+
+
+def summary(latencias: list, duracion: float) -> dict:
+    """docs/s y latencias p50/p99 en ms"""
+    return {
+        'docs_por_segundo': len(latencias) / duracion,
+        'p50': statistics.median(latencias),
+        'p99': percentile(latencias, 99)
+    }
+
+
+def run_sync(url: str, workers: int, documents: list) -> dict:
+    """Guarda los documentos con DatabaseStorage desde workers hilos"""
+    engine = create_database_engine(url)
+    db_manager = DatabaseManager(url, engine=engine)
+    db_manager.drop_tables()
+    storage = DatabaseStorage(db_manager)
+
+    latencias = []
+    lock = threading.Lock()
+
+    def writer(docs):
+        for document in docs:
+            inicio = time.perf_counter()
+            storage.save_document(document)
+            with lock:
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+    hilos = [threading.Thread(target=writer, args=(documents[w::workers],)) for w in range(workers)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    db_manager.drop_tables()
+    engine.dispose()
+    return summary(latencias, duracion)
+
+
+async def run_async(url: str, workers: int, documents: list) -> dict:
+    """Guarda los documentos con AsyncDatabaseStorage desde workers tareas"""
+    DatabaseManager(url, engine=create_database_engine(url)).drop_tables()
+    latencias = []
+
+    async with AsyncDatabaseStorage(url) as storage:
+        async def writer(docs):
+            for document in docs:
+                inicio = time.perf_counter()
+                await storage.save_document(document)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(writer(documents[w::workers]) for w in range(workers)))
+        duracion = time.perf_counter() - inicio
+
+    return summary(latencias, duracion)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de almacenamiento en BD síncrono frente a asíncrono')
+    parser.add_argument('--url', type=str, default=None,
+                        help='URL de base de datos (default: SQLite temporal)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8, 32],
+                        help='Hilos (síncrono) o tareas (asíncrono) concurrentes')
+    parser.add_argument('--documents', type=int, default=800, help='Documentos en total')
+    parser.add_argument('--pages', type=int, default=4, help='Páginas por documento')
+    args = parser.parse_args()
+
+    temp_dir = None
+    url = args.url
+    if url is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{Path(temp_dir.name) / 'bench.db'}"
+
+    documents = make_documents(args.documents, args.pages, 'async')
+    print(f"💾 {url.split('@')[-1]} | {args.documents} documentos x {args.pages} páginas\n")
+    print(f"{'backend':>10} {'conc.':>6} {'docs/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+
+    for workers in args.workers:
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = [
+                ('síncrono', run_sync(url, workers, documents)),
+                ('asíncrono', asyncio.run(run_async(url, workers, documents)))
+            ]
+        for nombre, result in results:
+            print(
+                f"{nombre:>10} {workers:>6} {result['docs_por_segundo']:>10.1f} "
+                f"{result['p50']:>10.2f} {result['p99']:>10.2f}"
+            )
+
+    if temp_dir:
+        temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: guardado documento a documento frente a guardado por lotes
+Compara DatabaseStorage.save_document con DatabaseStorage.save_documents
+en SQLite (por defecto) o en la base de datos indicada con --url
+"""
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models import DatabaseManager
+from storage.database_storage import DatabaseStorage
+
+
+def make_documents(num_documents: int, num_pages: int, prefix: str) -> list:
+    """
+    Genera documentos sintéticos con el formato de extract_pdf
+
+    Args:
+        num_documents: Número de documentos
+        num_pages: Páginas por documento
+        prefix: Prefijo para que las rutas no coincidan entre pasadas
+
+    Returns:
+        Lista de diccionarios de documento
+    """
+    return [{
+        'nombre_archivo': f'{prefix}_{i:06d}.pdf',
+        'ruta_archivo': f'/bench/{prefix}_{i:06d}.pdf',
+        'num_paginas': num_pages,
+        'titulo': f'Factura {i}',
+        'autor': 'Benchmark',
+        'fecha_creacion': None,
+        'paginas': [
+            {'numero_pagina': p + 1, 'contenido': f'Factura {i} página {p + 1} ' * 40}
+            for p in range(num_pages)
+        ]
+    } for i in range(num_documents)]
+
+
+def timed(func) -> float:
+    """Ejecuta func sin salida por consola y devuelve los segundos empleados"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        func()
+        return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de guardado por lotes en BD')
+    parser.add_argument('--url', type=str, default=None,
+                        help='URL de base de datos (default: SQLite temporal)')
+    parser.add_argument('--documents', type=int, default=2000, help='Documentos por pasada')
+    parser.add_argument('--pages', type=int, default=4, help='Páginas por documento')
+    parser.add_argument('--batch-sizes', type=str, default='50,200,1000',
+                        help='Tamaños de lote separados por comas')
+    args = parser.parse_args()
+
+    temp_dir = None
+    url = args.url
+    if url is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{Path(temp_dir.name) / 'bench.db'}"
+
+    db_manager = DatabaseManager(url)
+    db_manager.drop_tables()
+    storage = DatabaseStorage(db_manager)
+
+    print(f"💾 {url.split('@')[-1]} | {args.documents} documentos x {args.pages} páginas\n")
+    print(f"{'modo':>16} {'segundos':>10} {'docs/s':>10}")
+
+    documents = make_documents(args.documents, args.pages, 'fila')
+    segundos = timed(lambda: [storage.save_document(d) for d in documents])
+    print(f"{'por documento':>16} {segundos:>10.2f} {args.documents / segundos:>10.1f}")
+
+    for batch_size in [int(b) for b in args.batch_sizes.split(',')]:
+        documents = make_documents(args.documents, args.pages, f'lote{batch_size}')
+        segundos = timed(lambda: storage.save_documents(documents, batch_size=batch_size))
+        print(f"{'lote ' + str(batch_size):>16} {segundos:>10.2f} {args.documents / segundos:>10.1f}")
+
+    db_manager.drop_tables()
+    db_manager.engine.dispose()
+    if temp_dir:
+        temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
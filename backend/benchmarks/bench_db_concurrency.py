@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark: escritores concurrentes sobre la misma base de datos
+Lanza N hilos que guardan documentos con DatabaseStorage.save_document (y
+opcionalmente lectores que listan) y compara el motor sin ajustar
+(create_engine por defecto) con el de create_database_engine (pool y PRAGMA
+de Config): documentos por segundo, latencias y errores de bloqueo
+"""
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models import DatabaseManager, create_database_engine
+from storage.database_storage import DatabaseStorage
+from benchmarks.bench_db_batch import make_documents
+from profiling import percentile
+
+
+def run(engine, url: str, writers: int, documents: int, pages: int, readers: int) -> dict:
+    """
+    Guarda documents documentos con writers hilos a la vez
+
+    Returns:
+        Dict con docs/s, latencias p50/p99 en ms, errores y un ejemplo de error
+    """
+    db_manager = DatabaseManager(url, engine=engine)
+    db_manager.drop_tables()
+    with contextlib.redirect_stdout(io.StringIO()):
+        storage = DatabaseStorage(db_manager)
+
+    por_hilo = [make_documents(documents // writers, pages, f'hilo{w}') for w in range(writers)]
+    latencias, errores = [], []
+    lock = threading.Lock()
+    terminado = threading.Event()
+
+    def writer(docs):
+        for document in docs:
+            inicio = time.perf_counter()
+            try:
+                storage.save_document(document)
+            except Exception as e:
+                with lock:
+                    errores.append(str(e).splitlines()[0])
+                continue
+            with lock:
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+    def reader():
+        while not terminado.is_set():
+            try:
+                storage.list_documents()
+            except Exception as e:
+                with lock:
+                    errores.append(str(e).splitlines()[0])
+
+    hilos_lectores = [threading.Thread(target=reader) for _ in range(readers)]
+    hilos = [threading.Thread(target=writer, args=(docs,)) for docs in por_hilo]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for hilo in hilos_lectores:
+            hilo.start()
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+        terminado.set()
+        for hilo in hilos_lectores:
+            hilo.join()
+
+    db_manager.drop_tables()
+    engine.dispose()
+    return {
+        'docs_por_segundo': len(latencias) / duracion,
+        'p50': statistics.median(latencias) if latencias else 0.0,
+        'p99': percentile(latencias, 99) if latencias else 0.0,
+        'errores': len(errores),
+        'ejemplo': errores[0] if errores else ''
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de escritores concurrentes en BD')
+    parser.add_argument('--url', type=str, default=None,
+                        help='URL de base de datos (default: SQLite temporal)')
+    parser.add_argument('--writers', type=int, default=8, help='Hilos escritores')
+    parser.add_argument('--readers', type=int, default=2, help='Hilos lectores (list_documents)')
+    parser.add_argument('--documents', type=int, default=800, help='Documentos en total')
+    parser.add_argument('--pages', type=int, default=4, help='Páginas por documento')
+    args = parser.parse_args()
+
+    temp_dir = None
+    url = args.url
+    if url is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{Path(temp_dir.name) / 'bench.db'}"
+
+    print(
+        f"💾 {url.split('@')[-1]} | {args.writers} escritores, {args.readers} lectores, "
+        f"{args.documents} documentos x {args.pages} páginas\n"
+    )
+    print(f"{'motor':>12} {'docs/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errores':>8}")
+
+    for nombre, engine in [('por defecto', create_engine(url)), ('ajustado', create_database_engine(url))]:
+        result = run(engine, url, args.writers, args.documents, args.pages, args.readers)
+        print(
+            f"{nombre:>12} {result['docs_por_segundo']:>10.1f} {result['p50']:>10.2f} "
+            f"{result['p99']:>10.2f} {result['errores']:>8}"
+        )
+        if result['ejemplo']:
+            print(f"{'':>12} ↳ {result['ejemplo']}")
+
+    if temp_dir:
+        temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
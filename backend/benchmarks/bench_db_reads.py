@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: rutas de lectura de DatabaseStorage
+Mide list_documents, search_by_filename (con y sin páginas) y get_document
+sobre una base de datos con muchos documentos, junto con las consultas SQL
+que emite cada operación
+"""
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import event
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models import DatabaseManager
+from storage.database_storage import DatabaseStorage
+
+
+def populate(storage: DatabaseStorage, num_documents: int, num_pages: int):
+    """Llena la base de datos con documentos sintéticos"""
+    batch = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(num_documents):
+            batch.append({
+                'nombre_archivo': f'Naturgy_{i:06d}.pdf',
+                'ruta_archivo': f'/bench/Naturgy_{i:06d}.pdf',
+                'num_paginas': num_pages,
+                'titulo': f'Factura {i}',
+                'autor': 'Naturgy',
+                'paginas': [
+                    {'numero_pagina': p + 1, 'contenido': f'Factura {i} página {p + 1} ' * 20}
+                    for p in range(num_pages)
+                ]
+            })
+            if len(batch) == 5000:
+                storage.save_documents(batch, batch_size=5000)
+                batch = []
+        if batch:
+            storage.save_documents(batch, batch_size=5000)
+
+
+def measure(engine, func) -> tuple:
+    """
+    Ejecuta func contando consultas SQL
+
+    Returns:
+        Tupla (segundos, consultas, resultado)
+    """
+    queries = [0]
+
+    def before_cursor_execute(*args):
+        queries[0] += 1
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        inicio = time.perf_counter()
+        result = func()
+        return time.perf_counter() - inicio, queries[0], result
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de lecturas en BD')
+    parser.add_argument('--url', type=str, default=None,
+                        help='URL de base de datos (default: SQLite temporal)')
+    parser.add_argument('--documents', type=int, default=100000, help='Documentos a generar')
+    parser.add_argument('--pages', type=int, default=4, help='Páginas por documento')
+    args = parser.parse_args()
+
+    temp_dir = None
+    url = args.url
+    if url is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{Path(temp_dir.name) / 'bench.db'}"
+
+    db_manager = DatabaseManager(url)
+    db_manager.drop_tables()
+    storage = DatabaseStorage(db_manager)
+
+    print(f"📦 Generando {args.documents} documentos x {args.pages} páginas...")
+    populate(storage, args.documents, args.pages)
+
+    operations = [
+        ('list_documents', storage.list_documents),
+        ('search (páginas)', lambda: storage.search_by_filename('Naturgy_0001')),
+        ('search (cabeceras)', lambda: storage.search_by_filename('Naturgy_0001', include_pages=False)),
+        ('get_document', lambda: storage.get_document(args.documents // 2)),
+        ('get_document (cab.)', lambda: storage.get_document(args.documents // 2, include_pages=False)),
+    ]
+
+    print(f"\n{'operación':>20} {'segundos':>10} {'consultas':>10} {'resultados':>11}")
+    for name, func in operations:
+        segundos, consultas, result = measure(db_manager.engine, func)
+        count = len(result) if isinstance(result, list) else 1
+        print(f"{name:>20} {segundos:>10.3f} {consultas:>10} {count:>11}")
+
+    db_manager.drop_tables()
+    db_manager.engine.dispose()
+    if temp_dir:
+        temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
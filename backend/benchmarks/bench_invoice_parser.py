@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: análisis de facturas por segundo y por núcleo
+Mide el analizador sobre textos sintéticos de facturas y el modo por lotes
+(--parse-invoices) sobre documentos ya guardados en una base de datos temporal
+"""
+import argparse
+import contextlib
+import io
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import Config
+from models import DatabaseManager
+from storage.database_storage import DatabaseStorage
+from extractors.invoice_parser import CUPS_LETRAS_CONTROL, parse_invoice_text
+from main import parse_stored_invoices
+from benchmarks.bench_search import VOCABULARIO
+
+
+def synthetic_invoice(rng: random.Random) -> str:
+    """Texto de una factura de Naturgy de tres páginas con valores aleatorios"""
+    digits = f"{rng.randrange(10 ** 16):016d}"
+    cociente, resto = divmod(int(digits) % 529, 23)
+    cups = f"ES{digits}{CUPS_LETRAS_CONTROL[cociente]}{CUPS_LETRAS_CONTROL[resto]}"
+    mes = rng.randint(1, 11)
+    relleno = lambda: ' '.join(rng.choices(VOCABULARIO, k=400))
+
+    return '\n'.join([
+        'NATURGY IBERIA, S.A. Factura de electricidad',
+        f"CUPS: {cups}",
+        f"Periodo de facturación: del 01/{mes:02d}/2025 a 28/{mes + 1:02d}/2025",
+        relleno(),
+        f"Consumo total: {rng.randint(50, 3000)} kWh",
+        relleno(),
+        f"Término de potencia {rng.randint(5, 40)},{rng.randint(0, 99):02d} €",
+        f"TOTAL IMPORTE FACTURA {rng.randint(20, 600)},{rng.randint(0, 99):02d} €",
+        relleno()
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del analizador de facturas')
+    parser.add_argument('--invoices', type=int, default=20000, help='Facturas sintéticas')
+    parser.add_argument('--workers', type=int, default=1, help='Procesos del modo por lotes')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    texts = [synthetic_invoice(rng) for _ in range(args.invoices)]
+
+    inicio = time.perf_counter()
+    for text in texts:
+        parse_invoice_text(text)
+    segundos = time.perf_counter() - inicio
+    print(f"🧾 Analizador: {args.invoices / segundos:,.0f} facturas/s en un núcleo")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        Config.DATABASE_TYPE = 'sqlite'
+        Config.DATABASE_PATH = str(Path(temp_dir) / 'bench.db')
+        db_manager = DatabaseManager(Config.get_database_url())
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            DatabaseStorage(db_manager).save_documents([{
+                'nombre_archivo': f'factura_{i:06d}.pdf',
+                'ruta_archivo': f'/bench/factura_{i:06d}.pdf',
+                'num_paginas': 1,
+                'paginas': [{'numero_pagina': 1, 'contenido': text}]
+            } for i, text in enumerate(texts)], batch_size=2000)
+            resumen = parse_stored_invoices(args.workers)
+        db_manager.engine.dispose()
+
+    print(
+        f"🗄 Modo por lotes ({args.workers} procesos): {resumen['analizadas'] / resumen['segundos']:,.0f} "
+        f"facturas/s, {resumen['facturas_por_segundo_proceso']:,.0f} por proceso "
+        f"(lectura de la BD y guardado incluidos)"
+    )
+    for campo, valor in resumen['confianza_media'].items():
+        print(f"  - {campo}: confianza media {valor:.2f}")
+
+
+if __name__ == '__main__':
+    main()
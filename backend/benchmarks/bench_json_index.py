@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark: listado y filtros de la salida JSON con y sin índice
+Compara filtrar abriendo todos los archivos (como antes del índice) con
+consultar el índice, y mide el coste de reconstruirlo
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from storage.json_storage import INDEX_FILENAME, JSONStorage
+from benchmarks.bench_search import VOCABULARIO
+
+
+def timed(func) -> tuple:
+    """Devuelve (resultado, segundos) de func()"""
+    inicio = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - inicio
+
+
+def filter_by_opening_files(output_dir: Path, min_paginas: int, titulo: str) -> list:
+    """Filtra abriendo cada archivo JSON del directorio"""
+    result = []
+    for json_path in output_dir.glob('*.json'):
+        with open(json_path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data['num_paginas'] >= min_paginas and titulo in (data.get('titulo') or '').lower():
+            result.append(json_path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del índice de la salida JSON')
+    parser.add_argument('--docs', type=int, default=20000, help='Archivos JSON del directorio')
+    args = parser.parse_args()
+
+    temp_dir = Path(tempfile.mkdtemp(prefix='bench_json_index_'))
+    rng = random.Random(42)
+
+    try:
+        storage = JSONStorage(temp_dir)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(args.docs):
+                paginas = rng.randint(1, 6)
+                storage.save_document({
+                    'nombre_archivo': f'factura_{i:07d}.pdf',
+                    'ruta_archivo': f'/bench/factura_{i:07d}.pdf',
+                    'num_paginas': paginas,
+                    'titulo': rng.choice(['Factura electricidad', 'Factura gas', 'Contrato', None]),
+                    'paginas': [
+                        {'numero_pagina': p + 1, 'contenido': ' '.join(rng.choices(VOCABULARIO, k=300))}
+                        for p in range(paginas)
+                    ]
+                })
+
+        sin_indice, t_files = timed(lambda: filter_by_opening_files(temp_dir, 4, 'gas'))
+        con_indice, t_index = timed(lambda: storage.query_documents(min_paginas=4, titulo='gas'))
+        _, t_list = timed(storage.list_documents)
+        assert len(sin_indice) == len(con_indice)
+
+        _, t_incremental = timed(storage.rebuild_index)
+        storage.index.close()
+        for path in temp_dir.glob(f'{INDEX_FILENAME}*'):
+            path.unlink()
+        _, t_full = timed(lambda: JSONStorage(temp_dir))
+
+        print(f"📂 {args.docs} archivos JSON, {len(con_indice)} cumplen el filtro\n")
+        print(f"  Filtrar abriendo los archivos:     {t_files * 1000:>10.1f} ms")
+        print(f"  Filtrar con el índice:             {t_index * 1000:>10.1f} ms")
+        print(f"  Listar todos con el índice:        {t_list * 1000:>10.1f} ms")
+        print(f"  Sincronizar índice sin cambios:    {t_incremental * 1000:>10.1f} ms")
+        print(f"  Reconstruir índice desde cero:     {t_full * 1000:>10.1f} ms")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark: almacenamiento JSON Lines frente a un archivo JSON por documento
+Guarda el mismo corpus sintético con JSONStorage y JSONLStorage y compara el
+tamaño, la escritura, el listado, la carga de documentos sueltos y la compactación
+"""
+import argparse
+import contextlib
+import io
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from storage.json_storage import JSONStorage
+from storage.jsonl_storage import JSONLStorage
+from benchmarks.bench_search import VOCABULARIO
+
+
+def synthetic_documents(num_docs: int, pages_per_doc: int, seed: int):
+    """Genera documentos con páginas de texto sintético reproducible"""
+    rng = random.Random(seed)
+    for i in range(num_docs):
+        yield {
+            'nombre_archivo': f'factura_{i:07d}.pdf',
+            'ruta_archivo': f'/bench/factura_{i:07d}.pdf',
+            'num_paginas': pages_per_doc,
+            'hash_contenido': f'{i:064x}',
+            'paginas': [
+                {'numero_pagina': p + 1, 'contenido': ' '.join(rng.choices(VOCABULARIO, k=300))}
+                for p in range(pages_per_doc)
+            ]
+        }
+
+
+def directory_size(path: Path) -> int:
+    """Tamaño total en bytes de los archivos de un directorio"""
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+def timed(func) -> tuple:
+    """Devuelve (resultado, segundos) de func()"""
+    inicio = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSONL frente a JSON')
+    parser.add_argument('--docs', type=int, default=20000, help='Documentos del corpus')
+    parser.add_argument('--pages-per-doc', type=int, default=3, help='Páginas por documento')
+    parser.add_argument('--loads', type=int, default=1000, help='Documentos sueltos que se cargan')
+    args = parser.parse_args()
+
+    temp_dir = Path(tempfile.mkdtemp(prefix='bench_jsonl_'))
+    rng = random.Random(7)
+
+    try:
+        json_storage = JSONStorage(temp_dir / 'json')
+        jsonl_storage = JSONLStorage(temp_dir / 'jsonl')
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            json_paths, json_write = timed(lambda: [
+                json_storage.save_document(d) for d in synthetic_documents(args.docs, args.pages_per_doc, 42)
+            ])
+            claves, jsonl_write = timed(lambda: [
+                jsonl_storage.save_document(d) for d in synthetic_documents(args.docs, args.pages_per_doc, 42)
+            ])
+            jsonl_storage.close()
+
+        json_size = directory_size(temp_dir / 'json')
+        jsonl_size = directory_size(temp_dir / 'jsonl')
+
+        muestra = rng.sample(range(args.docs), min(args.loads, args.docs))
+        _, json_list = timed(json_storage.list_documents)
+        _, json_load = timed(lambda: [json_storage.load_document(json_paths[i]) for i in muestra])
+
+        reopened, jsonl_open = timed(lambda: JSONLStorage(temp_dir / 'jsonl'))
+        _, jsonl_list = timed(reopened.list_documents)
+        _, jsonl_load = timed(lambda: [reopened.load_document(claves[i]) for i in muestra])
+
+        # Volver a guardar la mitad del corpus deja esas versiones obsoletas
+        with contextlib.redirect_stdout(io.StringIO()):
+            for document in synthetic_documents(args.docs // 2, args.pages_per_doc, 43):
+                reopened.save_document(document)
+            obsoletos = reopened.stats()['bytes_obsoletos']
+            resumen, compact = timed(reopened.compact)
+        reopened.close()
+
+        print(f"📦 {args.docs} documentos, {args.docs * args.pages_per_doc} páginas\n")
+        print(f"{'':>24} {'JSON':>12} {'JSONL':>12}")
+        print(f"{'tamaño (MB)':>24} {json_size / 1e6:>12.1f} {jsonl_size / 1e6:>12.1f}")
+        print(f"{'escritura (s)':>24} {json_write:>12.2f} {jsonl_write:>12.2f}")
+        print(f"{'abrir índice (ms)':>24} {'-':>12} {jsonl_open * 1000:>12.1f}")
+        print(f"{'listado (ms)':>24} {json_list * 1000:>12.1f} {jsonl_list * 1000:>12.1f}")
+        print(f"{f'{len(muestra)} cargas (ms)':>24} {json_load * 1000:>12.1f} {jsonl_load * 1000:>12.1f}")
+        print(
+            f"\n🧹 Compactación: {obsoletos / 1e6:.1f} MB obsoletos, "
+            f"{resumen['bytes_liberados'] / 1e6:.1f} MB liberados en {compact:.2f} s"
+        )
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: listado de la BD completo, por OFFSET y por cursor (keyset)
+Llena una base de datos con documentos sin texto y mide cargar el listado
+entero con list_documents, leer una página profunda con LIMIT/OFFSET y
+leerla con list_documents_page, además de recorrer toda la tabla por páginas
+"""
+import argparse
+import contextlib
+import io
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import select
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models import DatabaseManager, Documento
+from storage.database_storage import LIST_COLUMNS, DatabaseStorage, encode_cursor
+
+
+def timed(func) -> tuple:
+    """Devuelve (resultado, segundos) de func()"""
+    inicio = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del listado paginado de la BD')
+    parser.add_argument('--docs', type=int, default=200000, help='Documentos de la tabla')
+    parser.add_argument('--page-size', type=int, default=100, help='Documentos por página')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_manager = DatabaseManager(f"sqlite:///{Path(temp_dir) / 'bench.db'}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            storage = DatabaseStorage(db_manager)
+
+        rng = random.Random(42)
+        inicio = datetime(2020, 1, 1)
+        with db_manager.engine.begin() as connection:
+            connection.execute(Documento.__table__.insert(), [
+                {
+                    'nombre_archivo': f'factura_{i:07d}.pdf',
+                    'ruta_archivo': f'/bench/factura_{i:07d}.pdf',
+                    'num_paginas': rng.randint(1, 8),
+                    'autor': rng.choice(['Naturgy', 'Iberdrola', 'Endesa', None]),
+                    'fecha_procesamiento': inicio + timedelta(minutes=i)
+                }
+                for i in range(args.docs)
+            ])
+
+        # Página a tres cuartos de la tabla
+        offset = args.docs * 3 // 4
+        with db_manager.engine.connect() as connection:
+            anterior = connection.execute(
+                select(Documento.fecha_procesamiento, Documento.id)
+                .order_by(Documento.fecha_procesamiento, Documento.id).offset(offset - 1).limit(1)
+            ).one()
+
+        def by_offset():
+            with db_manager.engine.connect() as connection:
+                return connection.execute(
+                    select(*LIST_COLUMNS).order_by(Documento.fecha_procesamiento, Documento.id)
+                    .offset(offset).limit(args.page_size)
+                ).all()
+
+        cursor = encode_cursor(anterior.fecha_procesamiento, anterior.id)
+        _, t_full = timed(storage.list_documents)
+        con_offset, t_offset = timed(by_offset)
+        con_cursor, t_cursor = timed(lambda: storage.list_documents_page(args.page_size, cursor))
+        assert [row.id for row in con_offset] == [doc['id'] for doc in con_cursor['documentos']]
+        _, t_walk = timed(lambda: sum(len(page) for page in storage.iter_document_pages(args.page_size)))
+        _, t_author = timed(lambda: storage.list_documents_page(args.page_size, cursor, autor='Naturgy'))
+
+        print(f"📋 {args.docs} documentos, páginas de {args.page_size}\n")
+        filas = [
+            ('list_documents (tabla entera)', t_full),
+            (f'Página {offset // args.page_size} con OFFSET', t_offset),
+            ('Misma página con cursor', t_cursor),
+            ('Misma página con cursor y autor', t_author),
+            ('Recorrer la tabla por cursor', t_walk)
+        ]
+        for nombre, segundos in filas:
+            print(f"  {nombre + ':':<38}{segundos * 1000:>10.2f} ms")
+        db_manager.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark: inventario de metadatos y número de páginas
+Compara la carga anterior (leer el archivo y forzar len(reader.pages)) con
+read_pdf_info, que proyecta el archivo en memoria y no recorre las páginas
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import PyPDF2
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from extractors.pdf_extractor import read_pdf_info
+from benchmarks.bench_workers import build_corpus
+
+
+def eager_info(pdf_path: Path) -> dict:
+    """Carga previa a la proyección en memoria: análisis completo del árbol de páginas"""
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        return {'num_paginas': len(reader.pages), 'metadata': reader.metadata}
+
+
+def timed_scan(pdf_files: list, func) -> float:
+    """Devuelve los segundos empleados en aplicar func a todos los archivos"""
+    inicio = time.perf_counter()
+    for pdf_file in pdf_files:
+        func(pdf_file)
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de inventario de PDFs')
+    parser.add_argument('--files', type=int, default=2000, help='Archivos del corpus replicado')
+    parser.add_argument('--source', type=str, default=str(Path(__file__).parent.parent / 'pdfs'),
+                        help='Directorio con los PDFs de muestra (mejor si son grandes)')
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore')
+    temp_dir = Path(tempfile.mkdtemp(prefix='bench_scan_'))
+
+    try:
+        pdf_files = build_corpus(Path(args.source), temp_dir, args.files)
+
+        print(f"{'modo':>14} {'segundos':>10} {'arch/s':>10}")
+        for name, func in [('carga completa', eager_info), ('read_pdf_info', read_pdf_info)]:
+            segundos = timed_scan(pdf_files, func)
+            print(f"{name:>14} {segundos:>10.2f} {len(pdf_files) / segundos:>10.1f}")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark: consultas sobre una base de datos anterior a las migraciones y tras migrarla
+Crea una base de datos grande con el esquema sin índices (como la dejaba
+create_all antes de migrations.py), mide las consultas habituales con su plan
+de ejecución, aplica las migraciones y repite las mismas mediciones. También
+compara el coste de construir DatabaseStorage antes y después de memorizar
+la creación del esquema
+"""
+import argparse
+import contextlib
+import io
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models import Base, DatabaseManager, Documento, Pagina, create_database_engine
+from migrations import ensure_schema
+from storage.database_storage import DatabaseStorage
+from storage.search_index import get_search_index
+
+# Índices que añaden las migraciones (la clave primaria ya existía)
+INDICES_NUEVOS = [index for table in (Documento.__table__, Pagina.__table__) for index in table.indexes]
+
+CONSULTAS = [
+    ('páginas de un documento',
+     "SELECT id, numero_pagina, contenido FROM paginas WHERE documento_id = :id ORDER BY numero_pagina"),
+    ('borrar sus páginas',
+     "DELETE FROM paginas WHERE documento_id = :id"),
+    ('documento por ruta',
+     "SELECT id FROM documentos WHERE ruta_archivo = '/bench/factura_' || printf('%07d', :id) || '.pdf'"),
+    ('documento por hash',
+     "SELECT id FROM documentos WHERE hash_contenido = printf('%064x', :id)"),
+    ('documento por nombre',
+     "SELECT id FROM documentos WHERE nombre_archivo = 'factura_' || printf('%07d', :id) || '.pdf'"),
+    ('nombre con LIKE %...%',
+     "SELECT id FROM documentos WHERE nombre_archivo LIKE '%' || printf('%07d', :id) || '%'"),
+]
+
+
+def build_legacy_database(engine, docs: int, pages: int):
+    """Tablas sin índices secundarios ni versión de esquema, con datos sintéticos"""
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for index in INDICES_NUEVOS:
+            connection.execute(text(f"DROP INDEX {index.name}"))
+        connection.execute(text("DROP TABLE schema_version"))
+
+        connection.execute(Documento.__table__.insert(), [
+            {
+                'id': i,
+                'nombre_archivo': f'factura_{i:07d}.pdf',
+                'ruta_archivo': f'/bench/factura_{i:07d}.pdf',
+                'num_paginas': pages,
+                'hash_contenido': f'{i:064x}'
+            }
+            for i in range(1, docs + 1)
+        ])
+        connection.execute(Pagina.__table__.insert(), [
+            {'documento_id': i, 'numero_pagina': p, 'contenido': f'Página {p} de la factura {i}'}
+            for i in range(1, docs + 1) for p in range(1, pages + 1)
+        ])
+        get_search_index(engine).create(connection)
+
+
+def measure(engine, docs: int, repeticiones: int) -> list:
+    """Plan y tiempo medio (ms) de cada consulta de CONSULTAS"""
+    rng = random.Random(7)
+    ids = [rng.randint(1, docs) for _ in range(repeticiones)]
+    result = []
+
+    for nombre, sql in CONSULTAS:
+        # Todo en una transacción que se deshace, para que el DELETE no altere los datos
+        with engine.connect() as connection:
+            plan = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"), {'id': 1}).all()
+            inicio = time.perf_counter()
+            for doc_id in ids:
+                rows = connection.execute(text(sql), {'id': doc_id})
+                if rows.returns_rows:
+                    rows.all()
+            ms = (time.perf_counter() - inicio) * 1000 / len(ids)
+            connection.rollback()
+        result.append((nombre, ms, '; '.join(row[-1] for row in plan)))
+
+    return result
+
+
+def constructor_ms(db_manager, memorizado: bool, repeticiones: int = 50) -> float:
+    """Tiempo medio de construir DatabaseStorage"""
+    search_index = get_search_index(db_manager.engine)
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeticiones):
+            if memorizado:
+                DatabaseStorage(db_manager)
+            else:
+                # Lo que hacía el constructor antes de las migraciones
+                Base.metadata.create_all(db_manager.engine)
+                with db_manager.engine.begin() as connection:
+                    search_index.create(connection)
+    return (time.perf_counter() - inicio) * 1000 / repeticiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de índices y migraciones del esquema')
+    parser.add_argument('--docs', type=int, default=100000, help='Documentos de la base de datos')
+    parser.add_argument('--pages', type=int, default=3, help='Páginas por documento')
+    parser.add_argument('--queries', type=int, default=200, help='Repeticiones de cada consulta')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        url = f"sqlite:///{Path(temp_dir) / 'bench.db'}"
+        engine = create_database_engine(url)
+        build_legacy_database(engine, args.docs, args.pages)
+        db_manager = DatabaseManager(url, engine=engine)
+
+        antes = measure(engine, args.docs, args.queries)
+        constructor_antes = constructor_ms(db_manager, memorizado=False)
+
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            aplicadas = ensure_schema(engine)
+        migracion = time.perf_counter() - inicio
+
+        despues = measure(engine, args.docs, args.queries)
+        constructor_despues = constructor_ms(db_manager, memorizado=True)
+        engine.dispose()
+
+    print(f"🗄️  {args.docs} documentos x {args.pages} páginas")
+    print(f"   Migraciones {aplicadas} aplicadas en {migracion:.2f} s\n")
+    print(f"{'consulta':>24} {'antes ms':>10} {'después ms':>11}")
+    for (nombre, ms_antes, _), (_, ms_despues, _) in zip(antes, despues):
+        print(f"{nombre:>24} {ms_antes:>10.3f} {ms_despues:>11.3f}")
+
+    print("\nPlanes de ejecución:")
+    for (nombre, _, plan_antes), (_, _, plan_despues) in zip(antes, despues):
+        print(f"  {nombre}\n    antes:   {plan_antes}\n    después: {plan_despues}")
+
+    print(f"\n🏗️  Construir DatabaseStorage: {constructor_antes:.3f} ms antes, {constructor_despues:.3f} ms después")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: OCR de respaldo en páginas por segundo y por núcleo
+Extrae los PDFs de muestra (facturas en imagen) con OCR usando 1..W procesos.
+Requiere Tesseract, Poppler, pytesseract y pdf2image
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from extractors.ocr import OCRFallback, get_ocr_engine
+from extractors.pdf_extractor import extract_pdf
+
+
+def run_benchmark(pdf_files: list, engine, workers: int) -> dict:
+    """
+    Extrae todos los PDFs con OCR y el número de procesos indicado
+
+    Returns:
+        Dict con páginas reconocidas, segundos y páginas/s (total y por núcleo)
+    """
+    paginas_ocr = 0
+
+    with OCRFallback(engine, workers=workers) as ocr, contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        for pdf_file in pdf_files:
+            document = extract_pdf(pdf_file, ocr)
+            paginas_ocr += sum(1 for p in document['paginas'] if p['metodo_extraccion'] == 'ocr')
+        duracion = time.perf_counter() - inicio
+
+    return {
+        'workers': workers,
+        'paginas': paginas_ocr,
+        'segundos': duracion,
+        'paginas_por_segundo': paginas_ocr / duracion,
+        'paginas_por_segundo_nucleo': paginas_ocr / duracion / workers
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de OCR de respaldo')
+    parser.add_argument('--source', type=str, default=str(Path(__file__).parent.parent / 'pdfs'),
+                        help='Directorio con PDFs en imagen')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1,
+                        help='Número máximo de procesos de OCR')
+    parser.add_argument('--engine', type=str, default='tesseract', help='Motor de OCR')
+    parser.add_argument('--lang', type=str, default='spa', help='Idioma del OCR')
+    parser.add_argument('--dpi', type=int, default=300, help='Resolución de rasterizado')
+    args = parser.parse_args()
+
+    pdf_files = sorted(Path(args.source).glob('*.pdf'))
+    engine = get_ocr_engine(args.engine, lang=args.lang, dpi=args.dpi)
+
+    workers_list = [w for w in sorted({1, 2, 4, 8, args.max_workers}) if w <= args.max_workers]
+
+    print(f"{'workers':>8} {'páginas':>8} {'segundos':>10} {'pág/s':>8} {'pág/s/núcleo':>13}")
+    for workers in workers_list:
+        result = run_benchmark(pdf_files, engine, workers)
+        print(
+            f"{result['workers']:>8} {result['paginas']:>8} {result['segundos']:>10.2f} "
+            f"{result['paginas_por_segundo']:>8.2f} {result['paginas_por_segundo_nucleo']:>13.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
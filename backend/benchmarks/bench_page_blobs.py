@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Benchmark: texto de las páginas en línea o compartido y comprimido ('blob')
+Genera un año de facturas sintéticas de Naturgy (primera página y detalle
+propios de cada factura, condiciones del contrato repetidas en todas las del
+mismo cliente y páginas legales comunes a todas), las guarda con
+DB_PAGE_STORAGE=inline y con 'blob', y compara el tamaño de la base de datos
+tras VACUUM y la latencia de get_document y search_content
+"""
+import argparse
+import contextlib
+import io
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models import DatabaseManager
+from storage.database_storage import PAGE_STORAGE_MODES, DatabaseStorage
+from profiling import percentile
+from benchmarks.bench_search import VOCABULARIO
+
+BUSQUEDAS = ['suministro', 'reclamaciones consumo', 'potencia contratada', 'bono social']
+
+
+def legal_pages(rng: random.Random, num: int, palabras: int = 450) -> list:
+    """Páginas de condiciones generales e información legal, iguales en todas las facturas"""
+    return [' '.join(rng.choice(VOCABULARIO) for _ in range(palabras)) for _ in range(num)]
+
+
+def make_year(households: int, legales: int, seed: int = 11) -> list:
+    """Doce facturas mensuales de Naturgy por cliente"""
+    rng = random.Random(seed)
+    comunes = legal_pages(rng, legales)
+    documentos = []
+
+    for cliente in range(households):
+        cups = f"ES0021{cliente:012d}LB"
+        contrato = (
+            f"Titular: cliente {cliente}. CUPS: {cups}. Tarifa 2.0TD. Potencia contratada P1 "
+            f"{rng.choice([3.3, 4.6, 5.75])} kW. " + ' '.join(rng.choice(VOCABULARIO) for _ in range(250))
+        )
+        for mes in range(1, 13):
+            consumo = rng.randint(120, 600)
+            portada = (
+                f"NATURGY IBERIA, S.A.\nCUPS: {cups}\nPeriodo de facturación: mes {mes:02d}/2024\n"
+                f"Consumo total: {consumo} kWh\nTOTAL IMPORTE FACTURA {consumo * 0.19:.2f} €"
+            )
+            detalle = ' '.join(rng.choice(VOCABULARIO) for _ in range(200)) + f" lectura {rng.randint(10000, 99999)}"
+            paginas = [portada, detalle, contrato] + comunes
+            documentos.append({
+                'nombre_archivo': f'naturgy_{cliente:05d}_{mes:02d}.pdf',
+                'ruta_archivo': f'/bench/naturgy_{cliente:05d}_{mes:02d}.pdf',
+                'num_paginas': len(paginas),
+                'autor': 'Naturgy',
+                'paginas': [
+                    {'numero_pagina': i, 'contenido': contenido, 'metodo_extraccion': 'texto'}
+                    for i, contenido in enumerate(paginas, start=1)
+                ]
+            })
+
+    return documentos
+
+
+def latencies(func, args: list) -> list:
+    """Latencia en ms de func(arg) para cada argumento"""
+    result = []
+    for arg in args:
+        inicio = time.perf_counter()
+        func(arg)
+        result.append((time.perf_counter() - inicio) * 1000)
+    return result
+
+
+def run(mode: str, documentos: list, lecturas: int, temp_dir: Path) -> dict:
+    path = temp_dir / f'{mode}.db'
+    db_manager = DatabaseManager(f"sqlite:///{path}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        storage = DatabaseStorage(db_manager, page_storage=mode)
+        inicio = time.perf_counter()
+        doc_ids = storage.save_documents(documentos)
+        escritura = time.perf_counter() - inicio
+
+    # VACUUM fuera de SQLAlchemy: el motor abre siempre una transacción
+    db_manager.engine.dispose()
+    with contextlib.closing(sqlite3.connect(path, isolation_level=None)) as connection:
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        connection.execute("VACUUM")
+
+    rng = random.Random(3)
+    muestra = [rng.choice(doc_ids) for _ in range(lecturas)]
+    lectura = latencies(storage.get_document, muestra)
+    busqueda = latencies(storage.search_content, BUSQUEDAS * 5)
+
+    db_manager.engine.dispose()
+    return {
+        'mb': path.stat().st_size / 1024 / 1024,
+        'escritura': escritura,
+        'lectura': lectura,
+        'busqueda': busqueda
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del almacenamiento de páginas compartido y comprimido')
+    parser.add_argument('--households', type=int, default=300, help='Clientes (12 facturas cada uno)')
+    parser.add_argument('--legal-pages', type=int, default=2, help='Páginas legales comunes por factura')
+    parser.add_argument('--reads', type=int, default=500, help='Lecturas de get_document')
+    args = parser.parse_args()
+
+    documentos = make_year(args.households, args.legal_pages)
+    paginas = sum(len(doc['paginas']) for doc in documentos)
+    texto_mb = sum(len(p['contenido'].encode('utf-8')) for doc in documentos for p in doc['paginas']) / 1024 / 1024
+    print(f"🧾 {len(documentos)} facturas, {paginas} páginas, {texto_mb:.1f} MB de texto\n")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        resultados = {mode: run(mode, documentos, args.reads, Path(temp_dir)) for mode in PAGE_STORAGE_MODES}
+
+    print(f"{'modo':>8} {'BD MB':>8} {'guardar s':>10} {'leer p50':>9} {'leer p95':>9} {'buscar p50':>11} {'buscar p95':>11}")
+    for mode, r in resultados.items():
+        print(
+            f"{mode:>8} {r['mb']:>8.1f} {r['escritura']:>10.2f} "
+            f"{percentile(r['lectura'], 50):>9.3f} {percentile(r['lectura'], 95):>9.3f} "
+            f"{percentile(r['busqueda'], 50):>11.2f} {percentile(r['busqueda'], 95):>11.2f}"
+        )
+
+    reduccion = 1 - resultados['blob']['mb'] / resultados['inline']['mb']
+    print(f"\n💾 Reducción de tamaño con 'blob': {reduccion:.0%} (latencias en ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark: extracción por rangos de páginas de un único PDF grande
+Genera facturas sintéticas con capa de texto de 50, 200 y 500 páginas y
+mide extract_pdf en serie y con PageRangePool de 2..W procesos (mejor de
+varias repeticiones, con el pool ya arrancado)
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from extractors.pdf_extractor import PageRangePool, extract_pdf
+from benchmarks.synthetic_pdfs import make_invoice_pdf
+
+
+def best_time(pdf_path: Path, repeat: int, page_pool: PageRangePool = None) -> float:
+    """Mejor tiempo de extract_pdf en segundos"""
+    tiempos = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            extract_pdf(pdf_path, page_pool=page_pool)
+            tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la extracción por rangos de páginas')
+    parser.add_argument('--pages', type=int, nargs='+', default=[50, 200, 500], help='Páginas de cada PDF')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({2, os.cpu_count() or 1} - {1}) or [2],
+                        help='Procesos del pool a probar')
+    parser.add_argument('--range-pages', type=int, default=0, help='Páginas por rango (0 = automático)')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeticiones (se toma la mejor)')
+    args = parser.parse_args()
+
+    print(f"📑 {os.cpu_count()} CPU; mejor de {args.repeat} repeticiones\n")
+    cabecera = f"{'páginas':>8} {'serie s':>9}" + ''.join(f" {f'{w} proc. s':>11} {'×':>6}" for w in args.workers)
+    print(cabecera)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pools = {w: PageRangePool(w, min_pages=1, range_pages=args.range_pages) for w in args.workers}
+        try:
+            for num_pages in args.pages:
+                pdf_path = make_invoice_pdf(Path(temp_dir) / f'factura_{num_pages}p.pdf', num_pages)
+                serie = best_time(pdf_path, args.repeat)
+                fila = f"{num_pages:>8} {serie:>9.3f}"
+                for workers, pool in pools.items():
+                    # Arrancar los procesos antes de medir
+                    best_time(pdf_path, 1, pool)
+                    segundos = best_time(pdf_path, args.repeat, pool)
+                    fila += f" {segundos:>11.3f} {serie / segundos:>6.2f}"
+                print(fila)
+        finally:
+            for pool in pools.values():
+                pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark: exportación Parquet frente al directorio de salida JSON
+Guarda el mismo corpus sintético con JSONStorage y ParquetStorage y compara
+el tamaño en disco y el tiempo de recorrer todo el corpus
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pyarrow.compute as pc
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from storage.json_storage import JSONStorage
+from storage.parquet_storage import ParquetStorage
+from benchmarks.bench_search import PALABRAS_RARAS, VOCABULARIO
+
+
+def synthetic_documents(num_docs: int, pages_per_doc: int, seed: int):
+    """Genera documentos con páginas de texto sintético reproducible"""
+    rng = random.Random(seed)
+    for i in range(num_docs):
+        paginas = []
+        for p in range(pages_per_doc):
+            palabras = rng.choices(VOCABULARIO, k=300)
+            if rng.random() < 0.01:
+                palabras.append(rng.choice(PALABRAS_RARAS))
+            paginas.append({'numero_pagina': p + 1, 'contenido': ' '.join(palabras), 'metodo_extraccion': 'texto'})
+        yield {
+            'nombre_archivo': f'factura_{i:07d}.pdf',
+            'ruta_archivo': f'/bench/factura_{i:07d}.pdf',
+            'num_paginas': pages_per_doc,
+            'hash_contenido': f'{i:064x}',
+            'paginas': paginas
+        }
+
+
+def directory_size(path: Path) -> int:
+    """Tamaño total en bytes de los archivos de un directorio"""
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+def timed(func) -> tuple:
+    """Devuelve (resultado, segundos) de func()"""
+    inicio = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - inicio
+
+
+def scan_json(storage: JSONStorage, term: str) -> int:
+    """Páginas que contienen term, abriendo todos los JSON"""
+    total = 0
+    for json_path in storage.list_documents():
+        document = storage.load_document(json_path)
+        total += sum(term in page['contenido'] for page in document['paginas'])
+    return total
+
+
+def scan_parquet(storage: ParquetStorage, term: str) -> int:
+    """Páginas que contienen term, leyendo solo la columna de contenido"""
+    contenido = storage.read_pages(['contenido']).column('contenido')
+    # El kernel de expresiones regulares (RE2) es varias veces más rápido que match_substring
+    return pc.sum(pc.match_substring_regex(contenido, re.escape(term))).as_py() or 0
+
+
+def headers_json(storage: JSONStorage) -> int:
+    """Páginas totales del corpus según las cabeceras JSON"""
+    total = 0
+    for json_path in storage.list_documents():
+        with open(json_path, encoding='utf-8') as f:
+            total += json.load(f)['num_paginas']
+    return total
+
+
+def headers_parquet(storage: ParquetStorage) -> int:
+    """Páginas totales del corpus según las cabeceras Parquet"""
+    return sum(doc['num_paginas'] for doc in storage.list_documents())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Parquet frente a JSON')
+    parser.add_argument('--docs', type=int, default=20000, help='Documentos del corpus')
+    parser.add_argument('--pages-per-doc', type=int, default=3, help='Páginas por documento')
+    args = parser.parse_args()
+
+    temp_dir = Path(tempfile.mkdtemp(prefix='bench_parquet_'))
+
+    try:
+        json_storage = JSONStorage(temp_dir / 'json')
+        parquet_storage = ParquetStorage(temp_dir / 'parquet', flush_every=5000)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, json_write = timed(lambda: [
+                json_storage.save_document(d) for d in synthetic_documents(args.docs, args.pages_per_doc, 42)
+            ])
+
+            def write_parquet():
+                for document in synthetic_documents(args.docs, args.pages_per_doc, 42):
+                    parquet_storage.save_document(document)
+                    if parquet_storage.needs_flush():
+                        parquet_storage.flush()
+                parquet_storage.flush()
+            _, parquet_write = timed(write_parquet)
+
+        json_size = directory_size(temp_dir / 'json')
+        parquet_size = directory_size(temp_dir / 'parquet')
+        json_hits, json_scan = timed(lambda: scan_json(json_storage, 'autoconsumo'))
+        parquet_hits, parquet_scan = timed(lambda: scan_parquet(parquet_storage, 'autoconsumo'))
+        json_pages, json_headers = timed(lambda: headers_json(json_storage))
+        parquet_pages, parquet_headers = timed(lambda: headers_parquet(parquet_storage))
+
+        assert json_hits == parquet_hits and json_pages == parquet_pages
+
+        print(f"📦 {args.docs} documentos, {args.docs * args.pages_per_doc} páginas\n")
+        print(f"{'':>22} {'JSON':>12} {'Parquet':>12}")
+        print(f"{'tamaño (MB)':>22} {json_size / 1e6:>12.1f} {parquet_size / 1e6:>12.1f}")
+        print(f"{'escritura (s)':>22} {json_write:>12.2f} {parquet_write:>12.2f}")
+        print(f"{'búsqueda en texto (s)':>22} {json_scan:>12.2f} {parquet_scan:>12.2f}")
+        print(f"{'cabeceras (s)':>22} {json_headers:>12.2f} {parquet_headers:>12.2f}")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ingesta en etapas (--pipeline) frente a la secuencial
+Genera un corpus de facturas sintéticas y lo procesa con --storage both,
+en secuencia y en etapas, con 1 y varios procesos de extracción. Con
+--db-delay cada commit en la BD tarda además esos ms, como una base de
+datos remota o un disco lento
+"""
+import argparse
+import contextlib
+import functools
+import io
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import Config
+from main import process_directory
+from storage.database_storage import DatabaseStorage
+from benchmarks.synthetic_pdfs import build_corpus
+
+
+def slow_commits(delay: float):
+    """Añade ``delay`` segundos a cada guardado en la BD"""
+    for name in ('save_document', 'save_documents'):
+        original = getattr(DatabaseStorage, name)
+
+        @functools.wraps(original)
+        def slow(self, *args, _original=original, **kwargs):
+            time.sleep(delay)
+            return _original(self, *args, **kwargs)
+
+        setattr(DatabaseStorage, name, slow)
+
+
+def run(input_dir: Path, work_dir: Path, workers: int, pipeline: bool, db_batch_size: int) -> float:
+    """Segundos en procesar el corpus en un directorio de salida nuevo"""
+    salida = Path(tempfile.mkdtemp(dir=work_dir))
+    Config.JSON_OUTPUT_DIR = salida / 'output_json'
+    Config.MANIFEST_PATH = salida / 'manifest.json'
+    Config.DATABASE_TYPE = 'sqlite'
+    Config.DATABASE_PATH = str(salida / 'ingesta.db')
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        resumen = process_directory(input_dir, 'both', workers, db_batch_size=db_batch_size, pipeline=pipeline)
+        segundos = time.perf_counter() - inicio
+
+    if resumen['fallidos']:
+        raise RuntimeError(f"{resumen['fallidos']} PDFs fallaron")
+    return segundos
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la ingesta en etapas')
+    parser.add_argument('--files', type=int, default=60, help='Facturas del corpus')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2], help='Procesos de extracción a probar')
+    parser.add_argument('--db-delay', type=float, default=0.0, help='ms añadidos a cada guardado en BD')
+    parser.add_argument('--db-batch-size', type=int, default=1, help='Documentos por commit en BD')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeticiones (se toma la mejor)')
+    args = parser.parse_args()
+
+    if args.db_delay:
+        slow_commits(args.db_delay / 1000)
+
+    temp_dir = Path(tempfile.mkdtemp(prefix='bench_pipeline_'))
+    try:
+        input_dir = temp_dir / 'pdfs'
+        build_corpus(input_dir, [3, 5, 8], ['texto'], copies=args.files // 3)
+        num_files = len(list(input_dir.glob('*.pdf')))
+
+        print(
+            f"🔀 {num_files} facturas, --storage both, {args.db_delay:g} ms extra por guardado en BD, "
+            f"lotes de {args.db_batch_size} (mejor de {args.repeat})\n"
+        )
+        print(f"{'procesos':>8} {'secuencial s':>13} {'etapas s':>9} {'×':>6}")
+        for workers in args.workers:
+            tiempos = {False: float('inf'), True: float('inf')}
+            for _ in range(args.repeat):
+                for pipeline in tiempos:
+                    tiempos[pipeline] = min(
+                        tiempos[pipeline], run(input_dir, temp_dir, workers, pipeline, args.db_batch_size)
+                    )
+            print(f"{workers:>8} {tiempos[False]:>13.2f} {tiempos[True]:>9.2f} {tiempos[False] / tiempos[True]:>6.2f}")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark: coste de la instrumentación de la ingesta (profiling.py)
+Extrae los PDFs de muestra varias veces sin instrumentación, con tiempos
+por etapa y con tiempos más cProfile, y mide también el coste de una
+llamada a ``stage`` con la instrumentación desactivada
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+import timeit
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import profiling
+from extractors.pdf_extractor import extract_pdfs
+
+SAMPLE_PDFS_DIR = Path(__file__).parent.parent / 'pdfs'
+
+
+def run(pdf_files: list, modo: str) -> float:
+    """Segundos en extraer todos los PDFs con la instrumentación indicada"""
+    if modo != 'desactivada':
+        profiling.enable(profiling.Profiler(slowest=5 if modo == 'cprofile' else 0))
+
+    try:
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _, _, error in extract_pdfs(pdf_files):
+                if error:
+                    raise error
+        return time.perf_counter() - inicio
+    finally:
+        profiling.disable()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del coste de la instrumentación')
+    parser.add_argument('--rounds', type=int, default=20, help='Veces que se extrae cada PDF de muestra')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeticiones de cada modo (se toma la mejor)')
+    args = parser.parse_args()
+
+    pdf_files = sorted(SAMPLE_PDFS_DIR.glob('*.pdf')) * args.rounds
+    modos = ['desactivada', 'etapas', 'cprofile']
+    # Los modos se alternan en cada repetición para que el ruido les afecte por igual
+    tiempos = {modo: float('inf') for modo in modos}
+    for _ in range(args.repeat):
+        for modo in modos:
+            tiempos[modo] = min(tiempos[modo], run(pdf_files, modo))
+
+    print(f"⏱ {len(pdf_files)} extracciones (mejor de {args.repeat})\n")
+    base = tiempos['desactivada']
+    for modo in modos:
+        print(f"  {modo:<12} {tiempos[modo]:>8.3f} s  {len(pdf_files) / tiempos[modo]:>8.1f} PDFs/s  {tiempos[modo] / base - 1:>+7.1%}")
+
+    llamadas = 1_000_000
+    segundos = timeit.timeit("with stage('pagina'): pass", globals={'stage': profiling.stage}, number=llamadas)
+    print(f"\n  stage() desactivada: {segundos / llamadas * 1e9:.0f} ns por llamada")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Benchmark: resumen mensual de facturas con años de historial
+Llena una BD SQLite con una factura por hogar y mes (10.000 hogares y 10
+años por defecto), construye el resumen mensual con rebuild_rollups y mide
+la latencia del resumen de un hogar, por el resumen y agregando las
+facturas, la del resumen de todos los hogares de un mes, lo que cuesta
+mantenerlo al guardar facturas y la reconstrucción completa
+"""
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import sys
+import tempfile
+import time
+from unittest import mock
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import func, insert, select
+
+from models import DatabaseManager, Documento, Factura
+from storage import monthly_rollup
+from storage.database_storage import DatabaseStorage
+from profiling import percentile
+
+PROVEEDORES = ('naturgy', 'iberdrola', 'endesa')
+INSERT_BATCH = 20000
+
+
+def cups(hogar: int) -> str:
+    """CUPS sintético de un hogar"""
+    return f'ES0021{hogar:012d}LB'
+
+
+def fin_de_periodo(indice: int, primer_anio: int) -> date:
+    """Fin del periodo de la factura del mes ``indice`` del historial"""
+    anio, mes = divmod(indice, 12)
+    return date(primer_anio + anio, mes + 1, 28)
+
+
+def fill(storage: DatabaseStorage, households: int, months: int, seed: int):
+    """Inserta documentos y facturas en bloque, sin pasar por el resumen"""
+    rng = random.Random(seed)
+    perfiles = [
+        ('gas' if rng.random() < 0.3 else 'electricidad', rng.choice(PROVEEDORES))
+        for _ in range(households)
+    ]
+    primer_anio = date.today().year - months // 12
+    fecha = datetime.utcnow()
+
+    with storage.db_manager.engine.begin() as connection:
+        doc_id = 0
+        filas = [(h, m) for m in range(months) for h in range(households)]
+        for start in range(0, len(filas), INSERT_BATCH):
+            bloque = filas[start:start + INSERT_BATCH]
+            connection.execute(insert(Documento), [
+                {'id': doc_id + i + 1, 'nombre_archivo': f'{h}_{m}.pdf', 'ruta_archivo': f'/bench/{h}_{m}.pdf',
+                 'num_paginas': 1, 'fecha_procesamiento': fecha}
+                for i, (h, m) in enumerate(bloque)
+            ])
+            connection.execute(insert(Factura), [
+                {'documento_id': doc_id + i + 1, 'proveedor': perfiles[h][1], 'categoria': perfiles[h][0],
+                 'cups': cups(h), 'importe_total': Decimal(rng.randint(2000, 25000)) / 100,
+                 'periodo_fin': fin_de_periodo(m, primer_anio), 'consumo_kwh': float(rng.randint(50, 900)),
+                 'confianza': {}, 'version_analizador': 'bench', 'fecha_analisis': fecha}
+                for i, (h, m) in enumerate(bloque)
+            ])
+            doc_id += len(bloque)
+    return primer_anio
+
+
+def latencies(func, queries: int) -> dict:
+    """p50/p95 en ms de ``queries`` llamadas a func(i)"""
+    tiempos = []
+    for i in range(queries):
+        inicio = time.perf_counter()
+        func(i)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return {'p50': percentile(tiempos, 50), 'p95': percentile(tiempos, 95)}
+
+
+def summary_from_invoices(storage: DatabaseStorage, hogar: str, desde: date, hasta: date) -> list:
+    """Resumen de un hogar agregando sus facturas (sin la tabla de resumen)"""
+    mes = func.strftime('%Y-%m', Factura.periodo_fin)
+    with storage.db_manager.engine.connect() as connection:
+        return connection.execute(
+            select(mes, Factura.categoria, Factura.proveedor, func.count(), func.sum(Factura.importe_total),
+                   func.sum(Factura.consumo_kwh))
+            .where(Factura.cups == hogar, Factura.periodo_fin >= desde, Factura.periodo_fin <= hasta)
+            .group_by(mes, Factura.categoria, Factura.proveedor).order_by(mes)
+        ).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del resumen mensual de facturas')
+    parser.add_argument('--households', type=int, default=10000, help='Hogares')
+    parser.add_argument('--years', type=int, default=10, help='Años de historial')
+    parser.add_argument('--queries', type=int, default=500, help='Consultas por caso')
+    parser.add_argument('--update-batch', type=int, default=500, help='Facturas por save_invoices')
+    parser.add_argument('--update-rounds', type=int, default=5, help='Guardados medidos con y sin el resumen')
+    parser.add_argument('--seed', type=int, default=0, help='Semilla')
+    args = parser.parse_args()
+
+    months = args.years * 12
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_manager = DatabaseManager(f"sqlite:///{Path(temp_dir) / 'resumen.db'}")
+        storage = DatabaseStorage(db_manager)
+
+        inicio = time.perf_counter()
+        primer_anio = fill(storage, args.households, months, args.seed)
+        print(
+            f"📊 {args.households} hogares × {months} meses = {args.households * months} facturas "
+            f"(insertadas en {time.perf_counter() - inicio:.1f} s)"
+        )
+
+        inicio = time.perf_counter()
+        informe = storage.rebuild_rollups()
+        print(f"  rebuild_rollups (vacío → lleno): {time.perf_counter() - inicio:.1f} s, {informe['filas']} filas")
+        inicio = time.perf_counter()
+        informe = storage.rebuild_rollups()
+        diferencias = informe['insertadas'] + informe['corregidas'] + informe['eliminadas']
+        print(f"  rebuild_rollups (comprobación): {time.perf_counter() - inicio:.1f} s, {diferencias} diferencias\n")
+
+        hogares = [cups(rng.randrange(args.households)) for _ in range(args.queries)]
+        ultimo_anio = date(primer_anio + args.years - 1, 1, 1), date(primer_anio + args.years - 1, 12, 31)
+        todo = date(primer_anio, 1, 1), date(primer_anio + args.years - 1, 12, 31)
+        meses = [date(primer_anio + rng.randrange(args.years), rng.randint(1, 12), 1) for _ in range(args.queries)]
+
+        casos = {
+            'hogar, 12 meses (resumen)': lambda i: storage.monthly_summary(hogares[i], *ultimo_anio),
+            f'hogar, {months} meses (resumen)': lambda i: storage.monthly_summary(hogares[i], *todo),
+            'hogar, 12 meses (facturas)': lambda i: summary_from_invoices(storage, hogares[i], *ultimo_anio),
+            f'hogar, {months} meses (facturas)': lambda i: summary_from_invoices(storage, hogares[i], *todo),
+            'todos los hogares, 1 mes': lambda i: storage.monthly_summary(desde=meses[i], hasta=meses[i]),
+        }
+        print(f"{'consulta':<32} {'p50 ms':>8} {'p95 ms':>8}")
+        for nombre, func_caso in casos.items():
+            consultas = args.queries if 'todos' not in nombre else max(args.queries // 20, 5)
+            resultado = latencies(func_caso, consultas)
+            print(f"{nombre:<32} {resultado['p50']:>8.2f} {resultado['p95']:>8.2f}")
+
+        # Mantenimiento: volver a analizar facturas guardadas al azar, cada
+        # vez otras (sin caché caliente). Sin el resumen se guardan con los
+        # mismos valores, para que no se desvíe
+        def sample(nuevo_importe: bool) -> list:
+            with db_manager.engine.connect() as connection:
+                facturas = [dict(row._mapping) for row in connection.execute(
+                    select(Factura.__table__).order_by(func.random()).limit(args.update_batch)
+                )]
+            for factura in facturas:
+                factura.pop('id')
+                if nuevo_importe:
+                    factura['importe_total'] = Decimal(rng.randint(2000, 25000)) / 100
+            return facturas
+
+        tiempos = {False: [], True: []}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(args.update_rounds):
+                for con_resumen in (False, True):
+                    facturas = sample(con_resumen)
+                    with contextlib.ExitStack() as stack:
+                        if not con_resumen:
+                            stack.enter_context(mock.patch.object(monthly_rollup, 'apply_changes'))
+                        inicio = time.perf_counter()
+                        storage.save_invoices(facturas)
+                        tiempos[con_resumen].append(time.perf_counter() - inicio)
+
+        sin_resumen, con_resumen = (statistics.median(tiempos[False]), statistics.median(tiempos[True]))
+        print(
+            f"\n  save_invoices de {args.update_batch} facturas (mediana de {args.update_rounds}): "
+            f"{sin_resumen * 1000:.1f} ms sin el resumen, {con_resumen * 1000:.1f} ms manteniéndolo "
+            f"(+{(con_resumen - sin_resumen) / args.update_batch * 1e6:.0f} µs/factura)"
+        )
+        informe = storage.rebuild_rollups()
+        diferencias = informe['insertadas'] + informe['corregidas'] + informe['eliminadas']
+        print(f"  rebuild_rollups tras los guardados: {diferencias} diferencias")
+        db_manager.engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark: búsqueda de texto completo sobre el contenido de las páginas
+Genera un corpus sintético de páginas de facturas y compara la latencia de
+DatabaseStorage.search_content con un LIKE '%x%' sobre paginas.contenido
+"""
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models import DatabaseManager
+from storage.database_storage import DatabaseStorage
+
+
+VOCABULARIO = (
+    'factura electricidad gas energía consumo potencia contratada término fijo variable '
+    'periodo facturación importe total impuesto eléctrico alquiler equipo medida iva '
+    'lectura real estimada contador cups tarifa peaje acceso cargos bono social cliente '
+    'dirección suministro fecha emisión vencimiento domiciliación banco cuenta kwh días '
+    'precio descuento oferta mantenimiento servicio urgencias reclamaciones comercializadora'
+).split()
+
+PALABRAS_RARAS = ['autoconsumo', 'excedentes', 'reactiva', 'penalización', 'refacturación']
+
+
+def populate(storage: DatabaseStorage, num_pages: int, pages_per_doc: int, seed: int):
+    """Llena la base de datos con páginas de texto sintético reproducible"""
+    rng = random.Random(seed)
+    num_docs = num_pages // pages_per_doc
+    batch = []
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(num_docs):
+            paginas = []
+            for p in range(pages_per_doc):
+                palabras = rng.choices(VOCABULARIO, k=120)
+                if rng.random() < 0.001:
+                    palabras.append(rng.choice(PALABRAS_RARAS))
+                paginas.append({'numero_pagina': p + 1, 'contenido': ' '.join(palabras)})
+
+            batch.append({
+                'nombre_archivo': f'factura_{i:07d}.pdf',
+                'ruta_archivo': f'/bench/factura_{i:07d}.pdf',
+                'num_paginas': pages_per_doc,
+                'paginas': paginas
+            })
+            if len(batch) == 2000:
+                storage.save_documents(batch, batch_size=2000)
+                batch = []
+        if batch:
+            storage.save_documents(batch, batch_size=2000)
+
+
+def latencies(func, repeat: int) -> tuple:
+    """Devuelve (p50, p95) en milisegundos de repeat ejecuciones de func"""
+    tiempos = []
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        func()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return statistics.median(tiempos), tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de búsqueda de texto completo')
+    parser.add_argument('--url', type=str, default=None,
+                        help='URL de base de datos (default: SQLite temporal)')
+    parser.add_argument('--pages', type=int, default=1000000, help='Páginas del corpus')
+    parser.add_argument('--pages-per-doc', type=int, default=4, help='Páginas por documento')
+    parser.add_argument('--repeat', type=int, default=20, help='Repeticiones por consulta')
+    parser.add_argument('--skip-like', action='store_true', help='No medir la búsqueda con LIKE')
+    args = parser.parse_args()
+
+    temp_dir = None
+    url = args.url
+    if url is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        url = f"sqlite:///{Path(temp_dir.name) / 'bench.db'}"
+
+    db_manager = DatabaseManager(url)
+    db_manager.drop_tables()
+    storage = DatabaseStorage(db_manager)
+
+    print(f"📦 Generando {args.pages} páginas...")
+    inicio = time.perf_counter()
+    populate(storage, args.pages, args.pages_per_doc, seed=42)
+    print(f"  ✓ Corpus indexado en {time.perf_counter() - inicio:.1f} s")
+
+    consultas = [
+        ('rara (1 término)', 'autoconsumo'),
+        ('rara (2 términos)', 'excedentes reactiva'),
+        ('frecuente', 'potencia'),
+        ('frecuente, pág. 50', 'potencia'),
+    ]
+
+    print(f"\n{'consulta':>20} {'modo':>6} {'p50 ms':>10} {'p95 ms':>10}")
+    for nombre, consulta in consultas:
+        offset = 50 * 20 if 'pág.' in nombre else 0
+        p50, p95 = latencies(lambda: storage.search_content(consulta, limit=20, offset=offset), args.repeat)
+        print(f"{nombre:>20} {'fts':>6} {p50:>10.2f} {p95:>10.2f}")
+
+        if not args.skip_like:
+            termino = consulta.split()[0]
+
+            def like():
+                with db_manager.engine.connect() as connection:
+                    connection.execute(text(
+                        "SELECT documento_id, numero_pagina FROM paginas "
+                        "WHERE contenido LIKE :patron ORDER BY id LIMIT 20 OFFSET :offset"
+                    ), {'patron': f'%{termino}%', 'offset': offset}).all()
+
+            p50, p95 = latencies(like, max(1, args.repeat // 4))
+            print(f"{nombre:>20} {'like':>6} {p50:>10.2f} {p95:>10.2f}")
+
+    db_manager.drop_tables()
+    db_manager.engine.dispose()
+    if temp_dir:
+        temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
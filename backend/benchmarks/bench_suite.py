@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Benchmark: suite reproducible de la ingesta con facturas sintéticas
+Genera un corpus determinista con synthetic_pdfs.py y mide extract_pdf
+(con capa de texto y escaneadas, de 1 a 500 páginas), JSONStorage.save_document,
+DatabaseStorage.save_document / list_documents / search_by_filename y
+process_directory completo con 'json' y 'database'. Guarda los resultados
+en benchmarks/results/<commit>.json y, con --baseline, los compara con los
+de otro commit y termina con código 1 si algún caso empeora más que el umbral
+"""
+import argparse
+import contextlib
+import fnmatch
+import io
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import Config
+from models import DatabaseManager
+from extractors.pdf_extractor import extract_pdf
+from storage.json_storage import JSONStorage
+from storage.database_storage import DatabaseStorage
+from main import process_directory
+from benchmarks.synthetic_pdfs import VARIANTS, build_corpus, make_invoice_pdf
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+RESULTS_VERSION = 1
+
+PERFILES = {
+    'completo': {'paginas': [1, 10, 100, 500], 'documentos': 50, 'corpus': 40, 'repeticiones': 5},
+    'rapido': {'paginas': [1, 10, 50], 'documentos': 20, 'corpus': 12, 'repeticiones': 3},
+}
+
+
+def git_commit() -> str:
+    """Commit actual (con '-sucio' si hay cambios sin guardar) o 'desconocido'"""
+    repo = Path(__file__).parent
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        cambios = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repo,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconocido'
+    return f'{commit}-sucio' if cambios else commit
+
+
+def measure(func, repeat: int, operaciones: int = 1, setup=None) -> dict:
+    """
+    Mide ``func`` varias veces
+
+    Args:
+        func: Función a medir; recibe lo que devuelve ``setup``
+        repeat: Repeticiones
+        operaciones: Operaciones que hace cada llamada a ``func``
+        setup: Preparación sin medir antes de cada repetición (opcional)
+
+    Returns:
+        Dict con los segundos de cada repetición y la mejor y la mediana por operación
+    """
+    tiempos = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            estado = setup() if setup else None
+            inicio = time.perf_counter()
+            func(estado)
+            tiempos.append(time.perf_counter() - inicio)
+
+    return {
+        'repeticiones': tiempos,
+        'operaciones': operaciones,
+        'mejor_s': min(tiempos) / operaciones,
+        'mediana_s': statistics.median(tiempos) / operaciones
+    }
+
+
+def extraction_cases(corpus_dir: Path, params: dict) -> dict:
+    """extract_pdf por variante y número de páginas"""
+    casos = {}
+    for variant in VARIANTS:
+        for num_pages in params['paginas']:
+            pdf = make_invoice_pdf(corpus_dir / f'{variant}_{num_pages}p.pdf', num_pages, variant)
+            casos[f'extraccion_{variant}_{num_pages}p'] = (
+                lambda _, pdf=pdf: extract_pdf(pdf), 1, None
+            )
+    return casos
+
+
+def storage_cases(corpus_dir: Path, work_dir: Path, params: dict) -> dict:
+    """Guardado en JSON y en BD y consultas de la BD con documentos de 10 páginas"""
+    pdf = make_invoice_pdf(corpus_dir / 'almacenamiento_10p.pdf', 10)
+    with contextlib.redirect_stdout(io.StringIO()):
+        base = extract_pdf(pdf)
+
+    num_docs = params['documentos']
+    documentos = [
+        {**base, 'nombre_archivo': f'factura_{i:05d}.pdf', 'ruta_archivo': f'/bench/factura_{i:05d}.pdf'}
+        for i in range(num_docs)
+    ]
+    contador = iter(range(10 ** 6))
+
+    def new_db() -> DatabaseStorage:
+        db_manager = DatabaseManager(f"sqlite:///{work_dir / f'bench_{next(contador)}.db'}")
+        return DatabaseStorage(db_manager)
+
+    def filled_db() -> DatabaseStorage:
+        storage = new_db()
+        storage.save_documents(documentos)
+        return storage
+
+    def save_all(save):
+        for doc in documentos:
+            save(doc)
+
+    consultas = 10
+    return {
+        'json_guardar': (
+            lambda storage: save_all(storage.save_document), num_docs,
+            lambda: JSONStorage(work_dir / f'json_{next(contador)}')
+        ),
+        'bd_guardar': (lambda storage: save_all(storage.save_document), num_docs, new_db),
+        'bd_listar': (
+            lambda storage: [storage.list_documents() for _ in range(consultas)], consultas, filled_db
+        ),
+        'bd_buscar_nombre': (
+            lambda storage: [storage.search_by_filename(f'factura_{i:03d}') for i in range(consultas)],
+            consultas, filled_db
+        ),
+    }
+
+
+def process_directory_cases(corpus_dir: Path, work_dir: Path, params: dict) -> dict:
+    """process_directory completo sobre un corpus mixto"""
+    input_dir = corpus_dir / 'ingesta'
+    # Sobre todo facturas cortas con texto, algunas escaneadas y alguna larga
+    corpus = params['corpus']
+    pdf_files = (
+        build_corpus(input_dir, [2, 6], ['texto'], copies=corpus * 3 // 8) +
+        build_corpus(input_dir, [4], ['imagen'], copies=corpus // 8, seed=100) +
+        build_corpus(input_dir, [min(params['paginas'][-1], 100)], ['texto'], copies=max(corpus // 20, 1), seed=200)
+    )
+    contador = iter(range(10 ** 6))
+
+    def setup():
+        salida = work_dir / f'ingesta_{next(contador)}'
+        salida.mkdir()
+        Config.JSON_OUTPUT_DIR = salida / 'output_json'
+        Config.MANIFEST_PATH = salida / 'manifest.json'
+        Config.DATABASE_TYPE = 'sqlite'
+        Config.DATABASE_PATH = str(salida / 'ingesta.db')
+
+    return {
+        f'process_directory_{storage_type}': (
+            lambda _, storage_type=storage_type: process_directory(input_dir, storage_type, force=True),
+            len(pdf_files), setup
+        )
+        for storage_type in ('json', 'database')
+    }
+
+
+def run_suite(params: dict, patterns: list) -> dict:
+    """
+    Ejecuta los casos cuyo nombre coincide con algún patrón
+
+    Args:
+        params: Tamaños del perfil elegido
+        patterns: Patrones fnmatch de los casos
+
+    Returns:
+        Dict con los resultados de cada caso
+    """
+    temp_dir = Path(tempfile.mkdtemp(prefix='bench_suite_'))
+    original_config = {
+        name: getattr(Config, name)
+        for name in ('JSON_OUTPUT_DIR', 'MANIFEST_PATH', 'DATABASE_TYPE', 'DATABASE_PATH')
+    }
+    try:
+        corpus_dir, work_dir = temp_dir / 'corpus', temp_dir / 'trabajo'
+        corpus_dir.mkdir()
+        work_dir.mkdir()
+
+        casos = {
+            **extraction_cases(corpus_dir, params),
+            **storage_cases(corpus_dir, work_dir, params),
+            **process_directory_cases(corpus_dir, work_dir, params)
+        }
+
+        resultados = {}
+        for nombre, (func, operaciones, setup) in casos.items():
+            if not any(fnmatch.fnmatch(nombre, pattern) for pattern in patterns):
+                continue
+            resultados[nombre] = measure(func, params['repeticiones'], operaciones, setup)
+            print(f"  {nombre:<32} {resultados[nombre]['mejor_s'] * 1000:>10.2f} ms/op")
+
+        return resultados
+    finally:
+        for name, value in original_config.items():
+            setattr(Config, name, value)
+        shutil.rmtree(temp_dir)
+
+
+def compare(base: dict, actual: dict, threshold: float) -> list:
+    """
+    Compara la mejor repetición de cada caso común
+
+    Args:
+        base: Resultados de referencia
+        actual: Resultados nuevos
+        threshold: Empeoramiento relativo a partir del que hay regresión (0.1 = 10 %)
+
+    Returns:
+        Lista con los nombres de los casos que empeoran más que el umbral
+    """
+    if base.get('parametros') != actual.get('parametros'):
+        print("⚠ Los resultados se tomaron con parámetros distintos: la comparación es orientativa")
+
+    print(f"\n📊 {base['commit']} → {actual['commit']} (umbral {threshold:.0%})\n")
+    print(f"{'caso':<32} {'base ms':>10} {'actual ms':>10} {'cambio':>8}")
+
+    regresiones = []
+    for nombre, resultado in actual['casos'].items():
+        if nombre not in base['casos']:
+            print(f"{nombre:<32} {'-':>10} {resultado['mejor_s'] * 1000:>10.2f}   (nuevo)")
+            continue
+        antes, ahora = base['casos'][nombre]['mejor_s'], resultado['mejor_s']
+        cambio = ahora / antes - 1
+        marca = ''
+        if cambio > threshold:
+            regresiones.append(nombre)
+            marca = '  ⚠ regresión'
+        elif cambio < -threshold:
+            marca = '  🚀'
+        print(f"{nombre:<32} {antes * 1000:>10.2f} {ahora * 1000:>10.2f} {cambio:>+8.1%}{marca}")
+
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Suite de benchmarks con facturas sintéticas')
+    parser.add_argument('--profile', choices=PERFILES, default='completo', help='Tamaños de la suite')
+    parser.add_argument('--repeat', type=int, help='Repeticiones de cada caso (por defecto, las del perfil)')
+    parser.add_argument('--only', nargs='+', default=['*'], metavar='PATRON',
+                        help="Casos a ejecutar (patrones fnmatch, p. ej. 'bd_*')")
+    parser.add_argument('--output', type=str, help='Archivo de resultados (por defecto results/<commit>.json)')
+    parser.add_argument('--baseline', type=str, help='Resultados de referencia con los que comparar')
+    parser.add_argument('--load', type=str, help='Comparar estos resultados guardados en lugar de ejecutar la suite')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Empeoramiento relativo que cuenta como regresión (por defecto 0.10)')
+    args = parser.parse_args()
+
+    if args.load and not args.baseline:
+        parser.error("--load requiere --baseline")
+
+    if args.load:
+        actual = json.loads(Path(args.load).read_text(encoding='utf-8'))
+    else:
+        params = dict(PERFILES[args.profile])
+        if args.repeat:
+            params['repeticiones'] = args.repeat
+
+        commit = git_commit()
+        print(f"⏱ Suite '{args.profile}' en {commit} ({params['repeticiones']} repeticiones, mejor tiempo)\n")
+        actual = {
+            'version': RESULTS_VERSION,
+            'commit': commit,
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'perfil': args.profile,
+            'parametros': params,
+            'casos': run_suite(params, args.only)
+        }
+
+        output = Path(args.output) if args.output else RESULTS_DIR / f'{commit}.json'
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(actual, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"\n💾 Resultados guardados en {output}")
+
+    if args.baseline:
+        base = json.loads(Path(args.baseline).read_text(encoding='utf-8'))
+        regresiones = compare(base, actual, args.threshold)
+        if regresiones:
+            print(f"\n❌ {len(regresiones)} casos empeoran más del {args.threshold:.0%}: {', '.join(regresiones)}")
+            sys.exit(1)
+        print("\n✓ Sin regresiones")
+
+
+if __name__ == '__main__':
+    main()
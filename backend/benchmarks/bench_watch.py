@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latencia de la ingesta continua (--watch)
+Copia PDFs de muestra en un directorio vigilado a un ritmo fijo, cada uno
+en varios bloques como una copia lenta, y mide cuánto tarda cada uno en
+quedar guardado desde que termina de llegar, con sondeo y con inotify (si
+watchdog está instalado). También muestra la profundidad máxima de la cola
+"""
+import argparse
+import contextlib
+import io
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from storage.ingestion_manifest import IngestionManifest
+from storage.json_storage import JSONStorage
+from watcher import FolderWatcher, Observer
+
+SAMPLE_PDFS_DIR = Path(__file__).parent.parent / 'pdfs'
+
+
+def drop_files(input_dir: Path, files: int, interval: float, chunks: int = 4):
+    """Escribe ``files`` PDFs en el directorio, uno cada ``interval`` segundos"""
+    samples = [pdf.read_bytes() for pdf in sorted(SAMPLE_PDFS_DIR.glob('*.pdf'))]
+
+    for i in range(files):
+        data = samples[i % len(samples)]
+        step = len(data) // chunks + 1
+        with open(input_dir / f'factura_{i:05d}.pdf', 'wb') as f:
+            for start in range(0, len(data), step):
+                f.write(data[start:start + step])
+                f.flush()
+                time.sleep(interval / (chunks * 4))
+        time.sleep(interval * 3 / 4)
+
+
+def run(mode: str, args) -> dict:
+    temp_dir = Path(tempfile.mkdtemp(prefix='bench_watch_'))
+    try:
+        input_dir = temp_dir / 'pdfs'
+        input_dir.mkdir()
+        storage = JSONStorage(temp_dir / 'output_json')
+        watcher = FolderWatcher(
+            input_dir, storage.save_document, IngestionManifest(temp_dir / 'manifest.json'), ['json'],
+            workers=args.workers, queue_size=args.queue_size, debounce=args.debounce,
+            poll_interval=args.poll, use_notifications=mode == 'inotify'
+        )
+
+        max_cola = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            with watcher:
+                writer = threading.Thread(target=drop_files, args=(input_dir, args.files, args.interval))
+                inicio = time.perf_counter()
+                writer.start()
+                while writer.is_alive():
+                    max_cola = max(max_cola, watcher.stats()['en_cola'])
+                    time.sleep(0.01)
+                watcher.wait_idle()
+                segundos = time.perf_counter() - inicio
+                stats = watcher.stats()
+
+        return {**stats, 'max_cola': max_cola, 'segundos': segundos}
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la ingesta continua')
+    parser.add_argument('--files', type=int, default=100, help='PDFs que llegan al directorio')
+    parser.add_argument('--interval', type=float, default=0.1, help='Segundos entre llegadas')
+    parser.add_argument('--workers', type=int, default=1, help='Procesos de extracción')
+    parser.add_argument('--debounce', type=float, default=0.5, help='Segundos sin cambios antes de procesar')
+    parser.add_argument('--poll', type=float, default=1.0, help='Segundos entre sondeos')
+    parser.add_argument('--queue-size', type=int, default=100, help='Tamaño máximo de la cola')
+    args = parser.parse_args()
+
+    modos = ['sondeo'] + (['inotify'] if Observer is not None else [])
+    print(
+        f"👀 {args.files} PDFs, uno cada {args.interval:g} s; debounce {args.debounce:g} s, "
+        f"sondeo cada {args.poll:g} s, {args.workers} procesos\n"
+    )
+    if Observer is None:
+        print("   (watchdog no está instalado: solo se mide el sondeo)\n")
+
+    print(f"{'modo':>8} {'p50 s':>7} {'p95 s':>7} {'máx s':>7} {'cola máx':>9} {'errores':>8} {'total s':>8}")
+    for mode in modos:
+        r = run(mode, args)
+        print(
+            f"{mode:>8} {r['latencia_p50']:>7.2f} {r['latencia_p95']:>7.2f} {r['latencia_max']:>7.2f} "
+            f"{r['max_cola']:>9} {r['fallidos']:>8} {r['segundos']:>8.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: escalado de la extracción multiproceso
+Replica el corpus de muestra (pdfs/) hasta N archivos y mide el rendimiento
+de extract_pdfs con 1..W procesos
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from extractors.pdf_extractor import extract_pdfs
+
+
+def build_corpus(source_dir: Path, target_dir: Path, num_files: int) -> list:
+    """
+    Replica los PDFs de muestra hasta alcanzar num_files archivos
+
+    Args:
+        source_dir: Directorio con los PDFs originales
+        target_dir: Directorio donde se crean las copias
+        num_files: Número total de archivos a generar
+
+    Returns:
+        Lista de rutas a los PDFs generados
+    """
+    sources = sorted(source_dir.glob('*.pdf'))
+    if not sources:
+        raise ValueError(f"No hay PDFs de muestra en {source_dir}")
+
+    pdf_files = []
+    for i in range(num_files):
+        source = sources[i % len(sources)]
+        target = target_dir / f"{source.stem}_{i:05d}.pdf"
+        shutil.copy(source, target)
+        pdf_files.append(target)
+
+    return pdf_files
+
+
+def run_benchmark(pdf_files: list, workers: int) -> dict:
+    """
+    Extrae todo el corpus con el número de procesos indicado
+
+    Args:
+        pdf_files: Archivos a extraer
+        workers: Número de procesos
+
+    Returns:
+        Dict con tiempo total, archivos por segundo y errores
+    """
+    errores = 0
+    inicio = time.perf_counter()
+
+    for _, _, error in extract_pdfs(pdf_files, workers):
+        if error:
+            errores += 1
+
+    duracion = time.perf_counter() - inicio
+    return {
+        'workers': workers,
+        'segundos': duracion,
+        'archivos_por_segundo': len(pdf_files) / duracion,
+        'errores': errores
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de extracción multiproceso')
+    parser.add_argument('--files', type=int, default=3000, help='Archivos del corpus replicado')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1,
+                        help='Número máximo de procesos a probar')
+    parser.add_argument('--source', type=str, default=str(Path(__file__).parent.parent / 'pdfs'),
+                        help='Directorio con los PDFs de muestra')
+    args = parser.parse_args()
+
+    temp_dir = Path(tempfile.mkdtemp(prefix='bench_workers_'))
+
+    try:
+        print(f"📦 Generando corpus de {args.files} archivos en {temp_dir}")
+        pdf_files = build_corpus(Path(args.source), temp_dir, args.files)
+
+        workers_list = sorted({1, 2, 4, 8, 16, args.max_workers})
+        workers_list = [w for w in workers_list if w <= args.max_workers]
+
+        base = None
+        print(f"\n{'workers':>8} {'segundos':>10} {'arch/s':>10} {'speedup':>8} {'errores':>8}")
+        for workers in workers_list:
+            result = run_benchmark(pdf_files, workers)
+            if base is None:
+                base = result['archivos_por_segundo']
+            speedup = result['archivos_por_segundo'] / base
+            print(
+                f"{result['workers']:>8} {result['segundos']:>10.2f} "
+                f"{result['archivos_por_segundo']:>10.1f} {speedup:>8.2f} {result['errores']:>8}"
+            )
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Generador de facturas PDF sintéticas para los benchmarks
+Escribe el PDF a mano (catálogo, páginas, fuente Helvetica y tabla xref),
+sin dependencias. Con la misma semilla genera siempre los mismos bytes.
+Hay dos variantes:
+- 'texto': con capa de texto. La primera página es la portada con CUPS,
+  periodo, consumo e importe y el resto son líneas de detalle
+- 'imagen': páginas escaneadas, una imagen en escala de grises por página
+  sin capa de texto
+"""
+import argparse
+import random
+import sys
+import zlib
+from pathlib import Path
+
+# Añadir el directorio padre al path para importar módulos
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.bench_search import VOCABULARIO
+
+VARIANTS = ('texto', 'imagen')
+
+# A4 en puntos
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+LINES_PER_PAGE = 60
+WORDS_PER_LINE = 12
+# Resolución de las páginas escaneadas (~50 ppp)
+SCAN_WIDTH, SCAN_HEIGHT = 413, 585
+
+
+def _escape(text: str) -> bytes:
+    """Cadena literal de PDF en WinAnsiEncoding"""
+    data = text.encode('cp1252', errors='replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def _text_stream(lines: list) -> bytes:
+    """Contenido de una página con una línea de texto por elemento"""
+    ops = [b'BT /F1 9 Tf 12 TL 40 800 Td']
+    for line in lines:
+        ops.append(_escape(line) + b" Tj T*")
+    ops.append(b'ET')
+    return b'\n'.join(ops)
+
+
+def _euros(importe: float) -> str:
+    """Importe con coma decimal, como en las facturas"""
+    return f'{importe:.2f} €'.replace('.', ',')
+
+
+def invoice_lines(rng: random.Random, page: int, cliente: int, mes: int) -> list:
+    """Líneas de texto de una página de factura"""
+    if page == 1:
+        consumo = rng.randint(120, 1800)
+        lines = [
+            'NATURGY IBERIA, S.A.',
+            f'CUPS: ES 0021 {cliente // 10000:04d} {cliente % 10000:04d} {rng.randint(0, 9999):04d} LB',
+            f'Periodo de facturación: del 01/{mes:02d}/2025 a 28/{mes:02d}/2025',
+            f'Consumo total: {consumo} kWh',
+            f'Término de potencia {_euros(rng.uniform(5, 40))}',
+            f'TOTAL IMPORTE FACTURA {_euros(consumo * 0.19)}',
+        ]
+    else:
+        lines = [f'Detalle de la factura, página {page}']
+
+    while len(lines) < LINES_PER_PAGE:
+        lines.append(' '.join(rng.choices(VOCABULARIO, k=WORDS_PER_LINE)))
+    return lines
+
+
+def _scan_rows(rng: random.Random) -> list:
+    """Filas de píxeles de una página escaneada: blancas o con trazos de texto"""
+    rows = [bytes([255]) * SCAN_WIDTH]
+    for _ in range(15):
+        row = bytearray([250]) * SCAN_WIDTH
+        x = rng.randint(20, 40)
+        while x < SCAN_WIDTH - 40:
+            ancho = rng.randint(2, 12)
+            row[x:x + ancho] = bytes([rng.randint(0, 90)]) * ancho
+            x += ancho + rng.randint(2, 6)
+        rows.append(bytes(row))
+    return rows
+
+
+def _scan_image(rng: random.Random, rows: list) -> bytes:
+    """Píxeles de una página escaneada: bloques de filas de texto separados por blanco"""
+    lines = []
+    while len(lines) < SCAN_HEIGHT:
+        if rng.random() < 0.7:
+            lines.extend(rng.choice(rows[1:]) for _ in range(6))
+        lines.extend([rows[0]] * 4)
+    return b''.join(lines[:SCAN_HEIGHT])
+
+
+def make_invoice_pdf(path: Path, num_pages: int, variant: str = 'texto', seed: int = 0) -> Path:
+    """
+    Escribe una factura sintética
+
+    Args:
+        path: Ruta del PDF
+        num_pages: Número de páginas
+        variant: 'texto' (con capa de texto) o 'imagen' (escaneada)
+        seed: Semilla del contenido
+
+    Returns:
+        Ruta del PDF escrito
+
+    Raises:
+        ValueError: Si la variante no existe o num_pages < 1
+    """
+    if variant not in VARIANTS:
+        raise ValueError(f"Variante desconocida: {variant} (usa {', '.join(VARIANTS)})")
+    if num_pages < 1:
+        raise ValueError("Una factura tiene al menos una página")
+
+    rng = random.Random(f'{seed}-{num_pages}-{variant}')
+    cliente, mes = rng.randint(0, 10 ** 8 - 1), seed % 12 + 1
+    rows = _scan_rows(rng) if variant == 'imagen' else None
+
+    # Objetos 1-4 fijos; cada página usa los dos o tres siguientes
+    objects = {
+        3: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        4: (
+            b'<< /Title ' + _escape(f'Factura {cliente:08d} {mes:02d}/2025') +
+            b' /Author (Naturgy) /Producer (synthetic_pdfs.py)'
+            b' /CreationDate (D:2025' + f'{mes:02d}'.encode() + b'01000000Z) >>'
+        ),
+    }
+    per_page = 3 if variant == 'imagen' else 2
+    kids = []
+    for page in range(1, num_pages + 1):
+        page_id = 5 + (page - 1) * per_page
+        content_id = page_id + 1
+        kids.append(page_id)
+
+        if variant == 'imagen':
+            image_id = page_id + 2
+            image = zlib.compress(_scan_image(rng, rows))
+            objects[image_id] = (
+                f'<< /Type /XObject /Subtype /Image /Width {SCAN_WIDTH} /Height {SCAN_HEIGHT} '
+                f'/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode '
+                f'/Length {len(image)} >>'.encode(), image
+            )
+            content = f'q {PAGE_WIDTH} 0 0 {PAGE_HEIGHT} 0 0 cm /Im0 Do Q'.encode()
+            resources = f'/XObject << /Im0 {image_id} 0 R >>'
+        else:
+            content = _text_stream(invoice_lines(rng, page, cliente, mes))
+            resources = '/Font << /F1 3 0 R >>'
+
+        objects[page_id] = (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+            f'/Resources << {resources} >> /Contents {content_id} 0 R >>'
+        ).encode()
+        objects[content_id] = (f'<< /Length {len(content)} >>'.encode(), content)
+
+    objects[1] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[2] = (
+        f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {num_pages} >>"
+    ).encode()
+
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = {}
+    for obj_id in sorted(objects):
+        offsets[obj_id] = len(out)
+        obj = objects[obj_id]
+        out += f'{obj_id} 0 obj\n'.encode()
+        if isinstance(obj, tuple):
+            out += obj[0] + b'\nstream\n' + obj[1] + b'\nendstream'
+        else:
+            out += obj
+        out += b'\nendobj\n'
+
+    xref = len(out)
+    size = max(objects) + 1
+    out += f'xref\n0 {size}\n0000000000 65535 f \n'.encode()
+    for obj_id in range(1, size):
+        out += f'{offsets[obj_id]:010d} 00000 n \n'.encode()
+    out += f'trailer\n<< /Size {size} /Root 1 0 R /Info 4 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+
+    path = Path(path)
+    path.write_bytes(bytes(out))
+    return path
+
+
+def build_corpus(target_dir: Path, page_counts: list, variants: list = VARIANTS,
+                 copies: int = 1, seed: int = 0) -> list:
+    """
+    Genera un corpus con una factura por variante, número de páginas y copia
+
+    Args:
+        target_dir: Directorio donde se escriben los PDFs
+        page_counts: Números de páginas a generar
+        variants: Variantes a generar
+        copies: Facturas distintas de cada combinación
+        seed: Semilla base
+
+    Returns:
+        Lista de rutas a los PDFs generados
+    """
+    target_dir = Path(target_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+
+    pdf_files = []
+    for variant in variants:
+        for num_pages in page_counts:
+            for copy in range(copies):
+                path = target_dir / f'factura_{variant}_{num_pages:03d}p_{copy:04d}.pdf'
+                pdf_files.append(make_invoice_pdf(path, num_pages, variant, seed + copy))
+
+    return pdf_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generador de facturas PDF sintéticas')
+    parser.add_argument('output', type=str, help='Directorio de salida')
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 500],
+                        help='Números de páginas de las facturas')
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=list(VARIANTS),
+                        help='Variantes a generar')
+    parser.add_argument('--copies', type=int, default=1, help='Facturas de cada combinación')
+    parser.add_argument('--seed', type=int, default=0, help='Semilla base')
+    args = parser.parse_args()
+
+    if any(n < 1 or n > 500 for n in args.pages):
+        parser.error("--pages debe estar entre 1 y 500")
+
+    pdf_files = build_corpus(Path(args.output), args.pages, args.variants, args.copies, args.seed)
+    total_mb = sum(pdf.stat().st_size for pdf in pdf_files) / 1024 / 1024
+    print(f"🧾 {len(pdf_files)} facturas sintéticas en {args.output} ({total_mb:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
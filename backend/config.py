@@ -26,9 +26,73 @@ class Config:
     POSTGRES_PORT = os.getenv('POSTGRES_PORT', '5432')
     POSTGRES_DB = os.getenv('POSTGRES_DB', 'pdf_extractor')
     
+    # Pool de conexiones (un motor compartido por proceso y URL)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    
+    # PRAGMA de SQLite aplicados a cada conexión
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'wal')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'normal')
+    SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '65536'))
+    SQLITE_MMAP_SIZE_MB = int(os.getenv('SQLITE_MMAP_SIZE_MB', '256'))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '30000'))
+    SQLITE_WRITE_BEGIN_MODE = os.getenv('SQLITE_WRITE_BEGIN_MODE', 'immediate')
+    
     # Rutas
     PDF_INPUT_DIR = Path(os.getenv('PDF_INPUT_DIR', './pdfs'))
     JSON_OUTPUT_DIR = Path(os.getenv('JSON_OUTPUT_DIR', './output_json'))
+    PARQUET_OUTPUT_DIR = Path(os.getenv('PARQUET_OUTPUT_DIR', './output_parquet'))
+    JSONL_OUTPUT_DIR = Path(os.getenv('JSONL_OUTPUT_DIR', './output_jsonl'))
+    MANIFEST_PATH = Path(os.getenv('MANIFEST_PATH', './ingestion_manifest.json'))
+    
+    # Procesamiento
+    EXTRACTION_WORKERS = int(os.getenv('EXTRACTION_WORKERS', '1'))
+    DB_BATCH_SIZE = int(os.getenv('DB_BATCH_SIZE', '1'))
+    PARQUET_FLUSH_EVERY = int(os.getenv('PARQUET_FLUSH_EVERY', '1000'))
+    JSONL_SEGMENT_MAX_MB = int(os.getenv('JSONL_SEGMENT_MAX_MB', '64'))
+    INVOICE_BATCH_SIZE = int(os.getenv('INVOICE_BATCH_SIZE', '500'))
+    DB_LIST_PAGE_SIZE = int(os.getenv('DB_LIST_PAGE_SIZE', '500'))
+    DB_PAGE_STORAGE = os.getenv('DB_PAGE_STORAGE', 'inline')
+    
+    # Extracción por rangos de páginas de los PDFs grandes (1 = desactivada)
+    PAGE_WORKERS = int(os.getenv('PAGE_WORKERS', '1'))
+    PAGE_PARALLEL_MIN_PAGES = int(os.getenv('PAGE_PARALLEL_MIN_PAGES', '100'))
+    PAGE_RANGE_SIZE = int(os.getenv('PAGE_RANGE_SIZE', '0'))
+    
+    # Ingesta en etapas (--pipeline): documentos como máximo en cada cola
+    PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '8'))
+    
+    # Ingesta continua (--watch)
+    WATCH_DEBOUNCE_SECONDS = float(os.getenv('WATCH_DEBOUNCE_SECONDS', '1.0'))
+    WATCH_POLL_SECONDS = float(os.getenv('WATCH_POLL_SECONDS', '2.0'))
+    WATCH_QUEUE_SIZE = int(os.getenv('WATCH_QUEUE_SIZE', '100'))
+    WATCH_STATS_SECONDS = float(os.getenv('WATCH_STATS_SECONDS', '30'))
+    WATCH_MANIFEST_SAVE_EVERY = int(os.getenv('WATCH_MANIFEST_SAVE_EVERY', '50'))
+    WATCH_MANIFEST_SAVE_SECONDS = float(os.getenv('WATCH_MANIFEST_SAVE_SECONDS', '5'))
+    
+    # OCR de respaldo para páginas sin capa de texto (opcional)
+    OCR_ENABLED = os.getenv('OCR_ENABLED', 'false').lower() == 'true'
+    OCR_ENGINE = os.getenv('OCR_ENGINE', 'tesseract')
+    OCR_LANG = os.getenv('OCR_LANG', 'spa')
+    OCR_DPI = int(os.getenv('OCR_DPI', '300'))
+    OCR_WORKERS = int(os.getenv('OCR_WORKERS', '1'))
+    
+    # Caché de extracción en disco (opcional)
+    EXTRACTION_CACHE_ENABLED = os.getenv('EXTRACTION_CACHE_ENABLED', 'false').lower() == 'true'
+    EXTRACTION_CACHE_PATH = Path(os.getenv('EXTRACTION_CACHE_PATH', './extraction_cache.db'))
+    EXTRACTION_CACHE_MAX_MB = int(os.getenv('EXTRACTION_CACHE_MAX_MB', '512'))
+    
+    # API HTTP de ingesta (api.py)
+    API_HOST = os.getenv('API_HOST', '127.0.0.1')
+    API_PORT = int(os.getenv('API_PORT', '8000'))
+    API_UPLOAD_DIR = Path(os.getenv('API_UPLOAD_DIR', './uploads'))
+    API_WORKERS = int(os.getenv('API_WORKERS', '2'))
+    API_QUEUE_SIZE = int(os.getenv('API_QUEUE_SIZE', '1000'))
+    API_MAX_UPLOAD_MB = int(os.getenv('API_MAX_UPLOAD_MB', '20'))
+    API_CORS_ORIGINS = os.getenv('API_CORS_ORIGINS', 'http://localhost:4200').split(',')
     
     @classmethod
     def get_database_url(cls) -> str:
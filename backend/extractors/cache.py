@@ -0,0 +1,172 @@
+"""
+PASO 3c: Caché de extracción
+Guarda en disco los documentos ya extraídos, indexados por hash del PDF,
+versión del extractor y opciones de extracción
+"""
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class ExtractionCache:
+    """
+    Caché persistente de documentos extraídos (SQLite)
+    
+    Cada entrada guarda el documento comprimido (JSON + zlib). Cuando el
+    tamaño total supera ``max_bytes`` se eliminan las entradas usadas hace
+    más tiempo (LRU). El nombre y la ruta del archivo no forman parte de la
+    entrada: un mismo PDF copiado o renombrado reutiliza la extracción.
+    
+    La conexión se abre en cada proceso al primer uso, así que la caché
+    puede pasarse a los procesos de extracción.
+    """
+    
+    def __init__(self, cache_path: Path, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Inicializa la caché
+        
+        Args:
+            cache_path: Ruta al archivo SQLite de la caché
+            max_bytes: Tamaño máximo de los documentos comprimidos en bytes
+        """
+        self.cache_path = Path(cache_path)
+        self.max_bytes = max_bytes
+        self._connection = None
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+    
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Conexión a la caché, creando la tabla si no existe"""
+        if self._connection is None:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit y espera a otros procesos que estén escribiendo
+            connection = sqlite3.connect(self.cache_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entradas ("
+                "clave TEXT PRIMARY KEY, datos BLOB NOT NULL, "
+                "tamano INTEGER NOT NULL, ultimo_acceso REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_entradas_ultimo_acceso ON entradas (ultimo_acceso)"
+            )
+            self._connection = connection
+        return self._connection
+    
+    @staticmethod
+    def make_key(file_hash: str, version: str, options: Optional[Dict] = None) -> str:
+        """
+        Construye la clave de una extracción
+        
+        Args:
+            file_hash: Hash SHA-256 del PDF
+            version: Versión del extractor
+            options: Opciones que cambian el resultado (p. ej. el OCR)
+        
+        Returns:
+            str: Clave de la entrada
+        """
+        opciones = json.dumps(options or {}, sort_keys=True)
+        digest = hashlib.sha256(opciones.encode('utf-8')).hexdigest()[:16]
+        return f"{file_hash}:{version}:{digest}"
+    
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Obtiene un documento de la caché
+        
+        Args:
+            key: Clave de make_key
+        
+        Returns:
+            Dict con el documento sin nombre ni ruta, o None si no está
+        """
+        row = self.connection.execute(
+            "SELECT datos FROM entradas WHERE clave = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        
+        self.connection.execute(
+            "UPDATE entradas SET ultimo_acceso = ? WHERE clave = ?", (time.time(), key)
+        )
+        document = json.loads(zlib.decompress(row[0]))
+        if document.get('fecha_creacion'):
+            document['fecha_creacion'] = datetime.fromisoformat(document['fecha_creacion'])
+        return document
+    
+    def put(self, key: str, document: Dict):
+        """
+        Guarda un documento en la caché y aplica el límite de tamaño
+        
+        Args:
+            key: Clave de make_key
+            document: Documento extraído (con 'paginas' como lista)
+        """
+        entry = {k: v for k, v in document.items() if k not in ('nombre_archivo', 'ruta_archivo')}
+        if isinstance(entry.get('fecha_creacion'), datetime):
+            entry['fecha_creacion'] = entry['fecha_creacion'].isoformat()
+        datos = zlib.compress(json.dumps(entry, ensure_ascii=False).encode('utf-8'))
+        
+        # Un documento que no cabe nunca se guarda, para no vaciar la caché
+        if len(datos) > self.max_bytes:
+            return
+        
+        self.connection.execute(
+            "INSERT OR REPLACE INTO entradas (clave, datos, tamano, ultimo_acceso) VALUES (?, ?, ?, ?)",
+            (key, datos, len(datos), time.time())
+        )
+        self._evict()
+    
+    def _evict(self):
+        """Elimina las entradas menos usadas hasta respetar max_bytes"""
+        total = self.connection.execute("SELECT COALESCE(SUM(tamano), 0) FROM entradas").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        
+        claves = []
+        for clave, tamano in self.connection.execute(
+            "SELECT clave, tamano FROM entradas ORDER BY ultimo_acceso"
+        ):
+            claves.append((clave,))
+            total -= tamano
+            if total <= self.max_bytes:
+                break
+        
+        self.connection.executemany("DELETE FROM entradas WHERE clave = ?", claves)
+    
+    def stats(self) -> Dict[str, int]:
+        """
+        Resumen de la caché
+        
+        Returns:
+            Dict con el número de entradas y su tamaño total en bytes
+        """
+        entradas, tamano = self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM entradas"
+        ).fetchone()
+        return {'entradas': entradas, 'tamano': tamano}
+    
+    def clear(self):
+        """Elimina todas las entradas"""
+        self.connection.execute("DELETE FROM entradas")
+    
+    def close(self):
+        """Cierra la conexión de este proceso"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,326 @@
+"""
+PASO 3d: Análisis de facturas
+Obtiene los campos estructurados de una factura (proveedor, tipo de suministro,
+importe, periodo, consumo y CUPS) a partir del texto extraído de sus páginas
+"""
+import re
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Versión de las reglas de análisis: incrementarla al cambiar los patrones
+# hace que el modo por lotes vuelva a analizar las facturas guardadas
+PARSER_VERSION = '2'
+
+# Campos que se obtienen de cada factura
+CAMPOS_FACTURA = ('importe_total', 'periodo', 'consumo_kwh', 'cups')
+
+# Confianza base según el tipo de patrón que encuentra el valor
+CONFIANZA_PROVEEDOR = 0.9
+CONFIANZA_GENERICA = 0.6
+
+# Tipo de suministro de la factura: la primera categoría con alguno de sus
+# términos en el texto (en minúsculas); si no aparece ninguno queda en None
+CATEGORIAS = (
+    ('gas', (r'\bm3\b', r'm³', r'consumo\s+de\s+gas', r'\brl\.?\s?[1-6]\b')),
+    ('electricidad', (r't[eé]rmino\s+de\s+potencia', r'potencia\s+contratada',
+                      r'energ[ií]a\s+activa', r'\b[23]\.0\s?td\b', r'electricidad')),
+)
+
+# Caracteres de control del CUPS (resto de la parte numérica módulo 529)
+CUPS_LETRAS_CONTROL = 'TRWAGMYFPDXBNJZSQVHLCKE'
+
+# Texto inicial que se examina para identificar al proveedor
+LONGITUD_HUELLA = 4000
+
+# El texto se pasa a minúsculas una vez y los patrones se escriben en
+# minúsculas y sin IGNORECASE: así el motor de expresiones regulares puede
+# saltar directamente al literal inicial de cada patrón ('total', 'consumo'...)
+_FLAGS = re.MULTILINE
+
+_IMPORTE = r'(-?\d{1,3}(?:\.\d{3})*,\d{2}|-?\d+,\d{2})'
+_FECHA = r'(\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4})'
+_KWH = r'(\d{1,3}(?:\.\d{3})+|\d+)(?:,(\d+))?\s*kwh'
+_CUPS = re.compile(r'es(?=\s?\d)(\s?\d{4}\s?\d{4}\s?\d{4}\s?\d{4}\s?[a-z]{2}(?:\s?\d[fpcrxyz])?)\b', _FLAGS)
+
+
+class SupplierProfile:
+    """
+    Conjunto de patrones precompilados para las facturas de un proveedor
+
+    Args:
+        nombre: Nombre del proveedor
+        huella: Expresiones que identifican al proveedor (en minúsculas)
+        patrones: Patrones por campo (en minúsculas)
+        confianza: Confianza base de un valor encontrado con estos patrones
+    """
+
+    def __init__(self, nombre: str, huella: Iterable[str], patrones: Dict[str, Iterable[str]],
+                 confianza: float = CONFIANZA_PROVEEDOR):
+        self.nombre = nombre
+        self.huella = tuple(huella)
+        self.patrones = {
+            campo: tuple(re.compile(patron, _FLAGS) for patron in lista)
+            for campo, lista in patrones.items()
+        }
+        self.confianza = confianza
+
+
+# Patrones válidos para cualquier factura, usados cuando los del proveedor fallan
+PERFIL_GENERICO = SupplierProfile(
+    nombre=None,
+    huella=(),
+    patrones={
+        'importe_total': [
+            r'total\b[^\n\d-]{0,40}' + _IMPORTE + r'\s*(?:€|eur)',
+            _IMPORTE + r'\s*€',
+        ],
+        'periodo': [
+            _FECHA + r'\s*(?:a|al|-|–|hasta(?:\s+el)?)\s*' + _FECHA,
+        ],
+        'consumo_kwh': [
+            r'consumo[^\n\d]{0,40}' + _KWH,
+            _KWH,
+        ],
+    },
+    confianza=CONFIANZA_GENERICA
+)
+
+SUPPLIER_PROFILES = [
+    SupplierProfile(
+        nombre='naturgy',
+        huella=(r'naturgy', r'gas\s+natural\s+(?:fenosa|comercializadora|servicios)'),
+        patrones={
+            'importe_total': [
+                r'total\s+(?:importe\s+)?(?:a\s+pagar|factura)\s*:?\s*' + _IMPORTE + r'\s*(?:€|eur)',
+                r'importe\s+total(?:\s+(?:de\s+la\s+)?factura)?\s*:?\s*' + _IMPORTE + r'\s*(?:€|eur)',
+            ],
+            'periodo': [
+                r'periodo\s+de\s+(?:facturaci[oó]n|consumo)\s*:?\s*(?:del\s+)?' + _FECHA
+                + r'\s*(?:a|al|-|–|hasta(?:\s+el)?)\s*' + _FECHA,
+            ],
+            'consumo_kwh': [
+                r'consumo\s+(?:total|facturado|del\s+periodo)\s*:?\s*' + _KWH,
+                r'(?:electricidad|energ[ií]a)\s+consumida\s*:?\s*' + _KWH,
+            ],
+        }
+    ),
+]
+
+_CATEGORIAS = [(nombre, re.compile('|'.join(terminos), _FLAGS)) for nombre, terminos in CATEGORIAS]
+
+# Huella combinada: una sola búsqueda identifica al proveedor entre todos
+_HUELLA = re.compile(
+    '|'.join(
+        f"(?P<p{index}>{'|'.join(profile.huella)})"
+        for index, profile in enumerate(SUPPLIER_PROFILES)
+    ),
+    _FLAGS
+)
+
+
+def identify_supplier(text: str) -> Optional[SupplierProfile]:
+    """
+    Identifica al proveedor por su huella en el inicio del texto
+
+    Args:
+        text: Texto de la factura en minúsculas
+
+    Returns:
+        SupplierProfile del proveedor o None si no se reconoce
+    """
+    match = _HUELLA.search(text, 0, LONGITUD_HUELLA)
+    if match is None:
+        return None
+    return SUPPLIER_PROFILES[int(match.lastgroup[1:])]
+
+
+def identify_category(text: str) -> Optional[str]:
+    """
+    Identifica el tipo de suministro (ver CATEGORIAS)
+
+    Args:
+        text: Texto de la factura en minúsculas
+
+    Returns:
+        'gas', 'electricidad' o None si no se reconoce
+    """
+    for nombre, patron in _CATEGORIAS:
+        if patron.search(text):
+            return nombre
+    return None
+
+
+def parse_amount(value: str) -> Optional[Decimal]:
+    """Convierte un importe en formato español ('1.234,56') a Decimal"""
+    try:
+        return Decimal(value.replace('.', '').replace(',', '.'))
+    except InvalidOperation:
+        return None
+
+
+def parse_date(value: str) -> Optional[date]:
+    """Convierte una fecha dd/mm/aaaa (o dd/mm/aa, con / . o -) a date"""
+    day, month, year = re.split(r'[/.-]', value)
+    if len(year) == 2:
+        year = '20' + year
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def parse_kwh(integer: str, decimals: Optional[str]) -> float:
+    """Convierte un consumo en formato español a float"""
+    value = float(integer.replace('.', ''))
+    if decimals:
+        value += float(f"0.{decimals}")
+    return value
+
+
+def validate_cups(cups: str) -> bool:
+    """
+    Comprueba las letras de control de un CUPS
+
+    Args:
+        cups: CUPS sin espacios (ES + 16 dígitos + 2 letras [+ 2 caracteres])
+
+    Returns:
+        bool: True si las letras de control son correctas
+    """
+    digits, control = cups[2:18], cups[18:20]
+    if not digits.isdigit():
+        return False
+    cociente, resto = divmod(int(digits) % 529, 23)
+    return control == CUPS_LETRAS_CONTROL[cociente] + CUPS_LETRAS_CONTROL[resto]
+
+
+def _search(profiles: List[SupplierProfile], campo: str, text: str) -> Tuple[Optional[re.Match], float, bool]:
+    """
+    Busca un campo con los patrones de los perfiles, en orden
+
+    Returns:
+        Tupla (coincidencia, confianza base, ambiguo). ``ambiguo`` indica que
+        el mismo patrón encuentra valores distintos en el texto
+    """
+    for profile in profiles:
+        for pattern in profile.patrones.get(campo, ()):
+            matches = []
+            for match in pattern.finditer(text):
+                matches.append(match)
+                if len(matches) == 3:
+                    break
+            if matches:
+                ambiguo = len({m.groups() for m in matches}) > 1
+                return matches[0], profile.confianza, ambiguo
+    return None, 0.0, False
+
+
+def parse_invoice_text(text: str) -> Dict:
+    """
+    Obtiene los campos de una factura a partir de su texto
+
+    Los patrones del proveedor identificado se prueban antes que los
+    genéricos. Cada campo lleva una confianza entre 0 y 1: la base del
+    patrón que lo encontró, reducida si el valor es ambiguo o no supera las
+    validaciones (letras de control del CUPS, orden de las fechas...).
+
+    Args:
+        text: Texto completo de la factura
+
+    Returns:
+        Dict con proveedor, categoria, importe_total, periodo_inicio,
+        periodo_fin, consumo_kwh, cups y confianza (por campo)
+    """
+    text = text.lower()
+    profile = identify_supplier(text)
+    profiles = [profile, PERFIL_GENERICO] if profile else [PERFIL_GENERICO]
+
+    result = {
+        'proveedor': profile.nombre if profile else None,
+        'categoria': identify_category(text),
+        'importe_total': None,
+        'periodo_inicio': None,
+        'periodo_fin': None,
+        'consumo_kwh': None,
+        'cups': None,
+        'confianza': dict.fromkeys(CAMPOS_FACTURA, 0.0)
+    }
+    confianza = result['confianza']
+
+    match, base, ambiguo = _search(profiles, 'importe_total', text)
+    if match:
+        importe = parse_amount(match.group(1))
+        if importe is not None:
+            result['importe_total'] = importe
+            confianza['importe_total'] = base * (0.7 if ambiguo else 1) * (1 if importe > 0 else 0.5)
+
+    match, base, ambiguo = _search(profiles, 'periodo', text)
+    if match:
+        inicio, fin = parse_date(match.group(1)), parse_date(match.group(2))
+        if inicio and fin:
+            result['periodo_inicio'], result['periodo_fin'] = inicio, fin
+            valido = inicio < fin and (fin - inicio).days <= 366
+            confianza['periodo'] = base * (0.7 if ambiguo else 1) * (1 if valido else 0.3)
+
+    match, base, ambiguo = _search(profiles, 'consumo_kwh', text)
+    if match:
+        result['consumo_kwh'] = parse_kwh(match.group(1), match.group(2))
+        confianza['consumo_kwh'] = base * (0.7 if ambiguo else 1)
+
+    # El CUPS tiene formato propio para todos los proveedores: su
+    # confianza depende de las letras de control, no del patrón
+    cups_encontrados = {
+        'ES' + re.sub(r'\s', '', m.group(1)).upper()
+        for m in _CUPS.finditer(text)
+        if m.start() == 0 or not text[m.start() - 1].isalnum()
+    }
+    if cups_encontrados:
+        validos = sorted(c for c in cups_encontrados if validate_cups(c))
+        if validos:
+            result['cups'] = validos[0]
+            confianza['cups'] = 1.0 if len(validos) == 1 else 0.7
+        else:
+            result['cups'] = sorted(cups_encontrados)[0]
+            confianza['cups'] = 0.3
+
+    confianza.update({campo: round(valor, 2) for campo, valor in confianza.items()})
+    return result
+
+
+def parse_invoice(document: Dict) -> Dict:
+    """
+    Obtiene los campos de una factura a partir de un documento extraído
+
+    Args:
+        document: Documento con 'paginas' (salida de extract_pdf o de la BD)
+
+    Returns:
+        Dict con los campos de la factura (ver parse_invoice_text)
+    """
+    return parse_invoice_text('\n'.join(page['contenido'] or '' for page in document['paginas']))
+
+
+def parse_invoice_batch(batch: List[Tuple[int, str]]) -> List[Dict]:
+    """
+    Analiza un lote de textos de documentos guardados
+
+    Función de nivel de módulo para poder repartir lotes en un pool de procesos.
+
+    Args:
+        batch: Lista de tuplas (documento_id, texto)
+
+    Returns:
+        Lista de resultados con 'documento_id' y 'version_analizador'
+    """
+    fecha_analisis = datetime.utcnow()
+    return [
+        dict(
+            parse_invoice_text(text),
+            documento_id=doc_id,
+            version_analizador=PARSER_VERSION,
+            fecha_analisis=fecha_analisis
+        )
+        for doc_id, text in batch
+    ]
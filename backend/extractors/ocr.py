@@ -0,0 +1,219 @@
+"""
+PASO 3b: OCR de respaldo
+Reconoce el texto de las páginas sin capa de texto (facturas escaneadas o en imagen)
+"""
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+# Métodos con los que se obtiene el contenido de una página
+METODO_TEXTO = 'texto'
+METODO_OCR = 'ocr'
+METODO_VACIA = 'vacia'
+
+
+class OCREngine(ABC):
+    """
+    Motor de OCR para una página de un PDF
+    
+    Las implementaciones rasterizan solo la página pedida, de modo que cada
+    llamada mantiene en memoria una única imagen.
+    """
+    
+    name = 'base'
+    
+    @abstractmethod
+    def recognize(self, pdf_path: Path, page_number: int) -> str:
+        """
+        Reconoce el texto de una página
+        
+        Args:
+            pdf_path: Ruta al archivo PDF
+            page_number: Número de página (1-indexed)
+        
+        Returns:
+            str: Texto reconocido
+        """
+    
+    def options(self) -> Dict:
+        """Opciones que cambian el texto reconocido (clave de la caché de extracción)"""
+        return {'motor': self.name}
+
+
+class TesseractOCREngine(OCREngine):
+    """
+    OCR local con Tesseract
+    
+    Requiere ``pytesseract`` y ``pdf2image`` además de los binarios de
+    Tesseract (con el idioma indicado) y Poppler instalados en el sistema.
+    """
+    
+    name = 'tesseract'
+    
+    def __init__(self, lang: str = 'spa', dpi: int = 300):
+        """
+        Inicializa el motor
+        
+        Args:
+            lang: Idioma(s) de Tesseract, p. ej. 'spa' o 'spa+eng'
+            dpi: Resolución de rasterizado
+        """
+        try:
+            import pytesseract  # noqa: F401
+            import pdf2image  # noqa: F401
+        except ImportError:
+            raise ImportError(
+                "El OCR con Tesseract requiere 'pytesseract' y 'pdf2image' "
+                "(pip install pytesseract pdf2image)"
+            )
+        
+        self.lang = lang
+        self.dpi = dpi
+    
+    def options(self) -> Dict:
+        return {'motor': self.name, 'lang': self.lang, 'dpi': self.dpi}
+    
+    def recognize(self, pdf_path: Path, page_number: int) -> str:
+        import pytesseract
+        from pdf2image import convert_from_path
+        
+        images = convert_from_path(
+            str(pdf_path), dpi=self.dpi, first_page=page_number, last_page=page_number
+        )
+        try:
+            return pytesseract.image_to_string(images[0], lang=self.lang) if images else ""
+        finally:
+            for image in images:
+                image.close()
+
+
+# Motores disponibles por nombre (Config.OCR_ENGINE)
+OCR_ENGINES = {
+    TesseractOCREngine.name: TesseractOCREngine,
+}
+
+
+def get_ocr_engine(name: str, **options) -> OCREngine:
+    """
+    Crea un motor de OCR por su nombre
+    
+    Args:
+        name: Nombre registrado en OCR_ENGINES
+        **options: Opciones del motor (lang, dpi...)
+    
+    Returns:
+        OCREngine: Motor de OCR
+    """
+    if name not in OCR_ENGINES:
+        raise ValueError(f"Motor de OCR desconocido '{name}'. Opciones: {', '.join(OCR_ENGINES)}")
+    return OCR_ENGINES[name](**options)
+
+
+def _recognize_page(engine: OCREngine, pdf_path: Path, page_number: int) -> str:
+    """Tarea del pool de procesos: OCR de una página"""
+    text = engine.recognize(pdf_path, page_number)
+    return text.strip() if text else ""
+
+
+class OCRFallback:
+    """
+    Aplica OCR solo a las páginas cuya capa de texto está vacía
+    
+    Con ``workers > 1`` las páginas se reconocen en un pool de procesos.
+    Como mucho hay ``max_pending`` páginas en vuelo, por lo que la memoria
+    no depende del número de páginas del documento.
+    """
+    
+    def __init__(self, engine: OCREngine, workers: int = 1, max_pending: Optional[int] = None):
+        """
+        Inicializa el OCR de respaldo
+        
+        Args:
+            engine: Motor de OCR
+            workers: Procesos de OCR (1 = en el proceso actual)
+            max_pending: Páginas en vuelo como máximo (default: workers * 2)
+        """
+        self.engine = engine
+        self.workers = max(1, workers)
+        self.max_pending = max_pending or self.workers * 2
+        self._executor = None
+    
+    def __getstate__(self):
+        # Al enviarse a otro proceso (extracción multiproceso de archivos)
+        # el OCR se hace dentro de ese proceso, sin pool propio
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        state['workers'] = 1
+        state['max_pending'] = 1
+        return state
+    
+    def process(self, pdf_path: Path, pages: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Completa las páginas vacías con OCR, manteniendo el orden
+        
+        Args:
+            pdf_path: Ruta al archivo PDF
+            pages: Páginas extraídas (numero_pagina, contenido)
+        
+        Yields:
+            Páginas con 'contenido' y 'metodo_extraccion'
+        """
+        if self.workers == 1:
+            for page in pages:
+                yield self._inline(pdf_path, page)
+            return
+        
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        
+        pending = deque()
+        for page in pages:
+            if page['contenido']:
+                future = None
+            else:
+                future = self._executor.submit(_recognize_page, self.engine, pdf_path, page['numero_pagina'])
+            pending.append((page, future))
+            
+            while len(pending) > self.max_pending:
+                yield self._resolve(*pending.popleft())
+        
+        while pending:
+            yield self._resolve(*pending.popleft())
+    
+    def _inline(self, pdf_path: Path, page: Dict) -> Dict:
+        """OCR de una página en el proceso actual si hace falta"""
+        if page['contenido']:
+            return dict(page, metodo_extraccion=METODO_TEXTO)
+        
+        try:
+            text = _recognize_page(self.engine, pdf_path, page['numero_pagina'])
+        except Exception as e:
+            print(f"Error de OCR en página {page['numero_pagina']}: {str(e)}")
+            text = ""
+        return dict(page, contenido=text, metodo_extraccion=METODO_OCR if text else METODO_VACIA)
+    
+    def _resolve(self, page: Dict, future) -> Dict:
+        """Espera el resultado de OCR de una página enviada al pool"""
+        if future is None:
+            return dict(page, metodo_extraccion=METODO_TEXTO)
+        
+        try:
+            text = future.result()
+        except Exception as e:
+            print(f"Error de OCR en página {page['numero_pagina']}: {str(e)}")
+            text = ""
+        return dict(page, contenido=text, metodo_extraccion=METODO_OCR if text else METODO_VACIA)
+    
+    def close(self):
+        """Detiene el pool de procesos de OCR"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -2,38 +2,124 @@
 PASO 3: Extractor de PDF
 Clase para extraer texto y metadatos de archivos PDF
 """
+import hashlib
+import mmap
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import PyPDF2
 
+import profiling
+from extractors.cache import ExtractionCache
+from extractors.ocr import METODO_TEXTO, METODO_VACIA, OCRFallback
+
+
+# Versión del resultado de la extracción: incrementarla al cambiar el texto
+# o los campos extraídos invalida las entradas de la caché de extracción
+EXTRACTOR_VERSION = '1'
+
+
+def file_signature(file_stat: os.stat_result) -> Dict[str, int]:
+    """Tamaño y fecha de modificación de un archivo (ver IngestionManifest)"""
+    return {'tamano': file_stat.st_size, 'mtime_ns': file_stat.st_mtime_ns}
+
+
+def compute_file_hash(file_path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Calcula el hash SHA-256 del contenido de un archivo
+    
+    Args:
+        file_path: Ruta al archivo
+        chunk_size: Tamaño de bloque de lectura en bytes
+    
+    Returns:
+        str: Hash en hexadecimal
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 
 class PDFExtractor:
     """
     Extractor de contenido y metadatos de archivos PDF
+    
+    El archivo se proyecta en memoria (mmap) y permanece abierto mientras
+    viva el extractor; las páginas y sus contenidos se leen solo cuando se
+    piden. Se recomienda usarlo como gestor de contexto para liberar el
+    archivo al terminar::
+    
+        with PDFExtractor(ruta) as extractor:
+            num_pages = extractor.get_num_pages()
     """
     
-    def __init__(self, pdf_path: Path):
+    def __init__(self, pdf_path: Path, ocr: Optional[OCRFallback] = None,
+                 page_pool: Optional['PageRangePool'] = None):
         """
         Inicializa el extractor con la ruta del PDF
         
         Args:
             pdf_path: Ruta al archivo PDF
+            ocr: OCR de respaldo para páginas sin texto (opcional)
+            page_pool: Pool para extraer por rangos las páginas de los PDFs
+                grandes (opcional)
         """
         self.pdf_path = Path(pdf_path)
+        self.ocr = ocr
+        self.page_pool = page_pool
         self.reader = None
+        self._file = None
+        self._mmap = None
+        self.signature = None
         self._load_pdf()
     
     def _load_pdf(self):
-        """Carga el archivo PDF"""
+        """
+        Abre el archivo PDF proyectado en memoria
+        
+        Solo se leen la tabla de referencias y el trailer; el árbol de
+        páginas y los flujos de contenido se analizan bajo demanda.
+        """
         try:
-            with open(self.pdf_path, 'rb') as file:
-                self.reader = PyPDF2.PdfReader(file)
-                # Forzar la carga completa
-                _ = len(self.reader.pages)
+            with profiling.stage('carga'):
+                self._file = open(self.pdf_path, 'rb')
+                self.signature = file_signature(os.fstat(self._file.fileno()))
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.reader = PyPDF2.PdfReader(self._mmap)
         except Exception as e:
+            self.close()
             raise ValueError(f"Error al cargar el PDF '{self.pdf_path}': {str(e)}")
     
+    def close(self):
+        """Libera la proyección en memoria y cierra el archivo"""
+        self.reader = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def compute_hash(self) -> str:
+        """
+        Calcula el hash SHA-256 del PDF sin volver a leerlo del disco
+        
+        Returns:
+            str: Hash en hexadecimal
+        """
+        return hashlib.sha256(self._mmap).hexdigest()
+    
     def extract_metadata(self) -> Dict[str, Optional[str]]:
         """
         Extrae metadatos del PDF
@@ -72,9 +158,18 @@ class PDFExtractor:
         """
         Obtiene el número de páginas del PDF
         
+        Se lee el /Count del árbol de páginas para no tener que recorrerlo;
+        si falta o no es válido se cuentan las páginas.
+        
         Returns:
             int: Número de páginas
         """
+        try:
+            count = self.reader.trailer['/Root']['/Pages']['/Count']
+            if isinstance(count, int) and count >= 0:
+                return int(count)
+        except Exception:
+            pass
         return len(self.reader.pages)
     
     def extract_text_from_page(self, page_num: int) -> str:
@@ -95,6 +190,49 @@ class PDFExtractor:
             print(f"Error al extraer texto de página {page_num + 1}: {str(e)}")
             return ""
     
+    def iter_pages(self) -> Iterator[Dict[str, any]]:
+        """
+        Extrae el texto página a página
+        
+        Cada página se devuelve en cuanto se ha extraído, de modo que quien
+        consume el generador solo necesita mantener una página en memoria.
+        Si hay OCR de respaldo, las páginas sin capa de texto se reconocen
+        con OCR; 'metodo_extraccion' indica el origen del contenido. Si el
+        PDF tiene al menos ``page_pool.min_pages`` páginas, se extraen por
+        rangos en el pool de procesos y se devuelven en orden.
+        
+        Yields:
+            Diccionario con número de página, contenido y método de extracción
+        """
+        num_pages = self.get_num_pages()
+        if self.page_pool is not None and self.page_pool.applies(num_pages):
+            pages = self.page_pool.process(self.pdf_path, num_pages)
+        else:
+            pages = (self._extract_page(page_num) for page_num in range(num_pages))
+        
+        if self.ocr is not None:
+            pages = self.ocr.process(self.pdf_path, pages)
+        
+        yield from pages
+    
+    def _extract_page(self, page_num: int) -> Dict[str, any]:
+        """
+        Extrae una página de la capa de texto
+        
+        Args:
+            page_num: Número de página (0-indexed)
+        
+        Returns:
+            Diccionario con número de página, contenido y método de extracción
+        """
+        with profiling.stage(profiling.STAGE_PAGE):
+            content = self.extract_text_from_page(page_num)
+        return {
+            'numero_pagina': page_num + 1,  # 1-indexed para el usuario
+            'contenido': content,
+            'metodo_extraccion': METODO_TEXTO if content else METODO_VACIA
+        }
+    
     def extract_all_pages(self) -> List[Dict[str, any]]:
         """
         Extrae el texto de todas las páginas
@@ -102,17 +240,29 @@ class PDFExtractor:
         Returns:
             Lista de diccionarios con número de página y contenido
         """
-        pages = []
-        num_pages = self.get_num_pages()
-        
-        for page_num in range(num_pages):
-            content = self.extract_text_from_page(page_num)
-            pages.append({
-                'numero_pagina': page_num + 1,  # 1-indexed para el usuario
-                'contenido': content
-            })
+        return list(self.iter_pages())
+    
+    def extract_document_header(self) -> Dict:
+        """
+        Extrae la información del documento sin las páginas
         
-        return pages
+        Returns:
+            Dict con nombre, ruta, número de páginas, metadatos, hash y la
+            firma del archivo (tamaño y fecha) al abrirlo
+        """
+        with profiling.stage('preparacion'):
+            metadata = self.extract_metadata()
+            
+            return {
+                'nombre_archivo': self.pdf_path.name,
+                'ruta_archivo': str(self.pdf_path.absolute()),
+                'num_paginas': self.get_num_pages(),
+                'titulo': metadata['titulo'],
+                'autor': metadata['autor'],
+                'fecha_creacion': metadata['fecha_creacion'],
+                'hash_contenido': self.compute_hash(),
+                'firma_archivo': self.signature
+            }
     
     def extract_full_document(self) -> Dict:
         """
@@ -121,29 +271,353 @@ class PDFExtractor:
         Returns:
             Dict con toda la información del documento
         """
-        metadata = self.extract_metadata()
-        pages = self.extract_all_pages()
+        document = self.extract_document_header()
+        document['paginas'] = self.extract_all_pages()
+        return document
+    
+    def extract_document_stream(self) -> Dict:
+        """
+        Extrae el documento con las páginas como generador
         
+        Igual que extract_full_document, pero 'paginas' es un iterador que
+        extrae cada página al consumirlo. Solo puede recorrerse una vez y
+        cierra el extractor al terminar.
+        
+        Returns:
+            Dict con la cabecera del documento y 'paginas' como iterador
+        """
+        document = self.extract_document_header()
+        document['paginas'] = self._iter_pages_and_close()
+        return document
+    
+    def _iter_pages_and_close(self) -> Iterator[Dict[str, any]]:
+        """Recorre las páginas y cierra el extractor al acabar"""
+        try:
+            yield from self.iter_pages()
+        finally:
+            self.close()
+
+
+# PDF abierto por el proceso del pool de rangos: (ruta, mtime, tamaño) y extractor
+_range_extractor = (None, None)
+
+
+def _open_for_range(pdf_path: Path) -> PDFExtractor:
+    """
+    Extractor del PDF en un proceso del pool de rangos
+    
+    Cargar un PDF de cientos de páginas (tabla xref y árbol de páginas)
+    cuesta decenas de ms, así que cada proceso mantiene abierto el último
+    PDF y lo reutiliza en los siguientes rangos del mismo archivo.
+    """
+    global _range_extractor
+    stat = Path(pdf_path).stat()
+    key = (str(pdf_path), stat.st_mtime_ns, stat.st_size)
+    cached_key, extractor = _range_extractor
+    if cached_key != key:
+        if extractor is not None:
+            extractor.close()
+        _range_extractor = (None, None)
+        extractor = PDFExtractor(pdf_path)
+        _range_extractor = (key, extractor)
+    return extractor
+
+
+def _extract_page_range(pdf_path: Path, start: int, stop: int,
+                        profile: bool = False) -> Tuple[List[Dict], Optional[Dict]]:
+    """
+    Tarea del pool de procesos: extrae las páginas [start, stop) de un PDF
+    
+    Cada proceso abre el PDF por su cuenta. Con ``profile`` las etapas se
+    miden con un perfil propio y se devuelven para ``Profiler.merge``; el
+    tiempo total del PDF lo mide el proceso principal.
+    
+    Returns:
+        Tupla (páginas, mediciones exportadas o None)
+    """
+    def extract() -> List[Dict]:
+        extractor = _open_for_range(pdf_path)
+        return [extractor._extract_page(page_num) for page_num in range(start, stop)]
+    
+    if not profile:
+        return extract(), None
+    
+    pages, mediciones = profiling.call_profiled(0, pdf_path, extract)
+    for archivo in mediciones['archivos'].values():
+        archivo['total'] = 0.0
+    return pages, mediciones
+
+
+class PageRangePool:
+    """
+    Extrae por rangos de páginas los PDFs grandes en un pool de procesos
+    
+    Un PDF de cientos de páginas se extrae página a página en un único
+    proceso aunque haya varios libres, y acaba marcando la latencia de la
+    ingesta. A partir de ``min_pages`` páginas, el documento se divide en
+    rangos que se extraen en ``workers`` procesos (cada uno abre el archivo
+    por su cuenta) y las páginas se devuelven en orden. Como mucho hay
+    ``workers * 2`` rangos en vuelo.
+    """
+    
+    def __init__(self, workers: int, min_pages: int = 100, range_pages: int = 0):
+        """
+        Inicializa el pool
+        
+        Args:
+            workers: Procesos de extracción de páginas (1 = desactivado)
+            min_pages: Páginas a partir de las que se divide un PDF
+            range_pages: Páginas por rango (0 = las del PDF repartidas en
+                ``workers * 4`` rangos)
+        """
+        self.workers = max(1, workers)
+        self.min_pages = min_pages
+        self.range_pages = range_pages
+        self._executor = None
+    
+    def __getstate__(self):
+        # Dentro de un proceso de extracción de archivos no se abre otro pool
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        state['workers'] = 1
+        return state
+    
+    def applies(self, num_pages: int) -> bool:
+        """Indica si un PDF con ``num_pages`` páginas se extrae por rangos"""
+        return self.workers > 1 and num_pages >= self.min_pages
+    
+    def ranges(self, num_pages: int) -> List[Tuple[int, int]]:
+        """
+        Rangos de páginas (0-indexed, fin excluido) en los que se divide un PDF
+        
+        Args:
+            num_pages: Número de páginas del PDF
+        
+        Returns:
+            Lista de tuplas (inicio, fin)
+        """
+        size = self.range_pages or max(1, -(-num_pages // (self.workers * 4)))
+        return [(start, min(start + size, num_pages)) for start in range(0, num_pages, size)]
+    
+    def process(self, pdf_path: Path, num_pages: int) -> Iterator[Dict]:
+        """
+        Extrae las páginas de un PDF por rangos, en orden
+        
+        Args:
+            pdf_path: Ruta al archivo PDF
+            num_pages: Número de páginas del PDF
+        
+        Yields:
+            Diccionario con número de página, contenido y método de extracción
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        
+        profiler = profiling.get_profiler()
+        ranges = iter(self.ranges(num_pages))
+        pending = deque()
+        
+        def submit_next():
+            page_range = next(ranges, None)
+            if page_range is not None:
+                pending.append(self._executor.submit(
+                    _extract_page_range, pdf_path, *page_range, profiler is not None
+                ))
+        
+        try:
+            for _ in range(self.workers * 2):
+                submit_next()
+            
+            while pending:
+                with profiling.stage('espera_rangos'):
+                    pages, mediciones = pending.popleft().result()
+                submit_next()
+                if mediciones:
+                    profiler.merge(mediciones)
+                yield from pages
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    def close(self):
+        """Detiene el pool de procesos"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def extract_pdf(pdf_path: Path, ocr: Optional[OCRFallback] = None,
+                cache: Optional[ExtractionCache] = None,
+                page_pool: Optional[PageRangePool] = None) -> Dict:
+    """
+    Función auxiliar para extraer un PDF
+    
+    Args:
+        pdf_path: Ruta al archivo PDF
+        ocr: OCR de respaldo para páginas sin texto (opcional)
+        cache: Caché de extracción a consultar antes de analizar el PDF (opcional)
+        page_pool: Pool para extraer por rangos los PDFs grandes (opcional)
+    
+    Returns:
+        Dict con la información extraída
+    """
+    if cache is None:
+        with PDFExtractor(pdf_path, ocr, page_pool) as extractor:
+            return extractor.extract_full_document()
+    
+    pdf_path = Path(pdf_path)
+    options = {'ocr': ocr.engine.options() if ocr else None}
+    with profiling.stage('cache'):
+        # La firma se toma antes de leer el archivo para el hash
+        signature = file_signature(pdf_path.stat())
+        key = cache.make_key(compute_file_hash(pdf_path), EXTRACTOR_VERSION, options)
+        document = cache.get(key)
+    
+    if document is not None:
+        # La entrada no depende de dónde esté el archivo
+        document['nombre_archivo'] = pdf_path.name
+        document['ruta_archivo'] = str(pdf_path.absolute())
+        document['firma_archivo'] = signature
+        return document
+    
+    with PDFExtractor(pdf_path, ocr, page_pool) as extractor:
+        document = extractor.extract_full_document()
+    with profiling.stage('cache'):
+        cache.put(key, document)
+    return document
+
+
+def read_pdf_info(pdf_path: Path) -> Dict:
+    """
+    Lee nombre, número de páginas y metadatos sin extraer el texto
+    
+    No toca los flujos de contenido de las páginas, por lo que es mucho
+    más barato que extract_pdf para inventariar archivos grandes.
+    
+    Args:
+        pdf_path: Ruta al archivo PDF
+    
+    Returns:
+        Dict con nombre_archivo, num_paginas, titulo, autor y fecha_creacion
+    """
+    with PDFExtractor(pdf_path) as extractor:
+        metadata = extractor.extract_metadata()
         return {
-            'nombre_archivo': self.pdf_path.name,
-            'ruta_archivo': str(self.pdf_path.absolute()),
-            'num_paginas': self.get_num_pages(),
+            'nombre_archivo': extractor.pdf_path.name,
+            'num_paginas': extractor.get_num_pages(),
             'titulo': metadata['titulo'],
             'autor': metadata['autor'],
-            'fecha_creacion': metadata['fecha_creacion'],
-            'paginas': pages
+            'fecha_creacion': metadata['fecha_creacion']
         }
 
 
-def extract_pdf(pdf_path: Path) -> Dict:
+def extract_pdf_stream(pdf_path: Path, ocr: Optional[OCRFallback] = None,
+                       page_pool: Optional[PageRangePool] = None) -> Dict:
     """
-    Función auxiliar para extraer un PDF
+    Función auxiliar para extraer un PDF en streaming
     
     Args:
         pdf_path: Ruta al archivo PDF
+        ocr: OCR de respaldo para páginas sin texto (opcional)
+        page_pool: Pool para extraer por rangos los PDFs grandes (opcional)
     
     Returns:
-        Dict con la información extraída
+        Dict con la cabecera del documento y 'paginas' como iterador
+    """
+    extractor = PDFExtractor(pdf_path, ocr, page_pool)
+    try:
+        return extractor.extract_document_stream()
+    except Exception:
+        extractor.close()
+        raise
+
+
+def extract_pdfs(pdf_paths: Iterable[Path], workers: int = 1, stream: bool = False,
+                 ocr: Optional[OCRFallback] = None,
+                 cache: Optional[ExtractionCache] = None,
+                 page_pool: Optional[PageRangePool] = None) -> Iterator[Tuple[Path, Optional[Dict], Optional[Exception]]]:
+    """
+    Extrae varios PDFs, opcionalmente repartidos en un pool de procesos
+    
+    Los resultados se devuelven a medida que terminan (no en orden) para
+    que un único escritor los vaya guardando. Como mucho hay ``workers * 2``
+    extracciones en vuelo, así la memoria no crece con el tamaño del lote.
+    Con la instrumentación activa (profiling.py), los tiempos de cada
+    extracción se atribuyen a su PDF, también los medidos en otros procesos.
+    
+    Args:
+        pdf_paths: Rutas a los archivos PDF
+        workers: Número de procesos de extracción (1 = en el proceso actual)
+        stream: Devolver las páginas como iterador (solo con workers = 1,
+            los resultados de otros procesos siempre llegan completos)
+        ocr: OCR de respaldo para páginas sin texto (opcional). Con
+            workers > 1 cada proceso hace el OCR de sus propios archivos
+        cache: Caché de extracción (opcional). La caché guarda documentos
+            completos, así que con caché no se extrae en streaming
+        page_pool: Pool para extraer por rangos los PDFs grandes (opcional,
+            solo con workers = 1; con más procesos cada PDF se extrae
+            entero en uno de ellos)
+    
+    Yields:
+        Tuplas (ruta, datos, error); datos es None si la extracción falló
     """
-    extractor = PDFExtractor(pdf_path)
-    return extractor.extract_full_document()
\ No newline at end of file
+    profiler = profiling.get_profiler()
+    
+    if workers <= 1:
+        for pdf_path in pdf_paths:
+            try:
+                # Con streaming, las páginas se extraen (y se miden) al guardarlas
+                with profiling.track(pdf_path, cprofile=True):
+                    if stream and cache is None:
+                        document = extract_pdf_stream(pdf_path, ocr, page_pool)
+                    else:
+                        document = extract_pdf(pdf_path, ocr, cache, page_pool)
+            except Exception as e:
+                yield pdf_path, None, e
+                continue
+            yield pdf_path, document, None
+        return
+    
+    pending = iter(pdf_paths)
+    max_in_flight = workers * 2
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+        
+        def submit_next() -> bool:
+            pdf_path = next(pending, None)
+            if pdf_path is None:
+                return False
+            if profiler:
+                # Cada proceso mide con su propio perfil y lo devuelve con el resultado
+                future = executor.submit(
+                    profiling.call_profiled, profiler.slowest, pdf_path, extract_pdf, pdf_path, ocr, cache
+                )
+            else:
+                future = executor.submit(extract_pdf, pdf_path, ocr, cache)
+            in_flight[future] = pdf_path
+            return True
+        
+        while len(in_flight) < max_in_flight and submit_next():
+            pass
+        
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                pdf_path = in_flight.pop(future)
+                try:
+                    document = future.result()
+                    if profiler:
+                        document, mediciones = document
+                        profiler.merge(mediciones)
+                except Exception as e:
+                    yield pdf_path, None, e
+                else:
+                    yield pdf_path, document, None
+                submit_next()
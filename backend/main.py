@@ -3,116 +3,657 @@ PASO 5: Script Principal
 Procesamiento de directorio y manejo de argumentos CLI
 """
 import argparse
+import json
 import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
 from pathlib import Path
 
 from config import config
 from models import DatabaseManager
-from extractors.pdf_extractor import extract_pdf
+from migrations import remove_duplicate_hashes
+from extractors.pdf_extractor import PageRangePool, extract_pdfs, read_pdf_info
 from storage.json_storage import JSONStorage
 from storage.database_storage import DatabaseStorage
+from storage.parquet_storage import ParquetStorage
+from storage.jsonl_storage import JSONLStorage
+from extractors.ocr import OCRFallback, get_ocr_engine
+from extractors.cache import ExtractionCache
+from storage.ingestion_manifest import IngestionManifest
+from extractors.invoice_parser import CAMPOS_FACTURA, PARSER_VERSION, parse_invoice_batch
+from watcher import FolderWatcher
+from pipeline import IngestionPipeline
+import profiling
 
 
-def process_pdf_file(pdf_path: Path, storage_type: str, json_storage=None, db_storage=None):
+def storage_targets(storage_type: str) -> list:
     """
-    Procesa un archivo PDF individual
+    Almacenamientos concretos que implica un tipo de almacenamiento
     
     Args:
-        pdf_path: Ruta al archivo PDF
-        storage_type: Tipo de almacenamiento ('json', 'database', 'both')
+        storage_type: Tipo de almacenamiento ('json', 'database', 'both', 'parquet', 'jsonl')
+    
+    Returns:
+        Lista con 'json' y/o 'database', o 'parquet' o 'jsonl'
+    """
+    if storage_type == 'both':
+        return ['json', 'database']
+    return [storage_type]
+
+
+def build_ocr_fallback(workers: int = None) -> OCRFallback:
+    """
+    Crea el OCR de respaldo según la configuración
+    
+    Args:
+        workers: Procesos de OCR (default: Config.OCR_WORKERS)
+    
+    Returns:
+        OCRFallback: OCR para las páginas sin capa de texto
+    """
+    engine = get_ocr_engine(config.OCR_ENGINE, lang=config.OCR_LANG, dpi=config.OCR_DPI)
+    return OCRFallback(engine, workers=workers or config.OCR_WORKERS)
+
+
+def build_jsonl_storage() -> JSONLStorage:
+    """
+    Crea el almacenamiento JSONL según la configuración
+    
+    Returns:
+        JSONLStorage: Almacenamiento en Config.JSONL_OUTPUT_DIR
+    """
+    return JSONLStorage(config.JSONL_OUTPUT_DIR, config.JSONL_SEGMENT_MAX_MB * 1024 * 1024)
+
+
+def build_extraction_cache() -> ExtractionCache:
+    """
+    Crea la caché de extracción según la configuración
+    
+    Returns:
+        ExtractionCache: Caché en Config.EXTRACTION_CACHE_PATH
+    """
+    return ExtractionCache(config.EXTRACTION_CACHE_PATH, config.EXTRACTION_CACHE_MAX_MB * 1024 * 1024)
+
+
+def store_document(document_data: dict, storage_type: str, json_storage=None, db_storage=None,
+                   jsonl_storage=None):
+    """
+    Guarda un documento ya extraído en los almacenamientos indicados
+    
+    Args:
+        document_data: Diccionario con los datos del documento
+        storage_type: Tipo de almacenamiento ('json', 'database', 'both', 'jsonl')
         json_storage: Instancia de JSONStorage (opcional)
         db_storage: Instancia de DatabaseStorage (opcional)
+        jsonl_storage: Instancia de JSONLStorage (opcional)
     """
-    print(f"\n📄 Procesando: {pdf_path.name}")
+    if storage_type in ['json', 'both']:
+        if json_storage:
+            json_storage.save_document(document_data)
     
-    try:
-        # Extraer información del PDF
-        document_data = extract_pdf(pdf_path)
-        print(f"  ✓ Extraídas {document_data['num_paginas']} páginas")
-        
-        # Guardar según el tipo de almacenamiento
-        if storage_type in ['json', 'both']:
-            if json_storage:
-                json_storage.save_document(document_data)
-        
-        if storage_type in ['database', 'both']:
-            if db_storage:
-                db_storage.save_document(document_data)
-        
-        print(f"  ✓ Procesamiento completado")
-        
-    except Exception as e:
-        print(f"  ✗ Error: {str(e)}")
+    if storage_type in ['database', 'both']:
+        if db_storage:
+            db_storage.save_document(document_data)
+    
+    if storage_type == 'jsonl':
+        if jsonl_storage:
+            jsonl_storage.save_document(document_data)
+
+
+def open_storages(storage_type: str) -> tuple:
+    """
+    Crea los almacenamientos de un tipo de almacenamiento
+    
+    Args:
+        storage_type: Tipo de almacenamiento ('json', 'database', 'both', 'parquet', 'jsonl')
+    
+    Returns:
+        Tupla (json_storage, db_storage, parquet_storage, jsonl_storage),
+        con None en los que no se usan
+    """
+    json_storage = None
+    db_storage = None
+    
+    if storage_type in ['json', 'both']:
+        json_storage = JSONStorage(config.JSON_OUTPUT_DIR)
+        print(f"📁 Salida JSON: {config.JSON_OUTPUT_DIR}")
+    
+    if storage_type in ['database', 'both']:
+        db_manager = DatabaseManager(config.get_database_url())
+        db_storage = DatabaseStorage(db_manager)
+        print(f"💾 Base de datos: {config.DATABASE_TYPE}")
+    
+    parquet_storage = None
+    
+    if storage_type == 'parquet':
+        parquet_storage = ParquetStorage(config.PARQUET_OUTPUT_DIR, config.PARQUET_FLUSH_EVERY)
+        print(f"🧱 Salida Parquet: {config.PARQUET_OUTPUT_DIR}")
+    
+    jsonl_storage = None
+    
+    if storage_type == 'jsonl':
+        jsonl_storage = build_jsonl_storage()
+        print(f"📜 Salida JSONL: {config.JSONL_OUTPUT_DIR}")
+    
+    return json_storage, db_storage, parquet_storage, jsonl_storage
 
 
-def process_directory(input_dir: Path, storage_type: str):
+def ingest_pipelined(pdf_files: list, workers: int, ocr: OCRFallback, cache: ExtractionCache,
+                     page_pool: PageRangePool, manifest: IngestionManifest, targets: list,
+                     json_storage, db_storage, jsonl_storage, db_batch_size: int, resumen: dict):
+    """
+    Extrae los PDFs y los guarda con la ingesta en etapas (ver pipeline.py)
+    
+    La extracción sigue en este proceso (o en el pool de ``workers``) y
+    cada almacenamiento guarda en su propio hilo; si alguno va lento, la
+    extracción espera a que haya sitio en su cola.
+    
+    Args:
+        pdf_files: PDFs a procesar
+        workers: Número de procesos de extracción
+        ocr: OCR de respaldo para páginas sin texto (opcional)
+        cache: Caché de extracción (opcional)
+        page_pool: Pool de extracción por rangos de páginas (opcional)
+        manifest: Manifiesto de ingesta
+        targets: Almacenamientos que se registran en el manifiesto
+        json_storage: Instancia de JSONStorage (opcional)
+        db_storage: Instancia de DatabaseStorage (opcional)
+        jsonl_storage: Instancia de JSONLStorage (opcional)
+        db_batch_size: Documentos como máximo por commit en la BD
+        resumen: Recuento de exitosos y fallidos a actualizar
+    """
+    etapas = IngestionPipeline(
+        manifest, targets, json_storage, db_storage, jsonl_storage, config.PIPELINE_QUEUE_SIZE, db_batch_size
+    )
+    with etapas:
+        # Las ramas comparten el documento, así que las páginas no van en streaming
+        for pdf_file, document_data, error in extract_pdfs(pdf_files, workers, False, ocr, cache, page_pool):
+            if error:
+                print(f"\n📄 {pdf_file.name}\n  ✗ Error: {str(error)}")
+                resumen['fallidos'] += 1
+                continue
+            print(f"\n📄 {pdf_file.name}: extraídas {document_data['num_paginas']} páginas")
+            etapas.submit(pdf_file, document_data)
+    
+    resumen['exitosos'] += etapas.resumen['exitosos']
+    resumen['fallidos'] += etapas.resumen['fallidos']
+    print(f"\n{etapas.format_stats()}")
+
+
+def process_directory(input_dir: Path, storage_type: str, workers: int = 1, force: bool = False,
+                      db_batch_size: int = 1, ocr: OCRFallback = None,
+                      cache: ExtractionCache = None, page_pool: PageRangePool = None,
+                      pipeline: bool = False) -> dict:
     """
     Procesa todos los PDFs en un directorio
     
+    Con ``workers > 1`` la extracción se reparte en un pool de procesos y
+    los resultados se guardan desde este proceso, que es el único escritor.
+    Los PDFs que no han cambiado desde la última ejecución se omiten según
+    el manifiesto de ingesta, salvo que se indique ``force``. Con
+    ``db_batch_size > 1`` los documentos se guardan en la base de datos por
+    lotes con ``DatabaseStorage.save_documents``. En Parquet los documentos
+    se escriben por volcados de ``Config.PARQUET_FLUSH_EVERY`` y solo se
+    registran en el manifiesto cuando su volcado termina. Con ``cache`` los PDFs ya
+    extraídos con el mismo extractor y opciones no se vuelven a analizar. Con
+    ``page_pool`` (y ``workers = 1``) las páginas de los PDFs grandes se
+    extraen por rangos en varios procesos. Con ``pipeline`` cada almacenamiento
+    guarda en su propio hilo (pipeline.py) mientras se extrae el siguiente PDF.
+    
     Args:
         input_dir: Directorio con archivos PDF
-        storage_type: Tipo de almacenamiento ('json', 'database', 'both')
+        storage_type: Tipo de almacenamiento ('json', 'database', 'both', 'parquet', 'jsonl')
+        workers: Número de procesos de extracción
+        force: Procesar todos los PDFs aunque no hayan cambiado
+        db_batch_size: Documentos por lote al guardar en base de datos
+            (1 = guardar cada documento al extraerlo)
+        ocr: OCR de respaldo para páginas sin texto (opcional)
+        cache: Caché de extracción (opcional)
+        page_pool: Pool de extracción por rangos de páginas (opcional)
+        pipeline: Guardar con la ingesta en etapas (no admite Parquet)
+    
+    Returns:
+        Dict con el número de archivos exitosos, fallidos y omitidos
     """
+    resumen = {'exitosos': 0, 'fallidos': 0, 'omitidos': 0}
+    
     # Buscar archivos PDF
     pdf_files = list(input_dir.glob('*.pdf'))
     
     if not pdf_files:
         print(f"⚠ No se encontraron archivos PDF en {input_dir}")
-        return
+        return resumen
     
     print(f"\n🔍 Encontrados {len(pdf_files)} archivos PDF")
     
+    # Descartar los PDFs ya procesados que no han cambiado
+    manifest = IngestionManifest(config.MANIFEST_PATH)
+    targets = storage_targets(storage_type)
+    
+    if not force:
+        pendientes = [pdf for pdf in pdf_files if manifest.needs_processing(pdf, targets)]
+        resumen['omitidos'] = len(pdf_files) - len(pendientes)
+        pdf_files = pendientes
+        
+        if resumen['omitidos']:
+            print(f"⏭ Omitidos {resumen['omitidos']} archivos sin cambios (usa --force para reprocesarlos)")
+    
     # Inicializar almacenamiento
-    json_storage = None
-    db_storage = None
+    json_storage, db_storage, parquet_storage, jsonl_storage = open_storages(storage_type)
     
-    if storage_type in ['json', 'both']:
-        json_storage = JSONStorage(config.JSON_OUTPUT_DIR)
-        print(f"📁 Salida JSON: {config.JSON_OUTPUT_DIR}")
+    db_batch = []
+    parquet_batch = []
     
-    if storage_type in ['database', 'both']:
-        db_manager = DatabaseManager(config.get_database_url())
-        db_storage = DatabaseStorage(db_manager)
-        print(f"💾 Base de datos: {config.DATABASE_TYPE}")
+    def flush_db_batch():
+        """Guarda en la base de datos los documentos acumulados"""
+        if not db_batch:
+            return
+        
+        with profiling.stage('guardado_lote'):
+            doc_ids = db_storage.save_documents(
+                [document_data for _, document_data in db_batch],
+                batch_size=db_batch_size,
+                atomic=False
+            )
+        for (pdf_file, document_data), doc_id in zip(db_batch, doc_ids):
+            if doc_id is None:
+                resumen['fallidos'] += 1
+            else:
+                manifest.record(
+                    pdf_file, document_data.get('hash_contenido'), targets, document_data.get('firma_archivo')
+                )
+                resumen['exitosos'] += 1
+        db_batch.clear()
+    
+    def flush_parquet_batch():
+        """Escribe en Parquet los documentos acumulados"""
+        if not parquet_batch:
+            return
+        
+        try:
+            with profiling.stage('guardado_lote'):
+                parquet_storage.flush()
+            for pdf_file, file_hash, signature in parquet_batch:
+                manifest.record(pdf_file, file_hash, targets, signature)
+            resumen['exitosos'] += len(parquet_batch)
+        except Exception as e:
+            print(f"✗ Error al escribir Parquet: {str(e)}")
+            resumen['fallidos'] += len(parquet_batch)
+        parquet_batch.clear()
+    
+    # Con un único destino y sin lotes, las páginas se guardan según se extraen
+    # (salvo si se perfila con cProfile, que solo abarca la extracción)
+    profiler = profiling.get_profiler()
+    stream = storage_type != 'both' and db_batch_size <= 1 and not (profiler and profiler.slowest)
     
     # Procesar cada PDF
-    for pdf_file in pdf_files:
-        process_pdf_file(pdf_file, storage_type, json_storage, db_storage)
+    try:
+        if workers > 1 and pdf_files:
+            print(f"⚙ Extrayendo con {workers} procesos")
+        
+        if pipeline:
+            ingest_pipelined(
+                pdf_files, workers, ocr, cache, page_pool, manifest, targets,
+                json_storage, db_storage, jsonl_storage, db_batch_size, resumen
+            )
+        else:
+            for pdf_file, document_data, error in extract_pdfs(pdf_files, workers, stream, ocr, cache, page_pool):
+                print(f"\n📄 Procesando: {pdf_file.name}")
+                
+                try:
+                    if error:
+                        raise error
+                    print(f"  ✓ Extraídas {document_data['num_paginas']} páginas")
+                    
+                    if db_storage and db_batch_size > 1:
+                        # La BD se escribe por lotes; el recuento se hace al volcar el lote
+                        if json_storage:
+                            with profiling.track(pdf_file), profiling.stage('guardado'):
+                                json_storage.save_document(document_data)
+                        db_batch.append((pdf_file, document_data))
+                        if len(db_batch) >= db_batch_size:
+                            flush_db_batch()
+                        continue
+                    
+                    if parquet_storage:
+                        # Parquet se escribe por volcados; el recuento se hace al volcar
+                        with profiling.track(pdf_file), profiling.stage('guardado'):
+                            parquet_storage.save_document(document_data)
+                        parquet_batch.append(
+                            (pdf_file, document_data.get('hash_contenido'), document_data.get('firma_archivo'))
+                        )
+                        if parquet_storage.needs_flush():
+                            flush_parquet_batch()
+                        continue
+                    
+                    with profiling.track(pdf_file), profiling.stage('guardado'):
+                        store_document(document_data, storage_type, json_storage, db_storage, jsonl_storage)
+                    manifest.record(
+                        pdf_file, document_data.get('hash_contenido'), targets, document_data.get('firma_archivo')
+                    )
+                    print(f"  ✓ Procesamiento completado")
+                    resumen['exitosos'] += 1
+                except Exception as e:
+                    print(f"  ✗ Error: {str(e)}")
+                    resumen['fallidos'] += 1
+            
+            flush_db_batch()
+            flush_parquet_batch()
+    finally:
+        if jsonl_storage:
+            jsonl_storage.close()
+        manifest.save()
     
-    print(f"\n✅ Procesamiento completado: {len(pdf_files)} archivos")
+    print(
+        f"\n✅ Procesamiento completado: {len(pdf_files)} archivos "
+        f"({resumen['exitosos']} correctos, {resumen['fallidos']} con errores, "
+        f"{resumen['omitidos']} omitidos)"
+    )
+    return resumen
 
 
-def list_documents(storage_type: str):
+def watch_directory(input_dir: Path, storage_type: str, workers: int = 1, force: bool = False,
+                    ocr: OCRFallback = None, cache: ExtractionCache = None, poll: bool = False,
+                    duration: float = None) -> dict:
+    """
+    Vigila un directorio y procesa los PDFs a medida que llegan (ver watcher.py)
+    
+    Primero procesa los PDFs que ya estaban y no constan en el manifiesto;
+    después, cada PDF nuevo o modificado en cuanto deja de cambiar. Cada
+    documento se guarda al extraerlo, sin lotes. Muestra el estado de la
+    cola y la latencia cada Config.WATCH_STATS_SECONDS.
+    
+    Args:
+        input_dir: Directorio con archivos PDF
+        storage_type: Tipo de almacenamiento ('json', 'database', 'both', 'jsonl')
+        workers: Número de procesos de extracción
+        force: Procesar todos los PDFs aunque no hayan cambiado
+        ocr: OCR de respaldo para páginas sin texto (opcional)
+        cache: Caché de extracción (opcional)
+        poll: Sondear el directorio aunque haya notificaciones (inotify) disponibles
+        duration: Segundos que vigilar (None = hasta Ctrl+C)
+    
+    Returns:
+        Dict con el estado final (ver FolderWatcher.stats)
+    """
+    if storage_type == 'parquet':
+        raise ValueError("La ingesta continua no admite Parquet, que se escribe por volcados")
+    
+    json_storage, db_storage, _, jsonl_storage = open_storages(storage_type)
+    manifest = IngestionManifest(config.MANIFEST_PATH)
+    
+    def store(document_data: dict):
+        store_document(document_data, storage_type, json_storage, db_storage, jsonl_storage)
+    
+    watcher = FolderWatcher(
+        input_dir, store, manifest, storage_targets(storage_type),
+        workers=workers,
+        queue_size=config.WATCH_QUEUE_SIZE,
+        debounce=config.WATCH_DEBOUNCE_SECONDS,
+        poll_interval=config.WATCH_POLL_SECONDS,
+        use_notifications=not poll,
+        force=force,
+        ocr=ocr,
+        cache=cache,
+        manifest_save_every=config.WATCH_MANIFEST_SAVE_EVERY,
+        manifest_save_interval=config.WATCH_MANIFEST_SAVE_SECONDS
+    )
+    
+    try:
+        with watcher:
+            print(f"👀 Vigilando {input_dir} ({watcher.mode}, {watcher.workers} procesos). Ctrl+C para terminar")
+            try:
+                if duration is None:
+                    watcher.run(config.WATCH_STATS_SECONDS)
+                else:
+                    time.sleep(duration)
+            except KeyboardInterrupt:
+                print("\n⏹ Deteniendo la ingesta continua...")
+    finally:
+        if jsonl_storage:
+            jsonl_storage.close()
+        manifest.save()
+    
+    print(watcher.format_stats())
+    return watcher.stats()
+
+
+def list_documents(storage_type: str, filters: dict = None, page_size: int = None):
     """
     Lista documentos almacenados
     
     Args:
-        storage_type: Tipo de almacenamiento ('json', 'database')
+        storage_type: Tipo de almacenamiento ('json', 'database', 'parquet', 'jsonl')
+        filters: Filtros del índice JSON o de la BD (ver JSONStorage.query_documents
+            y DatabaseStorage.list_documents_page)
+        page_size: Documentos por consulta al listar la BD (default: Config.DB_LIST_PAGE_SIZE)
     """
     print(f"\n📋 Documentos almacenados ({storage_type}):")
     
     if storage_type == 'json':
         json_storage = JSONStorage(config.JSON_OUTPUT_DIR)
-        docs = json_storage.list_documents()
+        docs = json_storage.query_documents(**(filters or {}))
         
         if not docs:
             print("  No hay documentos guardados")
             return
         
         for doc in docs:
-            print(f"  - {doc.name}")
+            titulo = f" | {doc['titulo']}" if doc['titulo'] else ''
+            print(f"  - {doc['archivo']} | {doc['num_paginas']} páginas | {doc['fecha_procesamiento']}{titulo}")
     
     elif storage_type == 'database':
         db_manager = DatabaseManager(config.get_database_url())
         db_storage = DatabaseStorage(db_manager)
-        docs = db_storage.list_documents()
+        
+        # Se imprime cada página según llega, sin cargar la tabla entera
+        total = 0
+        for docs in db_storage.iter_document_pages(page_size or config.DB_LIST_PAGE_SIZE, **(filters or {})):
+            for doc in docs:
+                print(f"  - ID: {doc['id']} | {doc['nombre_archivo']} | {doc['num_paginas']} páginas")
+            total += len(docs)
+        
+        if not total:
+            print("  No hay documentos guardados")
+    
+    elif storage_type == 'parquet':
+        docs = ParquetStorage(config.PARQUET_OUTPUT_DIR).list_documents()
+        
+        if not docs:
+            print("  No hay documentos guardados")
+            return
+        
+        for doc in docs:
+            print(f"  - {doc['nombre_archivo']} | {doc['num_paginas']} páginas | {doc['fecha_procesamiento']}")
+    
+    elif storage_type == 'jsonl':
+        storage = build_jsonl_storage()
+        docs = storage.list_documents()
         
         if not docs:
             print("  No hay documentos guardados")
             return
         
         for doc in docs:
-            print(f"  - ID: {doc['id']} | {doc['nombre_archivo']} | {doc['num_paginas']} páginas")
+            print(f"  - {doc['nombre_archivo']} | {doc['num_paginas']} páginas | {doc['fecha_procesamiento']}")
+        
+        stats = storage.stats()
+        print(f"  ({stats['segmentos']} segmentos, {stats['bytes_obsoletos']} bytes en versiones obsoletas)")
+
+
+def scan_directory(input_dir: Path):
+    """
+    Lista los PDFs de un directorio con su número de páginas y metadatos
+    
+    No extrae el texto, solo lee la estructura del PDF.
+    
+    Args:
+        input_dir: Directorio con archivos PDF
+    """
+    pdf_files = sorted(input_dir.glob('*.pdf'))
+    print(f"\n🔍 PDFs en {input_dir}: {len(pdf_files)}")
+    
+    for pdf_file in pdf_files:
+        try:
+            info = read_pdf_info(pdf_file)
+            print(f"  - {info['nombre_archivo']} | {info['num_paginas']} páginas | {info['titulo'] or 'sin título'}")
+        except Exception as e:
+            print(f"  ✗ {pdf_file.name}: {str(e)}")
+
+
+def search_documents(query: str, limit: int = 20, page: int = 1):
+    """
+    Busca texto dentro de las páginas guardadas en base de datos
+    
+    Args:
+        query: Palabras a buscar
+        limit: Resultados por página
+        page: Página de resultados (empezando en 1)
+    """
+    db_manager = DatabaseManager(config.get_database_url())
+    db_storage = DatabaseStorage(db_manager)
+    results = db_storage.search_content(query, limit=limit, offset=(page - 1) * limit)
+    
+    print(f"\n🔎 Resultados para '{query}' (página {page}):")
+    
+    if not results:
+        print("  Sin resultados")
+        return
+    
+    for result in results:
+        print(
+            f"  - ID: {result['documento_id']} | {result['nombre_archivo']} | "
+            f"pág. {result['numero_pagina']} | {result['fragmento']}"
+        )
+
+
+def parse_stored_invoices(workers: int = 1, batch_size: int = None, reparse: bool = False) -> dict:
+    """
+    Analiza las facturas de los documentos guardados en base de datos
+    
+    Trabaja sobre el texto ya guardado, sin volver a leer los PDFs. Con
+    ``workers > 1`` los lotes se analizan en un pool de procesos (como mucho
+    ``workers * 2`` lotes en vuelo) y se guardan desde este proceso.
+    
+    Args:
+        workers: Procesos de análisis
+        batch_size: Documentos por lote (default: Config.INVOICE_BATCH_SIZE)
+        reparse: Volver a analizar también las facturas ya analizadas con
+            la versión actual del analizador
+    
+    Returns:
+        Dict con facturas analizadas, segundos, facturas/s por proceso y
+        confianza media y porcentaje encontrado de cada campo
+    """
+    db_manager = DatabaseManager(config.get_database_url())
+    db_storage = DatabaseStorage(db_manager)
+    batches = db_storage.iter_invoice_texts(
+        batch_size or config.INVOICE_BATCH_SIZE,
+        version=None if reparse else PARSER_VERSION
+    )
+    
+    analizadas = 0
+    confianza = dict.fromkeys(CAMPOS_FACTURA, 0.0)
+    encontrados = dict.fromkeys(CAMPOS_FACTURA, 0)
+    
+    def results():
+        if workers <= 1:
+            yield from map(parse_invoice_batch, batches)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for batch in batches:
+                pending.append(executor.submit(parse_invoice_batch, batch))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    
+    inicio = time.perf_counter()
+    for invoices in results():
+        db_storage.save_invoices(invoices)
+        analizadas += len(invoices)
+        for invoice in invoices:
+            for campo, valor in invoice['confianza'].items():
+                confianza[campo] += valor
+                encontrados[campo] += valor > 0
+        print(f"  ✓ {analizadas} facturas analizadas")
+    segundos = time.perf_counter() - inicio
+    db_manager.engine.dispose()
+    
+    return {
+        'analizadas': analizadas,
+        'segundos': segundos,
+        'facturas_por_segundo_proceso': analizadas / segundos / max(1, workers) if segundos else 0.0,
+        'confianza_media': {c: v / analizadas if analizadas else 0.0 for c, v in confianza.items()},
+        'encontrados': {c: v / analizadas if analizadas else 0.0 for c, v in encontrados.items()}
+    }
+
+
+def rebuild_rollups():
+    """
+    Recalcula el resumen mensual de facturas de la BD desde las facturas
+    
+    Termina con código 1 si el resumen tenía diferencias (ya corregidas).
+    """
+    db_manager = DatabaseManager(config.get_database_url())
+    db_storage = DatabaseStorage(db_manager)
+    
+    inicio = time.perf_counter()
+    informe = db_storage.rebuild_rollups()
+    db_manager.engine.dispose()
+    diferencias = informe['insertadas'] + informe['corregidas'] + informe['eliminadas']
+    
+    print(
+        f"📊 Resumen mensual recalculado en {time.perf_counter() - inicio:.2f} s: "
+        f"{informe['filas']} filas de {informe['hogares']} hogares"
+    )
+    if diferencias:
+        print(
+            f"⚠ Tenía {diferencias} diferencias, ya corregidas: {informe['insertadas']} filas insertadas, "
+            f"{informe['corregidas']} corregidas y {informe['eliminadas']} eliminadas"
+        )
+        sys.exit(1)
+    print("✓ El resumen estaba al día")
+
+
+def dedup_content_hashes(backup_path: Path):
+    """
+    Elimina de la BD los documentos repetidos por hash de contenido y aplica
+    las migraciones pendientes
+    
+    La migración 5 (hash de contenido único) se detiene si hay documentos
+    con el mismo hash. De cada hash se conserva el último guardado; las filas
+    eliminadas se escriben antes en backup_path (JSON) y, si no se puede, no
+    se elimina nada.
+    
+    Args:
+        backup_path: Archivo JSON nuevo para la copia de las filas eliminadas
+    """
+    if backup_path.exists():
+        print(f"❌ Error: {backup_path} ya existe")
+        sys.exit(1)
+    
+    db_manager = DatabaseManager(config.get_database_url())
+    with db_manager.engine.connect() as connection:
+        connection = connection.execution_options(escritura=True)
+        with connection.begin():
+            filas = remove_duplicate_hashes(connection)
+            if filas['documentos']:
+                with open(backup_path, 'w', encoding='utf-8') as f:
+                    json.dump(filas, f, ensure_ascii=False, indent=2, default=str)
+    
+    if filas['documentos']:
+        print(
+            f"🗑 Eliminados {len(filas['documentos'])} documentos repetidos, {len(filas['paginas'])} páginas "
+            f"y {len(filas['facturas'])} facturas (copia en {backup_path})"
+        )
+    else:
+        print("✓ No hay documentos con el mismo hash de contenido")
+    db_manager.create_tables()
+    db_manager.engine.dispose()
 
 
 def main():
@@ -136,9 +677,64 @@ Ejemplos de uso:
   # Procesar PDFs desde un directorio específico
   python main.py --input ./mis_pdfs --storage json
   
+  # Reprocesar todos los PDFs aunque no hayan cambiado
+  python main.py --storage json --force
+  
+  # Repartir la extracción en 4 procesos
+  python main.py --storage database --workers 4
+  
+  # Extraer las páginas de los PDFs de 200 páginas o más en 4 procesos
+  python main.py --storage database --page-workers 4 --page-min-pages 200
+  
+  # Exportar a Parquet (columnar, comprimido) para análisis
+  python main.py --storage parquet
+  
+  # Guardar en segmentos JSON Lines y eliminar después las versiones obsoletas
+  python main.py --storage jsonl
+  python main.py --compact
+  
+  # Guardar en base de datos en lotes de 200 documentos
+  python main.py --storage database --db-batch-size 200
+  
+  # Guardar en JSON y en BD a la vez, mientras se extrae el siguiente PDF
+  python main.py --storage both --pipeline
+  
+  # Medir el tiempo de cada etapa y guardar el perfil de las 5 extracciones más lentas
+  python main.py --storage database --profile informe.json --profile-slowest 5
+  
+  # Vigilar el directorio de entrada y guardar cada PDF nuevo al llegar
+  python main.py --storage database --watch
+  
+  # Buscar texto dentro de las facturas guardadas en base de datos
+  python main.py --search "término fijo"
+  python main.py --search "término fijo" --page 2 --limit 10
+  
+  # Aplicar OCR a las páginas sin capa de texto (facturas en imagen)
+  python main.py --storage json --ocr --ocr-workers 4
+  
+  # Reutilizar extracciones anteriores al cambiar de almacenamiento
+  python main.py --storage json --cache
+  python main.py --storage database --cache
+  
+  # Obtener importe, periodo, consumo y CUPS de las facturas guardadas en BD
+  python main.py --parse-invoices --workers 4
+  
+  # Recalcular el resumen mensual de facturas y comprobar que estaba al día
+  python main.py --rebuild-rollups
+  
+  # Inventariar los PDFs de entrada sin extraer el texto
+  python main.py --scan
+  
   # Listar documentos guardados
   python main.py --list json
   python main.py --list database
+  
+  # Filtrar la salida JSON desde su índice y reconstruir el índice
+  python main.py --list json --since 2025-01-01 --min-pages 3 --title factura
+  python main.py --rebuild-index
+  
+  # Filtrar el listado de la BD (se lee por páginas)
+  python main.py --list database --since 2025-01-01 --author "Naturgy" --page-size 200
         """
     )
     
@@ -152,27 +748,334 @@ Ejemplos de uso:
     parser.add_argument(
         '--storage',
         type=str,
-        choices=['json', 'database', 'both'],
+        choices=['json', 'database', 'both', 'parquet', 'jsonl'],
         help='Tipo de almacenamiento (default: json)',
         default='json'
     )
     
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help=f'Procesos de extracción en paralelo (default: {config.EXTRACTION_WORKERS})',
+        default=config.EXTRACTION_WORKERS
+    )
+    
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        help=f'Guardar en cada almacenamiento en su propio hilo, con colas de {config.PIPELINE_QUEUE_SIZE} documentos'
+    )
+    
+    parser.add_argument(
+        '--page-workers',
+        type=int,
+        help=f'Procesos que extraen por rangos las páginas de los PDFs grandes (default: {config.PAGE_WORKERS})',
+        default=config.PAGE_WORKERS
+    )
+    
+    parser.add_argument(
+        '--page-min-pages',
+        type=int,
+        help=f'Páginas a partir de las que un PDF se extrae por rangos (default: {config.PAGE_PARALLEL_MIN_PAGES})',
+        default=config.PAGE_PARALLEL_MIN_PAGES
+    )
+    
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Reprocesar todos los PDFs ignorando el manifiesto de ingesta'
+    )
+    
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Vigilar el directorio de entrada y procesar los PDFs según llegan (Ctrl+C para terminar)'
+    )
+    
+    parser.add_argument(
+        '--poll',
+        action='store_true',
+        help=f'Con --watch, sondear el directorio cada {config.WATCH_POLL_SECONDS:g} s en lugar de usar inotify'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        type=str,
+        help='Medir el tiempo de cada etapa de la ingesta y guardar el informe JSON en esta ruta',
+        default=None
+    )
+    
+    parser.add_argument(
+        '--profile-slowest',
+        type=int,
+        help='Con --profile, guardar el perfil de cProfile de las N extracciones más lentas (default: 0)',
+        default=0
+    )
+    
+    parser.add_argument(
+        '--db-batch-size',
+        type=int,
+        help=f'Documentos por lote al guardar en base de datos (default: {config.DB_BATCH_SIZE})',
+        default=config.DB_BATCH_SIZE
+    )
+    
     parser.add_argument(
         '--list',
         type=str,
-        choices=['json', 'database'],
+        choices=['json', 'database', 'parquet', 'jsonl'],
         help='Listar documentos almacenados',
         default=None
     )
     
+    parser.add_argument(
+        '--since',
+        type=date.fromisoformat,
+        help='Con --list json o database, documentos procesados desde esta fecha (AAAA-MM-DD)',
+        default=None
+    )
+    
+    parser.add_argument(
+        '--until',
+        type=date.fromisoformat,
+        help='Con --list json o database, documentos procesados hasta esta fecha incluida (AAAA-MM-DD)',
+        default=None
+    )
+    
+    parser.add_argument(
+        '--min-pages',
+        type=int,
+        help='Con --list json o database, número mínimo de páginas',
+        default=None
+    )
+    
+    parser.add_argument(
+        '--max-pages',
+        type=int,
+        help='Con --list json o database, número máximo de páginas',
+        default=None
+    )
+    
+    parser.add_argument(
+        '--title',
+        type=str,
+        help='Con --list json o database, texto contenido en el título',
+        default=None
+    )
+    
+    parser.add_argument(
+        '--author',
+        type=str,
+        help='Con --list database, autor exacto',
+        default=None
+    )
+    
+    parser.add_argument(
+        '--page-size',
+        type=int,
+        help=f'Con --list database, documentos por consulta (default: {config.DB_LIST_PAGE_SIZE})',
+        default=config.DB_LIST_PAGE_SIZE
+    )
+    
+    parser.add_argument(
+        '--rebuild-index',
+        action='store_true',
+        help=f'Reconstruir el índice de la salida JSON a partir de {config.JSON_OUTPUT_DIR}'
+    )
+    
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='Compactar el almacenamiento JSONL eliminando las versiones obsoletas'
+    )
+    
+    parser.add_argument(
+        '--ocr',
+        action=argparse.BooleanOptionalAction,
+        help='Aplicar OCR a las páginas sin capa de texto (requiere Tesseract; default: OCR_ENABLED)',
+        default=config.OCR_ENABLED
+    )
+    
+    parser.add_argument(
+        '--ocr-workers',
+        type=int,
+        help=f'Procesos de OCR en paralelo (default: {config.OCR_WORKERS})',
+        default=config.OCR_WORKERS
+    )
+    
+    parser.add_argument(
+        '--cache',
+        action=argparse.BooleanOptionalAction,
+        help=f'Usar la caché de extracción en disco ({config.EXTRACTION_CACHE_PATH}; default: EXTRACTION_CACHE_ENABLED)',
+        default=config.EXTRACTION_CACHE_ENABLED
+    )
+    
+    parser.add_argument(
+        '--scan',
+        action='store_true',
+        help='Listar los PDFs de entrada con páginas y metadatos, sin extraer texto'
+    )
+    
+    parser.add_argument(
+        '--search',
+        type=str,
+        help='Buscar texto en el contenido de los documentos guardados en BD',
+        default=None
+    )
+    
+    parser.add_argument(
+        '--parse-invoices',
+        action='store_true',
+        help='Analizar los campos de factura de los documentos guardados en BD'
+    )
+    
+    parser.add_argument(
+        '--reparse',
+        action='store_true',
+        help='Con --parse-invoices, volver a analizar también las facturas ya analizadas'
+    )
+    
+    parser.add_argument(
+        '--rebuild-rollups',
+        action='store_true',
+        help='Recalcular el resumen mensual de facturas de la BD (termina con código 1 si tenía diferencias)'
+    )
+    
+    parser.add_argument(
+        '--dedup-hashes',
+        type=Path,
+        metavar='COPIA.json',
+        help='Eliminar de la BD los documentos con el mismo hash de contenido (se conserva el último) '
+             'guardando antes las filas eliminadas en COPIA.json, y migrar el esquema',
+        default=None
+    )
+    
+    parser.add_argument(
+        '--limit',
+        type=int,
+        help='Resultados por página en --search (default: 20)',
+        default=20
+    )
+    
+    parser.add_argument(
+        '--page',
+        type=int,
+        help='Página de resultados en --search (default: 1)',
+        default=1
+    )
+    
     args = parser.parse_args()
     
+    if args.workers < 1:
+        parser.error('--workers debe ser mayor o igual que 1')
+    
+    if args.db_batch_size < 1:
+        parser.error('--db-batch-size debe ser mayor o igual que 1')
+    
+    if args.page_workers < 1 or args.page_min_pages < 1:
+        parser.error('--page-workers y --page-min-pages deben ser mayores o iguales que 1')
+    
+    if args.pipeline and (args.watch or args.storage == 'parquet'):
+        parser.error('--pipeline no se usa con --watch ni con --storage parquet')
+    
+    if args.page_workers > 1 and (args.workers > 1 or args.watch):
+        parser.error('--page-workers solo se usa con --workers 1 y sin --watch')
+    
+    if args.ocr_workers < 1:
+        parser.error('--ocr-workers debe ser mayor o igual que 1')
+    
+    if args.limit < 1 or args.page < 1:
+        parser.error('--limit y --page deben ser mayores o iguales que 1')
+    
+    if args.page_size < 1:
+        parser.error('--page-size debe ser mayor o igual que 1')
+    
+    if args.watch and args.storage == 'parquet':
+        parser.error('--watch no admite --storage parquet, que se escribe por volcados')
+    
+    if args.poll and not args.watch:
+        parser.error('--poll solo se usa con --watch')
+    
+    if args.profile_slowest < 0:
+        parser.error('--profile-slowest debe ser mayor o igual que 0')
+    
+    if args.profile_slowest and not args.profile:
+        parser.error('--profile-slowest solo se usa con --profile')
+    
+    if args.profile and args.watch:
+        parser.error('--profile no se usa con --watch, que ya muestra la latencia de cada PDF')
+    
+    filters = {
+        'desde': args.since,
+        'hasta': args.until,
+        'min_paginas': args.min_pages,
+        'max_paginas': args.max_pages,
+        'titulo': args.title
+    }
+    filters = {k: v for k, v in filters.items() if v is not None}
+    if filters and args.list not in ('json', 'database'):
+        parser.error('--since, --until, --min-pages, --max-pages y --title solo se usan con --list json o database')
+    if args.author is not None:
+        if args.list != 'database':
+            parser.error('--author solo se usa con --list database')
+        filters['autor'] = args.author
+    
     # Asegurar que existan los directorios
     config.ensure_directories()
     
     # Listar documentos
     if args.list:
-        list_documents(args.list)
+        list_documents(args.list, filters, args.page_size)
+        return
+    
+    # Reconstruir el índice de la salida JSON
+    if args.rebuild_index:
+        inicio = time.perf_counter()
+        resumen = JSONStorage(config.JSON_OUTPUT_DIR).rebuild_index()
+        print(
+            f"✅ Índice JSON reconstruido en {time.perf_counter() - inicio:.2f} s: "
+            f"{resumen['indexados']} indexados, {resumen['sin_cambios']} sin cambios, "
+            f"{resumen['eliminados']} eliminados, {resumen['errores']} con errores"
+        )
+        return
+    
+    # Compactar el almacenamiento JSONL
+    if args.compact:
+        with build_jsonl_storage() as storage:
+            resumen = storage.compact()
+        print(
+            f"✅ {resumen['documentos']} documentos en {resumen['segmentos']} segmentos "
+            f"({resumen['bytes_liberados']} bytes liberados)"
+        )
+        return
+    
+    # Buscar en el contenido
+    if args.search:
+        search_documents(args.search, args.limit, args.page)
+        return
+    
+    # Analizar facturas guardadas
+    if args.parse_invoices:
+        print(f"🧾 Analizando facturas guardadas en BD ({args.workers} procesos)")
+        resumen = parse_stored_invoices(args.workers, reparse=args.reparse)
+        print(
+            f"\n✅ {resumen['analizadas']} facturas analizadas en {resumen['segundos']:.2f} s "
+            f"({resumen['facturas_por_segundo_proceso']:.0f} facturas/s por proceso)"
+        )
+        for campo in CAMPOS_FACTURA:
+            print(
+                f"  - {campo}: encontrado en {resumen['encontrados'][campo]:.0%}, "
+                f"confianza media {resumen['confianza_media'][campo]:.2f}"
+            )
+        return
+    
+    # Recalcular el resumen mensual
+    if args.rebuild_rollups:
+        rebuild_rollups()
+        return
+    
+    # Eliminar documentos repetidos que impiden migrar
+    if args.dedup_hashes:
+        dedup_content_hashes(args.dedup_hashes)
         return
     
     # Determinar directorio de entrada
@@ -182,11 +1085,62 @@ Ejemplos de uso:
         print(f"❌ Error: El directorio {input_dir} no existe")
         sys.exit(1)
     
+    # Inventariar sin extraer
+    if args.scan:
+        scan_directory(input_dir)
+        return
+    
     # Procesar PDFs
     print(f"🚀 Iniciando extracción de PDFs")
     print(f"📂 Directorio de entrada: {input_dir}")
     
-    process_directory(input_dir, args.storage)
+    ocr = None
+    if args.ocr:
+        try:
+            ocr = build_ocr_fallback(args.ocr_workers)
+        except (ImportError, ValueError) as e:
+            print(f"❌ Error: {str(e)}")
+            sys.exit(1)
+        print(f"🔤 OCR de respaldo: {config.OCR_ENGINE} ({args.ocr_workers} procesos)")
+    
+    cache = None
+    if args.cache:
+        cache = build_extraction_cache()
+        print(f"🗄 Caché de extracción: {config.EXTRACTION_CACHE_PATH}")
+    
+    page_pool = None
+    if args.page_workers > 1:
+        page_pool = PageRangePool(args.page_workers, args.page_min_pages, config.PAGE_RANGE_SIZE)
+        print(f"📑 PDFs de {args.page_min_pages} páginas o más: por rangos en {args.page_workers} procesos")
+    
+    profiler = None
+    if args.profile:
+        profiler = profiling.Profiler(slowest=args.profile_slowest)
+        profiling.enable(profiler)
+    
+    try:
+        if args.watch:
+            watch_directory(input_dir, args.storage, args.workers, args.force, ocr, cache, args.poll)
+        else:
+            process_directory(
+                input_dir, args.storage, args.workers, args.force, args.db_batch_size, ocr, cache, page_pool,
+                args.pipeline
+            )
+    finally:
+        if ocr:
+            ocr.close()
+        if page_pool:
+            page_pool.close()
+        if cache:
+            cache.close()
+        if profiler:
+            profiling.disable()
+            report = profiler.save(Path(args.profile))
+            print(f"\n⏱ Tiempos por etapa ({report['num_archivos']} archivos, {report['segundos']:.2f} s):")
+            print(profiler.format_summary(report))
+            print(f"📈 Informe: {args.profile}")
+            for perfil in report['perfiles']:
+                print(f"  🔥 {Path(perfil['archivo']).name}: {perfil['extraccion_s']:.3f} s → {perfil['perfil']}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,255 @@
+"""
+PASO 2: Modelos de Datos - Migraciones
+Versiones del esquema de la base de datos, aplicadas en orden una sola vez
+"""
+import threading
+import weakref
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import MetaData, Table, delete, func, insert, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from models import Base, ContenidoPagina, Documento, Factura, Pagina, ResumenMensual, VersionEsquema
+from storage import monthly_rollup
+from storage.search_index import get_search_index
+
+
+class MigrationError(RuntimeError):
+    """Una migración no puede aplicarse sin intervención (el esquema no cambia)"""
+
+
+def _create_indexes(connection: Connection, table, *names: str):
+    """Crea los índices del modelo indicados si aún no existen"""
+    indexes = {index.name: index for index in table.indexes}
+    for name in names:
+        indexes[name].create(connection, checkfirst=True)
+
+
+def _add_columns(connection: Connection, table: str, columns: Dict[str, str]):
+    """Añade con ALTER TABLE las columnas ({nombre: tipo}) que aún no tenga la tabla"""
+    existing = {column['name'] for column in inspect(connection).get_columns(table)}
+    for name, column_type in columns.items():
+        if name not in existing:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}"))
+
+
+# Columnas añadidas a tablas del esquema original antes de que hubiera
+# migraciones. create_all no añade columnas a una tabla que ya existe
+LEGACY_COLUMNS = {
+    'documentos': {'hash_contenido': 'VARCHAR(64)'},
+    'paginas': {'metodo_extraccion': 'VARCHAR(20)'},
+}
+
+
+def _initial_schema(connection: Connection):
+    # En una base de datos nueva crea ya el esquema completo (con todos los
+    # índices); en una anterior a las migraciones solo añade lo que falte
+    Base.metadata.create_all(connection)
+    for table, columns in LEGACY_COLUMNS.items():
+        _add_columns(connection, table, columns)
+
+
+def _search_index(connection: Connection):
+    search_index = get_search_index(connection.engine)
+    if search_index:
+        search_index.create(connection)
+
+
+def _listing_indexes(connection: Connection):
+    _create_indexes(connection, Documento.__table__, 'ix_documentos_fecha_id', 'ix_documentos_autor_fecha_id')
+
+
+def _lookup_indexes(connection: Connection):
+    _create_indexes(connection, Pagina.__table__, 'ix_paginas_documento_id')
+    _create_indexes(connection, Documento.__table__, 'ix_documentos_nombre_archivo', 'ix_documentos_ruta_archivo')
+
+
+def _unique_content_hash(connection: Connection):
+    # Los documentos repetidos no se eliminan aquí: hay que hacerlo a propósito
+    # con remove_duplicate_hashes (main.py --dedup-hashes)
+    duplicates = duplicate_content_hashes(connection)
+    if duplicates:
+        detalle = '; '.join(f"{file_hash[:12]}…: {', '.join(map(str, ids))}" for file_hash, ids in duplicates.items())
+        raise MigrationError(
+            f"No se puede crear el índice único de hash_contenido: {len(duplicates)} hashes se repiten en "
+            f"documentos ({detalle}). Elimínalos con 'python main.py --dedup-hashes COPIA.json', que guarda "
+            f"antes una copia de las filas eliminadas"
+        )
+
+    _create_indexes(connection, Documento.__table__, 'uq_documentos_hash_contenido')
+
+
+def _shared_contents(connection: Connection):
+    ContenidoPagina.__table__.create(connection, checkfirst=True)
+    _add_columns(connection, 'paginas', {'contenido_id': 'INTEGER REFERENCES contenidos (id)'})
+    _create_indexes(connection, Pagina.__table__, 'ix_paginas_contenido_id')
+    _search_index(connection)
+
+
+def _monthly_rollup(connection: Connection):
+    _add_columns(connection, 'facturas', {'categoria': 'VARCHAR(20)'})
+    _create_indexes(connection, Factura.__table__, 'ix_facturas_cups_periodo')
+    ResumenMensual.__table__.create(connection, checkfirst=True)
+    # Las facturas ya analizadas no tienen categoría hasta volver a analizarlas
+    # (PARSER_VERSION 2); mientras tanto cuentan como SIN_CATEGORIA
+    monthly_rollup.rebuild(connection)
+
+
+# (versión, descripción, función). Las versiones solo se añaden al final y
+# cada función debe poder aplicarse sobre un esquema que ya la incluya
+MIGRACIONES = [
+    (1, 'Esquema inicial', _initial_schema),
+    (2, 'Índice de texto completo de las páginas', _search_index),
+    (3, 'Índices del listado por fecha de procesamiento', _listing_indexes),
+    (4, 'Índices de páginas por documento, nombre y ruta', _lookup_indexes),
+    (5, 'Hash de contenido único', _unique_content_hash),
+    (6, 'Contenidos de página compartidos y comprimidos', _shared_contents),
+    (7, 'Resumen mensual de facturas por hogar', _monthly_rollup),
+    (8, 'Índice de texto completo único para páginas y contenidos compartidos', _search_index),
+]
+
+HEAD = MIGRACIONES[-1][0]
+
+# Motores cuyo esquema ya se comprobó en este proceso (ver ensure_schema)
+_ready = weakref.WeakSet()
+_ready_lock = threading.Lock()
+
+
+def current_version(connection: Connection) -> int:
+    """
+    Versión del esquema de la base de datos
+
+    Returns:
+        int: Última migración aplicada (0 si no hay ninguna)
+    """
+    if not inspect(connection).has_table(VersionEsquema.__tablename__):
+        return 0
+    return connection.scalar(select(func.max(VersionEsquema.version))) or 0
+
+
+def migrate(connection: Connection, target: int = None) -> List[int]:
+    """
+    Aplica las migraciones pendientes en la transacción de la conexión
+
+    Args:
+        connection: Conexión síncrona con una transacción abierta
+        target: Versión hasta la que migrar (default: HEAD)
+
+    Returns:
+        Lista de versiones aplicadas
+    """
+    VersionEsquema.__table__.create(connection, checkfirst=True)
+    version = current_version(connection)
+    aplicadas = []
+
+    for numero, descripcion, aplicar in MIGRACIONES:
+        if numero <= version or (target is not None and numero > target):
+            continue
+        aplicar(connection)
+        connection.execute(insert(VersionEsquema).values(
+            version=numero, descripcion=descripcion, fecha_aplicacion=datetime.utcnow()
+        ))
+        aplicadas.append(numero)
+
+    return aplicadas
+
+
+def duplicate_content_hashes(connection: Connection) -> Dict[str, List[int]]:
+    """
+    Documentos que comparten hash de contenido
+
+    Returns:
+        Diccionario {hash: [ids de documento en orden]} con los hashes repetidos
+    """
+    repeated = (
+        select(Documento.hash_contenido)
+        .where(Documento.hash_contenido.is_not(None))
+        .group_by(Documento.hash_contenido)
+        .having(func.count() > 1)
+    )
+    duplicates = {}
+    for file_hash, doc_id in connection.execute(
+        select(Documento.hash_contenido, Documento.id)
+        .where(Documento.hash_contenido.in_(repeated))
+        .order_by(Documento.hash_contenido, Documento.id)
+    ):
+        duplicates.setdefault(file_hash, []).append(doc_id)
+    return duplicates
+
+
+def remove_duplicate_hashes(connection: Connection) -> Dict[str, List[Dict]]:
+    """
+    Elimina los documentos repetidos por hash de contenido, con sus páginas y facturas
+
+    De cada hash se conserva el documento de id más alto (el último
+    guardado). Las filas eliminadas se devuelven para poder guardar una
+    copia antes de confirmar la transacción.
+
+    Args:
+        connection: Conexión síncrona con una transacción abierta
+
+    Returns:
+        Filas eliminadas por tabla ({'documentos': [...], 'paginas': [...], 'facturas': [...]})
+    """
+    removed = [doc_id for ids in duplicate_content_hashes(connection).values() for doc_id in ids[:-1]]
+    filas = {'documentos': [], 'paginas': [], 'facturas': []}
+    if not removed:
+        return filas
+
+    # Tablas tal como están en la base de datos: antes de la versión 5 no
+    # tienen todas las columnas del modelo
+    metadata = MetaData()
+    for name in ('paginas', 'facturas', 'documentos'):
+        if not inspect(connection).has_table(name):
+            continue
+        table = Table(name, metadata, autoload_with=connection)
+        column = table.c.id if name == 'documentos' else table.c.documento_id
+        filas[name] = [
+            dict(row._mapping) for row in connection.execute(select(table).where(column.in_(removed)))
+        ]
+        connection.execute(delete(table).where(column.in_(removed)))
+    return filas
+
+
+def ensure_schema(engine: Engine) -> List[int]:
+    """
+    Deja la base de datos en la última versión del esquema
+
+    Solo la primera llamada para cada motor del proceso consulta la base de
+    datos; las siguientes no hacen nada. Las migraciones se aplican en una
+    transacción de escritura (BEGIN IMMEDIATE en SQLite), así que si varios
+    procesos arrancan a la vez, solo uno las aplica.
+
+    Args:
+        engine: Motor de SQLAlchemy
+
+    Returns:
+        Lista de versiones aplicadas (vacía si ya estaba al día)
+    """
+    if engine in _ready:
+        return []
+
+    with _ready_lock:
+        if engine in _ready:
+            return []
+
+        with engine.connect() as connection:
+            pendiente = current_version(connection) < HEAD
+
+        aplicadas = []
+        if pendiente:
+            with engine.connect() as connection:
+                connection = connection.execution_options(escritura=True)
+                with connection.begin():
+                    aplicadas = migrate(connection)
+        _ready.add(engine)
+
+    if aplicadas:
+        print(f"✓ Esquema de BD migrado a la versión {HEAD} (migraciones {', '.join(map(str, aplicadas))})")
+    return aplicadas
+
+
+def forget_schema(engine: Engine):
+    """Vuelve a comprobar el esquema en el próximo ensure_schema (p. ej. tras borrar las tablas)"""
+    _ready.discard(engine)
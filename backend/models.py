@@ -1,21 +1,31 @@
 """
 PASO 2: Modelos de Datos
-Define la estructura de datos para documentos y paginas
+Define la estructura de datos para documentos y páginas
 """
+import hashlib
+import os
+import threading
+import zlib
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, create_engine
+from sqlalchemy import (
+    JSON, Column, Date, DateTime, Float, ForeignKey, Index, Integer, LargeBinary, Numeric, String, Text,
+    create_engine, event
+)
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 
+from config import Config
+
 Base = declarative_base()
 
 
 class Documento(Base):
     """
-    Modelo para almacenar informacion de documentos PDF
+    Modelo para almacenar información de documentos PDF
     """
     __tablename__ = 'documentos'
-
+    
     id = Column(Integer, primary_key=True, autoincrement=True)
     nombre_archivo = Column(String(255), nullable=False)
     ruta_archivo = Column(String(500), nullable=False)
@@ -24,16 +34,46 @@ class Documento(Base):
     titulo = Column(String(500), nullable=True)
     fecha_creacion = Column(DateTime, nullable=True)
     fecha_procesamiento = Column(DateTime, default=datetime.utcnow)
-
-    # Relacion con paginas
-    paginas = relationship("Pagina", back_populates="documento", cascade="all, delete-orphan")
-
+    hash_contenido = Column(String(64), nullable=True)
+    
+    # Índices del listado paginado por (fecha_procesamiento, id) (ver
+    # DatabaseStorage.list_documents_page) y de las búsquedas por nombre, ruta
+    # y hash. Las bases de datos anteriores los reciben al migrar (migrations.py)
+    __table_args__ = (
+        Index('ix_documentos_fecha_id', 'fecha_procesamiento', 'id'),
+        Index('ix_documentos_autor_fecha_id', 'autor', 'fecha_procesamiento', 'id'),
+        Index('ix_documentos_nombre_archivo', 'nombre_archivo'),
+        Index('ix_documentos_ruta_archivo', 'ruta_archivo'),
+        Index('uq_documentos_hash_contenido', 'hash_contenido', unique=True),
+    )
+    
+    # Relación con páginas
+    paginas = relationship(
+        "Pagina",
+        back_populates="documento",
+        cascade="all, delete-orphan",
+        order_by="Pagina.numero_pagina"
+    )
+    
+    # Campos de factura obtenidos del texto (si se ha analizado)
+    factura = relationship(
+        "Factura",
+        back_populates="documento",
+        cascade="all, delete-orphan",
+        uselist=False
+    )
+    
     def __repr__(self):
         return f"<Documento(id={self.id}, nombre='{self.nombre_archivo}', paginas={self.num_paginas})>"
-
-    def to_dict(self):
-        """Convierte el documento a diccionario"""
-        return {
+    
+    def to_dict(self, include_pages: bool = True):
+        """
+        Convierte el documento a diccionario
+        
+        Args:
+            include_pages: Incluir las páginas (carga la relación si no está cargada)
+        """
+        data = {
             'id': self.id,
             'nombre_archivo': self.nombre_archivo,
             'ruta_archivo': self.ruta_archivo,
@@ -42,139 +82,359 @@ class Documento(Base):
             'titulo': self.titulo,
             'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
             'fecha_procesamiento': self.fecha_procesamiento.isoformat(),
-            'paginas': [pagina.to_dict() for pagina in self.paginas]
+            'hash_contenido': self.hash_contenido
         }
+        
+        if include_pages:
+            data['paginas'] = [pagina.to_dict() for pagina in self.paginas]
+        
+        return data
 
 
 class Pagina(Base):
     """
-    Modelo para almacenar el contenido de cada pagina del PDF
+    Modelo para almacenar el contenido de cada página del PDF
     """
     __tablename__ = 'paginas'
-
+    
     id = Column(Integer, primary_key=True, autoincrement=True)
     documento_id = Column(Integer, ForeignKey('documentos.id'), nullable=False)
     numero_pagina = Column(Integer, nullable=False)
     contenido = Column(Text, nullable=False)
-
-    # Relacion con documento
+    metodo_extraccion = Column(String(20), nullable=True)
+    
+    # Texto compartido y comprimido (modo 'blob', ver DB_PAGE_STORAGE); si
+    # está, 'contenido' queda vacío
+    contenido_id = Column(Integer, ForeignKey('contenidos.id'), nullable=True)
+    
+    # Carga de las páginas de un documento (en orden) y borrado en cascada
+    __table_args__ = (
+        Index('ix_paginas_documento_id', 'documento_id', 'numero_pagina'),
+        Index('ix_paginas_contenido_id', 'contenido_id'),
+    )
+    
+    # Relación con documento
     documento = relationship("Documento", back_populates="paginas")
-
+    contenido_compartido = relationship("ContenidoPagina")
+    
     def __repr__(self):
         return f"<Pagina(id={self.id}, doc_id={self.documento_id}, num={self.numero_pagina})>"
-
+    
+    @property
+    def texto(self) -> str:
+        """Texto de la página, descomprimido si está en la tabla de contenidos"""
+        if self.contenido_id is None:
+            return self.contenido
+        return self.contenido_compartido.texto
+    
     def to_dict(self):
-        """Convierte la pagina a diccionario"""
+        """Convierte la página a diccionario"""
         return {
             'id': self.id,
             'numero_pagina': self.numero_pagina,
-            'contenido': self.contenido
+            'contenido': self.texto,
+            'metodo_extraccion': self.metodo_extraccion
         }
 
 
-class DatabaseManager:
-    """
-    Gestor de la base de datos
-    """
-
-    def __init__(self, database_url: str):
-        """
-        Inicializa el gestor de base de datos
+def content_hash(texto: str) -> str:
+    """Hash SHA-256 del texto de una página (clave de ContenidoPagina)"""
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
 
-        Args:
-            database_url: URL de conexion a la base de datos
-        """
-        self.engine = create_engine(database_url, echo=False)
-        self.Session = sessionmaker(bind=self.engine)
 
-    def create_tables(self):
-        """Crea todas las tablas en la base de datos"""
-        Base.metadata.create_all(self.engine)
+def compress_text(texto: str) -> bytes:
+    """Comprime el texto de una página para ContenidoPagina.datos"""
+    return zlib.compress(texto.encode('utf-8'), 6)
 
-    def get_session(self):
-        """
-        Obtiene una nueva sesion de base de datos
 
-        Returns:
-            Session: Sesion de SQLAlchemy
-        """
-        return self.Session()
+def decompress_text(datos: bytes) -> str:
+    """Recupera el texto guardado con compress_text"""
+    return zlib.decompress(datos).decode('utf-8')
 
-    def drop_tables(self):
-        """Elimina todas las tablas (usar con precaucion)"""
-        Base.metadata.drop_all(self.engine)
-"""
-PASO 2: Modelos de Datos
-Define la estructura de datos para documentos y páginas
-"""
-from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
 
-Base = declarative_base()
+class ContenidoPagina(Base):
+    """
+    Texto de página comprimido y direccionado por su hash
+    
+    Las páginas que se repiten entre documentos (condiciones generales,
+    avisos legales...) se guardan una sola vez y las filas de Pagina lo
+    referencian con contenido_id.
+    """
+    __tablename__ = 'contenidos'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    hash = Column(String(64), nullable=False, unique=True)
+    datos = Column(LargeBinary, nullable=False)
+    tamano = Column(Integer, nullable=False)
+    
+    def __repr__(self):
+        return f"<ContenidoPagina(id={self.id}, tamano={self.tamano})>"
+    
+    @property
+    def texto(self) -> str:
+        return decompress_text(self.datos)
 
 
-class Documento(Base):
+class Factura(Base):
     """
-    Modelo para almacenar información de documentos PDF
+    Modelo para los campos estructurados de una factura
+    
+    Se obtiene del texto de las páginas de un Documento con el analizador
+    de facturas (extractors/invoice_parser.py).
     """
-    __tablename__ = 'documentos'
+    __tablename__ = 'facturas'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    nombre_archivo = Column(String(255), nullable=False)
-    ruta_archivo = Column(String(500), nullable=False)
-    num_paginas = Column(Integer, nullable=False)
-    autor = Column(String(255), nullable=True)
-    titulo = Column(String(500), nullable=True)
-    fecha_creacion = Column(DateTime, nullable=True)
-    fecha_procesamiento = Column(DateTime, default=datetime.utcnow)
+    documento_id = Column(Integer, ForeignKey('documentos.id'), nullable=False, unique=True)
+    proveedor = Column(String(100), nullable=True)
+    categoria = Column(String(20), nullable=True)
+    cups = Column(String(22), nullable=True)
+    importe_total = Column(Numeric(12, 2), nullable=True)
+    periodo_inicio = Column(Date, nullable=True)
+    periodo_fin = Column(Date, nullable=True)
+    consumo_kwh = Column(Float, nullable=True)
+    confianza = Column(JSON, nullable=False, default=dict)
+    version_analizador = Column(String(20), nullable=False)
+    fecha_analisis = Column(DateTime, default=datetime.utcnow)
     
-    # Relación con páginas
-    paginas = relationship("Pagina", back_populates="documento", cascade="all, delete-orphan")
+    # Facturas de cada hogar por periodo (reconstrucción del resumen mensual)
+    __table_args__ = (
+        Index('ix_facturas_cups_periodo', 'cups', 'periodo_fin'),
+    )
+    
+    # Relación con documento
+    documento = relationship("Documento", back_populates="factura")
     
     def __repr__(self):
-        return f"<Documento(id={self.id}, nombre='{self.nombre_archivo}', paginas={self.num_paginas})>"
+        return f"<Factura(id={self.id}, doc_id={self.documento_id}, proveedor='{self.proveedor}')>"
     
     def to_dict(self):
-        """Convierte el documento a diccionario"""
+        """Convierte la factura a diccionario"""
         return {
             'id': self.id,
-            'nombre_archivo': self.nombre_archivo,
-            'ruta_archivo': self.ruta_archivo,
-            'num_paginas': self.num_paginas,
-            'autor': self.autor,
-            'titulo': self.titulo,
-            'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
-            'fecha_procesamiento': self.fecha_procesamiento.isoformat(),
-            'paginas': [pagina.to_dict() for pagina in self.paginas]
+            'documento_id': self.documento_id,
+            'proveedor': self.proveedor,
+            'categoria': self.categoria,
+            'cups': self.cups,
+            'importe_total': float(self.importe_total) if self.importe_total is not None else None,
+            'periodo_inicio': self.periodo_inicio.isoformat() if self.periodo_inicio else None,
+            'periodo_fin': self.periodo_fin.isoformat() if self.periodo_fin else None,
+            'consumo_kwh': self.consumo_kwh,
+            'confianza': self.confianza,
+            'version_analizador': self.version_analizador,
+            'fecha_analisis': self.fecha_analisis.isoformat() if self.fecha_analisis else None
         }
 
 
-class Pagina(Base):
+class ResumenMensual(Base):
     """
-    Modelo para almacenar el contenido de cada página del PDF
+    Totales de las facturas de un hogar en un mes, por categoría y proveedor
+    
+    El hogar es el CUPS de la factura y el mes, el del fin de su periodo
+    (primer día del mes). DatabaseStorage lo mantiene al guardar y borrar
+    facturas (ver storage/monthly_rollup.py).
     """
-    __tablename__ = 'paginas'
+    __tablename__ = 'resumen_mensual'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    documento_id = Column(Integer, ForeignKey('documentos.id'), nullable=False)
-    numero_pagina = Column(Integer, nullable=False)
-    contenido = Column(Text, nullable=False)
+    hogar = Column(String(22), nullable=False)
+    mes = Column(Date, nullable=False)
+    categoria = Column(String(20), nullable=False)
+    proveedor = Column(String(100), nullable=False)
+    num_facturas = Column(Integer, nullable=False, default=0)
+    importe_total = Column(Numeric(14, 2), nullable=False, default=0)
+    consumo_kwh = Column(Float, nullable=False, default=0.0)
     
-    # Relación con documento
-    documento = relationship("Documento", back_populates="paginas")
+    # Resumen de un hogar por rango de meses y de todos los hogares por mes
+    __table_args__ = (
+        Index('uq_resumen_mensual_clave', 'hogar', 'mes', 'categoria', 'proveedor', unique=True),
+        Index('ix_resumen_mensual_mes', 'mes'),
+    )
     
     def __repr__(self):
-        return f"<Pagina(id={self.id}, doc_id={self.documento_id}, num={self.numero_pagina})>"
+        return f"<ResumenMensual(hogar='{self.hogar}', mes={self.mes}, categoria='{self.categoria}')>"
+
+
+class VersionEsquema(Base):
+    """
+    Migración aplicada a la base de datos (ver migrations.py)
+    """
+    __tablename__ = 'schema_version'
     
-    def to_dict(self):
-        """Convierte la página a diccionario"""
-        return {
-            'id': self.id,
-            'numero_pagina': self.numero_pagina,
-            'contenido': self.contenido
-        }
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    descripcion = Column(String(200), nullable=False)
+    fecha_aplicacion = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<VersionEsquema(version={self.version}, descripcion='{self.descripcion}')>"
+
+
+# Valores admitidos en los PRAGMA de SQLite configurables
+SQLITE_JOURNAL_MODES = ('wal', 'delete', 'truncate', 'persist', 'memory', 'off')
+SQLITE_SYNCHRONOUS = ('off', 'normal', 'full', 'extra')
+SQLITE_BEGIN_MODES = ('deferred', 'immediate', 'exclusive')
+
+# Un motor por proceso y URL (ver get_engine)
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _check_option(name: str, value: str, allowed: tuple) -> str:
+    """Valida una opción de SQLite que se interpola en un PRAGMA o BEGIN"""
+    value = value.lower()
+    if value not in allowed:
+        raise ValueError(f"{name} no válido: '{value}' (opciones: {', '.join(allowed)})")
+    return value
+
+
+def _configure_sqlite(engine: Engine, in_memory: bool):
+    """
+    Aplica los PRAGMA de Config a cada conexión SQLite nueva
+    
+    Las sesiones de escritura (``get_session(write=True)``) empiezan con
+    ``BEGIN <SQLITE_WRITE_BEGIN_MODE>``. Con el modo por defecto (IMMEDIATE)
+    el escritor reserva la base de datos al empezar y los demás esperan
+    hasta ``SQLITE_BUSY_TIMEOUT_MS``; con BEGIN diferido, una transacción que
+    lee y luego escribe puede fallar con "database is locked" sin esperar si
+    otro escritor se le adelanta. Las lecturas usan BEGIN diferido y, con
+    WAL, no bloquean a los escritores.
+    """
+    journal_mode = _check_option('SQLITE_JOURNAL_MODE', Config.SQLITE_JOURNAL_MODE, SQLITE_JOURNAL_MODES)
+    synchronous = _check_option('SQLITE_SYNCHRONOUS', Config.SQLITE_SYNCHRONOUS, SQLITE_SYNCHRONOUS)
+    write_begin_mode = _check_option(
+        'SQLITE_WRITE_BEGIN_MODE', Config.SQLITE_WRITE_BEGIN_MODE, SQLITE_BEGIN_MODES
+    )
+    cache_size_kb = int(Config.SQLITE_CACHE_SIZE_KB)
+    mmap_size = int(Config.SQLITE_MMAP_SIZE_MB) * 1024 * 1024
+    busy_timeout_ms = int(Config.SQLITE_BUSY_TIMEOUT_MS)
+    
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        # El driver no abre transacciones por su cuenta: las abre el evento 'begin'
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+            cursor.execute(f"PRAGMA mmap_size={mmap_size}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA cache_size=-{cache_size_kb}")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        cursor.close()
+    
+    @event.listens_for(engine, 'begin')
+    def on_begin(connection):
+        mode = write_begin_mode if connection.get_execution_options().get('escritura') else 'deferred'
+        # Directamente en el driver, como el BEGIN implícito de sqlite3
+        cursor = connection.connection.cursor()
+        cursor.execute(f"BEGIN {mode.upper()}")
+        cursor.close()
+
+
+# Drivers asíncronos de cada motor (ver to_async_url)
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+
+def _is_sqlite_memory(url) -> bool:
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def _pool_options(url) -> dict:
+    """Opciones del pool de Config (SQLite en memoria usa su pool de una conexión)"""
+    if _is_sqlite_memory(url):
+        return {}
+    return {
+        'pool_size': Config.DB_POOL_SIZE,
+        'max_overflow': Config.DB_MAX_OVERFLOW,
+        'pool_timeout': Config.DB_POOL_TIMEOUT,
+        'pool_recycle': Config.DB_POOL_RECYCLE,
+        'pool_pre_ping': Config.DB_POOL_PRE_PING
+    }
+
+
+def create_database_engine(database_url: str) -> Engine:
+    """
+    Crea un motor de SQLAlchemy con el pool y los PRAGMA de Config
+    
+    Args:
+        database_url: URL de conexión a la base de datos
+    
+    Returns:
+        Engine: Motor nuevo (usa get_engine para compartirlo)
+    """
+    url = make_url(database_url)
+    options = dict(_pool_options(url), echo=False)
+    if url.get_backend_name() == 'sqlite':
+        options['connect_args'] = {'timeout': Config.SQLITE_BUSY_TIMEOUT_MS / 1000, 'check_same_thread': False}
+    
+    engine = create_engine(database_url, **options)
+    if url.get_backend_name() == 'sqlite':
+        _configure_sqlite(engine, _is_sqlite_memory(url))
+    return engine
+
+
+def to_async_url(database_url: str) -> str:
+    """
+    Cambia el driver de una URL por el asíncrono del mismo motor
+    
+    Args:
+        database_url: URL síncrona (p. ej. la de Config.get_database_url())
+    
+    Returns:
+        str: URL con aiosqlite (SQLite) o asyncpg (PostgreSQL)
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No hay driver asíncrono para '{backend}'")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def create_async_database_engine(database_url: str):
+    """
+    Crea un motor asíncrono con el mismo pool y PRAGMA que create_database_engine
+    
+    Requiere ``aiosqlite`` o ``asyncpg`` según el motor. El motor queda
+    ligado al bucle de eventos donde se usa, así que no se comparte entre
+    procesos ni bucles como el de get_engine.
+    
+    Args:
+        database_url: URL de conexión (síncrona o asíncrona)
+    
+    Returns:
+        AsyncEngine: Motor asíncrono de SQLAlchemy
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+    
+    url = make_url(to_async_url(database_url))
+    options = dict(_pool_options(url), echo=False)
+    if url.get_backend_name() == 'sqlite':
+        options['connect_args'] = {'timeout': Config.SQLITE_BUSY_TIMEOUT_MS / 1000}
+    
+    engine = create_async_engine(url, **options)
+    if url.get_backend_name() == 'sqlite':
+        _configure_sqlite(engine.sync_engine, _is_sqlite_memory(url))
+    return engine
+
+
+def get_engine(database_url: str) -> Engine:
+    """
+    Motor compartido por todo el proceso para una URL
+    
+    Todos los DatabaseManager de una misma URL comparten el pool de
+    conexiones. Tras un fork, el proceso hijo crea su propio motor.
+    
+    Args:
+        database_url: URL de conexión a la base de datos
+    
+    Returns:
+        Engine: Motor de SQLAlchemy
+    """
+    key = (os.getpid(), database_url)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = create_database_engine(database_url)
+    return engine
 
 
 class DatabaseManager:
@@ -182,29 +442,49 @@ class DatabaseManager:
     Gestor de la base de datos
     """
     
-    def __init__(self, database_url: str):
+    def __init__(self, database_url: str, engine: Engine = None):
         """
         Inicializa el gestor de base de datos
         
         Args:
             database_url: URL de conexión a la base de datos
+            engine: Motor a usar (default: el compartido de get_engine)
         """
-        self.engine = create_engine(database_url, echo=False)
+        self.engine = engine or get_engine(database_url)
         self.Session = sessionmaker(bind=self.engine)
     
     def create_tables(self):
-        """Crea todas las tablas en la base de datos"""
-        Base.metadata.create_all(self.engine)
+        """
+        Crea las tablas o aplica las migraciones pendientes
+        
+        Solo consulta la base de datos la primera vez para cada motor del
+        proceso (ver migrations.ensure_schema).
+        
+        Returns:
+            Lista de versiones aplicadas (vacía si ya estaba al día)
+        """
+        # migrations importa este módulo
+        from migrations import ensure_schema
+        return ensure_schema(self.engine)
     
-    def get_session(self):
+    def get_session(self, write: bool = False):
         """
         Obtiene una nueva sesión de base de datos
         
+        Args:
+            write: La sesión va a escribir. En SQLite su transacción empieza
+                reservando la base de datos (ver SQLITE_WRITE_BEGIN_MODE)
+        
         Returns:
             Session: Sesión de SQLAlchemy
         """
-        return self.Session()
+        session = self.Session()
+        if write:
+            session.connection(execution_options={'escritura': True})
+        return session
     
     def drop_tables(self):
         """Elimina todas las tablas (usar con precaución)"""
-        Base.metadata.drop_all(self.engine)
\ No newline at end of file
+        from migrations import forget_schema
+        Base.metadata.drop_all(self.engine)
+        forget_schema(self.engine)
\ No newline at end of file
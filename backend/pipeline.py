@@ -0,0 +1,346 @@
+"""
+PASO 9: Ingesta en etapas
+Conecta la extracción, la serialización y cada almacenamiento con colas acotadas
+
+Cada documento extraído se reparte entre las ramas de sus almacenamientos
+(JSON: serialización y escritura; BD; JSONL), y cada etapa es un hilo con
+su propia cola. Así los guardados en JSON y en BD del mismo documento se
+hacen a la vez, y mientras el siguiente PDF se extrae. Si una etapa va
+lenta, su cola se llena y la extracción espera. Un documento solo se
+registra en el manifiesto cuando todas sus ramas lo han guardado.
+"""
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+import profiling
+from storage.ingestion_manifest import IngestionManifest
+
+# Marca de fin de la entrada de una etapa
+_FIN = object()
+
+
+def _each(func: Callable) -> Callable[[List], List]:
+    """Aplica func a cada elemento de un lote; los errores se devuelven como resultado"""
+    def run(values: List) -> List:
+        results = []
+        for value in values:
+            try:
+                results.append(func(value))
+            except Exception as e:
+                results.append(e)
+        return results
+    return run
+
+
+class _Document:
+    """Documento en curso y las ramas de almacenamiento que aún no lo han guardado"""
+
+    __slots__ = ('pdf_file', 'data', 'pendientes', 'errores')
+
+    def __init__(self, pdf_file: Path, data: Dict, ramas: int):
+        self.pdf_file = pdf_file
+        self.data = data
+        self.pendientes = ramas
+        self.errores = []
+
+
+class _Stage(threading.Thread):
+    """
+    Etapa de la ingesta: un hilo que consume los elementos de su cola
+
+    ``func`` recibe una lista de valores (hasta ``batch``, de los que ya
+    estén en la cola) y devuelve el resultado de cada uno, o la excepción
+    si falló. El resultado pasa a la etapa siguiente; en la última etapa
+    la rama del documento queda terminada.
+    """
+
+    def __init__(self, pipeline: 'IngestionPipeline', name: str, func: Callable[[List], List],
+                 queue_size: int, batch: int = 1, profile_stage: Optional[str] = None):
+        super().__init__(name=f'etapa-{name}', daemon=True)
+        self.pipeline = pipeline
+        self.stage_name = name
+        self.func = func
+        self.batch = batch
+        self.profile_stage = profile_stage
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.next = None
+        self.procesados = 0
+        self.lotes = 0
+        self.ocupado = 0.0
+        self.cola_max = 0
+
+    def put(self, item):
+        """Encola un elemento, esperando si la cola está llena"""
+        self.queue.put(item)
+        self.cola_max = max(self.cola_max, self.queue.qsize())
+
+    def run(self):
+        fin = False
+        while not fin:
+            items = [self.queue.get()]
+            while len(items) < self.batch and items[-1] is not _FIN:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if items[-1] is _FIN:
+                items.pop()
+                fin = True
+
+            if not items:
+                continue
+            if self.pipeline.aborted:
+                # Tras un error fatal se vacía la cola sin guardar nada más
+                self.pipeline._discard(items)
+                continue
+            try:
+                self._process(items)
+            except BaseException as e:
+                self.pipeline._fail(e)
+                self.pipeline._discard(items)
+
+        if self.next:
+            self.next.put(_FIN)
+
+    def _process(self, items: List):
+        """Procesa un lote y pasa cada resultado a la etapa siguiente"""
+        values = [value for _, value in items]
+        inicio = time.perf_counter()
+        try:
+            if len(items) == 1 and self.profile_stage:
+                with profiling.track(items[0][0].pdf_file), profiling.stage(self.profile_stage):
+                    results = self.func(values)
+            elif self.profile_stage:
+                with profiling.stage('guardado_lote'):
+                    results = self.func(values)
+            else:
+                results = self.func(values)
+        except Exception as e:
+            results = [e] * len(items)
+        self.ocupado += time.perf_counter() - inicio
+        self.procesados += len(items)
+        self.lotes += 1
+
+        for (document, _), result in zip(items, results):
+            if isinstance(result, Exception):
+                self.pipeline._branch_done(document, self.stage_name, result)
+            elif self.next:
+                self.next.put((document, result))
+            else:
+                self.pipeline._branch_done(document, self.stage_name, None)
+
+
+class IngestionPipeline:
+    """
+    Ingesta en etapas de los documentos extraídos
+
+    ``submit`` reparte cada documento entre las ramas de los almacenamientos
+    indicados y espera si alguna cola está llena (contrapresión). Los
+    errores de un documento en una rama solo hacen fallar ese documento. Un
+    error inesperado en una etapa detiene la ingesta: las colas se vacían
+    sin guardar nada más y ``submit`` y ``close`` lanzan RuntimeError. Usar
+    como gestor de contexto::
+
+        with IngestionPipeline(manifest, targets, json_storage, db_storage) as etapas:
+            for pdf_file, document_data in documentos:
+                etapas.submit(pdf_file, document_data)
+    """
+
+    def __init__(self, manifest: IngestionManifest, targets: Iterable[str], json_storage=None,
+                 db_storage=None, jsonl_storage=None, queue_size: int = 8, db_batch_size: int = 1):
+        """
+        Crea las etapas y arranca sus hilos
+
+        Args:
+            manifest: Manifiesto donde registrar los PDFs guardados
+            targets: Almacenamientos que se registran en el manifiesto
+            json_storage: Instancia de JSONStorage (opcional)
+            db_storage: Instancia de DatabaseStorage (opcional)
+            jsonl_storage: Instancia de JSONLStorage (opcional)
+            queue_size: Elementos como máximo en la cola de cada etapa
+            db_batch_size: Documentos como máximo por commit en la BD; la
+                etapa agrupa los que ya estén esperando en su cola
+
+        Raises:
+            ValueError: Si no se indica ningún almacenamiento
+        """
+        self.manifest = manifest
+        self.targets = list(targets)
+        self.resumen = {'exitosos': 0, 'fallidos': 0, 'descartados': 0}
+        self.error = None
+        self.espera = 0.0
+        self._aborted = threading.Event()
+        self._lock = threading.Lock()
+        self._stages = []
+        self._heads = []
+
+        if json_storage:
+            serialize = self._add('serializacion', _each(json_storage.serialize_document), queue_size)
+            serialize.next = self._add(
+                'json', _each(lambda serialized: json_storage.write_serialized(*serialized)),
+                queue_size, profile_stage='guardado_json'
+            )
+            self._heads.append(serialize)
+
+        if db_storage:
+            if db_batch_size > 1:
+                def save(documents: List[Dict]) -> List:
+                    doc_ids = db_storage.save_documents(documents, batch_size=db_batch_size, atomic=False)
+                    return [RuntimeError("no se guardó en BD") if doc_id is None else doc_id for doc_id in doc_ids]
+            else:
+                save = _each(db_storage.save_document)
+            self._heads.append(
+                self._add('bd', save, queue_size, batch=db_batch_size, profile_stage='guardado_bd')
+            )
+
+        if jsonl_storage:
+            self._heads.append(
+                self._add('jsonl', _each(jsonl_storage.save_document), queue_size, profile_stage='guardado_jsonl')
+            )
+
+        if not self._heads:
+            raise ValueError("La ingesta en etapas necesita al menos un almacenamiento")
+
+        for stage in self._stages:
+            stage.start()
+
+    def _add(self, name: str, func: Callable[[List], List], queue_size: int, **options) -> _Stage:
+        stage = _Stage(self, name, func, queue_size, **options)
+        self._stages.append(stage)
+        return stage
+
+    @property
+    def aborted(self) -> bool:
+        """Indica si la ingesta se ha detenido por un error"""
+        return self._aborted.is_set()
+
+    def submit(self, pdf_file: Path, document_data: Dict):
+        """
+        Reparte un documento extraído entre las ramas de almacenamiento
+
+        Args:
+            pdf_file: Ruta del PDF
+            document_data: Documento extraído, con 'paginas' como lista
+
+        Raises:
+            RuntimeError: Si la ingesta se ha detenido por un error
+        """
+        document = _Document(pdf_file, document_data, len(self._heads))
+        for head in self._heads:
+            inicio = time.perf_counter()
+            while True:
+                if self.aborted:
+                    raise RuntimeError(f"Ingesta en etapas detenida: {self.error}") from self.error
+                try:
+                    head.queue.put((document, document_data), timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            self.espera += time.perf_counter() - inicio
+            head.cola_max = max(head.cola_max, head.queue.qsize())
+
+    def _branch_done(self, document: _Document, stage_name: str, error: Optional[Exception]):
+        """Una rama ha terminado con un documento; con todas, se registra"""
+        with self._lock:
+            if error is not None:
+                document.errores.append(f"{stage_name}: {error}")
+            document.pendientes -= 1
+            if document.pendientes:
+                return
+
+            if not document.errores:
+                try:
+                    self.manifest.record(
+                        document.pdf_file, document.data.get('hash_contenido'), self.targets,
+                        document.data.get('firma_archivo')
+                    )
+                except OSError as e:
+                    document.errores.append(f"manifiesto: {e}")
+
+            if document.errores:
+                self.resumen['fallidos'] += 1
+                print(f"  ✗ Error al guardar {document.pdf_file.name}: {'; '.join(document.errores)}")
+            else:
+                self.resumen['exitosos'] += 1
+                print(f"  ✓ Guardado: {document.pdf_file.name}")
+
+    def _discard(self, items: List):
+        """Cuenta los documentos que ya no se guardarán tras un error fatal"""
+        with self._lock:
+            for document, _ in items:
+                if document.pendientes > 0:
+                    document.pendientes = 0
+                    self.resumen['descartados'] += 1
+
+    def _fail(self, error: BaseException):
+        """Detiene la ingesta por un error inesperado en una etapa"""
+        with self._lock:
+            if self.error is None:
+                self.error = error
+                print(f"❌ Error en la ingesta en etapas, deteniendo: {error}")
+        self._aborted.set()
+
+    def close(self, abort: bool = False):
+        """
+        Espera a que se guarden los documentos encolados y detiene las etapas
+
+        Args:
+            abort: Descartar los documentos que sigan en las colas
+
+        Raises:
+            RuntimeError: Si la ingesta se detuvo por un error (salvo con abort)
+        """
+        if abort:
+            self._aborted.set()
+        for head in self._heads:
+            head.put(_FIN)
+        for stage in self._stages:
+            stage.join()
+
+        if self.error is not None and not abort:
+            raise RuntimeError(f"Ingesta en etapas detenida: {self.error}") from self.error
+
+    def stats(self) -> Dict:
+        """
+        Estado de cada etapa
+
+        Returns:
+            Dict con el recuento de documentos, los segundos que la
+            extracción ha esperado por colas llenas y, por etapa, los
+            elementos procesados, lotes, segundos ocupada y cola máxima
+        """
+        return {
+            **self.resumen,
+            'espera_s': self.espera,
+            'etapas': {
+                stage.stage_name: {
+                    'procesados': stage.procesados,
+                    'lotes': stage.lotes,
+                    'ocupado_s': stage.ocupado,
+                    'cola_max': stage.cola_max,
+                    'cola_tamano': stage.queue.maxsize
+                }
+                for stage in self._stages
+            }
+        }
+
+    def format_stats(self) -> str:
+        """Resumen de las etapas, una línea por etapa"""
+        stats = self.stats()
+        lineas = [f"🔀 Etapas (la extracción esperó {stats['espera_s']:.2f} s por colas llenas):"]
+        for nombre, etapa in stats['etapas'].items():
+            lineas.append(
+                f"  - {nombre}: {etapa['procesados']} documentos en {etapa['lotes']} lotes, "
+                f"ocupada {etapa['ocupado_s']:.2f} s, cola máxima {etapa['cola_max']}/{etapa['cola_tamano']}"
+            )
+        return '\n'.join(lineas)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(abort=exc_type is not None)
+        return False
@@ -0,0 +1,391 @@
+"""
+PASO 8: Instrumentación de la ingesta
+Tiempos por etapa de cada PDF (carga, extracción de cada página,
+preparación, guardado...) y del conjunto, con informe JSON y volcados de
+cProfile opcionales de las extracciones más lentas
+
+Desactivada no mide nada: ``stage`` y ``track`` devuelven un gestor de
+contexto vacío compartido, así que el código instrumentado cuesta lo mismo
+que sin instrumentar.
+"""
+import cProfile
+import heapq
+import io
+import itertools
+import json
+import marshal
+import pstats
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Límites superiores (ms) de los tramos de los histogramas
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Etapa con el tiempo de cada página (histograma por archivo)
+STAGE_PAGE = 'pagina'
+
+# Perfil activo en este proceso (None = instrumentación desactivada)
+_active = None
+
+
+class _Noop:
+    """Gestor de contexto vacío que se usa con la instrumentación desactivada"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NOOP = _Noop()
+
+
+def percentile(values: Iterable[float], pct: float) -> float:
+    """Percentil pct (0-100) de unos valores (al menos uno)"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _histogram(values_ms: List[float]) -> Dict[str, int]:
+    """Número de valores por tramo de HISTOGRAM_BUCKETS_MS (solo los tramos no vacíos)"""
+    counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+    for value in values_ms:
+        for i, limit in enumerate(HISTOGRAM_BUCKETS_MS):
+            if value < limit:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+
+    labels = [f'<{limit}' for limit in HISTOGRAM_BUCKETS_MS] + [f'>={HISTOGRAM_BUCKETS_MS[-1]}']
+    return {label: count for label, count in zip(labels, counts) if count}
+
+
+def _summary(seconds: List[float]) -> Dict:
+    """Resumen de las duraciones de una etapa (en ms)"""
+    values = sorted(value * 1000 for value in seconds)
+    return {
+        'mediciones': len(values),
+        'total_s': round(sum(values) / 1000, 6),
+        'media_ms': round(sum(values) / len(values), 3),
+        'p50_ms': round(percentile(values, 50), 3),
+        'p95_ms': round(percentile(values, 95), 3),
+        'p99_ms': round(percentile(values, 99), 3),
+        'max_ms': round(values[-1], 3),
+        'histograma_ms': _histogram(values)
+    }
+
+
+class _Stage:
+    """Mide el tiempo propio de una etapa, descontando el de las etapas anidadas"""
+
+    __slots__ = ('profiler', 'name', 'start', 'nested')
+
+    def __init__(self, profiler: 'Profiler', name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.nested = 0.0
+        self.profiler._stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self.start
+        stack = self.profiler._stack()
+        stack.pop()
+        if stack:
+            stack[-1].nested += elapsed
+        self.profiler.record(self.name, elapsed - self.nested)
+        return False
+
+
+class _Track:
+    """Atribuye las etapas medidas dentro a un PDF y suma su tiempo total"""
+
+    __slots__ = ('profiler', 'key', 'cprofile', 'previous', 'start', 'profile')
+
+    def __init__(self, profiler: 'Profiler', key: str, cprofile: bool):
+        self.profiler = profiler
+        self.key = key
+        self.cprofile = cprofile and profiler.slowest > 0
+
+    def __enter__(self):
+        local = self.profiler._local
+        self.previous = getattr(local, 'archivo', None)
+        local.archivo = self.key
+        self.profile = cProfile.Profile() if self.cprofile else None
+        self.start = time.perf_counter()
+        if self.profile:
+            self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.profile:
+            self.profile.disable()
+        elapsed = time.perf_counter() - self.start
+        self.profiler._local.archivo = self.previous
+        self.profiler._add_total(self.key, elapsed)
+        if self.profile:
+            self.profile.create_stats()
+            self.profiler._keep_profile(elapsed, self.key, self.profile.stats)
+        return False
+
+
+class Profiler:
+    """
+    Tiempos de la ingesta
+
+    Cada etapa guarda su tiempo propio: si una etapa se ejecuta dentro de
+    otra (p. ej. la serialización JSON dentro del guardado), su tiempo no se
+    cuenta dos veces. Con ``slowest > 0`` cada extracción se ejecuta además
+    con cProfile y se conservan las ``slowest`` más lentas.
+    """
+
+    def __init__(self, slowest: int = 0):
+        """
+        Inicializa el perfil
+
+        Args:
+            slowest: Extracciones más lentas de las que guardar el perfil de cProfile (0 = ninguna)
+        """
+        self.slowest = slowest
+        self.etapas: Dict[str, List[float]] = {}
+        self.archivos: Dict[str, Dict] = {}
+        self.inicio = time.perf_counter()
+        self._perfiles = []
+        self._counter = itertools.count()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _entry(self, key: str) -> Dict:
+        return self.archivos.setdefault(key, {'total': 0.0, 'etapas': {}, 'paginas': []})
+
+    def record(self, name: str, seconds: float, key: str = None):
+        """
+        Anota la duración de una etapa
+
+        Args:
+            name: Nombre de la etapa
+            seconds: Duración en segundos
+            key: PDF al que atribuirla (default: el de ``track`` en curso, si lo hay)
+        """
+        key = key or getattr(self._local, 'archivo', None)
+        with self._lock:
+            self.etapas.setdefault(name, []).append(seconds)
+            if key is not None:
+                entry = self._entry(key)
+                entry['etapas'][name] = entry['etapas'].get(name, 0.0) + seconds
+                if name == STAGE_PAGE:
+                    entry['paginas'].append(seconds)
+
+    def _add_total(self, key: str, seconds: float):
+        with self._lock:
+            self._entry(key)['total'] += seconds
+
+    def _keep_profile(self, seconds: float, key: str, stats: Dict):
+        """Conserva el perfil de cProfile si está entre los ``slowest`` más lentos"""
+        with self._lock:
+            item = (seconds, next(self._counter), key, stats)
+            if len(self._perfiles) < self.slowest:
+                heapq.heappush(self._perfiles, item)
+            elif seconds > self._perfiles[0][0]:
+                heapq.heapreplace(self._perfiles, item)
+
+    def export(self) -> Dict:
+        """Mediciones en bruto, para enviarlas desde un proceso de extracción (ver merge)"""
+        return {
+            'etapas': self.etapas,
+            'archivos': self.archivos,
+            'perfiles': [(seconds, key, stats) for seconds, _, key, stats in self._perfiles]
+        }
+
+    def merge(self, data: Dict):
+        """Suma las mediciones exportadas por otro proceso"""
+        with self._lock:
+            for name, values in data['etapas'].items():
+                self.etapas.setdefault(name, []).extend(values)
+            for key, other in data['archivos'].items():
+                entry = self._entry(key)
+                entry['total'] += other['total']
+                entry['paginas'].extend(other['paginas'])
+                for name, seconds in other['etapas'].items():
+                    entry['etapas'][name] = entry['etapas'].get(name, 0.0) + seconds
+        for seconds, key, stats in data['perfiles']:
+            self._keep_profile(seconds, key, stats)
+
+    def report(self) -> Dict:
+        """
+        Informe de tiempos
+
+        Returns:
+            Dict con la duración total, el resumen e histograma de cada etapa
+            y, por PDF (del más lento al más rápido), su tiempo total, el de
+            cada etapa, el no atribuido a ninguna etapa y el histograma de
+            sus páginas
+        """
+        with self._lock:
+            archivos = []
+            for key, entry in self.archivos.items():
+                paginas = sorted(seconds * 1000 for seconds in entry['paginas'])
+                medido = sum(entry['etapas'].values())
+                archivos.append({
+                    'archivo': key,
+                    'total_s': round(entry['total'], 6),
+                    'etapas_s': {name: round(seconds, 6) for name, seconds in entry['etapas'].items()},
+                    'sin_medir_s': round(max(0.0, entry['total'] - medido), 6),
+                    'paginas': len(paginas),
+                    'pagina_p50_ms': round(percentile(paginas, 50), 3) if paginas else None,
+                    'pagina_max_ms': round(paginas[-1], 3) if paginas else None,
+                    'histograma_paginas_ms': _histogram(paginas)
+                })
+            archivos.sort(key=lambda archivo: archivo['total_s'], reverse=True)
+
+            return {
+                'segundos': round(time.perf_counter() - self.inicio, 6),
+                'num_archivos': len(archivos),
+                'etapas': {name: _summary(values) for name, values in self.etapas.items() if values},
+                'archivos': archivos
+            }
+
+    def save(self, report_path: Path) -> Dict:
+        """
+        Guarda el informe JSON y los perfiles de cProfile conservados
+
+        Los perfiles se escriben junto al informe, en ``<informe>_cprofile/``:
+        un ``.prof`` por extracción (se abre con pstats, snakeviz o
+        flameprof para obtener la gráfica de llama) y un ``.txt`` con las
+        funciones de más tiempo acumulado.
+
+        Args:
+            report_path: Ruta del informe JSON
+
+        Returns:
+            Dict con el informe guardado
+        """
+        report_path = Path(report_path)
+        report = self.report()
+        report['perfiles'] = []
+
+        if self._perfiles:
+            profile_dir = report_path.with_name(report_path.stem + '_cprofile')
+            profile_dir.mkdir(parents=True, exist_ok=True)
+            for posicion, (seconds, _, key, stats) in enumerate(sorted(self._perfiles, reverse=True), start=1):
+                base = profile_dir / f'{posicion:02d}_{Path(key).stem}'
+                with open(base.with_suffix('.prof'), 'wb') as f:
+                    marshal.dump(stats, f)
+
+                texto = io.StringIO()
+                pstats.Stats(str(base.with_suffix('.prof')), stream=texto).sort_stats('cumulative').print_stats(30)
+                base.with_suffix('.txt').write_text(texto.getvalue(), encoding='utf-8')
+                report['perfiles'].append({
+                    'archivo': key, 'extraccion_s': round(seconds, 6), 'perfil': str(base.with_suffix('.prof'))
+                })
+
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
+
+    def format_summary(self, report: Dict = None) -> str:
+        """Tabla con el tiempo de cada etapa, de la más costosa a la que menos"""
+        report = report or self.report()
+        total = sum(etapa['total_s'] for etapa in report['etapas'].values()) or 1
+        lineas = [f"{'etapa':>14} {'mediciones':>10} {'total s':>9} {'%':>5} {'p50 ms':>9} {'p95 ms':>9} {'máx ms':>9}"]
+        for name, etapa in sorted(report['etapas'].items(), key=lambda item: item[1]['total_s'], reverse=True):
+            lineas.append(
+                f"{name:>14} {etapa['mediciones']:>10} {etapa['total_s']:>9.3f} {etapa['total_s'] / total:>5.0%} "
+                f"{etapa['p50_ms']:>9.3f} {etapa['p95_ms']:>9.3f} {etapa['max_ms']:>9.3f}"
+            )
+        return '\n'.join(lineas)
+
+
+def enable(profiler: Profiler):
+    """Activa la instrumentación en este proceso"""
+    global _active
+    _active = profiler
+
+
+def disable():
+    """Desactiva la instrumentación en este proceso"""
+    global _active
+    _active = None
+
+
+def get_profiler() -> Optional[Profiler]:
+    """Perfil activo, o None si la instrumentación está desactivada"""
+    return _active
+
+
+def stage(name: str):
+    """
+    Mide una etapa, si la instrumentación está activa::
+
+        with stage('carga'):
+            reader = PyPDF2.PdfReader(data)
+
+    Args:
+        name: Nombre de la etapa
+
+    Returns:
+        Gestor de contexto (vacío si está desactivada)
+    """
+    profiler = _active
+    if profiler is None:
+        return _NOOP
+    return _Stage(profiler, name)
+
+
+def track(key, cprofile: bool = False):
+    """
+    Atribuye a un PDF las etapas medidas dentro del bloque
+
+    Args:
+        key: PDF (su ruta)
+        cprofile: Ejecutar el bloque con cProfile si el perfil conserva perfiles
+
+    Returns:
+        Gestor de contexto (vacío si está desactivada)
+    """
+    profiler = _active
+    if profiler is None:
+        return _NOOP
+    return _Track(profiler, str(key), cprofile)
+
+
+def call_profiled(slowest: int, key, func: Callable, *args) -> tuple:
+    """
+    Ejecuta func(*args) en un proceso de extracción con un perfil propio
+
+    Args:
+        slowest: ``Profiler.slowest`` del proceso principal
+        key: PDF al que atribuir las etapas
+        func: Función a ejecutar
+
+    Returns:
+        Tupla (resultado, mediciones exportadas) para ``Profiler.merge``
+    """
+    previous = get_profiler()
+    profiler = Profiler(slowest)
+    enable(profiler)
+    try:
+        with track(key, cprofile=True):
+            result = func(*args)
+    finally:
+        if previous:
+            enable(previous)
+        else:
+            disable()
+    return result, profiler.export()
@@ -0,0 +1,271 @@
+"""
+PASO 4: Almacenamiento - Base de Datos asíncrona
+Versión asíncrona de DatabaseStorage sobre SQLAlchemy asyncio (aiosqlite o
+asyncpg), para usarla desde un bucle de eventos sin bloquearlo
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import selectinload
+
+from migrations import migrate
+from models import Documento, Factura, Pagina, create_async_database_engine
+from storage import monthly_rollup
+from storage.database_storage import (
+    DOCUMENT_HEADER_COLUMNS, LIST_COLUMNS, PAGES_WITH_TEXT, _chunks, _document_content_ids, _header_to_dict,
+    _list_row_to_dict, _purge_orphan_contents
+)
+from storage.search_index import get_search_index
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+except ImportError:  # sin greenlet
+    AsyncSession = async_sessionmaker = None
+
+
+class AsyncDatabaseStorage:
+    """
+    Almacena documentos extraídos en base de datos de forma asíncrona
+
+    Mismo esquema y mismo comportamiento que DatabaseStorage (upsert por
+    hash o ruta, páginas por bloques, BEGIN IMMEDIATE para las escrituras en
+    SQLite), pero cada método es una corrutina. El texto de las páginas se
+    guarda siempre en la propia página (modo 'inline'); en una base de datos
+    con páginas en modo 'blob' lee los dos formatos y, al reemplazar o
+    eliminar un documento, borra los contenidos compartidos que quedan sin
+    páginas, como DatabaseStorage. Antes de usarlo hay que llamar a
+    ``create_tables`` o usarlo con ``async with``.
+    """
+
+    def __init__(self, database_url: str, page_chunk_size: int = 500):
+        """
+        Inicializa el almacenamiento asíncrono
+
+        Args:
+            database_url: URL de conexión (se cambia al driver asíncrono del motor)
+            page_chunk_size: Páginas por inserción al guardar un documento
+        """
+        if async_sessionmaker is None:
+            raise ImportError("AsyncDatabaseStorage requiere 'greenlet' (pip install greenlet)")
+
+        self.engine = create_async_database_engine(database_url)
+        self.Session = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.page_chunk_size = page_chunk_size
+        self.search_index = get_search_index(self.engine.sync_engine)
+
+    async def create_tables(self):
+        """Crea las tablas o aplica las migraciones pendientes (ver migrations.py)"""
+        async with self.engine.connect() as connection:
+            connection = await connection.execution_options(escritura=True)
+            async with connection.begin():
+                await connection.run_sync(migrate)
+
+    async def close(self):
+        """Cierra las conexiones del motor"""
+        await self.engine.dispose()
+
+    async def __aenter__(self):
+        await self.create_tables()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _write_session(self) -> AsyncSession:
+        """Sesión cuya transacción empieza como escritura (ver get_session)"""
+        session = self.Session()
+        await session.connection(execution_options={'escritura': True})
+        return session
+
+    async def save_document(self, document_data: Dict) -> int:
+        """
+        Guarda un documento en la base de datos
+
+        Si ya existe un documento con el mismo hash de contenido o la misma
+        ruta de archivo, se actualiza en lugar de insertar un duplicado.
+
+        Args:
+            document_data: Diccionario con los datos del documento
+
+        Returns:
+            int: ID del documento guardado
+        """
+        session = await self._write_session()
+
+        try:
+            documento = await self._find_existing(session, document_data)
+            actualizado = documento is not None
+
+            if documento is None:
+                documento = Documento()
+                session.add(documento)
+
+            documento.nombre_archivo = document_data['nombre_archivo']
+            documento.ruta_archivo = document_data['ruta_archivo']
+            documento.num_paginas = document_data['num_paginas']
+            documento.autor = document_data.get('autor')
+            documento.titulo = document_data.get('titulo')
+            documento.fecha_creacion = document_data.get('fecha_creacion')
+            documento.fecha_procesamiento = datetime.utcnow()
+            documento.hash_contenido = document_data.get('hash_contenido')
+            await session.flush()
+            doc_id = documento.id
+
+            old_contents = []
+            if actualizado:
+                old_contents = await session.run_sync(lambda sync: _document_content_ids(sync, [doc_id]))
+                await session.run_sync(lambda sync: monthly_rollup.apply_changes(sync.connection(), [doc_id]))
+                await session.execute(delete(Pagina).where(Pagina.documento_id == doc_id))
+                await session.execute(delete(Factura).where(Factura.documento_id == doc_id))
+
+            for chunk in _chunks(document_data['paginas'], self.page_chunk_size):
+                await session.execute(insert(Pagina), [
+                    {
+                        'documento_id': doc_id,
+                        'numero_pagina': page_data['numero_pagina'],
+                        'contenido': page_data['contenido'],
+                        'metodo_extraccion': page_data.get('metodo_extraccion')
+                    }
+                    for page_data in chunk
+                ])
+            await session.run_sync(lambda sync: _purge_orphan_contents(sync, self.search_index, old_contents))
+
+            await session.commit()
+
+            if actualizado:
+                print(f"✓ Documento actualizado en BD con ID: {doc_id}")
+            else:
+                print(f"✓ Documento guardado en BD con ID: {doc_id}")
+
+            return doc_id
+
+        except Exception as e:
+            await session.rollback()
+            raise Exception(f"Error al guardar documento: {str(e)}")
+
+        finally:
+            await session.close()
+
+    async def _find_existing(self, session: AsyncSession, document_data: Dict) -> Optional[Documento]:
+        """
+        Busca un documento ya guardado para el mismo PDF
+
+        Args:
+            session: Sesión asíncrona
+            document_data: Diccionario con los datos del documento
+
+        Returns:
+            Documento existente o None
+        """
+        hash_contenido = document_data.get('hash_contenido')
+
+        if hash_contenido:
+            documento = await session.scalar(
+                select(Documento).where(Documento.hash_contenido == hash_contenido).limit(1)
+            )
+            if documento:
+                return documento
+
+        return await session.scalar(
+            select(Documento).where(Documento.ruta_archivo == document_data['ruta_archivo']).limit(1)
+        )
+
+    async def get_document(self, doc_id: int, include_pages: bool = True) -> Optional[Dict]:
+        """
+        Obtiene un documento por su ID
+
+        Args:
+            doc_id: ID del documento
+            include_pages: Incluir el contenido de las páginas
+
+        Returns:
+            Dict con los datos del documento o None si no existe
+        """
+        async with self.Session() as session:
+            if not include_pages:
+                row = (await session.execute(
+                    select(*DOCUMENT_HEADER_COLUMNS).where(Documento.id == doc_id)
+                )).first()
+                return _header_to_dict(row) if row else None
+
+            documento = await session.scalar(
+                select(Documento).options(PAGES_WITH_TEXT).where(Documento.id == doc_id)
+            )
+            return documento.to_dict() if documento else None
+
+    async def list_documents(self) -> List[Dict]:
+        """
+        Lista todos los documentos almacenados
+
+        Returns:
+            Lista de diccionarios con información básica de documentos
+        """
+        async with self.Session() as session:
+            rows = await session.execute(select(*LIST_COLUMNS).order_by(Documento.id))
+            return [_list_row_to_dict(row) for row in rows]
+
+    async def search_by_filename(self, filename: str, include_pages: bool = True) -> List[Dict]:
+        """
+        Busca documentos por nombre de archivo
+
+        Args:
+            filename: Nombre del archivo a buscar
+            include_pages: Incluir el contenido de las páginas
+
+        Returns:
+            Lista de documentos encontrados
+        """
+        condition = Documento.nombre_archivo.like(f'%{filename}%')
+
+        async with self.Session() as session:
+            if not include_pages:
+                rows = await session.execute(
+                    select(*DOCUMENT_HEADER_COLUMNS).where(condition).order_by(Documento.id)
+                )
+                return [_header_to_dict(row) for row in rows]
+
+            documentos = await session.scalars(
+                select(Documento).options(PAGES_WITH_TEXT)
+                .where(condition).order_by(Documento.id)
+            )
+            return [doc.to_dict() for doc in documentos]
+
+    async def delete_document(self, doc_id: int) -> bool:
+        """
+        Elimina un documento y sus páginas
+
+        Args:
+            doc_id: ID del documento
+
+        Returns:
+            bool: True si se eliminó, False si no existía
+        """
+        session = await self._write_session()
+
+        try:
+            # Cargar las relaciones para que el borrado en cascada no las pida después
+            documento = await session.scalar(
+                select(Documento).options(
+                    selectinload(Documento.paginas), selectinload(Documento.factura)
+                ).where(Documento.id == doc_id)
+            )
+
+            if documento:
+                old_contents = await session.run_sync(lambda sync: _document_content_ids(sync, [doc_id]))
+                await session.run_sync(lambda sync: monthly_rollup.apply_changes(sync.connection(), [doc_id]))
+                await session.delete(documento)
+                await session.flush()
+                await session.run_sync(lambda sync: _purge_orphan_contents(sync, self.search_index, old_contents))
+                await session.commit()
+                print(f"✓ Documento {doc_id} eliminado")
+                return True
+
+            return False
+
+        except Exception as e:
+            await session.rollback()
+            raise Exception(f"Error al eliminar documento: {str(e)}")
+
+        finally:
+            await session.close()
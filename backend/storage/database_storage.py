@@ -2,10 +2,183 @@
 PASO 4: Almacenamiento - Base de Datos
 Clase para guardar datos extraídos en base de datos usando SQLAlchemy
 """
-from typing import Dict, List, Optional
-from datetime import datetime
-from sqlalchemy.orm import Session
-from models import Documento, Pagina, DatabaseManager
+import base64
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import delete, exists, insert, or_, select, tuple_, update
+from sqlalchemy.orm import Session, selectinload
+import profiling
+from config import Config
+from models import (
+    ContenidoPagina, Documento, Factura, Pagina, DatabaseManager, compress_text, content_hash, decompress_text
+)
+from storage import monthly_rollup
+from storage.search_index import SearchIndex, get_search_index
+
+
+# Formas de guardar el texto de las páginas (ver DB_PAGE_STORAGE)
+PAGE_STORAGE_MODES = ('inline', 'blob')
+
+# Carga de las páginas con su texto compartido, si lo tienen
+PAGES_WITH_TEXT = selectinload(Documento.paginas).selectinload(Pagina.contenido_compartido)
+
+
+# Columnas de cabecera de un documento (todo salvo las páginas)
+DOCUMENT_HEADER_COLUMNS = (
+    Documento.id,
+    Documento.nombre_archivo,
+    Documento.ruta_archivo,
+    Documento.num_paginas,
+    Documento.autor,
+    Documento.titulo,
+    Documento.fecha_creacion,
+    Documento.fecha_procesamiento,
+    Documento.hash_contenido
+)
+
+
+# Columnas del listado de documentos
+LIST_COLUMNS = (
+    Documento.id,
+    Documento.nombre_archivo,
+    Documento.num_paginas,
+    Documento.titulo,
+    Documento.autor,
+    Documento.fecha_procesamiento
+)
+
+
+def _list_row_to_dict(row) -> Dict:
+    """Convierte una fila de LIST_COLUMNS en un dict del listado"""
+    return {
+        'id': row.id,
+        'nombre_archivo': row.nombre_archivo,
+        'num_paginas': row.num_paginas,
+        'titulo': row.titulo,
+        'autor': row.autor,
+        'fecha_procesamiento': row.fecha_procesamiento.isoformat()
+    }
+
+
+def encode_cursor(fecha_procesamiento: datetime, doc_id: int) -> str:
+    """
+    Cursor opaco que apunta justo después de un documento del listado
+    
+    Args:
+        fecha_procesamiento: Fecha de procesamiento del último documento devuelto
+        doc_id: ID del último documento devuelto
+    
+    Returns:
+        str: Cursor para list_documents_page
+    """
+    raw = f"{fecha_procesamiento.isoformat()}|{doc_id}".encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Recupera la fecha y el ID de un cursor de encode_cursor
+    
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    try:
+        fecha, doc_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('ascii').split('|')
+        return datetime.fromisoformat(fecha), int(doc_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Cursor no válido: {cursor}") from e
+
+
+def _as_datetime(value: Union[date, datetime], end_of_day: bool = False) -> datetime:
+    """Una fecha sin hora como el inicio de ese día (o del siguiente)"""
+    if isinstance(value, datetime):
+        return value
+    if end_of_day:
+        value += timedelta(days=1)
+    return datetime.combine(value, time.min)
+
+
+def _header_to_dict(row) -> Dict:
+    """
+    Convierte una fila de DOCUMENT_HEADER_COLUMNS al formato de Documento.to_dict
+    
+    Args:
+        row: Fila devuelta por la consulta
+    
+    Returns:
+        Dict con la cabecera del documento, sin páginas
+    """
+    return {
+        'id': row.id,
+        'nombre_archivo': row.nombre_archivo,
+        'ruta_archivo': row.ruta_archivo,
+        'num_paginas': row.num_paginas,
+        'autor': row.autor,
+        'titulo': row.titulo,
+        'fecha_creacion': row.fecha_creacion.isoformat() if row.fecha_creacion else None,
+        'fecha_procesamiento': row.fecha_procesamiento.isoformat(),
+        'hash_contenido': row.hash_contenido
+    }
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[List]:
+    """
+    Agrupa una lista o iterador en listas de como mucho ``size`` elementos
+    
+    Args:
+        items: Elementos a agrupar
+        size: Tamaño máximo de cada bloque
+    
+    Yields:
+        Listas consecutivas de elementos
+    """
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _document_content_ids(session: Session, doc_ids: List[int]) -> List[int]:
+    """Contenidos compartidos que referencian las páginas de unos documentos"""
+    return session.scalars(
+        select(Pagina.contenido_id).distinct()
+        .where(Pagina.documento_id.in_(doc_ids), Pagina.contenido_id.is_not(None))
+    ).all()
+
+
+def _purge_orphan_contents(session: Session, search_index: Optional[SearchIndex],
+                           content_ids: Optional[List[int]] = None) -> int:
+    """
+    Borra los contenidos compartidos que ya no referencia ninguna página
+    
+    Args:
+        session: Sesión de base de datos
+        search_index: Índice de texto completo del que quitarlos (opcional)
+        content_ids: Contenidos a comprobar (None para todos)
+    
+    Returns:
+        int: Contenidos borrados
+    """
+    if content_ids is not None and not content_ids:
+        return 0
+    
+    query = select(ContenidoPagina.id, ContenidoPagina.datos).where(
+        ~exists().where(Pagina.contenido_id == ContenidoPagina.id)
+    )
+    if content_ids is not None:
+        query = query.where(ContenidoPagina.id.in_(content_ids))
+    orphans = session.execute(query).all()
+    
+    if orphans:
+        if search_index:
+            search_index.unindex_contents(
+                session.connection(), [(row.id, decompress_text(row.datos)) for row in orphans]
+            )
+        session.execute(delete(ContenidoPagina).where(ContenidoPagina.id.in_([row.id for row in orphans])))
+    return len(orphans)
 
 
 class DatabaseStorage:
@@ -13,54 +186,106 @@ class DatabaseStorage:
     Almacena documentos extraídos en base de datos
     """
     
-    def __init__(self, database_manager: DatabaseManager):
+    def __init__(self, database_manager: DatabaseManager, page_chunk_size: int = 500,
+                 page_storage: Optional[str] = None):
         """
         Inicializa el almacenamiento en base de datos
         
         Args:
             database_manager: Gestor de base de datos
+            page_chunk_size: Páginas por inserción al guardar un documento
+            page_storage: 'inline' (texto en cada página) o 'blob' (texto
+                comprimido y compartido entre páginas iguales, solo SQLite).
+                Default: Config.DB_PAGE_STORAGE. Solo afecta a lo que se
+                guarda; las lecturas entienden los dos formatos
+        
+        Raises:
+            ValueError: Si el modo no existe o es 'blob' fuera de SQLite
         """
+        page_storage = (page_storage or Config.DB_PAGE_STORAGE).lower()
+        if page_storage not in PAGE_STORAGE_MODES:
+            raise ValueError(f"page_storage no válido: '{page_storage}' (opciones: {', '.join(PAGE_STORAGE_MODES)})")
+        if page_storage == 'blob' and database_manager.engine.dialect.name != 'sqlite':
+            # PostgreSQL ya comprime el texto largo (TOAST) y su índice de
+            # texto completo necesita el texto en la propia tabla paginas
+            raise ValueError("El modo 'blob' solo está disponible con SQLite")
+        
         self.db_manager = database_manager
+        self.page_chunk_size = page_chunk_size
+        self.page_storage = page_storage
+        # Tablas, índices y migraciones pendientes (una vez por motor y proceso)
         self.db_manager.create_tables()
+        
+        # Índice de texto completo sobre el contenido de las páginas (lo crea la migración 2)
+        self.search_index = get_search_index(self.db_manager.engine)
     
     def save_document(self, document_data: Dict) -> int:
         """
         Guarda un documento en la base de datos
         
+        Si ya existe un documento con el mismo hash de contenido o la misma
+        ruta de archivo, se actualiza en lugar de insertar un duplicado.
+        
+        Las páginas se insertan en bloques de ``page_chunk_size``, por lo que
+        'paginas' puede ser un iterador (ver extract_pdf_stream) y nunca se
+        mantiene en memoria más de un bloque.
+        
         Args:
             document_data: Diccionario con los datos del documento
         
         Returns:
             int: ID del documento guardado
         """
-        session = self.db_manager.get_session()
+        session = self.db_manager.get_session(write=True)
         
         try:
-            # Crear documento
-            documento = Documento(
-                nombre_archivo=document_data['nombre_archivo'],
-                ruta_archivo=document_data['ruta_archivo'],
-                num_paginas=document_data['num_paginas'],
-                autor=document_data.get('autor'),
-                titulo=document_data.get('titulo'),
-                fecha_creacion=document_data.get('fecha_creacion'),
-                fecha_procesamiento=datetime.utcnow()
-            )
+            documento = self._find_existing(session, document_data)
+            actualizado = documento is not None
             
-            # Agregar páginas
-            for page_data in document_data['paginas']:
-                pagina = Pagina(
-                    numero_pagina=page_data['numero_pagina'],
-                    contenido=page_data['contenido']
-                )
-                documento.paginas.append(pagina)
-            
-            # Guardar en base de datos
-            session.add(documento)
-            session.commit()
+            if documento is None:
+                documento = Documento()
+                session.add(documento)
             
+            documento.nombre_archivo = document_data['nombre_archivo']
+            documento.ruta_archivo = document_data['ruta_archivo']
+            documento.num_paginas = document_data['num_paginas']
+            documento.autor = document_data.get('autor')
+            documento.titulo = document_data.get('titulo')
+            documento.fecha_creacion = document_data.get('fecha_creacion')
+            documento.fecha_procesamiento = datetime.utcnow()
+            documento.hash_contenido = document_data.get('hash_contenido')
+            session.flush()
             doc_id = documento.id
-            print(f"✓ Documento guardado en BD con ID: {doc_id}")
+            
+            # Reemplazar las páginas anteriores, insertando las nuevas por bloques;
+            # la factura obtenida del texto anterior deja de ser válida
+            old_contents = []
+            if actualizado:
+                old_contents = _document_content_ids(session, [doc_id])
+                monthly_rollup.apply_changes(session.connection(), [doc_id])
+                session.execute(delete(Pagina).where(Pagina.documento_id == doc_id))
+                session.execute(delete(Factura).where(Factura.documento_id == doc_id))
+            
+            for chunk in _chunks(document_data['paginas'], self.page_chunk_size):
+                self._insert_pages(session, [
+                    {
+                        'documento_id': doc_id,
+                        'numero_pagina': page_data['numero_pagina'],
+                        'contenido': page_data['contenido'],
+                        'metodo_extraccion': page_data.get('metodo_extraccion')
+                    }
+                    for page_data in chunk
+                ])
+            _purge_orphan_contents(session, self.search_index, old_contents)
+            
+            # Guardar en base de datos
+            with profiling.stage('commit'):
+                session.commit()
+
+            if actualizado:
+                print(f"✓ Documento actualizado en BD con ID: {doc_id}")
+            else:
+                print(f"✓ Documento guardado en BD con ID: {doc_id}")
             
             return doc_id
         
@@ -71,12 +296,268 @@ class DatabaseStorage:
         finally:
             session.close()
     
-    def get_document(self, doc_id: int) -> Optional[Dict]:
+    def _insert_pages(self, session: Session, rows: List[Dict]):
+        """
+        Inserta filas de páginas, llevando su texto a la tabla de contenidos en modo 'blob'
+        
+        Args:
+            session: Sesión de base de datos
+            rows: Filas de Pagina con 'contenido'
+        """
+        if self.page_storage == 'blob':
+            shared = [row for row in rows if row['contenido']]
+            content_ids = self._shared_content_ids(session, [row['contenido'] for row in shared])
+            for row, content_id in zip(shared, content_ids):
+                row['contenido'] = ''
+                row['contenido_id'] = content_id
+        
+        if rows:
+            session.execute(insert(Pagina), rows)
+    
+    def _shared_content_ids(self, session: Session, texts: List[str]) -> List[int]:
+        """
+        IDs de ContenidoPagina de cada texto, guardando (comprimidos) los que no existan
+        
+        Args:
+            session: Sesión de base de datos
+            texts: Textos de página
+        
+        Returns:
+            Lista de IDs en el mismo orden que ``texts``
+        """
+        hashes = [content_hash(texto) for texto in texts]
+        by_hash = dict(zip(hashes, texts))
+        ids = dict(session.execute(
+            select(ContenidoPagina.hash, ContenidoPagina.id).where(ContenidoPagina.hash.in_(by_hash))
+        ).all())
+        
+        nuevos = [h for h in by_hash if h not in ids]
+        if nuevos:
+            rows = session.execute(
+                insert(ContenidoPagina).returning(
+                    ContenidoPagina.id, ContenidoPagina.hash, sort_by_parameter_order=True
+                ),
+                [
+                    {'hash': h, 'datos': compress_text(by_hash[h]), 'tamano': len(by_hash[h].encode('utf-8'))}
+                    for h in nuevos
+                ]
+            ).all()
+            ids.update({row.hash: row.id for row in rows})
+            if self.search_index:
+                self.search_index.index_contents(session.connection(), [(ids[h], by_hash[h]) for h in nuevos])
+        
+        return [ids[h] for h in hashes]
+    
+    def purge_contents(self) -> int:
+        """
+        Borra los contenidos compartidos sin páginas que los referencien
+        
+        Guardar y eliminar documentos ya los borra (también con
+        AsyncDatabaseStorage); esto recoge los que quedan si las páginas se
+        borran por otra vía.
+        
+        Returns:
+            int: Contenidos borrados
+        """
+        session = self.db_manager.get_session(write=True)
+        
+        try:
+            borrados = _purge_orphan_contents(session, self.search_index)
+            session.commit()
+            return borrados
+        
+        except Exception as e:
+            session.rollback()
+            raise Exception(f"Error al purgar contenidos: {str(e)}")
+        
+        finally:
+            session.close()
+    
+    def _find_existing(self, session: Session, document_data: Dict) -> Optional[Documento]:
+        """
+        Busca un documento ya guardado para el mismo PDF
+        
+        Args:
+            session: Sesión de base de datos
+            document_data: Diccionario con los datos del documento
+        
+        Returns:
+            Documento existente o None
+        """
+        hash_contenido = document_data.get('hash_contenido')
+        
+        if hash_contenido:
+            documento = session.query(Documento).filter(
+                Documento.hash_contenido == hash_contenido
+            ).first()
+            if documento:
+                return documento
+        
+        return session.query(Documento).filter(
+            Documento.ruta_archivo == document_data['ruta_archivo']
+        ).first()
+    
+    def save_documents(self, documents: List[Dict], batch_size: int = 500,
+                       atomic: bool = True) -> List[Optional[int]]:
+        """
+        Guarda muchos documentos con inserciones masivas, una transacción por lote
+        
+        Cada lote se resuelve en pocas consultas: una para localizar los
+        documentos ya existentes, un ``executemany`` con ``RETURNING`` para los
+        nuevos, otro para actualizar los existentes y otro para sus páginas.
+        
+        Args:
+            documents: Lista de diccionarios con los datos de cada documento
+            batch_size: Número de documentos por lote/transacción
+            atomic: Si es True, un error deshace el lote completo y se propaga
+                (los lotes anteriores ya quedan confirmados). Si es False, el
+                lote fallido se reintenta documento a documento y los que
+                fallan devuelven None
+        
+        Returns:
+            Lista de IDs en el mismo orden que ``documents`` (None si falló)
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size debe ser mayor o igual que 1")
+        
+        doc_ids = []
+        
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            
+            try:
+                doc_ids.extend(self._save_batch(batch))
+            except Exception as e:
+                if atomic:
+                    raise Exception(f"Error al guardar lote de documentos: {str(e)}")
+                
+                print(f"⚠ Error en lote de {len(batch)} documentos, reintentando uno a uno: {str(e)}")
+                for document_data in batch:
+                    try:
+                        doc_ids.append(self.save_document(document_data))
+                    except Exception as doc_error:
+                        print(f"✗ {document_data.get('nombre_archivo')}: {str(doc_error)}")
+                        doc_ids.append(None)
+        
+        return doc_ids
+    
+    def _save_batch(self, batch: List[Dict]) -> List[int]:
+        """
+        Guarda un lote de documentos en una única transacción
+        
+        Args:
+            batch: Documentos del lote
+        
+        Returns:
+            Lista de IDs en el mismo orden que ``batch``
+        """
+        session = self.db_manager.get_session(write=True)
+        
+        try:
+            fecha_procesamiento = datetime.utcnow()
+            
+            # Localizar documentos ya guardados (mismo hash o misma ruta)
+            hashes = {d['hash_contenido'] for d in batch if d.get('hash_contenido')}
+            rutas = {d['ruta_archivo'] for d in batch}
+            
+            existing = session.execute(
+                select(Documento.id, Documento.hash_contenido, Documento.ruta_archivo).where(
+                    or_(Documento.hash_contenido.in_(hashes), Documento.ruta_archivo.in_(rutas))
+                )
+            ).all()
+            by_hash = {row.hash_contenido: row.id for row in existing if row.hash_contenido}
+            by_ruta = {row.ruta_archivo: row.id for row in existing}
+            
+            # Un documento repetido dentro del lote se guarda una sola vez (gana el último)
+            positions = {}
+            for index, document_data in enumerate(batch):
+                key = document_data.get('hash_contenido') or document_data['ruta_archivo']
+                positions[key] = index
+            
+            # Cada documento guardado se actualiza como mucho una vez: si ya lo
+            # ha tomado otro del lote (p. ej. el PDF nuevo en su misma ruta y una
+            # copia de su contenido anterior en otra), el resto se insertan,
+            # como pasaría guardándolos de uno en uno con save_document
+            rows_insert, rows_update = [], []
+            claimed = set()
+            for key, index in positions.items():
+                document_data = batch[index]
+                row = {
+                    'nombre_archivo': document_data['nombre_archivo'],
+                    'ruta_archivo': document_data['ruta_archivo'],
+                    'num_paginas': document_data['num_paginas'],
+                    'autor': document_data.get('autor'),
+                    'titulo': document_data.get('titulo'),
+                    'fecha_creacion': document_data.get('fecha_creacion'),
+                    'fecha_procesamiento': fecha_procesamiento,
+                    'hash_contenido': document_data.get('hash_contenido')
+                }
+                
+                existing_id = by_hash.get(document_data.get('hash_contenido')) or by_ruta.get(document_data['ruta_archivo'])
+                if existing_id and existing_id not in claimed:
+                    claimed.add(existing_id)
+                    rows_update.append((index, dict(row, id=existing_id)))
+                else:
+                    rows_insert.append((index, row))
+            
+            ids_by_index = {}
+            
+            old_contents = []
+            if rows_update:
+                session.execute(update(Documento), [row for _, row in rows_update])
+                updated_ids = [row['id'] for _, row in rows_update]
+                old_contents = _document_content_ids(session, updated_ids)
+                monthly_rollup.apply_changes(session.connection(), updated_ids)
+                session.execute(delete(Pagina).where(Pagina.documento_id.in_(updated_ids)))
+                session.execute(delete(Factura).where(Factura.documento_id.in_(updated_ids)))
+                for index, row in rows_update:
+                    ids_by_index[index] = row['id']
+            
+            if rows_insert:
+                new_ids = session.scalars(
+                    insert(Documento).returning(Documento.id, sort_by_parameter_order=True),
+                    [row for _, row in rows_insert]
+                ).all()
+                for (index, _), doc_id in zip(rows_insert, new_ids):
+                    ids_by_index[index] = doc_id
+            
+            page_rows = [
+                {
+                    'documento_id': ids_by_index[index],
+                    'numero_pagina': page_data['numero_pagina'],
+                    'contenido': page_data['contenido'],
+                    'metodo_extraccion': page_data.get('metodo_extraccion')
+                }
+                for index in positions.values()
+                for page_data in batch[index]['paginas']
+            ]
+            self._insert_pages(session, page_rows)
+            _purge_orphan_contents(session, self.search_index, old_contents)
+            
+            with profiling.stage('commit'):
+                session.commit()
+            print(f"✓ Lote de {len(batch)} documentos guardado en BD")
+            
+            # Los duplicados dentro del lote comparten el ID del que se guardó
+            return [
+                ids_by_index[positions[d.get('hash_contenido') or d['ruta_archivo']]]
+                for d in batch
+            ]
+        
+        except Exception:
+            session.rollback()
+            raise
+        
+        finally:
+            session.close()
+    
+    def get_document(self, doc_id: int, include_pages: bool = True) -> Optional[Dict]:
         """
         Obtiene un documento por su ID
         
         Args:
             doc_id: ID del documento
+            include_pages: Incluir el contenido de las páginas
         
         Returns:
             Dict con los datos del documento o None si no existe
@@ -84,7 +565,15 @@ class DatabaseStorage:
         session = self.db_manager.get_session()
         
         try:
-            documento = session.query(Documento).filter(Documento.id == doc_id).first()
+            if not include_pages:
+                row = session.execute(
+                    select(*DOCUMENT_HEADER_COLUMNS).where(Documento.id == doc_id)
+                ).first()
+                return _header_to_dict(row) if row else None
+            
+            documento = session.query(Documento).options(
+                PAGES_WITH_TEXT
+            ).filter(Documento.id == doc_id).first()
             
             if documento:
                 return documento.to_dict()
@@ -103,26 +592,108 @@ class DatabaseStorage:
         session = self.db_manager.get_session()
         
         try:
-            documentos = session.query(Documento).all()
-            
-            return [{
-                'id': doc.id,
-                'nombre_archivo': doc.nombre_archivo,
-                'num_paginas': doc.num_paginas,
-                'titulo': doc.titulo,
-                'autor': doc.autor,
-                'fecha_procesamiento': doc.fecha_procesamiento.isoformat()
-            } for doc in documentos]
+            rows = session.execute(select(*LIST_COLUMNS).order_by(Documento.id))
+            return [_list_row_to_dict(row) for row in rows]
         
         finally:
             session.close()
     
-    def search_by_filename(self, filename: str) -> List[Dict]:
+    def list_documents_page(self, limit: int = 100, cursor: Optional[str] = None,
+                            desde: Optional[Union[date, datetime]] = None,
+                            hasta: Optional[Union[date, datetime]] = None,
+                            autor: Optional[str] = None, titulo: Optional[str] = None,
+                            min_paginas: Optional[int] = None,
+                            max_paginas: Optional[int] = None) -> Dict:
+        """
+        Lista una página de documentos, ordenados por fecha de procesamiento e ID
+        
+        La paginación es por clave (keyset): el cursor guarda la fecha y el ID
+        del último documento devuelto y la consulta sigue a partir de ahí por
+        el índice ``ix_documentos_fecha_id`` (``ix_documentos_autor_fecha_id``
+        si se filtra por autor), así que cada página cuesta lo mismo aunque la
+        tabla crezca y no se saltan ni repiten documentos si se insertan otros
+        mientras tanto.
+        
+        Args:
+            limit: Documentos por página
+            cursor: Cursor 'siguiente' de la página anterior (None para la primera)
+            desde: Fecha de procesamiento mínima
+            hasta: Fecha de procesamiento máxima (una fecha sin hora incluye el día entero)
+            autor: Autor exacto
+            titulo: Texto contenido en el título (sin distinguir mayúsculas)
+            min_paginas: Número mínimo de páginas
+            max_paginas: Número máximo de páginas
+        
+        Returns:
+            Dict con 'documentos' (como en list_documents) y 'siguiente'
+            (cursor de la página siguiente o None si no hay más)
+        
+        Raises:
+            ValueError: Si el cursor no es válido o limit es menor que 1
+        """
+        if limit < 1:
+            raise ValueError("limit debe ser mayor o igual que 1")
+        
+        query = select(*LIST_COLUMNS)
+        if cursor is not None:
+            query = query.where(tuple_(Documento.fecha_procesamiento, Documento.id) > decode_cursor(cursor))
+        if desde is not None:
+            query = query.where(Documento.fecha_procesamiento >= _as_datetime(desde))
+        if hasta is not None:
+            if isinstance(hasta, datetime):
+                query = query.where(Documento.fecha_procesamiento <= hasta)
+            else:
+                query = query.where(Documento.fecha_procesamiento < _as_datetime(hasta, end_of_day=True))
+        if autor is not None:
+            query = query.where(Documento.autor == autor)
+        if titulo:
+            escaped = titulo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            query = query.where(Documento.titulo.ilike(f'%{escaped}%', escape='\\'))
+        if min_paginas is not None:
+            query = query.where(Documento.num_paginas >= min_paginas)
+        if max_paginas is not None:
+            query = query.where(Documento.num_paginas <= max_paginas)
+        
+        # Una fila de más indica si hay página siguiente
+        query = query.order_by(Documento.fecha_procesamiento, Documento.id).limit(limit + 1)
+        
+        with self.db_manager.engine.connect() as connection:
+            rows = connection.execute(query).all()
+        
+        siguiente = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            siguiente = encode_cursor(rows[-1].fecha_procesamiento, rows[-1].id)
+        
+        return {'documentos': [_list_row_to_dict(row) for row in rows], 'siguiente': siguiente}
+    
+    def iter_document_pages(self, page_size: int = 100, **filters) -> Iterator[List[Dict]]:
+        """
+        Recorre el listado completo página a página
+        
+        Args:
+            page_size: Documentos por página
+            **filters: Filtros de list_documents_page
+        
+        Yields:
+            Listas de documentos (como en list_documents)
+        """
+        cursor = None
+        while True:
+            page = self.list_documents_page(limit=page_size, cursor=cursor, **filters)
+            if page['documentos']:
+                yield page['documentos']
+            cursor = page['siguiente']
+            if cursor is None:
+                return
+    
+    def search_by_filename(self, filename: str, include_pages: bool = True) -> List[Dict]:
         """
         Busca documentos por nombre de archivo
         
         Args:
             filename: Nombre del archivo a buscar
+            include_pages: Incluir el contenido de las páginas
         
         Returns:
             Lista de documentos encontrados
@@ -130,15 +701,194 @@ class DatabaseStorage:
         session = self.db_manager.get_session()
         
         try:
-            documentos = session.query(Documento).filter(
-                Documento.nombre_archivo.like(f'%{filename}%')
-            ).all()
+            condition = Documento.nombre_archivo.like(f'%{filename}%')
+            
+            if not include_pages:
+                rows = session.execute(
+                    select(*DOCUMENT_HEADER_COLUMNS).where(condition).order_by(Documento.id)
+                )
+                return [_header_to_dict(row) for row in rows]
+            
+            # Todas las páginas de los documentos encontrados en una sola consulta
+            documentos = session.query(Documento).options(
+                PAGES_WITH_TEXT
+            ).filter(condition).order_by(Documento.id).all()
             
             return [doc.to_dict() for doc in documentos]
         
         finally:
             session.close()
     
+    def search_content(self, query: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """
+        Busca texto dentro del contenido de las páginas
+        
+        Usa el índice de texto completo (FTS5 en SQLite, tsvector/GIN en
+        PostgreSQL). Los resultados van ordenados por relevancia y cada uno
+        incluye un fragmento con los términos resaltados entre corchetes.
+        
+        Args:
+            query: Palabras a buscar (deben aparecer todas)
+            limit: Número máximo de resultados
+            offset: Resultados a saltar (para paginar)
+        
+        Returns:
+            Lista de dicts con documento_id, nombre_archivo, numero_pagina,
+            puntuacion y fragmento
+        """
+        if self.search_index is None:
+            raise ValueError(
+                f"Búsqueda de texto completo no soportada para '{self.db_manager.engine.dialect.name}'"
+            )
+        
+        with self.db_manager.engine.connect() as connection:
+            return self.search_index.search(connection, query, limit, offset)
+    
+    def iter_invoice_texts(self, batch_size: int = 500,
+                           version: Optional[str] = None) -> Iterator[List[Tuple[int, str]]]:
+        """
+        Recorre el texto de los documentos guardados, por lotes
+        
+        Permite analizar facturas sin volver a leer los PDFs. Los lotes se
+        obtienen por rango de ID (sin OFFSET) y cada uno carga solo las
+        páginas de sus documentos.
+        
+        Args:
+            batch_size: Documentos por lote
+            version: Si se indica, solo documentos sin factura analizada con
+                esa versión del analizador
+        
+        Yields:
+            Listas de tuplas (documento_id, texto de todas sus páginas)
+        """
+        last_id = 0
+        
+        while True:
+            with self.db_manager.engine.connect() as connection:
+                query = select(Documento.id).where(Documento.id > last_id)
+                if version is not None:
+                    query = query.outerjoin(Factura).where(
+                        or_(Factura.id.is_(None), Factura.version_analizador != version)
+                    )
+                doc_ids = connection.scalars(query.order_by(Documento.id).limit(batch_size)).all()
+                
+                if not doc_ids:
+                    return
+                
+                texts = {doc_id: [] for doc_id in doc_ids}
+                rows = connection.execute(
+                    select(Pagina.documento_id, Pagina.contenido, ContenidoPagina.datos)
+                    .outerjoin(ContenidoPagina, ContenidoPagina.id == Pagina.contenido_id)
+                    .where(Pagina.documento_id.in_(doc_ids))
+                    .order_by(Pagina.documento_id, Pagina.numero_pagina)
+                )
+                for row in rows:
+                    texto = decompress_text(row.datos) if row.datos is not None else row.contenido
+                    texts[row.documento_id].append(texto or '')
+            
+            yield [(doc_id, '\n'.join(texts[doc_id])) for doc_id in doc_ids]
+            last_id = doc_ids[-1]
+    
+    def save_invoices(self, invoices: List[Dict]) -> int:
+        """
+        Guarda los campos de factura analizados, reemplazando los anteriores
+        
+        El resumen mensual se actualiza en la misma transacción.
+        
+        Args:
+            invoices: Resultados de invoice_parser.parse_invoice_batch
+                (cada uno con 'documento_id')
+        
+        Returns:
+            int: Número de facturas guardadas
+        """
+        if not invoices:
+            return 0
+        
+        session = self.db_manager.get_session(write=True)
+        
+        try:
+            columns = [column.name for column in Factura.__table__.columns if column.name != 'id']
+            doc_ids = [invoice['documento_id'] for invoice in invoices]
+            monthly_rollup.apply_changes(session.connection(), doc_ids, invoices)
+            session.execute(delete(Factura).where(Factura.documento_id.in_(doc_ids)))
+            session.execute(insert(Factura), [
+                {column: invoice.get(column) for column in columns} for invoice in invoices
+            ])
+            session.commit()
+            return len(invoices)
+        
+        except Exception as e:
+            session.rollback()
+            raise Exception(f"Error al guardar facturas: {str(e)}")
+        
+        finally:
+            session.close()
+    
+    def get_invoice(self, doc_id: int) -> Optional[Dict]:
+        """
+        Obtiene los campos de factura de un documento
+        
+        Args:
+            doc_id: ID del documento
+        
+        Returns:
+            Dict con los campos de la factura o None si no se ha analizado
+        """
+        session = self.db_manager.get_session()
+        
+        try:
+            factura = session.query(Factura).filter(Factura.documento_id == doc_id).first()
+            return factura.to_dict() if factura else None
+        
+        finally:
+            session.close()
+    
+    def monthly_summary(self, hogar: Optional[str] = None, desde: Optional[date] = None,
+                        hasta: Optional[date] = None) -> List[Dict]:
+        """
+        Totales mensuales de las facturas, leídos del resumen mensual
+        
+        Args:
+            hogar: CUPS del hogar (None para sumar todos los hogares)
+            desde: Primer mes incluido (cualquier día del mes)
+            hasta: Último mes incluido (cualquier día del mes)
+        
+        Returns:
+            Lista por mes con sus totales y su desglose por categoría y
+            proveedor (ver monthly_rollup.monthly_summary)
+        """
+        with self.db_manager.engine.connect() as connection:
+            return monthly_rollup.monthly_summary(connection, hogar, desde, hasta)
+    
+    def rebuild_rollups(self, batch_size: int = 500) -> Dict[str, int]:
+        """
+        Recalcula el resumen mensual desde las facturas, en una transacción
+        
+        Sirve para comprobar que el mantenimiento incremental no se ha
+        desviado: en un resumen correcto no hay filas insertadas,
+        corregidas ni eliminadas.
+        
+        Args:
+            batch_size: Hogares por lote
+        
+        Returns:
+            Dict con hogares, filas, insertadas, corregidas y eliminadas
+        """
+        session = self.db_manager.get_session(write=True)
+        
+        try:
+            informe = monthly_rollup.rebuild(session.connection(), batch_size)
+            session.commit()
+            return informe
+        
+        except Exception as e:
+            session.rollback()
+            raise Exception(f"Error al reconstruir el resumen mensual: {str(e)}")
+        
+        finally:
+            session.close()
+    
     def delete_document(self, doc_id: int) -> bool:
         """
         Elimina un documento y sus páginas
@@ -149,13 +899,17 @@ class DatabaseStorage:
         Returns:
             bool: True si se eliminó, False si no existía
         """
-        session = self.db_manager.get_session()
+        session = self.db_manager.get_session(write=True)
         
         try:
             documento = session.query(Documento).filter(Documento.id == doc_id).first()
             
             if documento:
+                old_contents = _document_content_ids(session, [doc_id])
+                monthly_rollup.apply_changes(session.connection(), [doc_id])
                 session.delete(documento)
+                session.flush()
+                _purge_orphan_contents(session, self.search_index, old_contents)
                 session.commit()
                 print(f"✓ Documento {doc_id} eliminado")
                 return True
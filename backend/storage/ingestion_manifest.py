@@ -0,0 +1,128 @@
+"""
+PASO 4: Almacenamiento - Manifiesto de ingesta
+Registro de los PDFs ya procesados para no volver a extraer los que no cambian
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from extractors.pdf_extractor import compute_file_hash, file_signature
+
+
+class IngestionManifest:
+    """
+    Manifiesto de ingesta indexado por el hash del contenido de cada PDF
+
+    ``documentos`` guarda, por hash SHA-256, los almacenamientos donde ya se
+    guardó ese contenido. ``archivos`` relaciona cada ruta con el hash, el
+    tamaño y la fecha de modificación que tenía el archivo: si el tamaño y la
+    fecha no han cambiado no se vuelve a calcular el hash. Un PDF renombrado,
+    movido o copiado tiene el mismo hash, así que no se vuelve a extraer.
+    """
+
+    def __init__(self, manifest_path: Path):
+        """
+        Inicializa el manifiesto cargándolo desde disco si existe
+
+        Args:
+            manifest_path: Ruta al archivo JSON del manifiesto
+        """
+        self.manifest_path = Path(manifest_path)
+        self.documentos: Dict[str, Dict] = {}
+        self.archivos: Dict[str, Dict] = {}
+
+        if self.manifest_path.exists():
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if 'archivos' in data:
+                self.documentos = data['documentos']
+                self.archivos = data['archivos']
+            else:
+                # Formato anterior: una entrada por ruta con su hash y sus almacenamientos
+                for key, entry in data.items():
+                    self.archivos[key] = {k: entry[k] for k in ('hash', 'tamano', 'mtime_ns')}
+                    documento = self.documentos.setdefault(entry['hash'], {'almacenamientos': []})
+                    documento['almacenamientos'] = sorted(
+                        set(documento['almacenamientos']) | set(entry['almacenamientos'])
+                    )
+
+    @staticmethod
+    def _key(pdf_path: Path) -> str:
+        """Clave de un archivo dentro de ``archivos`` (ruta absoluta)"""
+        return str(Path(pdf_path).absolute())
+
+    def needs_processing(self, pdf_path: Path, storages: Iterable[str]) -> bool:
+        """
+        Indica si un PDF debe extraerse de nuevo
+
+        Args:
+            pdf_path: Ruta al archivo PDF
+            storages: Almacenamientos donde debe estar guardado ('json', 'database')
+
+        Returns:
+            bool: True si el contenido del PDF es nuevo o falta en algún almacenamiento
+        """
+        key = self._key(pdf_path)
+        archivo = self.archivos.get(key)
+        stat = Path(pdf_path).stat()
+
+        if archivo and stat.st_size == archivo['tamano'] and stat.st_mtime_ns == archivo['mtime_ns']:
+            file_hash = archivo['hash']
+        else:
+            # Ruta nueva o tamaño o fecha distintos: el hash decide si el
+            # contenido ya se procesó (también con otro nombre)
+            file_hash = compute_file_hash(pdf_path)
+
+        documento = self.documentos.get(file_hash)
+        if documento is None:
+            return True
+
+        # Firma tomada antes de calcular el hash: si el archivo cambió entre
+        # medias, la siguiente comprobación lo vuelve a leer
+        self.archivos[key] = {'hash': file_hash, **file_signature(stat)}
+        return not set(storages) <= set(documento['almacenamientos'])
+
+    def record(self, pdf_path: Path, file_hash: Optional[str], storages: Iterable[str],
+               signature: Optional[Dict] = None):
+        """
+        Registra un PDF procesado correctamente
+
+        El tamaño y la fecha deben ser los del archivo cuando se calculó el
+        hash: si se tomaran ahora y el PDF hubiera cambiado durante la
+        extracción, el contenido nuevo se daría por procesado.
+
+        Args:
+            pdf_path: Ruta al archivo PDF
+            file_hash: Hash SHA-256 del contenido (se calcula si es None)
+            storages: Almacenamientos donde se ha guardado
+            signature: Tamaño y fecha del archivo al calcular file_hash
+                ('firma_archivo' del documento extraído)
+        """
+        if signature is None:
+            # Sin la firma de la extracción se toma ahora, antes de leer el
+            # contenido; si ya no coincide con file_hash, el PDF cambió y no
+            # se registra para que se vuelva a procesar
+            signature = file_signature(Path(pdf_path).stat())
+            current_hash = compute_file_hash(pdf_path)
+            if file_hash and file_hash != current_hash:
+                return
+            file_hash = current_hash
+
+        documento = self.documentos.setdefault(file_hash, {'almacenamientos': []})
+        documento['almacenamientos'] = sorted(set(documento['almacenamientos']) | set(storages))
+        self.archivos[self._key(pdf_path)] = {
+            'hash': file_hash,
+            'tamano': signature['tamano'],
+            'mtime_ns': signature['mtime_ns']
+        }
+
+    def save(self):
+        """Guarda el manifiesto en disco de forma atómica"""
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.manifest_path.with_suffix(self.manifest_path.suffix + '.tmp')
+
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'documentos': self.documentos, 'archivos': self.archivos}, f, ensure_ascii=False, indent=2)
+
+        os.replace(temp_path, self.manifest_path)
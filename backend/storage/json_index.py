@@ -0,0 +1,185 @@
+"""
+PASO 4: Almacenamiento - Índice de la salida JSON
+Resumen de cada archivo JSON guardado (SQLite) para listar y filtrar los
+documentos sin abrir los archivos
+"""
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+
+# Campos del documento que se guardan en el índice
+CAMPOS_RESUMEN = (
+    'nombre_archivo', 'ruta_archivo', 'num_paginas', 'titulo', 'autor',
+    'fecha_creacion', 'fecha_procesamiento', 'hash_contenido'
+)
+
+
+class JSONIndex:
+    """
+    Índice de los archivos JSON de un directorio de salida
+
+    Una fila por archivo con los campos de ``CAMPOS_RESUMEN`` y el tamaño y
+    la fecha de modificación del archivo, que permiten reconstruir el índice
+    leyendo solo los archivos que han cambiado. Cada actualización es una
+    transacción propia, salvo dentro de ``transaction``.
+    """
+
+    def __init__(self, index_path: Path):
+        """
+        Inicializa el índice
+
+        Args:
+            index_path: Ruta al archivo SQLite del índice
+        """
+        self.index_path = Path(index_path)
+        self._connection = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Conexión al índice, creando la tabla si no existe"""
+        if self._connection is None:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            # La conexión puede crearse en un hilo y usarse en otro (el escritor
+            # de la ingesta en etapas), pero nunca desde dos a la vez
+            connection = sqlite3.connect(
+                self.index_path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Sin fsync en cada escritura: el índice siempre puede reconstruirse
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS documentos ("
+                "archivo TEXT PRIMARY KEY, nombre_archivo TEXT NOT NULL, ruta_archivo TEXT, "
+                "num_paginas INTEGER NOT NULL, titulo TEXT, autor TEXT, fecha_creacion TEXT, "
+                "fecha_procesamiento TEXT, hash_contenido TEXT, "
+                "tamano INTEGER NOT NULL, mtime_ns INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_documentos_fecha_procesamiento "
+                "ON documentos (fecha_procesamiento)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_documentos_num_paginas ON documentos (num_paginas)"
+            )
+            self._connection = connection
+        return self._connection
+
+    @contextmanager
+    def transaction(self):
+        """Agrupa varias actualizaciones en una sola transacción"""
+        self.connection.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def upsert(self, json_path: Path, summary: Dict):
+        """
+        Añade o actualiza la fila de un archivo
+
+        Args:
+            json_path: Ruta al archivo JSON ya escrito
+            summary: Datos del documento (se usan los campos de CAMPOS_RESUMEN)
+
+        Raises:
+            ValueError: Si faltan el nombre o el número de páginas
+        """
+        if not isinstance(summary, dict) or None in (summary.get('nombre_archivo'), summary.get('num_paginas')):
+            raise ValueError(f"Documento sin nombre_archivo o num_paginas: {json_path}")
+
+        stat = Path(json_path).stat()
+        values = [Path(json_path).name] + [summary.get(campo) for campo in CAMPOS_RESUMEN]
+        self.connection.execute(
+            f"INSERT OR REPLACE INTO documentos (archivo, {', '.join(CAMPOS_RESUMEN)}, tamano, mtime_ns) "
+            f"VALUES ({', '.join('?' * (len(CAMPOS_RESUMEN) + 3))})",
+            values + [stat.st_size, stat.st_mtime_ns]
+        )
+
+    def remove(self, archivos: List[str]):
+        """Elimina las filas de los archivos indicados"""
+        self.connection.executemany(
+            "DELETE FROM documentos WHERE archivo = ?", [(archivo,) for archivo in archivos]
+        )
+
+    def file_stats(self) -> Dict[str, tuple]:
+        """Tamaño y fecha de modificación indexados de cada archivo"""
+        return {
+            row['archivo']: (row['tamano'], row['mtime_ns'])
+            for row in self.connection.execute("SELECT archivo, tamano, mtime_ns FROM documentos")
+        }
+
+    def files(self) -> List[str]:
+        """Nombres de los archivos indexados, ordenados"""
+        return [row[0] for row in self.connection.execute("SELECT archivo FROM documentos ORDER BY archivo")]
+
+    def query(self, desde: Optional[Union[date, datetime]] = None,
+              hasta: Optional[Union[date, datetime]] = None,
+              min_paginas: Optional[int] = None, max_paginas: Optional[int] = None,
+              titulo: Optional[str] = None, limit: Optional[int] = None,
+              offset: int = 0) -> List[Dict]:
+        """
+        Filtra los documentos indexados
+
+        Args:
+            desde: Fecha de procesamiento mínima
+            hasta: Fecha de procesamiento máxima (una fecha sin hora incluye el día entero)
+            min_paginas: Número mínimo de páginas
+            max_paginas: Número máximo de páginas
+            titulo: Texto contenido en el título (sin distinguir mayúsculas)
+            limit: Número máximo de resultados
+            offset: Resultados a omitir
+
+        Returns:
+            Lista de dicts con 'archivo' y los campos de CAMPOS_RESUMEN,
+            ordenados por fecha de procesamiento
+        """
+        conditions, params = [], []
+        if desde is not None:
+            conditions.append("fecha_procesamiento >= ?")
+            params.append(desde.isoformat())
+        if hasta is not None:
+            if isinstance(hasta, datetime):
+                conditions.append("fecha_procesamiento <= ?")
+                params.append(hasta.isoformat())
+            else:
+                conditions.append("fecha_procesamiento < ?")
+                params.append((hasta + timedelta(days=1)).isoformat())
+        if min_paginas is not None:
+            conditions.append("num_paginas >= ?")
+            params.append(min_paginas)
+        if max_paginas is not None:
+            conditions.append("num_paginas <= ?")
+            params.append(max_paginas)
+        if titulo:
+            conditions.append("titulo LIKE ? ESCAPE '\\'")
+            escaped = titulo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f"%{escaped}%")
+
+        sql = f"SELECT archivo, {', '.join(CAMPOS_RESUMEN)} FROM documentos"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY fecha_procesamiento, archivo LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+
+        return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def count(self) -> int:
+        """Número de archivos indexados"""
+        return self.connection.execute("SELECT COUNT(*) FROM documentos").fetchone()[0]
+
+    def close(self):
+        """Cierra la conexión"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -2,15 +2,29 @@
 PASO 4: Almacenamiento - JSON
 Clase para guardar datos extraídos en formato JSON
 """
+import io
 import json
+import os
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, Iterable, List, TextIO, Tuple
 from datetime import datetime
 
+import profiling
+from storage.json_index import JSONIndex
+
+
+# Índice de los archivos del directorio de salida (oculto para no mezclarse con los JSON)
+INDEX_FILENAME = '.index.db'
+
 
 class JSONStorage:
     """
     Almacena documentos extraídos en formato JSON
+    
+    Cada archivo guardado se registra en un índice (``.index.db`` en el
+    mismo directorio) con sus campos de resumen, así que listar y filtrar
+    no abre los archivos. Si el índice no existe se construye a partir del
+    directorio al crear el almacenamiento.
     """
     
     def __init__(self, output_dir: Path):
@@ -22,6 +36,14 @@ class JSONStorage:
         """
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        
+        index_path = self.output_dir / INDEX_FILENAME
+        index_exists = index_path.exists()
+        self.index = JSONIndex(index_path)
+        
+        # Directorio de una versión anterior, sin índice
+        if not index_exists and next(self.output_dir.glob('*.json'), None):
+            self.rebuild_index()
     
     def save_document(self, document_data: Dict) -> Path:
         """
@@ -33,22 +55,120 @@ class JSONStorage:
         Returns:
             Path: Ruta al archivo JSON creado
         """
-        # Crear nombre de archivo basado en el nombre del PDF
-        nombre_base = Path(document_data['nombre_archivo']).stem
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        json_filename = f"{nombre_base}_{timestamp}.json"
-        json_path = self.output_dir / json_filename
+        json_path = self._json_path(document_data['nombre_archivo'])
         
         # Preparar datos para serialización
         data_to_save = self._prepare_for_json(document_data)
         
-        # Guardar archivo JSON
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(data_to_save, f, ensure_ascii=False, indent=2)
+        # Guardar archivo JSON (las páginas se escriben según llegan)
+        with profiling.stage('serializacion'):
+            self._write_file(json_path, lambda f: self._write_json(f, data_to_save))
+        
+        self.index.upsert(json_path, data_to_save)
         
         print(f"✓ Documento guardado en JSON: {json_path}")
         return json_path
     
+    def serialize_document(self, document_data: Dict) -> Tuple[Dict, str]:
+        """
+        Serializa un documento sin escribirlo
+        
+        El texto tiene el mismo formato que el archivo de save_document.
+        Junto con write_serialized permite serializar y escribir en etapas
+        distintas de la ingesta (pipeline.py).
+        
+        Args:
+            document_data: Diccionario con los datos del documento
+        
+        Returns:
+            Tupla (datos preparados, texto JSON)
+        """
+        data = self._prepare_for_json(document_data)
+        buffer = io.StringIO()
+        with profiling.stage('serializacion'):
+            self._write_json(buffer, data)
+        return data, buffer.getvalue()
+    
+    def write_serialized(self, data: Dict, text: str) -> Path:
+        """
+        Escribe un documento serializado con serialize_document
+        
+        Args:
+            data: Datos preparados
+            text: Texto JSON
+        
+        Returns:
+            Path: Ruta al archivo JSON creado
+        """
+        json_path = self._json_path(data['nombre_archivo'])
+        with profiling.stage('escritura'):
+            self._write_file(json_path, lambda f: f.write(text))
+        
+        self.index.upsert(json_path, data)
+        
+        print(f"✓ Documento guardado en JSON: {json_path}")
+        return json_path
+    
+    def _json_path(self, nombre_archivo: str) -> Path:
+        """Ruta del JSON de un PDF: nombre del PDF y fecha de guardado"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return self.output_dir / f"{Path(nombre_archivo).stem}_{timestamp}.json"
+    
+    def _write_file(self, json_path: Path, write: Callable[[TextIO], None]):
+        """
+        Escribe un archivo que solo aparece con su nombre final cuando está completo
+        
+        Args:
+            json_path: Ruta final del archivo
+            write: Función que escribe el contenido en el archivo abierto
+        """
+        temp_path = json_path.with_suffix('.json.tmp')
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                write(f)
+            os.replace(temp_path, json_path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+    
+    def _write_json(self, f: TextIO, data: Dict):
+        """
+        Escribe el documento con el mismo formato que json.dump(indent=2)
+        
+        Las páginas se serializan de una en una, así que 'paginas' puede ser
+        un iterador y nunca se tiene el documento entero en memoria.
+        
+        Args:
+            f: Archivo de texto abierto para escritura
+            data: Datos preparados con _prepare_for_json
+        """
+        f.write('{')
+        for index, (key, value) in enumerate(data.items()):
+            f.write(',\n  ' if index else '\n  ')
+            f.write(json.dumps(key, ensure_ascii=False) + ': ')
+            
+            if key == 'paginas':
+                self._write_pages(f, value)
+            else:
+                f.write(json.dumps(value, ensure_ascii=False, indent=2).replace('\n', '\n  '))
+        f.write('\n}' if data else '}')
+    
+    def _write_pages(self, f: TextIO, pages: Iterable[Dict]):
+        """
+        Escribe la lista de páginas página a página
+        
+        Args:
+            f: Archivo de texto abierto para escritura
+            pages: Lista o iterador de páginas
+        """
+        f.write('[')
+        empty = True
+        for page in pages:
+            f.write('\n    ' if empty else ',\n    ')
+            f.write(json.dumps(page, ensure_ascii=False, indent=2).replace('\n', '\n    '))
+            empty = False
+        f.write(']' if empty else '\n  ]')
+    
     def _prepare_for_json(self, data: Dict) -> Dict:
         """
         Prepara los datos para serialización JSON
@@ -85,9 +205,56 @@ class JSONStorage:
     
     def list_documents(self) -> list:
         """
-        Lista todos los documentos JSON almacenados
+        Lista todos los documentos JSON almacenados (según el índice)
         
         Returns:
             Lista de rutas a archivos JSON
         """
-        return list(self.output_dir.glob('*.json'))
\ No newline at end of file
+        return [self.output_dir / archivo for archivo in self.index.files()]
+    
+    def query_documents(self, **filters) -> List[Dict]:
+        """
+        Lista los documentos que cumplen los filtros, sin abrir los archivos
+        
+        Args:
+            **filters: Filtros de JSONIndex.query (desde, hasta, min_paginas,
+                max_paginas, titulo, limit, offset)
+        
+        Returns:
+            Lista de dicts con 'archivo' y los campos de resumen
+        """
+        return self.index.query(**filters)
+    
+    def rebuild_index(self) -> Dict:
+        """
+        Sincroniza el índice con los archivos del directorio
+        
+        Solo se leen los archivos nuevos o cuyo tamaño o fecha de
+        modificación no coinciden con el índice; se eliminan las filas de
+        archivos que ya no existen o no se pueden leer.
+        
+        Returns:
+            Dict con el número de archivos indexados, sin cambios, eliminados y con errores
+        """
+        indexados = self.index.file_stats()
+        en_disco = {path.name: path for path in self.output_dir.glob('*.json')}
+        
+        eliminados = [archivo for archivo in indexados if archivo not in en_disco]
+        resumen = {'indexados': 0, 'sin_cambios': 0, 'eliminados': len(eliminados), 'errores': 0}
+        
+        with self.index.transaction():
+            for archivo, json_path in en_disco.items():
+                stat = json_path.stat()
+                if indexados.get(archivo) == (stat.st_size, stat.st_mtime_ns):
+                    resumen['sin_cambios'] += 1
+                    continue
+                
+                try:
+                    self.index.upsert(json_path, self.load_document(json_path))
+                    resumen['indexados'] += 1
+                except (OSError, ValueError):
+                    eliminados.append(archivo)
+                    resumen['errores'] += 1
+            
+            self.index.remove(eliminados)
+        return resumen
\ No newline at end of file
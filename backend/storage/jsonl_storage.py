@@ -0,0 +1,371 @@
+"""
+PASO 4: Almacenamiento - JSON Lines
+Almacenamiento de solo añadido: cada documento es una línea JSON compacta en
+archivos de segmento rotativos, con un índice de desplazamientos para
+cargar cualquier documento con una sola lectura
+"""
+import json
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+
+# Nombre de los archivos de segmento (el número crece con cada rotación)
+SEGMENT_PATTERN = re.compile(r'^segment-(\d{6})\.jsonl$')
+INDEX_FILENAME = 'index.json'
+INDEX_VERSION = 1
+
+# Campos de cada entrada del índice, en orden
+CAMPOS_INDICE = ('segmento', 'offset', 'longitud', 'nombre_archivo', 'num_paginas', 'fecha_procesamiento')
+
+
+def _segment_name(number: int) -> str:
+    """Nombre del archivo de segmento con el número indicado"""
+    return f"segment-{number:06d}.jsonl"
+
+
+def _dumps(value) -> str:
+    """JSON compacto en una sola línea"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class JSONLStorage:
+    """
+    Almacena documentos extraídos como líneas JSON en segmentos de solo añadido
+
+    Cada ``save_document`` añade una línea al segmento activo, que rota al
+    superar ``segment_max_bytes``. El índice (``index.json``) asocia la clave
+    de cada documento con su segmento, desplazamiento y longitud, así que
+    ``load_document`` lee una sola línea y ``list_documents`` no abre ningún
+    segmento. Volver a guardar un documento añade una versión nueva y deja la
+    anterior obsoleta hasta que ``compact`` la elimina.
+
+    El índice se escribe al cerrar, al rotar y al compactar. Si falta o está
+    desactualizado (por ejemplo, tras una interrupción), al abrir se recupera
+    leyendo solo la parte de los segmentos que no recoge; una línea final
+    incompleta se descarta.
+    """
+
+    def __init__(self, output_dir: Path, segment_max_bytes: int = 64 * 1024 * 1024):
+        """
+        Inicializa el almacenamiento JSONL cargando o recuperando el índice
+
+        Args:
+            output_dir: Directorio de los segmentos y el índice
+            segment_max_bytes: Tamaño a partir del cual se empieza un segmento nuevo
+        """
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.segment_max_bytes = segment_max_bytes
+        self.index_path = self.output_dir / INDEX_FILENAME
+
+        self._index: Dict[str, Tuple] = {}
+        self._segments: Dict[int, int] = {}
+        self._writer: Optional[BinaryIO] = None
+        self._dirty = False
+
+        self._load_index()
+
+    @staticmethod
+    def document_key(document_data: Dict) -> str:
+        """Clave de un documento: hash del contenido o, si no hay, la ruta"""
+        return document_data.get('hash_contenido') or document_data['ruta_archivo']
+
+    def _segment_path(self, number: int) -> Path:
+        return self.output_dir / _segment_name(number)
+
+    @property
+    def _active_segment(self) -> int:
+        return max(self._segments, default=1)
+
+    def save_document(self, document_data: Dict) -> str:
+        """
+        Añade un documento al segmento activo
+
+        Las páginas se serializan de una en una, así que 'paginas' puede ser
+        un iterador. Si la escritura falla, el segmento se trunca y no queda
+        ninguna línea a medias.
+
+        Args:
+            document_data: Diccionario con los datos del documento
+
+        Returns:
+            str: Clave del documento
+        """
+        clave = self.document_key(document_data)
+        data = self._prepare_for_json(document_data)
+        data['clave'] = clave
+        pages = data.pop('paginas')
+
+        writer = self._open_writer()
+        offset = writer.tell()
+        try:
+            head = _dumps(data)
+            writer.write((head[:-1] + ',"paginas":[').encode('utf-8'))
+            for index, page in enumerate(pages):
+                writer.write(((',' if index else '') + _dumps(page)).encode('utf-8'))
+            writer.write(b']}\n')
+            writer.flush()
+        except BaseException:
+            writer.truncate(offset)
+            writer.seek(offset)
+            raise
+
+        end = writer.tell()
+        self._segments[self._active_segment] = end
+        self._index[clave] = (
+            self._active_segment, offset, end - offset,
+            data['nombre_archivo'], data['num_paginas'], data['fecha_procesamiento']
+        )
+        self._dirty = True
+
+        print(f"✓ Documento guardado en JSONL: {_segment_name(self._active_segment)} @ {offset}")
+        return clave
+
+    def _open_writer(self) -> BinaryIO:
+        """Abre (o rota) el segmento activo para añadir"""
+        number = self._active_segment
+        if self._segments.get(number, 0) >= self.segment_max_bytes:
+            self._close_writer()
+            number += 1
+            self._segments[number] = 0
+            self.save_index()
+
+        if self._writer is None:
+            self._writer = open(self._segment_path(number), 'ab')
+            self._writer.seek(0, os.SEEK_END)
+            self._segments[number] = self._writer.tell()
+        return self._writer
+
+    def _prepare_for_json(self, data: Dict) -> Dict:
+        """
+        Prepara los datos para serialización JSON
+
+        Args:
+            data: Datos a preparar
+
+        Returns:
+            Dict: Datos preparados
+        """
+        prepared = data.copy()
+
+        if prepared.get('fecha_creacion') and isinstance(prepared['fecha_creacion'], datetime):
+            prepared['fecha_creacion'] = prepared['fecha_creacion'].isoformat()
+
+        prepared['fecha_procesamiento'] = datetime.now().isoformat()
+        return prepared
+
+    def load_document(self, clave: str) -> Optional[Dict]:
+        """
+        Carga la última versión de un documento
+
+        Args:
+            clave: Clave del documento (hash de contenido o ruta)
+
+        Returns:
+            Dict con los datos del documento o None si no existe
+        """
+        entry = self._index.get(clave)
+        if entry is None:
+            return None
+        return json.loads(self._read_record(entry[0], entry[1], entry[2]))
+
+    def _read_record(self, segment: int, offset: int, length: int) -> bytes:
+        """Lee una línea de un segmento"""
+        with open(self._segment_path(segment), 'rb') as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def list_documents(self) -> List[Dict]:
+        """
+        Lista la última versión de cada documento a partir del índice
+
+        Returns:
+            Lista de dicts con clave, nombre_archivo, num_paginas y fecha_procesamiento
+        """
+        return [
+            {'clave': clave, **dict(zip(CAMPOS_INDICE[3:], entry[3:]))}
+            for clave, entry in sorted(self._index.items(), key=lambda item: item[1][3])
+        ]
+
+    def iter_documents(self) -> Iterable[Dict]:
+        """
+        Recorre la última versión de cada documento en orden de escritura
+
+        Lee cada segmento de forma secuencial en lugar de saltar de un
+        documento a otro.
+
+        Yields:
+            Dict con los datos de cada documento
+        """
+        self._flush_writer()
+        by_segment = {}
+        for segment, offset, length, *_ in self._index.values():
+            by_segment.setdefault(segment, []).append((offset, length))
+
+        for segment in sorted(by_segment):
+            with open(self._segment_path(segment), 'rb') as f:
+                for offset, length in sorted(by_segment[segment]):
+                    f.seek(offset)
+                    yield json.loads(f.read(length))
+
+    def stats(self) -> Dict:
+        """
+        Tamaño del almacenamiento y espacio ocupado por versiones obsoletas
+
+        Returns:
+            Dict con documentos, segmentos, bytes y bytes_obsoletos
+        """
+        total = sum(self._segments.values())
+        live = sum(entry[2] for entry in self._index.values())
+        return {
+            'documentos': len(self._index),
+            'segmentos': len(self._segments),
+            'bytes': total,
+            'bytes_obsoletos': total - live
+        }
+
+    def compact(self) -> Dict:
+        """
+        Reescribe los documentos vigentes en segmentos nuevos y borra los antiguos
+
+        Los segmentos nuevos se numeran a continuación de los existentes y el
+        índice se guarda antes de borrar nada: si el proceso se interrumpe, al
+        abrir se recuperan los segmentos nuevos como versiones más recientes.
+
+        Returns:
+            Dict con los bytes liberados y las estadísticas tras compactar
+        """
+        before = self.stats()
+        self._close_writer()
+        old_segments = sorted(self._segments)
+        if not old_segments:
+            return {'bytes_liberados': 0, **before}
+
+        live = sorted(self._index.items(), key=lambda item: (item[1][0], item[1][1]))
+        self._segments = {old_segments[-1] + 1: 0}
+
+        readers = {}
+        try:
+            for clave, (segment, offset, length, *header) in live:
+                if segment not in readers:
+                    readers[segment] = open(self._segment_path(segment), 'rb')
+                readers[segment].seek(offset)
+                record = readers[segment].read(length)
+
+                writer = self._open_writer()
+                new_offset = writer.tell()
+                writer.write(record)
+                self._segments[self._active_segment] = new_offset + length
+                self._index[clave] = (self._active_segment, new_offset, length, *header)
+        finally:
+            for reader in readers.values():
+                reader.close()
+
+        self._close_writer()
+        self.save_index()
+        for segment in old_segments:
+            self._segment_path(segment).unlink()
+
+        after = self.stats()
+        print(f"✓ JSONL compactado: {before['bytes'] - after['bytes']} bytes liberados")
+        return {'bytes_liberados': before['bytes'] - after['bytes'], **after}
+
+    def save_index(self):
+        """Guarda el índice en disco de forma atómica"""
+        self._flush_writer()
+        temp_path = self.index_path.with_suffix('.json.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': INDEX_VERSION,
+                'segmentos': {_segment_name(n): size for n, size in sorted(self._segments.items())},
+                'documentos': {clave: list(entry) for clave, entry in self._index.items()}
+            }, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, self.index_path)
+        self._dirty = False
+
+    def _load_index(self):
+        """Carga el índice y lo completa con lo que los segmentos tengan de más"""
+        on_disk = {
+            int(match.group(1)): path.stat().st_size
+            for path in self.output_dir.iterdir()
+            if (match := SEGMENT_PATTERN.match(path.name))
+        }
+
+        if self.index_path.exists():
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get('version') == INDEX_VERSION:
+                self._segments = {
+                    int(SEGMENT_PATTERN.match(name).group(1)): size
+                    for name, size in saved['segmentos'].items()
+                }
+                self._index = {clave: tuple(entry) for clave, entry in saved['documentos'].items()}
+
+        # Un segmento indexado que ya no existe o ha encogido invalida el índice
+        if any(on_disk.get(n, 0) < size for n, size in self._segments.items()):
+            self._index, self._segments = {}, {}
+
+        recovered = False
+        for number in sorted(on_disk):
+            start = self._segments.get(number, 0)
+            if on_disk[number] > start or number not in self._segments:
+                self._scan_segment(number, start)
+                recovered = True
+
+        if recovered:
+            print(f"✓ Índice JSONL recuperado: {len(self._index)} documentos")
+            self.save_index()
+
+    def _scan_segment(self, number: int, start: int):
+        """
+        Indexa las líneas de un segmento a partir de un desplazamiento
+
+        Las versiones leídas sustituyen a las que ya estuvieran en el índice.
+        Una línea final sin salto de línea (escritura interrumpida) se trunca.
+        Una línea completa que no se puede leer se omite y se avisa, sin
+        tocar las que la siguen.
+        """
+        path = self._segment_path(number)
+        offset = start
+        with open(path, 'r+b') as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    f.truncate(offset)
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    print(f"⚠ Línea ilegible omitida en {path.name} @ {offset}")
+                    offset += len(line)
+                    continue
+                self._index[record['clave']] = (
+                    number, offset, len(line),
+                    record['nombre_archivo'], record['num_paginas'], record['fecha_procesamiento']
+                )
+                offset += len(line)
+        self._segments[number] = offset
+
+    def _flush_writer(self):
+        if self._writer is not None:
+            self._writer.flush()
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def close(self):
+        """Cierra el segmento activo y guarda el índice"""
+        self._close_writer()
+        if self._dirty:
+            self.save_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,338 @@
+"""
+PASO 4: Almacenamiento - Resumen mensual de facturas
+Totales por hogar (CUPS), mes, categoría y proveedor en la tabla resumen_mensual
+
+Cada cambio en las facturas se aplica como una diferencia sobre las filas
+afectadas, en la misma transacción que el cambio, así que el resumen de un
+hogar se responde leyendo sus filas por el índice único, sin recorrer
+documentos ni páginas. ``rebuild`` lo recalcula desde las facturas y
+corrige las diferencias que encuentre.
+"""
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, exists, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+
+from models import Factura, ResumenMensual
+
+
+# Valores de la clave para las facturas sin categoría o sin proveedor reconocido
+SIN_CATEGORIA = 'otros'
+SIN_PROVEEDOR = 'desconocido'
+
+# Documentos por consulta IN
+KEY_CHUNK_SIZE = 500
+
+# INSERT ... ON CONFLICT de cada base de datos admitida (ver Config.get_database_url)
+_DIALECT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+# Columnas de una factura que cuentan en el resumen
+INVOICE_COLUMNS = (
+    Factura.cups,
+    Factura.periodo_fin,
+    Factura.categoria,
+    Factura.proveedor,
+    Factura.importe_total,
+    Factura.consumo_kwh
+)
+
+# Columnas de una fila del resumen
+ROLLUP_COLUMNS = (
+    ResumenMensual.id,
+    ResumenMensual.hogar,
+    ResumenMensual.mes,
+    ResumenMensual.categoria,
+    ResumenMensual.proveedor,
+    ResumenMensual.num_facturas,
+    ResumenMensual.importe_total,
+    ResumenMensual.consumo_kwh
+)
+
+_CENTIMOS = Decimal('0.01')
+
+# (hogar, mes, categoria, proveedor)
+Key = Tuple[str, date, str, str]
+
+
+def _money(value) -> Decimal:
+    """Importe como Decimal (0 si falta); SQLite lo devuelve como float"""
+    return Decimal(str(value)) if value is not None else Decimal(0)
+
+
+def _normalize(num_facturas: int, importe_total, consumo_kwh) -> Tuple[int, Decimal, float]:
+    """Valores de una fila redondeados como se guardan (céntimos y Wh)"""
+    return int(num_facturas), _money(importe_total).quantize(_CENTIMOS), round(float(consumo_kwh or 0), 3)
+
+
+def _row_key(row) -> Key:
+    return row.hogar, row.mes, row.categoria, row.proveedor
+
+
+def rollup_key(invoice) -> Optional[Key]:
+    """
+    Fila del resumen a la que suma una factura
+
+    Args:
+        invoice: Factura como dict (salida de parse_invoice_batch) o fila
+            con INVOICE_COLUMNS
+
+    Returns:
+        (hogar, mes, categoria, proveedor), o None si la factura no tiene
+        CUPS o fin de periodo y no cuenta en el resumen
+    """
+    values = getattr(invoice, '_mapping', invoice)
+    cups, periodo_fin = values.get('cups'), values.get('periodo_fin')
+    if not cups or periodo_fin is None:
+        return None
+    return (
+        cups,
+        periodo_fin.replace(day=1),
+        values.get('categoria') or SIN_CATEGORIA,
+        values.get('proveedor') or SIN_PROVEEDOR
+    )
+
+
+def totals(invoices: Iterable, sign: int = 1, into: Optional[Dict] = None) -> Dict[Key, List]:
+    """
+    Suma unas facturas por fila del resumen
+
+    Args:
+        invoices: Facturas (ver rollup_key)
+        sign: 1 para sumarlas, -1 para restarlas
+        into: Totales a los que añadirlas (opcional)
+
+    Returns:
+        Dict {clave: [num_facturas, importe_total, consumo_kwh]}
+    """
+    result = {} if into is None else into
+    for invoice in invoices:
+        key = rollup_key(invoice)
+        if key is None:
+            continue
+        values = getattr(invoice, '_mapping', invoice)
+        total = result.setdefault(key, [0, Decimal(0), 0.0])
+        total[0] += sign
+        total[1] += sign * _money(values.get('importe_total'))
+        total[2] += sign * float(values.get('consumo_kwh') or 0)
+    return result
+
+
+def _rollup_rows(connection: Connection, condition) -> Dict[Key, object]:
+    """Filas actuales del resumen que cumplen una condición, por clave"""
+    return {_row_key(row): row for row in connection.execute(select(*ROLLUP_COLUMNS).where(condition))}
+
+
+def _write(connection: Connection, inserts: List[Dict], updates: List[Dict], deletes: List[int]):
+    """Inserta, actualiza (por '_id') y borra filas del resumen"""
+    if inserts:
+        connection.execute(insert(ResumenMensual), inserts)
+    if updates:
+        connection.execute(update(ResumenMensual).where(ResumenMensual.id == bindparam('_id')), updates)
+    if deletes:
+        connection.execute(delete(ResumenMensual).where(ResumenMensual.id.in_(deletes)))
+
+
+def _row_values(key: Key, values: Tuple[int, Decimal, float]) -> Dict:
+    hogar, mes, categoria, proveedor = key
+    num_facturas, importe_total, consumo_kwh = values
+    return {
+        'hogar': hogar,
+        'mes': mes,
+        'categoria': categoria,
+        'proveedor': proveedor,
+        'num_facturas': num_facturas,
+        'importe_total': importe_total,
+        'consumo_kwh': consumo_kwh
+    }
+
+
+def _upsert(dialect: str):
+    """INSERT ... ON CONFLICT que suma una diferencia a la fila de su clave"""
+    statement = _DIALECT_INSERTS[dialect](ResumenMensual)
+    return statement.on_conflict_do_update(
+        index_elements=[ResumenMensual.hogar, ResumenMensual.mes, ResumenMensual.categoria, ResumenMensual.proveedor],
+        set_={
+            'num_facturas': ResumenMensual.num_facturas + statement.excluded.num_facturas,
+            'importe_total': ResumenMensual.importe_total + statement.excluded.importe_total,
+            'consumo_kwh': ResumenMensual.consumo_kwh + statement.excluded.consumo_kwh
+        }
+    )
+
+
+# Filas de una clave que se han quedado sin facturas
+_DELETE_EMPTY = delete(ResumenMensual).where(
+    ResumenMensual.hogar == bindparam('k_hogar'),
+    ResumenMensual.mes == bindparam('k_mes'),
+    ResumenMensual.categoria == bindparam('k_categoria'),
+    ResumenMensual.proveedor == bindparam('k_proveedor'),
+    ResumenMensual.num_facturas <= 0
+)
+
+
+def apply_changes(connection: Connection, removed_doc_ids: Iterable[int] = (), added: Iterable[Dict] = ()) -> int:
+    """
+    Aplica al resumen el cambio de unas facturas
+
+    Hay que llamarla antes de borrar las facturas de ``removed_doc_ids``,
+    que se leen para restarlas. Cada diferencia se suma a su fila con un
+    INSERT ... ON CONFLICT, sin leer el resumen, así que también es correcto
+    con transacciones concurrentes en PostgreSQL. Las filas que se quedan
+    sin facturas se borran.
+
+    Args:
+        connection: Conexión con la transacción del cambio
+        removed_doc_ids: Documentos cuyas facturas guardadas se restan
+        added: Facturas nuevas que se suman (ver rollup_key)
+
+    Returns:
+        int: Filas del resumen modificadas
+    """
+    deltas = {}
+    removed_doc_ids = list(removed_doc_ids)
+    for start in range(0, len(removed_doc_ids), KEY_CHUNK_SIZE):
+        chunk = removed_doc_ids[start:start + KEY_CHUNK_SIZE]
+        totals(connection.execute(select(*INVOICE_COLUMNS).where(Factura.documento_id.in_(chunk))), -1, deltas)
+    totals(added, 1, deltas)
+
+    changes = [_row_values(key, delta) for key, delta in deltas.items() if any(delta)]
+    if changes:
+        connection.execute(_upsert(connection.dialect.name), changes)
+        emptied = [
+            {'k_hogar': row['hogar'], 'k_mes': row['mes'], 'k_categoria': row['categoria'],
+             'k_proveedor': row['proveedor']}
+            for row in changes if row['num_facturas'] < 0
+        ]
+        if emptied:
+            connection.execute(_DELETE_EMPTY, emptied)
+    return len(changes)
+
+
+def rebuild(connection: Connection, batch_size: int = 500) -> Dict[str, int]:
+    """
+    Recalcula el resumen desde las facturas y corrige las diferencias
+
+    Recorre los hogares por lotes en orden de CUPS (índice
+    ix_facturas_cups_periodo) y compara sus filas con las calculadas, así
+    que nunca tiene en memoria más que las de un lote.
+
+    Args:
+        connection: Conexión con una transacción de escritura abierta
+        batch_size: Hogares por lote
+
+    Returns:
+        Dict con hogares, filas (tras reconstruir) y filas insertadas,
+        corregidas y eliminadas (todas a 0 si el resumen era correcto)
+    """
+    informe = dict.fromkeys(('hogares', 'filas', 'insertadas', 'corregidas', 'eliminadas'), 0)
+    con_periodo = Factura.periodo_fin.is_not(None)
+    last = ''
+
+    while True:
+        hogares = connection.scalars(
+            select(Factura.cups).distinct()
+            .where(Factura.cups > last, con_periodo)
+            .order_by(Factura.cups).limit(batch_size)
+        ).all()
+        if not hogares:
+            break
+
+        expected = totals(connection.execute(
+            select(*INVOICE_COLUMNS).where(Factura.cups.in_(hogares), con_periodo)
+        ))
+        existing = _rollup_rows(connection, ResumenMensual.hogar.in_(hogares))
+
+        inserts, updates = [], []
+        for key, total in expected.items():
+            values = _normalize(*total)
+            row = existing.pop(key, None)
+            if row is None:
+                inserts.append(_row_values(key, values))
+            elif _normalize(row.num_facturas, row.importe_total, row.consumo_kwh) != values:
+                updates.append({
+                    '_id': row.id, 'num_facturas': values[0], 'importe_total': values[1], 'consumo_kwh': values[2]
+                })
+        deletes = [row.id for row in existing.values()]
+        _write(connection, inserts, updates, deletes)
+
+        informe['hogares'] += len(hogares)
+        informe['filas'] += len(expected)
+        informe['insertadas'] += len(inserts)
+        informe['corregidas'] += len(updates)
+        informe['eliminadas'] += len(deletes)
+        last = hogares[-1]
+
+    # Filas de hogares que ya no tienen ninguna factura
+    huerfanas = connection.execute(delete(ResumenMensual).where(
+        ~exists().where(Factura.cups == ResumenMensual.hogar, con_periodo)
+    ))
+    informe['eliminadas'] += huerfanas.rowcount
+    return informe
+
+
+def monthly_summary(connection: Connection, hogar: Optional[str] = None, desde: Optional[date] = None,
+                    hasta: Optional[date] = None) -> List[Dict]:
+    """
+    Totales por mes con su desglose por categoría y proveedor
+
+    Con ``hogar`` lee solo sus filas (prefijo del índice único); sin él
+    suma las de todos los hogares de cada mes (índice por mes).
+
+    Args:
+        connection: Conexión de lectura
+        hogar: CUPS del hogar (None para todos)
+        desde: Primer mes incluido (cualquier día del mes)
+        hasta: Último mes incluido (cualquier día del mes)
+
+    Returns:
+        Lista por mes ascendente de dicts con mes ('AAAA-MM'),
+        num_facturas, importe_total, consumo_kwh y desglose (lista de dicts
+        con categoria, proveedor y los mismos totales)
+    """
+    columns = (ResumenMensual.mes, ResumenMensual.categoria, ResumenMensual.proveedor)
+    if hogar is not None:
+        query = select(
+            *columns, ResumenMensual.num_facturas, ResumenMensual.importe_total, ResumenMensual.consumo_kwh
+        ).where(ResumenMensual.hogar == hogar)
+    else:
+        query = select(
+            *columns,
+            func.sum(ResumenMensual.num_facturas).label('num_facturas'),
+            func.sum(ResumenMensual.importe_total).label('importe_total'),
+            func.sum(ResumenMensual.consumo_kwh).label('consumo_kwh')
+        ).group_by(*columns)
+
+    if desde is not None:
+        query = query.where(ResumenMensual.mes >= desde.replace(day=1))
+    if hasta is not None:
+        query = query.where(ResumenMensual.mes <= hasta)
+
+    meses = {}
+    for row in connection.execute(query.order_by(*columns)):
+        num_facturas, importe_total, consumo_kwh = _normalize(row.num_facturas, row.importe_total, row.consumo_kwh)
+        mes = meses.get(row.mes)
+        if mes is None:
+            mes = meses[row.mes] = {
+                'mes': row.mes.strftime('%Y-%m'),
+                'num_facturas': 0,
+                'importe_total': Decimal(0),
+                'consumo_kwh': 0.0,
+                'desglose': []
+            }
+        mes['num_facturas'] += num_facturas
+        mes['importe_total'] += importe_total
+        mes['consumo_kwh'] += consumo_kwh
+        mes['desglose'].append({
+            'categoria': row.categoria,
+            'proveedor': row.proveedor,
+            'num_facturas': num_facturas,
+            'importe_total': float(importe_total),
+            'consumo_kwh': consumo_kwh
+        })
+
+    for mes in meses.values():
+        mes['importe_total'] = float(mes['importe_total'])
+        mes['consumo_kwh'] = round(mes['consumo_kwh'], 3)
+    return list(meses.values())
@@ -0,0 +1,312 @@
+"""
+PASO 4: Almacenamiento - Parquet
+Exportación columnar del corpus (documentos y páginas) en archivos Parquet
+particionados por mes de procesamiento
+
+Requiere ``pyarrow`` (pip install pyarrow).
+"""
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:  # Dependencia opcional
+    pa = None
+
+
+# Compresión del texto y columnas con pocos valores distintos
+PARQUET_COMPRESSION = 'zstd'
+DICTIONARY_COLUMNS = ['clave', 'nombre_archivo', 'metodo_extraccion']
+
+
+def _schemas():
+    """Esquemas de las tablas documentos y paginas"""
+    texto_dict = pa.dictionary(pa.int32(), pa.string())
+    documentos = pa.schema([
+        ('clave', texto_dict),
+        ('nombre_archivo', texto_dict),
+        ('ruta_archivo', pa.string()),
+        ('num_paginas', pa.int32()),
+        ('autor', pa.string()),
+        ('titulo', pa.string()),
+        ('fecha_creacion', pa.timestamp('us')),
+        ('fecha_procesamiento', pa.timestamp('us')),
+        ('hash_contenido', pa.string()),
+    ])
+    paginas = pa.schema([
+        ('clave', texto_dict),
+        ('nombre_archivo', texto_dict),
+        ('fecha_procesamiento', pa.timestamp('us')),
+        ('numero_pagina', pa.int32()),
+        ('contenido', pa.string()),
+        ('metodo_extraccion', texto_dict),
+    ])
+    return documentos, paginas
+
+
+def _decode_dictionaries(table):
+    """Convierte las columnas de diccionario a texto (para ordenar y hacer joins)"""
+    for index, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(index, field.name, pc.cast(table.column(index), field.type.value_type))
+    return table
+
+
+class ParquetStorage:
+    """
+    Almacena documentos extraídos en archivos Parquet
+
+    Los documentos se acumulan en memoria y se escriben juntos con
+    ``flush`` (o al cerrar): un archivo por tabla y volcado, en
+    ``<dir>/documentos/mes=AAAA-MM/`` y ``<dir>/paginas/mes=AAAA-MM/``. Los
+    archivos nunca se modifican; si un PDF se vuelve a guardar, las
+    lecturas devuelven su versión más reciente.
+
+    Las lecturas proyectan los archivos en memoria (mmap) y solo leen las
+    columnas pedidas.
+    """
+
+    def __init__(self, output_dir: Path, flush_every: int = 1000):
+        """
+        Inicializa el almacenamiento Parquet
+
+        Args:
+            output_dir: Directorio raíz de los datasets
+            flush_every: Documentos acumulados a partir de los que
+                ``needs_flush`` indica que conviene volcar
+        """
+        if pa is None:
+            raise ImportError("El almacenamiento Parquet requiere 'pyarrow' (pip install pyarrow)")
+
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.flush_every = flush_every
+        self.documentos_schema, self.paginas_schema = _schemas()
+        self.filesystem = pafs.LocalFileSystem(use_mmap=True)
+        self._pending = {}
+
+    @staticmethod
+    def document_key(document_data: Dict) -> str:
+        """Clave de un documento: hash del contenido o, si no hay, la ruta"""
+        return document_data.get('hash_contenido') or document_data['ruta_archivo']
+
+    def save_document(self, document_data: Dict) -> str:
+        """
+        Añade un documento al próximo volcado
+
+        'paginas' puede ser un iterador; se consume aquí.
+
+        Args:
+            document_data: Diccionario con los datos del documento
+
+        Returns:
+            str: Clave del documento
+        """
+        clave = self.document_key(document_data)
+        # Un documento repetido antes del volcado se guarda una sola vez
+        self._pending[clave] = dict(document_data, paginas=list(document_data['paginas']))
+        return clave
+
+    @property
+    def pending(self) -> int:
+        """Documentos pendientes de volcar"""
+        return len(self._pending)
+
+    def needs_flush(self) -> bool:
+        """Indica si se ha alcanzado ``flush_every``"""
+        return len(self._pending) >= self.flush_every
+
+    def flush(self) -> int:
+        """
+        Escribe los documentos pendientes
+
+        Returns:
+            int: Número de documentos escritos
+        """
+        if not self._pending:
+            return 0
+
+        fecha_procesamiento = datetime.now()
+        documentos = {name: [] for name in self.documentos_schema.names}
+        paginas = {name: [] for name in self.paginas_schema.names}
+
+        for clave, document_data in self._pending.items():
+            row = {
+                'clave': clave,
+                'nombre_archivo': document_data['nombre_archivo'],
+                'ruta_archivo': document_data['ruta_archivo'],
+                'num_paginas': document_data['num_paginas'],
+                'autor': document_data.get('autor'),
+                'titulo': document_data.get('titulo'),
+                'fecha_creacion': document_data.get('fecha_creacion'),
+                'fecha_procesamiento': fecha_procesamiento,
+                'hash_contenido': document_data.get('hash_contenido')
+            }
+            for name in documentos:
+                documentos[name].append(row[name])
+
+            for page in document_data['paginas']:
+                paginas['clave'].append(clave)
+                paginas['nombre_archivo'].append(document_data['nombre_archivo'])
+                paginas['fecha_procesamiento'].append(fecha_procesamiento)
+                paginas['numero_pagina'].append(page['numero_pagina'])
+                paginas['contenido'].append(page['contenido'])
+                paginas['metodo_extraccion'].append(page.get('metodo_extraccion'))
+
+        partition = f"mes={fecha_procesamiento:%Y-%m}"
+        filename = f"part-{fecha_procesamiento:%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+        written = len(self._pending)
+        try:
+            # Las páginas primero: un documento solo aparece cuando sus páginas ya están escritas
+            self._write(pa.table(paginas, schema=self.paginas_schema), 'paginas', partition, filename)
+            self._write(pa.table(documentos, schema=self.documentos_schema), 'documentos', partition, filename)
+        finally:
+            # Si falla, los documentos se descartan (no quedan registrados en el manifiesto)
+            self._pending.clear()
+        print(f"✓ {written} documentos guardados en Parquet: {self.output_dir}")
+        return written
+
+    def _write(self, table, dataset: str, partition: str, filename: str):
+        """Escribe una tabla en un archivo nuevo, visible solo cuando está completo"""
+        directory = self.output_dir / dataset / partition
+        directory.mkdir(parents=True, exist_ok=True)
+        temp_path = directory / f".{filename}.tmp"
+        pq.write_table(
+            table, temp_path,
+            compression=PARQUET_COMPRESSION,
+            use_dictionary=[c for c in DICTIONARY_COLUMNS if c in table.column_names]
+        )
+        temp_path.replace(directory / filename)
+
+    def close(self):
+        """Vuelca los documentos pendientes"""
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def dataset(self, name: str) -> Optional['ds.Dataset']:
+        """
+        Dataset de Arrow con todos los archivos de una tabla
+
+        Args:
+            name: 'documentos' o 'paginas'
+
+        Returns:
+            Dataset particionado por mes, o None si aún no hay archivos
+        """
+        path = self.output_dir / name
+        if not path.exists():
+            return None
+        schema = self.documentos_schema if name == 'documentos' else self.paginas_schema
+        return ds.dataset(
+            str(path), schema=schema, format='parquet', filesystem=self.filesystem,
+            partitioning='hive', exclude_invalid_files=False,
+            ignore_prefixes=['.']
+        )
+
+    def _latest_documents(self, filter=None):
+        """
+        Última versión de cada documento
+
+        Returns:
+            Tupla (tabla de Arrow con claves decodificadas, hay versiones antiguas)
+        """
+        dataset = self.dataset('documentos')
+        if dataset is None:
+            return _decode_dictionaries(self.documentos_schema.empty_table()), False
+
+        table = _decode_dictionaries(dataset.to_table(filter=filter))
+        if table.num_rows == 0:
+            return table, False
+
+        # Ordenar por clave y fecha descendente y quedarse con la primera fila de cada clave
+        table = table.sort_by([('clave', 'ascending'), ('fecha_procesamiento', 'descending')])
+        claves = table.column('clave').combine_chunks()
+        first = pa.concat_arrays([pa.array([True]), pc.not_equal(claves[1:], claves[:-1])])
+        latest = table.filter(first)
+        return latest, latest.num_rows < table.num_rows
+
+    def list_documents(self) -> List[Dict]:
+        """
+        Lista la última versión de cada documento, sin páginas
+
+        Returns:
+            Lista de dicts con la cabecera de cada documento
+        """
+        table, _ = self._latest_documents()
+        return [self._header_to_dict(row) for row in table.sort_by('nombre_archivo').to_pylist()]
+
+    def load_document(self, clave: str) -> Optional[Dict]:
+        """
+        Carga la última versión de un documento con sus páginas
+
+        Args:
+            clave: Clave del documento (hash de contenido o ruta)
+
+        Returns:
+            Dict con el mismo formato que JSONStorage.load_document o None
+        """
+        documentos, _ = self._latest_documents(filter=ds.field('clave') == clave)
+        if documentos.num_rows == 0:
+            return None
+
+        document = self._header_to_dict(documentos.to_pylist()[0])
+        fecha = documentos.column('fecha_procesamiento')[0]
+
+        paginas = self.dataset('paginas').to_table(
+            columns=['numero_pagina', 'contenido', 'metodo_extraccion'],
+            filter=(ds.field('clave') == clave) & (ds.field('fecha_procesamiento') == fecha)
+        )
+        document['paginas'] = _decode_dictionaries(paginas).sort_by('numero_pagina').to_pylist()
+        return document
+
+    def read_pages(self, columns: List[str] = None, filter=None):
+        """
+        Lee las páginas de la última versión de cada documento
+
+        Args:
+            columns: Columnas de paginas a leer (default: todas)
+            filter: Expresión de pyarrow.dataset para filtrar filas
+
+        Returns:
+            Tabla de Arrow
+        """
+        dataset = self.dataset('paginas')
+        columns = columns or self.paginas_schema.names
+        if dataset is None:
+            return self.paginas_schema.empty_table().select(columns)
+
+        latest, superseded = self._latest_documents()
+        if not superseded:
+            return dataset.to_table(columns=columns, filter=filter)
+
+        # Descartar las páginas de versiones antiguas con un join por (clave, fecha)
+        keys = ['clave', 'fecha_procesamiento']
+        read_columns = list(dict.fromkeys(columns + keys))
+        table = _decode_dictionaries(dataset.to_table(columns=read_columns, filter=filter))
+        return table.join(latest.select(keys), keys=keys, join_type='inner').select(columns)
+
+    @staticmethod
+    def _header_to_dict(row: Dict) -> Dict:
+        """Convierte una fila de documentos al formato de JSONStorage"""
+        return {
+            'nombre_archivo': row['nombre_archivo'],
+            'ruta_archivo': row['ruta_archivo'],
+            'num_paginas': row['num_paginas'],
+            'autor': row['autor'],
+            'titulo': row['titulo'],
+            'fecha_creacion': row['fecha_creacion'].isoformat() if row['fecha_creacion'] else None,
+            'fecha_procesamiento': row['fecha_procesamiento'].isoformat(),
+            'hash_contenido': row['hash_contenido'],
+            'clave': row['clave']
+        }
@@ -0,0 +1,311 @@
+"""
+PASO 4: Almacenamiento - Índice de búsqueda de texto completo
+Índice sobre el contenido de las páginas: FTS5 en SQLite y tsvector/GIN en PostgreSQL
+"""
+import re
+import unicodedata
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.engine import Connection, Engine
+
+from models import decompress_text
+
+
+# Marcadores de resaltado en los fragmentos devueltos
+HIGHLIGHT_START = '['
+HIGHLIGHT_END = ']'
+
+# Configuración de idioma de PostgreSQL (stemming en español)
+POSTGRES_TS_CONFIG = 'spanish'
+
+# Palabras de los fragmentos de SQLite, que se calculan en Python porque el
+# índice FTS5 no guarda el texto (como snippet(..., 12))
+FRAGMENT_TOKENS = 12
+
+
+def _fold(word: str) -> str:
+    """Minúsculas y sin tildes, como el tokenizador unicode61 con remove_diacritics"""
+    if word.isascii():
+        return word.lower()
+    decomposed = unicodedata.normalize('NFKD', word.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _fragment(texto: str, terms: List[str]) -> str:
+    """
+    Fragmento con los términos resaltados (ver SQLiteSearchIndex)
+
+    Args:
+        texto: Texto completo de la página
+        terms: Términos buscados
+
+    Returns:
+        str: Hasta FRAGMENT_TOKENS palabras alrededor de la primera coincidencia
+    """
+    wanted = {_fold(term) for term in terms}
+    tokens = list(re.finditer(r'\w+', texto))
+    if not tokens:
+        return ''
+
+    # Solo se normaliza hasta la primera coincidencia y dentro de la ventana
+    hit = next((i for i, token in enumerate(tokens) if _fold(token.group()) in wanted), 0)
+    first = max(0, min(hit - 2, len(tokens) - FRAGMENT_TOKENS))
+    window = tokens[first:first + FRAGMENT_TOKENS]
+    parts = ['…'] if first > 0 else []
+    position = window[0].start()
+    for token in window:
+        parts.append(texto[position:token.start()])
+        if _fold(token.group()) in wanted:
+            parts.append(f"{HIGHLIGHT_START}{token.group()}{HIGHLIGHT_END}")
+        else:
+            parts.append(token.group())
+        position = token.end()
+    if first + FRAGMENT_TOKENS < len(tokens):
+        parts.append('…')
+    return ''.join(parts)
+
+
+class SearchIndex(ABC):
+    """
+    Índice de texto completo sobre paginas.contenido
+
+    El índice se mantiene sincronizado por la propia base de datos (triggers
+    en SQLite, índice de expresión en PostgreSQL), así que cualquier escritura
+    en ``paginas``, sea por ORM o por inserciones masivas, queda indexada.
+    """
+
+    @abstractmethod
+    def create(self, connection: Connection):
+        """Crea el índice si no existe"""
+
+    @abstractmethod
+    def drop(self, connection: Connection):
+        """Elimina el índice si existe"""
+
+    @abstractmethod
+    def index_contents(self, connection: Connection, contents: Iterable[Tuple[int, str]]):
+        """Indexa contenidos compartidos nuevos (id, texto), ver ContenidoPagina"""
+
+    @abstractmethod
+    def unindex_contents(self, connection: Connection, contents: Iterable[Tuple[int, str]]):
+        """Quita del índice contenidos compartidos (id, texto) que se van a borrar"""
+
+    @abstractmethod
+    def search(self, connection: Connection, query: str, limit: int, offset: int) -> List[Dict]:
+        """Busca páginas que coinciden con la consulta, de más a menos relevante"""
+
+
+class SQLiteSearchIndex(SearchIndex):
+    """
+    Índice FTS5 sin contenido, ``textos_fts``, con el texto de las páginas y
+    de los contenidos compartidos
+
+    Las páginas con texto propio se indexan con su id mediante triggers; los
+    contenidos compartidos y comprimidos de la tabla contenidos (modo 'blob')
+    se indexan una sola vez con su id en negativo, y los mantiene
+    DatabaseStorage al crearlos y borrarlos porque la base de datos no puede
+    descomprimir el texto en un trigger. Al estar en el mismo índice, todas
+    las coincidencias se puntúan con las mismas estadísticas (bm25) y se
+    pueden ordenar juntas. El índice no guarda el texto, así que los
+    fragmentos se calculan solo para las páginas devueltas.
+    """
+
+    # Índices de versiones anteriores del esquema (migraciones 2 y 6)
+    _LEGACY_TABLES = ('paginas_fts', 'contenidos_fts')
+    _LEGACY_TRIGGERS = ('paginas_fts_ai', 'paginas_fts_ad', 'paginas_fts_au')
+
+    def create(self, connection: Connection):
+        # Los triggers desaparecen si se recrea la tabla paginas; sin ellos
+        # el índice quedaría desfasado, así que se reconstruye desde cero
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'textos_fts_ai'"
+        )).first()
+        if exists:
+            return
+
+        self.drop(connection)
+
+        # Las páginas vacías (y las que guardan su texto en contenidos) no se indexan
+        connection.execute(text(
+            "CREATE VIRTUAL TABLE textos_fts USING fts5("
+            "contenido, content='', tokenize='unicode61 remove_diacritics 2')"
+        ))
+        connection.execute(text(
+            "CREATE TRIGGER textos_fts_ai AFTER INSERT ON paginas WHEN new.contenido <> '' BEGIN "
+            "INSERT INTO textos_fts(rowid, contenido) VALUES (new.id, new.contenido); END"
+        ))
+        connection.execute(text(
+            "CREATE TRIGGER textos_fts_ad AFTER DELETE ON paginas WHEN old.contenido <> '' BEGIN "
+            "INSERT INTO textos_fts(textos_fts, rowid, contenido) "
+            "VALUES ('delete', old.id, old.contenido); END"
+        ))
+        connection.execute(text(
+            "CREATE TRIGGER textos_fts_au AFTER UPDATE ON paginas BEGIN "
+            "INSERT INTO textos_fts(textos_fts, rowid, contenido) "
+            "SELECT 'delete', old.id, old.contenido WHERE old.contenido <> ''; "
+            "INSERT INTO textos_fts(rowid, contenido) "
+            "SELECT new.id, new.contenido WHERE new.contenido <> ''; END"
+        ))
+
+        # Indexar las páginas y los contenidos que ya existían antes de crear el índice
+        connection.execute(text(
+            "INSERT INTO textos_fts(rowid, contenido) SELECT id, contenido FROM paginas WHERE contenido <> ''"
+        ))
+        has_contents = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contenidos'"
+        )).first()
+        if has_contents:
+            rows = connection.execute(text("SELECT id, datos FROM contenidos"))
+            self.index_contents(connection, ((row.id, decompress_text(row.datos)) for row in rows))
+
+    def drop(self, connection: Connection):
+        for trigger in ('textos_fts_ai', 'textos_fts_ad', 'textos_fts_au') + self._LEGACY_TRIGGERS:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        for table in ('textos_fts',) + self._LEGACY_TABLES:
+            connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+
+    def index_contents(self, connection: Connection, contents: Iterable[Tuple[int, str]]):
+        params = [{'id': -content_id, 'contenido': texto} for content_id, texto in contents]
+        if params:
+            connection.execute(text(
+                "INSERT INTO textos_fts(rowid, contenido) VALUES (:id, :contenido)"
+            ), params)
+
+    def unindex_contents(self, connection: Connection, contents: Iterable[Tuple[int, str]]):
+        # Un índice sin contenido necesita el texto original para borrar
+        params = [{'id': -content_id, 'contenido': texto} for content_id, texto in contents]
+        if params:
+            connection.execute(text(
+                "INSERT INTO textos_fts(textos_fts, rowid, contenido) "
+                "VALUES ('delete', :id, :contenido)"
+            ), params)
+
+    @staticmethod
+    def _match_expression(query: str) -> str:
+        """
+        Convierte el texto del usuario en una expresión MATCH segura
+
+        Cada palabra se entrecomilla para que los caracteres especiales de
+        FTS5 no produzcan errores de sintaxis; todas deben aparecer.
+        """
+        return ' '.join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+    def search(self, connection: Connection, query: str, limit: int, offset: int) -> List[Dict]:
+        match = self._match_expression(query)
+        if not match:
+            return []
+
+        # Ordenar sobre el índice y unir con las páginas solo las primeras
+        # offset + limit coincidencias: cada una tiene al menos una página
+        # (un contenido compartido, todas las que lo usan)
+        rows = connection.execute(text(
+            "WITH f AS MATERIALIZED ("
+            "  SELECT rowid, rank FROM textos_fts WHERE textos_fts MATCH :match "
+            "  ORDER BY rank LIMIT :candidatos"
+            ") "
+            "SELECT p.documento_id, d.nombre_archivo, p.numero_pagina, -f.rank AS puntuacion, "
+            "p.id AS pagina_id, p.contenido, p.contenido_id "
+            "FROM f JOIN paginas p ON p.id = f.rowid JOIN documentos d ON d.id = p.documento_id "
+            "WHERE f.rowid > 0 "
+            "UNION ALL "
+            "SELECT p.documento_id, d.nombre_archivo, p.numero_pagina, -f.rank AS puntuacion, "
+            "p.id AS pagina_id, p.contenido, p.contenido_id "
+            "FROM f JOIN paginas p ON p.contenido_id = -f.rowid JOIN documentos d ON d.id = p.documento_id "
+            "WHERE f.rowid < 0 "
+            "ORDER BY puntuacion DESC, pagina_id LIMIT :limit OFFSET :offset"
+        ), {'match': match, 'candidatos': limit + offset, 'limit': limit, 'offset': offset}).all()
+
+        # Textos de las páginas compartidas, descomprimiendo solo los devueltos
+        texts = {}
+        shared_ids = {row.contenido_id for row in rows if row.contenido_id is not None}
+        if shared_ids:
+            texts = {
+                row.id: decompress_text(row.datos)
+                for row in connection.execute(
+                    text("SELECT id, datos FROM contenidos WHERE id IN :ids").bindparams(
+                        bindparam('ids', expanding=True)
+                    ),
+                    {'ids': list(shared_ids)}
+                )
+            }
+
+        terms = re.findall(r'\w+', query)
+        return [
+            self._result(row, _fragment(texts.get(row.contenido_id, row.contenido), terms))
+            for row in rows
+        ]
+
+    @staticmethod
+    def _result(row, fragmento: str) -> Dict:
+        return {
+            'documento_id': row.documento_id,
+            'nombre_archivo': row.nombre_archivo,
+            'numero_pagina': row.numero_pagina,
+            'puntuacion': row.puntuacion,
+            'fragmento': fragmento
+        }
+
+
+class PostgresSearchIndex(SearchIndex):
+    """Índice GIN sobre to_tsvector(contenido) en la tabla paginas"""
+
+    def create(self, connection: Connection):
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_paginas_contenido_fts ON paginas "
+            f"USING GIN (to_tsvector('{POSTGRES_TS_CONFIG}', contenido))"
+        ))
+
+    def drop(self, connection: Connection):
+        connection.execute(text("DROP INDEX IF EXISTS ix_paginas_contenido_fts"))
+
+    def index_contents(self, connection: Connection, contents: Iterable[Tuple[int, str]]):
+        # DatabaseStorage no admite el modo 'blob' en PostgreSQL, así que no
+        # hay contenidos compartidos que indexar
+        raise ValueError("Los contenidos compartidos (modo 'blob') solo están disponibles con SQLite")
+
+    def unindex_contents(self, connection: Connection, contents: Iterable[Tuple[int, str]]):
+        raise ValueError("Los contenidos compartidos (modo 'blob') solo están disponibles con SQLite")
+
+    def search(self, connection: Connection, query: str, limit: int, offset: int) -> List[Dict]:
+        if not query.strip():
+            return []
+
+        rows = connection.execute(text(
+            "SELECT p.documento_id, d.nombre_archivo, p.numero_pagina, "
+            f"ts_rank(to_tsvector('{POSTGRES_TS_CONFIG}', p.contenido), q) AS puntuacion, "
+            f"ts_headline('{POSTGRES_TS_CONFIG}', p.contenido, q, "
+            "'StartSel=' || :inicio || ', StopSel=' || :fin || ', MaxWords=25, MinWords=8') AS fragmento "
+            "FROM paginas p "
+            "JOIN documentos d ON d.id = p.documento_id, "
+            f"websearch_to_tsquery('{POSTGRES_TS_CONFIG}', :query) q "
+            f"WHERE to_tsvector('{POSTGRES_TS_CONFIG}', p.contenido) @@ q "
+            "ORDER BY puntuacion DESC, p.id "
+            "LIMIT :limit OFFSET :offset"
+        ), {
+            'query': query,
+            'inicio': HIGHLIGHT_START,
+            'fin': HIGHLIGHT_END,
+            'limit': limit,
+            'offset': offset
+        })
+
+        return [dict(row._mapping) for row in rows]
+
+
+def get_search_index(engine: Engine) -> Optional[SearchIndex]:
+    """
+    Obtiene la implementación del índice para el motor de base de datos
+
+    Args:
+        engine: Motor de SQLAlchemy
+
+    Returns:
+        SearchIndex de SQLite o PostgreSQL, o None si el motor no está soportado
+    """
+    if engine.dialect.name == 'sqlite':
+        return SQLiteSearchIndex()
+    if engine.dialect.name == 'postgresql':
+        return PostgresSearchIndex()
+    return None
@@ -2,7 +2,9 @@
 PASO 5: Tests Unitarios
 Tests completos para todos los componentes del sistema
 """
+import asyncio
 import unittest
+from unittest import mock
 import tempfile
 import shutil
 from pathlib import Path
@@ -10,15 +12,62 @@ from datetime import datetime
 import json
 import os
 import sys
+import threading
+import time
 
 # Añadir el directorio padre al path para importar módulos
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from config import Config
-from models import DatabaseManager, Documento, Pagina
-from extractors.pdf_extractor import PDFExtractor
+from models import DatabaseManager, Documento, Pagina, create_database_engine
+from migrations import HEAD, MigrationError, current_version, migrate, remove_duplicate_hashes
+from extractors.pdf_extractor import (
+    PDFExtractor, PageRangePool, compute_file_hash, extract_pdf, extract_pdf_stream, file_signature, read_pdf_info
+)
 from storage.json_storage import JSONStorage
 from storage.database_storage import DatabaseStorage
+from storage.parquet_storage import ParquetStorage, pa
+from storage.jsonl_storage import JSONLStorage
+from storage.async_database_storage import AsyncDatabaseStorage
+from extractors.ocr import OCREngine, OCRFallback
+from extractors.cache import ExtractionCache
+from storage.ingestion_manifest import IngestionManifest
+from extractors.invoice_parser import PARSER_VERSION, parse_invoice, parse_invoice_batch, validate_cups
+from main import parse_stored_invoices, process_directory
+from watcher import FolderWatcher
+from pipeline import IngestionPipeline
+import profiling
+from benchmarks.synthetic_pdfs import make_invoice_pdf
+
+try:
+    from fastapi.testclient import TestClient
+    from api import create_app
+except ImportError:  # La API es opcional para el resto de tests
+    create_app = None
+
+try:
+    import aiosqlite
+except ImportError:  # El almacenamiento asíncrono es opcional
+    aiosqlite = None
+
+SAMPLE_PDFS_DIR = Path(__file__).parent.parent / 'pdfs'
+
+# Texto de una factura de Naturgy con el formato de sus campos principales
+NATURGY_INVOICE_TEXT = """NATURGY IBERIA, S.A.
+CUPS: ES 0021 0000 1234 5678 LB
+Periodo de facturación: del 01/12/2024 a 31/01/2025
+Consumo total: 1.245 kWh
+Término de potencia 10,50 €
+TOTAL IMPORTE FACTURA 185,43 €"""
+
+
+class FakeOCREngine(OCREngine):
+    """Motor de OCR simulado que devuelve un texto fijo por página"""
+    
+    name = 'fake'
+    
+    def recognize(self, pdf_path, page_number):
+        return f'OCR página {page_number}'
 
 
 class TestConfig(unittest.TestCase):
@@ -182,6 +231,116 @@ class TestModels(unittest.TestCase):
         self.assertEqual(len(paginas), 0)
         
         session.close()
+    
+    def test_shared_engine_and_sqlite_pragmas(self):
+        """Verifica que los gestores de una URL comparten motor y que se aplican los PRAGMA"""
+        self.assertIs(DatabaseManager(self.db_url).engine, self.db_manager.engine)
+        
+        with self.db_manager.engine.connect() as connection:
+            self.assertEqual(connection.exec_driver_sql("PRAGMA journal_mode").scalar(), 'wal')
+            self.assertEqual(connection.exec_driver_sql("PRAGMA busy_timeout").scalar(), Config.SQLITE_BUSY_TIMEOUT_MS)
+            self.assertEqual(connection.exec_driver_sql("PRAGMA cache_size").scalar(), -Config.SQLITE_CACHE_SIZE_KB)
+    
+    def test_migrations_applied_once(self):
+        """Verifica la versión del esquema, sus índices y que no se vuelve a comprobar"""
+        from sqlalchemy import event, inspect
+        
+        with self.db_manager.engine.connect() as connection:
+            self.assertEqual(current_version(connection), HEAD)
+        
+        inspector = inspect(self.db_manager.engine)
+        indexes = {index['name']: index for index in inspector.get_indexes('documentos')}
+        self.assertTrue(indexes['uq_documentos_hash_contenido']['unique'])
+        self.assertIn('ix_documentos_nombre_archivo', indexes)
+        self.assertIn('ix_paginas_documento_id', [index['name'] for index in inspector.get_indexes('paginas')])
+        
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(self.db_manager.engine, 'before_cursor_execute', listener)
+        try:
+            self.assertEqual(self.db_manager.create_tables(), [])
+            DatabaseStorage(self.db_manager)
+        finally:
+            event.remove(self.db_manager.engine, 'before_cursor_execute', listener)
+        self.assertEqual(statements, [])
+    
+    def test_migrate_legacy_database(self):
+        """Verifica la migración de una base de datos con el esquema original (sin versiones)"""
+        from sqlalchemy import exc, inspect, text
+        
+        legacy_path = Path(self.temp_db.name).with_suffix('.legacy.db')
+        legacy_url = f'sqlite:///{legacy_path}'
+        engine = create_database_engine(legacy_url)
+        try:
+            # Tablas tal como las crea el models.py original
+            with engine.begin() as connection:
+                connection.execute(text(
+                    "CREATE TABLE documentos (id INTEGER NOT NULL, nombre_archivo VARCHAR(255) NOT NULL, "
+                    "ruta_archivo VARCHAR(500) NOT NULL, num_paginas INTEGER NOT NULL, autor VARCHAR(255), "
+                    "titulo VARCHAR(500), fecha_creacion DATETIME, fecha_procesamiento DATETIME, PRIMARY KEY (id))"
+                ))
+                connection.execute(text(
+                    "CREATE TABLE paginas (id INTEGER NOT NULL, documento_id INTEGER NOT NULL, "
+                    "numero_pagina INTEGER NOT NULL, contenido TEXT NOT NULL, PRIMARY KEY (id), "
+                    "FOREIGN KEY(documento_id) REFERENCES documentos (id))"
+                ))
+                for doc_id in (1, 2, 3):
+                    connection.execute(text(
+                        "INSERT INTO documentos VALUES (:id, 'a.pdf', '/tmp/a.pdf', 1, NULL, NULL, NULL, "
+                        "'2024-01-01 00:00:00')"
+                    ), {'id': doc_id})
+                    connection.execute(text(
+                        "INSERT INTO paginas (documento_id, numero_pagina, contenido) VALUES (:id, 1, 'texto')"
+                    ), {'id': doc_id})
+            
+            # Hasta la versión 4, y dos documentos con el mismo hash antes del índice único
+            with engine.begin() as connection:
+                self.assertEqual(migrate(connection, target=4), [1, 2, 3, 4])
+                columns = {column['name'] for column in inspect(connection).get_columns('paginas')}
+                self.assertIn('metodo_extraccion', columns)
+                connection.execute(text("UPDATE documentos SET hash_contenido = 'mismo' WHERE id IN (1, 2)"))
+            
+            # La migración 5 se detiene sin eliminar nada
+            db_manager = DatabaseManager(legacy_url, engine=engine)
+            with self.assertRaises(MigrationError) as error:
+                db_manager.create_tables()
+            self.assertIn('1, 2', str(error.exception))
+            with engine.connect() as connection:
+                self.assertEqual(current_version(connection), 4)
+                self.assertEqual(connection.scalar(text("SELECT count(*) FROM documentos")), 3)
+                self.assertEqual(connection.scalar(text("SELECT count(*) FROM paginas")), 3)
+            
+            # Eliminándolos a propósito, se conserva el último y se devuelven las filas eliminadas
+            with engine.begin() as connection:
+                filas = remove_duplicate_hashes(connection)
+            self.assertEqual([fila['id'] for fila in filas['documentos']], [1])
+            self.assertEqual([fila['documento_id'] for fila in filas['paginas']], [1])
+            self.assertEqual(db_manager.create_tables(), list(range(5, HEAD + 1)))
+            
+            storage = DatabaseStorage(db_manager)
+            self.assertEqual(sorted(doc['id'] for doc in storage.list_documents()), [2, 3])
+            self.assertEqual(len(storage.search_content('texto')), 2)
+            self.assertIsNone(storage.get_document(3)['paginas'][0]['metodo_extraccion'])
+            
+            with self.assertRaises(exc.IntegrityError):
+                with engine.begin() as connection:
+                    connection.execute(text(
+                        "INSERT INTO documentos (nombre_archivo, ruta_archivo, num_paginas, hash_contenido) "
+                        "VALUES ('b.pdf', '/tmp/b.pdf', 1, 'mismo')"
+                    ))
+        finally:
+            engine.dispose()
+            legacy_path.unlink()
+    
+    def test_invalid_sqlite_option(self):
+        """Verifica que un valor de PRAGMA no admitido se rechaza"""
+        original = Config.SQLITE_JOURNAL_MODE
+        Config.SQLITE_JOURNAL_MODE = 'wal; DROP TABLE documentos'
+        try:
+            with self.assertRaises(ValueError):
+                create_database_engine(self.db_url)
+        finally:
+            Config.SQLITE_JOURNAL_MODE = original
 
 
 class TestJSONStorage(unittest.TestCase):
@@ -250,6 +409,26 @@ class TestJSONStorage(unittest.TestCase):
         docs = self.storage.list_documents()
         self.assertEqual(len(docs), 3)
     
+    def test_save_document_streamed_pages(self):
+        """Verifica que se guardan páginas recibidas como generador"""
+        def paginas():
+            for i in range(3):
+                yield {'numero_pagina': i + 1, 'contenido': f'Página "{i + 1}"\nñ'}
+        
+        document_data = {
+            'nombre_archivo': 'stream.pdf',
+            'ruta_archivo': '/tmp/stream.pdf',
+            'num_paginas': 3,
+            'paginas': paginas()
+        }
+        
+        json_path = self.storage.save_document(document_data)
+        loaded_data = self.storage.load_document(json_path)
+        
+        self.assertEqual([p['numero_pagina'] for p in loaded_data['paginas']], [1, 2, 3])
+        self.assertEqual(loaded_data['paginas'][0]['contenido'], 'Página "1"\nñ')
+        self.assertEqual(list(Path(self.temp_dir).glob('*.tmp')), [])
+    
     def test_datetime_serialization(self):
         """Verifica que las fechas se serializan correctamente"""
         document_data = {
@@ -265,6 +444,233 @@ class TestJSONStorage(unittest.TestCase):
         
         self.assertIsInstance(loaded_data['fecha_creacion'], str)
         self.assertIn('fecha_procesamiento', loaded_data)
+    
+    def test_query_documents_from_index(self):
+        """Verifica que el listado y los filtros se resuelven desde el índice"""
+        for i, paginas in enumerate([1, 3, 5]):
+            self.storage.save_document({
+                'nombre_archivo': f'doc{i}.pdf',
+                'ruta_archivo': f'/tmp/doc{i}.pdf',
+                'num_paginas': paginas,
+                'titulo': f'Factura {i}' if i else 'Contrato',
+                'paginas': [{'numero_pagina': p + 1, 'contenido': ''} for p in range(paginas)]
+            })
+        
+        docs = self.storage.query_documents(min_paginas=2, titulo='factura')
+        self.assertEqual([d['nombre_archivo'] for d in docs], ['doc1.pdf', 'doc2.pdf'])
+        self.assertEqual(self.storage.query_documents(max_paginas=1)[0]['titulo'], 'Contrato')
+        self.assertEqual(len(self.storage.query_documents(desde=datetime.now().date())), 3)
+        self.assertEqual(self.storage.query_documents(hasta=datetime(2000, 1, 1).date()), [])
+        
+        with mock.patch('builtins.open', side_effect=AssertionError):
+            self.assertEqual(len(self.storage.list_documents()), 3)
+    
+    def test_rebuild_index(self):
+        """Verifica que el índice se recupera a partir del directorio"""
+        paths = [
+            self.storage.save_document({
+                'nombre_archivo': f'doc{i}.pdf',
+                'ruta_archivo': f'/tmp/doc{i}.pdf',
+                'num_paginas': 1,
+                'paginas': [{'numero_pagina': 1, 'contenido': f'Content {i}'}]
+            })
+            for i in range(3)
+        ]
+        paths[0].unlink()
+        (Path(self.temp_dir) / 'copia.json').write_text(paths[1].read_text(encoding='utf-8'), encoding='utf-8')
+        (Path(self.temp_dir) / 'roto.json').write_text('{"nombre', encoding='utf-8')
+        
+        resumen = self.storage.rebuild_index()
+        
+        self.assertEqual(resumen, {'indexados': 1, 'sin_cambios': 2, 'eliminados': 1, 'errores': 1})
+        self.assertEqual(len(self.storage.list_documents()), 3)
+        
+        # Un directorio sin índice (versión anterior) se indexa al abrirlo
+        self.storage.index.close()
+        for path in Path(self.temp_dir).glob('.index.db*'):
+            path.unlink()
+        self.assertEqual(len(JSONStorage(Path(self.temp_dir)).list_documents()), 3)
+
+
+@unittest.skipIf(pa is None, 'pyarrow no está instalado')
+class TestParquetStorage(unittest.TestCase):
+    """Tests para el almacenamiento Parquet"""
+    
+    def setUp(self):
+        """Configurar directorio temporal para cada test"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.storage = ParquetStorage(self.temp_dir)
+    
+    def tearDown(self):
+        """Limpiar después de cada test"""
+        shutil.rmtree(self.temp_dir)
+    
+    def _document(self, i, contenidos):
+        return {
+            'nombre_archivo': f'factura_{i}.pdf',
+            'ruta_archivo': f'/tmp/factura_{i}.pdf',
+            'num_paginas': len(contenidos),
+            'fecha_creacion': datetime(2025, 1, i + 1),
+            'hash_contenido': f'hash_{i}',
+            'paginas': iter([
+                {'numero_pagina': p + 1, 'contenido': c, 'metodo_extraccion': 'texto'}
+                for p, c in enumerate(contenidos)
+            ])
+        }
+    
+    def test_flush_and_load(self):
+        """Verifica que los documentos solo se escriben al volcar y se recuperan completos"""
+        for i in range(3):
+            self.storage.save_document(self._document(i, ['uno', 'dos']))
+        
+        self.assertEqual(self.storage.list_documents(), [])
+        self.assertEqual(self.storage.flush(), 3)
+        
+        docs = self.storage.list_documents()
+        self.assertEqual([d['nombre_archivo'] for d in docs], ['factura_0.pdf', 'factura_1.pdf', 'factura_2.pdf'])
+        
+        document = self.storage.load_document('hash_1')
+        self.assertEqual(document['fecha_creacion'], '2025-01-02T00:00:00')
+        self.assertEqual([p['contenido'] for p in document['paginas']], ['uno', 'dos'])
+        self.assertIsNone(self.storage.load_document('otro'))
+    
+    def test_dictionary_encoded_columns(self):
+        """Verifica la lectura por columnas con nombres codificados como diccionario"""
+        self.storage.save_document(self._document(0, ['uno', 'dos', 'tres']))
+        self.storage.flush()
+        
+        table = self.storage.read_pages(['nombre_archivo', 'contenido'])
+        
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.column_names, ['nombre_archivo', 'contenido'])
+        self.assertTrue(pa.types.is_dictionary(table.schema.field('nombre_archivo').type))
+    
+    def test_latest_version_wins(self):
+        """Verifica que un documento guardado de nuevo sustituye al anterior en las lecturas"""
+        self.storage.save_document(self._document(0, ['antiguo', 'antiguo']))
+        self.storage.save_document(self._document(1, ['otro']))
+        self.storage.flush()
+        time.sleep(0.001)
+        self.storage.save_document(self._document(0, ['nuevo']))
+        self.storage.flush()
+        
+        self.assertEqual(len(self.storage.list_documents()), 2)
+        self.assertEqual(self.storage.load_document('hash_0')['num_paginas'], 1)
+        self.assertEqual(
+            sorted(self.storage.read_pages(['contenido']).column('contenido').to_pylist()),
+            ['nuevo', 'otro']
+        )
+
+
+class TestJSONLStorage(unittest.TestCase):
+    """Tests para el almacenamiento JSON Lines"""
+    
+    def setUp(self):
+        """Configurar directorio temporal para cada test"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.storage = JSONLStorage(self.temp_dir, segment_max_bytes=300)
+    
+    def tearDown(self):
+        """Limpiar después de cada test"""
+        self.storage.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def _document(self, i, contenido='Contenido'):
+        return {
+            'nombre_archivo': f'factura_{i}.pdf',
+            'ruta_archivo': f'/tmp/factura_{i}.pdf',
+            'num_paginas': 1,
+            'fecha_creacion': datetime(2025, 1, 1),
+            'hash_contenido': f'hash_{i}',
+            'paginas': iter([{'numero_pagina': 1, 'contenido': contenido}])
+        }
+    
+    def test_save_and_load(self):
+        """Verifica que cada documento se carga por su clave con una línea compacta"""
+        for i in range(3):
+            self.storage.save_document(self._document(i, f'Página "{i}"\nñ'))
+        
+        document = self.storage.load_document('hash_1')
+        self.assertEqual(document['paginas'][0]['contenido'], 'Página "1"\nñ')
+        self.assertEqual(document['fecha_creacion'], '2025-01-01T00:00:00')
+        self.assertIsNone(self.storage.load_document('otro'))
+        self.assertEqual(
+            [d['nombre_archivo'] for d in self.storage.list_documents()],
+            ['factura_0.pdf', 'factura_1.pdf', 'factura_2.pdf']
+        )
+        
+        segments = sorted(self.temp_dir.glob('segment-*.jsonl'))
+        self.assertGreater(len(segments), 1)
+        self.assertTrue(all(line.startswith('{') for line in segments[0].read_text(encoding='utf-8').splitlines()))
+    
+    def test_compact_removes_superseded_versions(self):
+        """Verifica que la compactación conserva solo la última versión de cada documento"""
+        for i in range(3):
+            self.storage.save_document(self._document(i, 'antiguo'))
+        self.storage.save_document(self._document(0, 'nuevo'))
+        self.assertGreater(self.storage.stats()['bytes_obsoletos'], 0)
+        
+        resumen = self.storage.compact()
+        
+        self.assertGreater(resumen['bytes_liberados'], 0)
+        self.assertEqual(resumen['bytes_obsoletos'], 0)
+        self.assertEqual(self.storage.load_document('hash_0')['paginas'][0]['contenido'], 'nuevo')
+        self.assertEqual(len(list(self.storage.iter_documents())), 3)
+        
+        reopened = JSONLStorage(self.temp_dir)
+        self.assertEqual(reopened.load_document('hash_2')['paginas'][0]['contenido'], 'antiguo')
+    
+    def test_index_recovered_after_interruption(self):
+        """Verifica que sin cerrar se recupera el índice y se descarta una línea incompleta"""
+        self.storage.save_document(self._document(0))
+        self.storage.close()
+        self.storage.save_document(self._document(1))
+        self.storage._flush_writer()
+        
+        active = sorted(self.temp_dir.glob('segment-*.jsonl'))[-1]
+        with open(active, 'ab') as f:
+            f.write(b'{"clave":"hash_2","nombre')
+        
+        reopened = JSONLStorage(self.temp_dir)
+        self.assertEqual([d['clave'] for d in reopened.list_documents()], ['hash_0', 'hash_1'])
+        self.assertEqual(active.read_bytes()[-1:], b'\n')
+        reopened.save_document(self._document(2))
+        self.assertEqual(reopened.load_document('hash_2')['nombre_archivo'], 'factura_2.pdf')
+        reopened.close()
+    
+    def test_corrupted_line_keeps_following_records(self):
+        """Verifica que una línea dañada en medio de un segmento no descarta las siguientes"""
+        storage = JSONLStorage(self.temp_dir / 'uno', segment_max_bytes=1024 * 1024)
+        for i in range(3):
+            storage.save_document(self._document(i))
+        storage.close()
+        
+        segment = next((self.temp_dir / 'uno').glob('segment-*.jsonl'))
+        lines = segment.read_bytes().splitlines(keepends=True)
+        lines[1] = b'{"clave":"hash_1",' + b'x' * (len(lines[1]) - 19) + b'\n'
+        segment.write_bytes(b''.join(lines))
+        storage.index_path.unlink()
+        
+        reopened = JSONLStorage(self.temp_dir / 'uno')
+        self.assertEqual([d['clave'] for d in reopened.list_documents()], ['hash_0', 'hash_2'])
+        self.assertEqual(segment.read_bytes(), b''.join(lines))
+        self.assertEqual(reopened.load_document('hash_2')['nombre_archivo'], 'factura_2.pdf')
+        reopened.close()
+    
+    def test_failed_write_leaves_no_partial_line(self):
+        """Verifica que un error al leer las páginas no deja líneas a medias"""
+        def paginas():
+            yield {'numero_pagina': 1, 'contenido': 'uno'}
+            raise ValueError('PDF dañado')
+        
+        self.storage.save_document(self._document(0))
+        with self.assertRaises(ValueError):
+            self.storage.save_document(dict(self._document(1), paginas=paginas()))
+        self.storage.save_document(self._document(2))
+        self.storage.close()
+        
+        reopened = JSONLStorage(self.temp_dir)
+        self.assertEqual([d['clave'] for d in reopened.list_documents()], ['hash_0', 'hash_2'])
 
 
 class TestDatabaseStorage(unittest.TestCase):
@@ -378,12 +784,1466 @@ class TestDatabaseStorage(unittest.TestCase):
         retrieved = self.storage.get_document(doc_id)
         self.assertIsNone(retrieved)
     
+    def test_save_document_upserts_same_file(self):
+        """Verifica que guardar el mismo PDF dos veces actualiza el documento"""
+        document_data = {
+            'nombre_archivo': 'test.pdf',
+            'ruta_archivo': '/tmp/test.pdf',
+            'num_paginas': 1,
+            'hash_contenido': 'a' * 64,
+            'paginas': [{'numero_pagina': 1, 'contenido': 'Versión 1'}]
+        }
+        
+        first_id = self.storage.save_document(document_data)
+        
+        document_data['paginas'] = [{'numero_pagina': 1, 'contenido': 'Versión 2'}]
+        second_id = self.storage.save_document(document_data)
+        
+        self.assertEqual(first_id, second_id)
+        self.assertEqual(len(self.storage.list_documents()), 1)
+        
+        retrieved = self.storage.get_document(first_id)
+        self.assertEqual(len(retrieved['paginas']), 1)
+        self.assertEqual(retrieved['paginas'][0]['contenido'], 'Versión 2')
+    
+    def test_save_document_streamed_pages(self):
+        """Verifica que las páginas de un generador se insertan por bloques"""
+        storage = DatabaseStorage(self.db_manager, page_chunk_size=2)
+        document_data = {
+            'nombre_archivo': 'stream.pdf',
+            'ruta_archivo': '/tmp/stream.pdf',
+            'num_paginas': 5,
+            'paginas': ({'numero_pagina': i + 1, 'contenido': f'Página {i + 1}'} for i in range(5))
+        }
+        
+        doc_id = storage.save_document(document_data)
+        retrieved = storage.get_document(doc_id)
+        
+        self.assertEqual([p['numero_pagina'] for p in retrieved['paginas']], [1, 2, 3, 4, 5])
+    
+    def test_save_documents_batch(self):
+        """Verifica el guardado masivo por lotes"""
+        documents = [{
+            'nombre_archivo': f'test{i}.pdf',
+            'ruta_archivo': f'/tmp/test{i}.pdf',
+            'num_paginas': 2,
+            'paginas': [
+                {'numero_pagina': 1, 'contenido': f'Doc {i} página 1'},
+                {'numero_pagina': 2, 'contenido': f'Doc {i} página 2'}
+            ]
+        } for i in range(5)]
+        
+        doc_ids = self.storage.save_documents(documents, batch_size=2)
+        
+        self.assertEqual(len(set(doc_ids)), 5)
+        self.assertEqual(len(self.storage.list_documents()), 5)
+        
+        retrieved = self.storage.get_document(doc_ids[3])
+        self.assertEqual(retrieved['nombre_archivo'], 'test3.pdf')
+        self.assertEqual(retrieved['paginas'][1]['contenido'], 'Doc 3 página 2')
+    
+    def test_save_documents_upserts_existing(self):
+        """Verifica que el guardado por lotes actualiza documentos ya existentes"""
+        document_data = {
+            'nombre_archivo': 'test.pdf',
+            'ruta_archivo': '/tmp/test.pdf',
+            'num_paginas': 1,
+            'hash_contenido': 'b' * 64,
+            'paginas': [{'numero_pagina': 1, 'contenido': 'Versión 1'}]
+        }
+        first_id = self.storage.save_document(document_data)
+        
+        updated = dict(document_data, paginas=[{'numero_pagina': 1, 'contenido': 'Versión 2'}])
+        doc_ids = self.storage.save_documents([updated])
+        
+        self.assertEqual(doc_ids, [first_id])
+        retrieved = self.storage.get_document(first_id)
+        self.assertEqual(len(retrieved['paginas']), 1)
+        self.assertEqual(retrieved['paginas'][0]['contenido'], 'Versión 2')
+    
+    def test_save_documents_same_row_matched_twice(self):
+        """Verifica que dos documentos del lote que coinciden con el mismo guardado no lo comparten"""
+        original = {
+            'nombre_archivo': 'x.pdf',
+            'ruta_archivo': '/tmp/x.pdf',
+            'num_paginas': 1,
+            'hash_contenido': 'c' * 64,
+            'paginas': [{'numero_pagina': 1, 'contenido': 'Versión 1'}]
+        }
+        first_id = self.storage.save_document(original)
+        
+        # X cambia de contenido y una copia de su contenido anterior llega con otra ruta
+        nuevo = dict(original, hash_contenido='d' * 64, paginas=[{'numero_pagina': 1, 'contenido': 'Versión 2'}])
+        copia = dict(original, nombre_archivo='copia.pdf', ruta_archivo='/tmp/copia.pdf')
+        doc_ids = self.storage.save_documents([nuevo, copia], atomic=True)
+        
+        self.assertEqual(doc_ids[0], first_id)
+        self.assertNotEqual(doc_ids[1], first_id)
+        self.assertEqual([p['contenido'] for p in self.storage.get_document(doc_ids[0])['paginas']], ['Versión 2'])
+        self.assertEqual([p['contenido'] for p in self.storage.get_document(doc_ids[1])['paginas']], ['Versión 1'])
+        self.assertEqual(self.storage.get_document(doc_ids[1])['ruta_archivo'], '/tmp/copia.pdf')
+    
+    def test_save_documents_atomic_rolls_back_batch(self):
+        """Verifica que en modo atómico un error deshace el lote completo"""
+        documents = [
+            {'nombre_archivo': 'ok.pdf', 'ruta_archivo': '/tmp/ok.pdf', 'num_paginas': 1,
+             'paginas': [{'numero_pagina': 1, 'contenido': 'Content'}]},
+            {'nombre_archivo': 'mal.pdf', 'ruta_archivo': '/tmp/mal.pdf', 'num_paginas': None,
+             'paginas': []}
+        ]
+        
+        with self.assertRaises(Exception):
+            self.storage.save_documents(documents, atomic=True)
+        
+        self.assertEqual(len(self.storage.list_documents()), 0)
+    
+    def test_save_documents_per_document_failures(self):
+        """Verifica que fuera del modo atómico solo fallan los documentos erróneos"""
+        documents = [
+            {'nombre_archivo': 'ok.pdf', 'ruta_archivo': '/tmp/ok.pdf', 'num_paginas': 1,
+             'paginas': [{'numero_pagina': 1, 'contenido': 'Content'}]},
+            {'nombre_archivo': 'mal.pdf', 'ruta_archivo': '/tmp/mal.pdf', 'num_paginas': None,
+             'paginas': []}
+        ]
+        
+        doc_ids = self.storage.save_documents(documents, atomic=False)
+        
+        self.assertIsInstance(doc_ids[0], int)
+        self.assertIsNone(doc_ids[1])
+        self.assertEqual(len(self.storage.list_documents()), 1)
+    
+    def _count_queries(self, func):
+        """Ejecuta func y devuelve su resultado y el número de consultas SQL emitidas"""
+        from sqlalchemy import event
+        
+        statements = []
+        
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(self.db_manager.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            result = func()
+        finally:
+            event.remove(self.db_manager.engine, 'before_cursor_execute', before_cursor_execute)
+        
+        return result, len(statements)
+    
+    def _save_many(self, count: int, pages: int = 3):
+        """Guarda count documentos llamados informe_<i>.pdf"""
+        self.storage.save_documents([{
+            'nombre_archivo': f'informe_{i}.pdf',
+            'ruta_archivo': f'/tmp/informe_{i}.pdf',
+            'num_paginas': pages,
+            'paginas': [{'numero_pagina': p + 1, 'contenido': f'Página {p + 1}'} for p in range(pages)]
+        } for i in range(count)])
+    
+    def test_concurrent_writers(self):
+        """Verifica que varios hilos guardan a la vez sin errores de bloqueo"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        def write(worker):
+            for i in range(10):
+                self.storage.save_document({
+                    'nombre_archivo': f'hilo_{worker}_{i}.pdf',
+                    'ruta_archivo': f'/tmp/hilo_{worker}_{i}.pdf',
+                    'num_paginas': 1,
+                    'paginas': [{'numero_pagina': 1, 'contenido': 'Contenido'}]
+                })
+        
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(write, range(4)))
+        
+        self.assertEqual(len(self.storage.list_documents()), 40)
+    
+    def test_search_by_filename_query_count(self):
+        """Verifica que buscar no emite una consulta por documento encontrado"""
+        self._save_many(10)
+        
+        results, queries = self._count_queries(lambda: self.storage.search_by_filename('informe'))
+        
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(len(doc['paginas']) == 3 for doc in results))
+        self.assertLessEqual(queries, 2)
+    
+    def test_list_documents_single_query(self):
+        """Verifica que el listado se resuelve con una única consulta"""
+        self._save_many(10)
+        
+        docs, queries = self._count_queries(self.storage.list_documents)
+        
+        self.assertEqual(len(docs), 10)
+        self.assertEqual(queries, 1)
+    
+    def test_headers_only(self):
+        """Verifica la lectura de cabeceras sin el texto de las páginas"""
+        self._save_many(2)
+        
+        results, queries = self._count_queries(
+            lambda: self.storage.search_by_filename('informe', include_pages=False)
+        )
+        self.assertEqual(queries, 1)
+        self.assertEqual(len(results), 2)
+        self.assertNotIn('paginas', results[0])
+        
+        header = self.storage.get_document(results[0]['id'], include_pages=False)
+        self.assertEqual(header['nombre_archivo'], results[0]['nombre_archivo'])
+        self.assertNotIn('paginas', header)
+    
+    def test_search_content(self):
+        """Verifica la búsqueda de texto completo con ranking y fragmentos"""
+        self.storage.save_documents([
+            {'nombre_archivo': 'luz.pdf', 'ruta_archivo': '/tmp/luz.pdf', 'num_paginas': 2,
+             'paginas': [
+                 {'numero_pagina': 1, 'contenido': 'Factura de electricidad. Término de energía consumida'},
+                 {'numero_pagina': 2, 'contenido': 'Energía, energía y más energía'}
+             ]},
+            {'nombre_archivo': 'agua.pdf', 'ruta_archivo': '/tmp/agua.pdf', 'num_paginas': 1,
+             'paginas': [{'numero_pagina': 1, 'contenido': 'Factura de agua del trimestre'}]}
+        ])
+        
+        results = self.storage.search_content('energia')
+        
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]['numero_pagina'], 2)
+        self.assertEqual(results[0]['nombre_archivo'], 'luz.pdf')
+        self.assertIn('[Energía]', results[0]['fragmento'])
+        
+        self.assertEqual(len(self.storage.search_content('factura', limit=1)), 1)
+        self.assertEqual(len(self.storage.search_content('factura', limit=1, offset=1)), 1)
+        self.assertEqual(len(self.storage.search_content('factura agua')), 1)
+        self.assertEqual(self.storage.search_content('"(*'), [])
+    
+    def test_search_content_stays_in_sync(self):
+        """Verifica que el índice se actualiza al reemplazar y eliminar documentos"""
+        document_data = {
+            'nombre_archivo': 'test.pdf',
+            'ruta_archivo': '/tmp/test.pdf',
+            'num_paginas': 1,
+            'paginas': [{'numero_pagina': 1, 'contenido': 'texto antiguo'}]
+        }
+        doc_id = self.storage.save_document(document_data)
+        
+        document_data['paginas'] = [{'numero_pagina': 1, 'contenido': 'texto nuevo'}]
+        self.storage.save_document(document_data)
+        
+        self.assertEqual(self.storage.search_content('antiguo'), [])
+        self.assertEqual(len(self.storage.search_content('nuevo')), 1)
+        
+        self.storage.delete_document(doc_id)
+        self.assertEqual(self.storage.search_content('texto'), [])
+    
+    def test_invoice_texts_and_results(self):
+        """Verifica el análisis por lotes sobre el texto guardado y su invalidación"""
+        self._save_many(5)
+        
+        batches = list(self.storage.iter_invoice_texts(batch_size=2, version=PARSER_VERSION))
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(batches[0][0][1], 'Página 1\nPágina 2\nPágina 3')
+        
+        for batch in batches:
+            self.assertEqual(self.storage.save_invoices(parse_invoice_batch(batch)), len(batch))
+        self.assertEqual(list(self.storage.iter_invoice_texts(version=PARSER_VERSION)), [])
+        self.assertEqual(len(list(self.storage.iter_invoice_texts())[0]), 5)
+        
+        # Al reemplazar el documento, su factura deja de ser válida
+        doc_id = batches[0][0][0]
+        self.assertEqual(self.storage.get_invoice(doc_id)['version_analizador'], PARSER_VERSION)
+        self._save_many(1)
+        self.assertIsNone(self.storage.get_invoice(doc_id))
+        
+        self.assertTrue(self.storage.delete_document(batches[0][1][0]))
+        self.assertIsNone(self.storage.get_invoice(batches[0][1][0]))
+    
+    def test_list_documents_page(self):
+        """Verifica la paginación por cursor y los filtros del listado"""
+        from datetime import timedelta
+        
+        self.storage.save_documents([
+            {'nombre_archivo': f'doc_{i}.pdf', 'ruta_archivo': f'/tmp/doc_{i}.pdf', 'num_paginas': i % 4 + 1,
+             'autor': 'Naturgy' if i % 2 else 'Iberdrola', 'titulo': 'Factura de gas' if i % 3 == 0 else 'Otro',
+             'paginas': []}
+            for i in range(12)
+        ])
+        
+        # Todos con la misma fecha de procesamiento: el ID desempata
+        pages = list(self.storage.iter_document_pages(page_size=5))
+        self.assertEqual([len(page) for page in pages], [5, 5, 2])
+        ids = [doc['id'] for page in pages for doc in page]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), 12)
+        
+        page = self.storage.list_documents_page(limit=3, autor='Naturgy', min_paginas=2)
+        self.assertTrue(all(doc['autor'] == 'Naturgy' and doc['num_paginas'] >= 2 for doc in page['documentos']))
+        rest = self.storage.list_documents_page(limit=3, cursor=page['siguiente'], autor='Naturgy', min_paginas=2)
+        self.assertEqual(len(page['documentos']) + len(rest['documentos']), 6)
+        self.assertIsNone(rest['siguiente'])
+        
+        self.assertEqual(len(self.storage.list_documents_page(titulo='DE GAS')['documentos']), 4)
+        self.assertEqual(self.storage.list_documents_page(titulo='%')['documentos'], [])
+        self.assertEqual(len(self.storage.list_documents_page(hasta=datetime.utcnow().date())['documentos']), 12)
+        self.assertEqual(self.storage.list_documents_page(desde=datetime.utcnow().date() + timedelta(days=1))['documentos'], [])
+        
+        with self.assertRaises(ValueError):
+            self.storage.list_documents_page(cursor='no-es-un-cursor')
+    
+    def test_blob_page_storage(self):
+        """Verifica el modo 'blob': textos compartidos, lectura transparente y purga"""
+        from sqlalchemy import func, select
+        from models import ContenidoPagina
+        
+        storage = DatabaseStorage(self.db_manager, page_storage='blob')
+        legal = 'Condiciones generales del contrato de suministro de energía eléctrica'
+        doc_ids = storage.save_documents([
+            {'nombre_archivo': f'factura_{mes}.pdf', 'ruta_archivo': f'/tmp/factura_{mes}.pdf', 'num_paginas': 3,
+             'paginas': [
+                 {'numero_pagina': 1, 'contenido': f'Factura del mes {mes}'},
+                 {'numero_pagina': 2, 'contenido': legal},
+                 {'numero_pagina': 3, 'contenido': ''}
+             ]}
+            for mes in range(1, 4)
+        ])
+        
+        with self.db_manager.engine.connect() as connection:
+            self.assertEqual(connection.scalar(select(func.count()).select_from(ContenidoPagina)), 4)
+        
+        documento = storage.get_document(doc_ids[0])
+        self.assertEqual([p['contenido'] for p in documento['paginas']], ['Factura del mes 1', legal, ''])
+        self.assertEqual(self.storage.get_document(doc_ids[1])['paginas'][1]['contenido'], legal)
+        self.assertEqual(list(storage.iter_invoice_texts(batch_size=1))[0][0][1], f'Factura del mes 1\n{legal}\n')
+        
+        results = storage.search_content('suministro electrica')
+        self.assertEqual(sorted(r['documento_id'] for r in results), doc_ids)
+        self.assertIn('[suministro]', results[0]['fragmento'])
+        self.assertEqual(len(storage.search_content('mes', limit=2, offset=2)), 1)
+        
+        # Reemplazar y borrar documentos elimina los textos que ya nadie usa
+        storage.save_document({'nombre_archivo': 'factura_1.pdf', 'ruta_archivo': '/tmp/factura_1.pdf',
+                               'num_paginas': 1, 'paginas': [{'numero_pagina': 1, 'contenido': 'Nueva'}]})
+        self.assertEqual(storage.search_content('"mes 1"'), [])
+        storage.delete_document(doc_ids[1])
+        storage.delete_document(doc_ids[2])
+        self.assertEqual(storage.search_content('suministro'), [])
+        with self.db_manager.engine.connect() as connection:
+            self.assertEqual(connection.scalar(select(func.count()).select_from(ContenidoPagina)), 1)
+        self.assertEqual(storage.purge_contents(), 0)
+    
+    def test_search_ranks_inline_and_blob_pages_together(self):
+        """Verifica que las páginas 'inline' y 'blob' se puntúan en la misma escala"""
+        blob_storage = DatabaseStorage(self.db_manager, page_storage='blob')
+        texto = 'Condiciones generales del contrato de suministro'
+        for storage, nombre in ((self.storage, 'inline'), (blob_storage, 'blob')):
+            storage.save_documents([
+                {'nombre_archivo': f'{nombre}_{i}.pdf', 'ruta_archivo': f'/tmp/{nombre}_{i}.pdf', 'num_paginas': 1,
+                 'paginas': [{'numero_pagina': 1, 'contenido': texto if i == 0 else f'Suministro {nombre} {i}'}]}
+                for i in range(3)
+            ])
+        
+        results = self.storage.search_content('condiciones suministro')
+        self.assertEqual(sorted(r['nombre_archivo'] for r in results), ['blob_0.pdf', 'inline_0.pdf'])
+        self.assertEqual(results[0]['puntuacion'], results[1]['puntuacion'])
+        
+        results = self.storage.search_content('suministro')
+        self.assertEqual(len(results), 6)
+        self.assertEqual([r['puntuacion'] for r in results], sorted((r['puntuacion'] for r in results), reverse=True))
+        self.assertEqual(
+            [r['nombre_archivo'] for r in self.storage.search_content('suministro', limit=2, offset=4)],
+            [r['nombre_archivo'] for r in results[4:]]
+        )
+    
+    def test_invalid_page_storage(self):
+        """Verifica que un modo de almacenamiento de páginas desconocido se rechaza"""
+        with self.assertRaises(ValueError):
+            DatabaseStorage(self.db_manager, page_storage='zip')
+    
     def test_delete_nonexistent_document(self):
         """Verifica que eliminar un documento inexistente retorna False"""
         result = self.storage.delete_document(9999)
         self.assertFalse(result)
 
 
+@unittest.skipIf(aiosqlite is None, 'aiosqlite no está instalado')
+class TestAsyncDatabaseStorage(unittest.TestCase):
+    """Tests para el almacenamiento asíncrono en base de datos"""
+    
+    def setUp(self):
+        """Configurar base de datos temporal para cada test"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_url = f"sqlite:///{Path(self.temp_dir) / 'async.db'}"
+    
+    def tearDown(self):
+        """Limpiar después de cada test"""
+        shutil.rmtree(self.temp_dir)
+    
+    def _document(self, i, contenido='Contenido'):
+        return {
+            'nombre_archivo': f'tarea_{i}.pdf',
+            'ruta_archivo': f'/tmp/tarea_{i}.pdf',
+            'num_paginas': 2,
+            'hash_contenido': f'{i:064x}',
+            'paginas': [
+                {'numero_pagina': 1, 'contenido': contenido},
+                {'numero_pagina': 2, 'contenido': 'Página 2'}
+            ]
+        }
+    
+    def _run(self, test):
+        """Ejecuta test(storage) en un bucle de eventos nuevo"""
+        async def main():
+            async with AsyncDatabaseStorage(self.db_url) as storage:
+                return await test(storage)
+        return asyncio.run(main())
+    
+    def test_save_and_read(self):
+        """Verifica guardar, leer, buscar y eliminar de forma asíncrona"""
+        async def test(storage):
+            doc_id = await storage.save_document(self._document(1))
+            
+            document = await storage.get_document(doc_id)
+            self.assertEqual(document['nombre_archivo'], 'tarea_1.pdf')
+            self.assertEqual([p['numero_pagina'] for p in document['paginas']], [1, 2])
+            self.assertNotIn('paginas', await storage.get_document(doc_id, include_pages=False))
+            self.assertIsNone(await storage.get_document(9999))
+            
+            self.assertEqual(len(await storage.search_by_filename('tarea')), 1)
+            self.assertEqual(await storage.search_by_filename('otro'), [])
+            
+            self.assertTrue(await storage.delete_document(doc_id))
+            self.assertFalse(await storage.delete_document(doc_id))
+            self.assertEqual(await storage.list_documents(), [])
+        
+        self._run(test)
+    
+    def test_upsert_matches_sync_storage(self):
+        """Verifica que volver a guardar actualiza y que el backend síncrono lo ve igual"""
+        async def test(storage):
+            doc_id = await storage.save_document(self._document(1, 'antiguo'))
+            self.assertEqual(await storage.save_document(self._document(1, 'nuevo')), doc_id)
+            return doc_id
+        
+        doc_id = self._run(test)
+        db_manager = DatabaseManager(self.db_url, engine=create_database_engine(self.db_url))
+        sync_storage = DatabaseStorage(db_manager)
+        
+        self.assertEqual(len(sync_storage.list_documents()), 1)
+        self.assertEqual(sync_storage.get_document(doc_id)['paginas'][0]['contenido'], 'nuevo')
+        self.assertEqual(sync_storage.search_content('antiguo'), [])
+        db_manager.engine.dispose()
+    
+    def test_blob_contents_purged(self):
+        """Verifica que reemplazar y borrar en una BD con páginas 'blob' no deja textos huérfanos"""
+        from sqlalchemy import func, select
+        from models import ContenidoPagina
+        
+        db_manager = DatabaseManager(self.db_url, engine=create_database_engine(self.db_url))
+        sync_storage = DatabaseStorage(db_manager, page_storage='blob')
+        doc_ids = [sync_storage.save_document(self._document(i, f'antiguo {i}')) for i in (1, 2)]
+        
+        async def test(storage):
+            await storage.save_document(self._document(1, 'nuevo'))
+            self.assertTrue(await storage.delete_document(doc_ids[1]))
+            self.assertEqual((await storage.get_document(doc_ids[0]))['paginas'][0]['contenido'], 'nuevo')
+        
+        self._run(test)
+        self.assertEqual(sync_storage.search_content('antiguo'), [])
+        self.assertEqual(len(sync_storage.search_content('nuevo')), 1)
+        with db_manager.engine.connect() as connection:
+            # El documento reemplazado guarda ahora el texto en sus páginas
+            self.assertEqual(connection.scalar(select(func.count()).select_from(ContenidoPagina)), 0)
+        self.assertEqual(sync_storage.purge_contents(), 0)
+        db_manager.engine.dispose()
+    
+    def test_concurrent_tasks(self):
+        """Verifica que varias tareas guardan a la vez sin errores de bloqueo"""
+        async def test(storage):
+            doc_ids = await asyncio.gather(*(storage.save_document(self._document(i)) for i in range(40)))
+            self.assertEqual(len(set(doc_ids)), 40)
+            self.assertEqual(len(await storage.list_documents()), 40)
+        
+        self._run(test)
+
+
+class TestMonthlyRollup(unittest.TestCase):
+    """Tests para el resumen mensual de facturas"""
+    
+    HOGAR_A = 'ES0021000012345678LB'
+    HOGAR_B = 'ES0021000087654321QZ'
+    
+    def setUp(self):
+        """Base de datos temporal con un documento por factura"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.db_manager = DatabaseManager(f"sqlite:///{self.temp_dir / 'test.db'}")
+        self.storage = DatabaseStorage(self.db_manager)
+        self.doc_ids = self.storage.save_documents([
+            {'nombre_archivo': f'f{i}.pdf', 'ruta_archivo': f'/tmp/f{i}.pdf', 'num_paginas': 1,
+             'paginas': [{'numero_pagina': 1, 'contenido': f'factura {i}'}]}
+            for i in range(6)
+        ])
+    
+    def tearDown(self):
+        """Limpiar"""
+        self.db_manager.engine.dispose()
+        shutil.rmtree(self.temp_dir)
+    
+    def _invoice(self, index, hogar, fin, importe, kwh=100.0, categoria='electricidad', proveedor='naturgy'):
+        from datetime import date
+        from decimal import Decimal
+        
+        return {
+            'documento_id': self.doc_ids[index], 'proveedor': proveedor, 'categoria': categoria, 'cups': hogar,
+            'importe_total': Decimal(importe), 'periodo_inicio': None, 'periodo_fin': date.fromisoformat(fin),
+            'consumo_kwh': kwh, 'confianza': {}, 'version_analizador': PARSER_VERSION
+        }
+    
+    def _save_sample(self):
+        self.storage.save_invoices([
+            self._invoice(0, self.HOGAR_A, '2025-01-31', '50.10'),
+            self._invoice(1, self.HOGAR_A, '2025-01-15', '20.05', 30.5, categoria='gas'),
+            self._invoice(2, self.HOGAR_A, '2025-02-28', '45.00'),
+            self._invoice(3, self.HOGAR_B, '2025-01-31', '99.99', proveedor=None),
+            # Sin CUPS no se sabe de qué hogar es: no cuenta
+            self._invoice(4, None, '2025-01-31', '10.00'),
+        ])
+    
+    def test_summary_by_household(self):
+        """Verifica los totales y el desglose de un hogar y de todos"""
+        from datetime import date
+        
+        self._save_sample()
+        
+        resumen = self.storage.monthly_summary(self.HOGAR_A)
+        self.assertEqual([mes['mes'] for mes in resumen], ['2025-01', '2025-02'])
+        self.assertEqual(resumen[0]['num_facturas'], 2)
+        self.assertEqual(resumen[0]['importe_total'], 70.15)
+        self.assertEqual(resumen[0]['consumo_kwh'], 130.5)
+        self.assertEqual(
+            [(d['categoria'], d['proveedor'], d['importe_total']) for d in resumen[0]['desglose']],
+            [('electricidad', 'naturgy', 50.1), ('gas', 'naturgy', 20.05)]
+        )
+        
+        todos = self.storage.monthly_summary(desde=date(2025, 1, 20), hasta=date(2025, 1, 20))
+        self.assertEqual(len(todos), 1)
+        self.assertEqual(todos[0]['num_facturas'], 3)
+        self.assertEqual(todos[0]['importe_total'], 170.14)
+        self.assertIn(('electricidad', 'desconocido'), [(d['categoria'], d['proveedor']) for d in todos[0]['desglose']])
+        self.assertEqual(self.storage.monthly_summary(self.HOGAR_A, desde=date(2025, 2, 1))[0]['mes'], '2025-02')
+        self.assertEqual(self.storage.monthly_summary('ES0000'), [])
+    
+    def test_incremental_changes_match_rebuild(self):
+        """Verifica el resumen tras volver a analizar, reemplazar y borrar documentos"""
+        self._save_sample()
+        
+        # Un nuevo análisis cambia el importe de una factura y el mes de otra
+        self.storage.save_invoices([
+            self._invoice(0, self.HOGAR_A, '2025-01-31', '60.10'),
+            self._invoice(2, self.HOGAR_A, '2025-03-31', '45.00'),
+        ])
+        resumen = self.storage.monthly_summary(self.HOGAR_A)
+        self.assertEqual([(mes['mes'], mes['importe_total']) for mes in resumen], [('2025-01', 80.15), ('2025-03', 45.0)])
+        
+        # Reemplazar el PDF invalida su factura; borrar el documento la quita
+        self.storage.save_document({
+            'nombre_archivo': 'f1.pdf', 'ruta_archivo': '/tmp/f1.pdf', 'num_paginas': 1, 'paginas': []
+        })
+        self.storage.delete_document(self.doc_ids[3])
+        self.assertEqual(self.storage.monthly_summary(self.HOGAR_A)[0]['desglose'][0]['importe_total'], 60.1)
+        self.assertEqual(len(self.storage.monthly_summary(self.HOGAR_A)[0]['desglose']), 1)
+        self.assertEqual(self.storage.monthly_summary(self.HOGAR_B), [])
+        
+        informe = self.storage.rebuild_rollups()
+        self.assertEqual(informe, {'hogares': 1, 'filas': 2, 'insertadas': 0, 'corregidas': 0, 'eliminadas': 0})
+    
+    def test_rebuild_fixes_drift(self):
+        """Verifica que la reconstrucción corrige filas desviadas, perdidas y huérfanas"""
+        from sqlalchemy import text
+        
+        self._save_sample()
+        esperado = self.storage.monthly_summary()
+        
+        with self.db_manager.engine.begin() as connection:
+            connection.execute(text("UPDATE resumen_mensual SET importe_total = 1 WHERE hogar = :h"), {'h': self.HOGAR_B})
+            connection.execute(text("DELETE FROM resumen_mensual WHERE categoria = 'gas'"))
+            connection.execute(text(
+                "INSERT INTO resumen_mensual (hogar, mes, categoria, proveedor, num_facturas, importe_total, "
+                "consumo_kwh) VALUES ('ES9', '2020-01-01', 'gas', 'x', 1, 5, 0)"
+            ))
+        
+        informe = self.storage.rebuild_rollups(batch_size=1)
+        self.assertEqual(informe, {'hogares': 2, 'filas': 4, 'insertadas': 1, 'corregidas': 1, 'eliminadas': 1})
+        self.assertEqual(self.storage.monthly_summary(), esperado)
+        self.assertEqual(self.storage.rebuild_rollups()['corregidas'], 0)
+
+
+class TestInvoiceParser(unittest.TestCase):
+    """Tests para el análisis de campos de factura"""
+    
+    def test_naturgy_invoice(self):
+        """Verifica los campos y la confianza con los patrones del proveedor"""
+        invoice = parse_invoice({'paginas': [{'numero_pagina': 1, 'contenido': NATURGY_INVOICE_TEXT}]})
+        
+        self.assertEqual(invoice['proveedor'], 'naturgy')
+        self.assertEqual(invoice['categoria'], 'electricidad')
+        self.assertEqual(str(invoice['importe_total']), '185.43')
+        self.assertEqual(invoice['periodo_inicio'].isoformat(), '2024-12-01')
+        self.assertEqual(invoice['periodo_fin'].isoformat(), '2025-01-31')
+        self.assertEqual(invoice['consumo_kwh'], 1245.0)
+        self.assertEqual(invoice['cups'], 'ES0021000012345678LB')
+        self.assertEqual(invoice['confianza'], {
+            'importe_total': 0.9, 'periodo': 0.9, 'consumo_kwh': 0.9, 'cups': 1.0
+        })
+    
+    def test_generic_patterns_have_lower_confidence(self):
+        """Verifica el uso de patrones genéricos con un proveedor desconocido"""
+        invoice = parse_invoice({'paginas': [
+            {'numero_pagina': 1, 'contenido': 'Comercializadora X. Total: 12,00 EUR'},
+            {'numero_pagina': 2, 'contenido': 'Consumo 3,5 kWh del 01/02/2025 al 28/02/2025'}
+        ]})
+        
+        self.assertIsNone(invoice['proveedor'])
+        self.assertEqual(str(invoice['importe_total']), '12.00')
+        self.assertEqual(invoice['consumo_kwh'], 3.5)
+        self.assertEqual(invoice['confianza']['importe_total'], 0.6)
+        self.assertEqual(invoice['confianza']['cups'], 0.0)
+    
+    def test_supply_category(self):
+        """Verifica la categoría de suministro según los términos de la factura"""
+        def categoria(texto):
+            return parse_invoice({'paginas': [{'numero_pagina': 1, 'contenido': texto}]})['categoria']
+        
+        self.assertEqual(categoria('Naturgy. Consumo de gas: 95 m3 (1.020 kWh). Tarifa RL.1'), 'gas')
+        self.assertEqual(categoria('Potencia contratada 4,6 kW, peaje 2.0TD'), 'electricidad')
+        self.assertIsNone(categoria('Total: 12,00 EUR'))
+    
+    def test_validation_lowers_confidence(self):
+        """Verifica que un CUPS incorrecto o un periodo invertido bajan la confianza"""
+        text = NATURGY_INVOICE_TEXT.replace('LB', 'XX').replace('del 01/12/2024 a 31/01/2025',
+                                                                 'del 31/01/2025 a 01/12/2024')
+        invoice = parse_invoice({'paginas': [{'numero_pagina': 1, 'contenido': text}]})
+        
+        self.assertEqual(invoice['confianza']['cups'], 0.3)
+        self.assertLess(invoice['confianza']['periodo'], 0.5)
+        self.assertTrue(validate_cups('ES0021000012345678LB'))
+        self.assertFalse(validate_cups('ES0021000012345678XX'))
+    
+    def test_parse_stored_invoices(self):
+        """Verifica el modo por lotes sobre los documentos de la base de datos"""
+        temp_dir = Path(tempfile.mkdtemp())
+        original_database = (Config.DATABASE_TYPE, Config.DATABASE_PATH)
+        Config.DATABASE_TYPE = 'sqlite'
+        Config.DATABASE_PATH = str(temp_dir / 'test.db')
+        
+        try:
+            db_manager = DatabaseManager(Config.get_database_url())
+            storage = DatabaseStorage(db_manager)
+            doc_ids = storage.save_documents([{
+                'nombre_archivo': f'factura_{i}.pdf',
+                'ruta_archivo': f'/tmp/factura_{i}.pdf',
+                'num_paginas': 1,
+                'paginas': [{'numero_pagina': 1, 'contenido': NATURGY_INVOICE_TEXT}]
+            } for i in range(3)])
+            
+            resumen = parse_stored_invoices(workers=2, batch_size=2)
+            self.assertEqual(resumen['analizadas'], 3)
+            self.assertEqual(resumen['encontrados']['cups'], 1.0)
+            self.assertEqual(storage.get_invoice(doc_ids[2])['importe_total'], 185.43)
+            
+            self.assertEqual(parse_stored_invoices()['analizadas'], 0)
+            self.assertEqual(parse_stored_invoices(reparse=True)['analizadas'], 3)
+            db_manager.engine.dispose()
+        finally:
+            Config.DATABASE_TYPE, Config.DATABASE_PATH = original_database
+            shutil.rmtree(temp_dir)
+
+
+class TestProcessDirectory(unittest.TestCase):
+    """Tests para el procesamiento de directorios"""
+    
+    def setUp(self):
+        """Preparar directorio de entrada con PDFs de muestra y uno corrupto"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.input_dir = self.temp_dir / 'pdfs'
+        self.input_dir.mkdir()
+        self.original_output_dir = Config.JSON_OUTPUT_DIR
+        self.original_manifest_path = Config.MANIFEST_PATH
+        self.original_parquet_dir = Config.PARQUET_OUTPUT_DIR
+        self.original_jsonl_dir = Config.JSONL_OUTPUT_DIR
+        self.original_database = (Config.DATABASE_TYPE, Config.DATABASE_PATH)
+        Config.JSON_OUTPUT_DIR = self.temp_dir / 'output_json'
+        Config.PARQUET_OUTPUT_DIR = self.temp_dir / 'output_parquet'
+        Config.JSONL_OUTPUT_DIR = self.temp_dir / 'output_jsonl'
+        Config.MANIFEST_PATH = self.temp_dir / 'manifest.json'
+        Config.DATABASE_TYPE = 'sqlite'
+        Config.DATABASE_PATH = str(self.temp_dir / 'test.db')
+        
+        for pdf in sorted(SAMPLE_PDFS_DIR.glob('*.pdf'))[:2]:
+            shutil.copy(pdf, self.input_dir / pdf.name)
+        (self.input_dir / 'corrupto.pdf').write_bytes(b'no es un pdf')
+    
+    def tearDown(self):
+        """Limpiar después de cada test"""
+        Config.JSON_OUTPUT_DIR = self.original_output_dir
+        Config.MANIFEST_PATH = self.original_manifest_path
+        Config.PARQUET_OUTPUT_DIR = self.original_parquet_dir
+        Config.JSONL_OUTPUT_DIR = self.original_jsonl_dir
+        Config.DATABASE_TYPE, Config.DATABASE_PATH = self.original_database
+        shutil.rmtree(self.temp_dir)
+    
+    def test_process_directory_sequential(self):
+        """Verifica el recuento de archivos correctos y fallidos en modo secuencial"""
+        resumen = process_directory(self.input_dir, 'json', workers=1)
+        
+        self.assertEqual(resumen, {'exitosos': 2, 'fallidos': 1, 'omitidos': 0})
+        self.assertEqual(len(list(Config.JSON_OUTPUT_DIR.glob('*.json'))), 2)
+    
+    def test_process_directory_parallel(self):
+        """Verifica que el modo multiproceso guarda los mismos documentos"""
+        resumen = process_directory(self.input_dir, 'json', workers=2)
+        
+        self.assertEqual(resumen, {'exitosos': 2, 'fallidos': 1, 'omitidos': 0})
+        self.assertEqual(len(list(Config.JSON_OUTPUT_DIR.glob('*.json'))), 2)
+    
+    def test_process_directory_database_batches(self):
+        """Verifica el guardado en base de datos por lotes desde process_directory"""
+        resumen = process_directory(self.input_dir, 'database', db_batch_size=2)
+        
+        self.assertEqual(resumen, {'exitosos': 2, 'fallidos': 1, 'omitidos': 0})
+        
+        db_manager = DatabaseManager(Config.get_database_url())
+        self.assertEqual(len(DatabaseStorage(db_manager).list_documents()), 2)
+        db_manager.engine.dispose()
+    
+    def test_process_directory_profile(self):
+        """Verifica el informe de tiempos por etapa y los perfiles de las extracciones más lentas"""
+        import pstats
+        
+        profiler = profiling.Profiler(slowest=1)
+        profiling.enable(profiler)
+        try:
+            process_directory(self.input_dir, 'json', workers=2)
+        finally:
+            profiling.disable()
+        
+        report = profiler.save(self.temp_dir / 'informe.json')
+        
+        self.assertEqual(report['num_archivos'], 2)
+        self.assertTrue({'carga', 'preparacion', 'pagina', 'guardado', 'serializacion'} <= set(report['etapas']))
+        self.assertEqual(
+            sum(archivo['paginas'] for archivo in report['archivos']),
+            report['etapas']['pagina']['mediciones']
+        )
+        self.assertEqual(json.loads((self.temp_dir / 'informe.json').read_text())['num_archivos'], 2)
+        self.assertEqual(len(report['perfiles']), 1)
+        self.assertGreater(pstats.Stats(report['perfiles'][0]['perfil']).total_calls, 0)
+    
+    def test_process_directory_pipeline(self):
+        """Verifica la ingesta en etapas en JSON y BD, con y sin lotes"""
+        for db_batch_size in (1, 4):
+            resumen = process_directory(self.input_dir, 'both', force=True, db_batch_size=db_batch_size, pipeline=True)
+            self.assertEqual(resumen, {'exitosos': 2, 'fallidos': 1, 'omitidos': 0})
+        
+        db_storage = DatabaseStorage(DatabaseManager(Config.get_database_url()))
+        self.assertEqual(len(db_storage.list_documents()), 2)
+        self.assertGreaterEqual(len(JSONStorage(Config.JSON_OUTPUT_DIR).list_documents()), 2)
+        
+        resumen = process_directory(self.input_dir, 'both', pipeline=True)
+        self.assertEqual(resumen, {'exitosos': 0, 'fallidos': 1, 'omitidos': 2})
+    
+    def test_unchanged_files_are_skipped(self):
+        """Verifica que una segunda ejecución omite los PDFs sin cambios"""
+        process_directory(self.input_dir, 'json')
+        resumen = process_directory(self.input_dir, 'json')
+        
+        self.assertEqual(resumen, {'exitosos': 0, 'fallidos': 1, 'omitidos': 2})
+    
+    def test_modified_file_is_reprocessed(self):
+        """Verifica que un PDF modificado se vuelve a extraer"""
+        process_directory(self.input_dir, 'json')
+        
+        pdf = sorted(self.input_dir.glob('Naturgy*.pdf'))[0]
+        with open(pdf, 'ab') as f:
+            f.write(b'\n')
+        
+        resumen = process_directory(self.input_dir, 'json')
+        self.assertEqual(resumen['exitosos'], 1)
+        self.assertEqual(resumen['omitidos'], 1)
+    
+    def test_file_rewritten_during_extraction(self):
+        """Verifica que un PDF reescrito mientras se extraía no se da por procesado"""
+        pdf = sorted(self.input_dir.glob('Naturgy*.pdf'))[0]
+        document_data = extract_pdf(pdf)
+        with open(pdf, 'ab') as f:
+            f.write(b'\n')
+        
+        manifest = IngestionManifest(Config.MANIFEST_PATH)
+        manifest.record(pdf, document_data['hash_contenido'], ['json'], document_data['firma_archivo'])
+        self.assertTrue(manifest.needs_processing(pdf, ['json']))
+        
+        # Sin la firma de la extracción tampoco se registra
+        manifest = IngestionManifest(Config.MANIFEST_PATH)
+        manifest.record(pdf, document_data['hash_contenido'], ['json'])
+        self.assertTrue(manifest.needs_processing(pdf, ['json']))
+    
+    def test_renamed_and_copied_files_are_skipped(self):
+        """Verifica que un PDF renombrado o copiado no se vuelve a extraer"""
+        process_directory(self.input_dir, 'json')
+        
+        pdf = sorted(self.input_dir.glob('Naturgy*.pdf'))[0]
+        shutil.copy(pdf, self.input_dir / 'copia.pdf')
+        pdf.rename(self.input_dir / 'renombrado.pdf')
+        
+        resumen = process_directory(self.input_dir, 'json')
+        self.assertEqual(resumen, {'exitosos': 0, 'fallidos': 1, 'omitidos': 3})
+    
+    def test_legacy_manifest_is_loaded(self):
+        """Verifica que se lee el manifiesto anterior, indexado por ruta"""
+        pdf = sorted(self.input_dir.glob('Naturgy*.pdf'))[0]
+        entry = {'hash': compute_file_hash(pdf), **file_signature(pdf.stat()), 'almacenamientos': ['json']}
+        Config.MANIFEST_PATH.write_text(json.dumps({str(pdf.absolute()): entry}))
+        
+        manifest = IngestionManifest(Config.MANIFEST_PATH)
+        self.assertFalse(manifest.needs_processing(pdf, ['json']))
+        self.assertTrue(manifest.needs_processing(pdf, ['json', 'database']))
+    
+    def test_new_storage_is_not_skipped(self):
+        """Verifica que un PDF guardado solo en JSON se procesa para la BD"""
+        process_directory(self.input_dir, 'json')
+        
+        manifest = IngestionManifest(Config.MANIFEST_PATH)
+        pdf = sorted(self.input_dir.glob('Naturgy*.pdf'))[0]
+        self.assertFalse(manifest.needs_processing(pdf, ['json']))
+        self.assertTrue(manifest.needs_processing(pdf, ['json', 'database']))
+    
+    def test_force_bypasses_manifest(self):
+        """Verifica que force reprocesa todos los PDFs"""
+        process_directory(self.input_dir, 'json')
+        resumen = process_directory(self.input_dir, 'json', force=True)
+        
+        self.assertEqual(resumen, {'exitosos': 2, 'fallidos': 1, 'omitidos': 0})
+    
+    @unittest.skipIf(pa is None, 'pyarrow no está instalado')
+    def test_process_directory_parquet(self):
+        """Verifica la exportación a Parquet y su registro en el manifiesto"""
+        resumen = process_directory(self.input_dir, 'parquet')
+        
+        self.assertEqual(resumen, {'exitosos': 2, 'fallidos': 1, 'omitidos': 0})
+        self.assertEqual(len(ParquetStorage(Config.PARQUET_OUTPUT_DIR).list_documents()), 2)
+        self.assertEqual(process_directory(self.input_dir, 'parquet')['omitidos'], 2)
+    
+    def test_process_directory_jsonl(self):
+        """Verifica el guardado en JSONL y que el índice queda escrito al terminar"""
+        resumen = process_directory(self.input_dir, 'jsonl', workers=2)
+        
+        self.assertEqual(resumen, {'exitosos': 2, 'fallidos': 1, 'omitidos': 0})
+        self.assertTrue((Config.JSONL_OUTPUT_DIR / 'index.json').exists())
+        self.assertEqual(len(JSONLStorage(Config.JSONL_OUTPUT_DIR).list_documents()), 2)
+    
+    def test_cache_reused_when_switching_storage(self):
+        """Verifica que al cambiar de almacenamiento no se vuelven a analizar los PDFs"""
+        cache = ExtractionCache(self.temp_dir / 'cache.db')
+        process_directory(self.input_dir, 'json', workers=2, cache=cache)
+        self.assertEqual(cache.stats()['entradas'], 2)
+        
+        with mock.patch('extractors.pdf_extractor.PDFExtractor.extract_full_document',
+                        side_effect=AssertionError):
+            resumen = process_directory(self.input_dir, 'database', cache=cache)
+        cache.close()
+        
+        self.assertEqual(resumen, {'exitosos': 2, 'fallidos': 1, 'omitidos': 0})
+
+
+class FakeStorage:
+    """Almacenamiento de prueba: guarda en memoria, falla o espera a una señal"""
+    
+    def __init__(self, fail_on: str = None, gate: threading.Event = None, error: type = ValueError):
+        self.saved = []
+        self.fail_on = fail_on
+        self.gate = gate
+        self.error = error
+    
+    def save_document(self, document_data: dict):
+        if self.gate is not None:
+            self.gate.wait(5)
+        if document_data['nombre_archivo'] == self.fail_on:
+            raise self.error(f"fallo en {self.fail_on}")
+        self.saved.append(document_data['nombre_archivo'])
+
+
+class FatalError(BaseException):
+    """Error inesperado que no es un fallo de un documento"""
+
+
+class TestIngestionPipeline(unittest.TestCase):
+    """Tests para la ingesta en etapas"""
+    
+    def setUp(self):
+        """Crear PDFs de prueba y el manifiesto"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.manifest = IngestionManifest(self.temp_dir / 'manifest.json')
+        self.json_storage = JSONStorage(self.temp_dir / 'output_json')
+        self.documents = []
+        for i in range(6):
+            pdf_file = self.temp_dir / f'factura_{i}.pdf'
+            pdf_file.write_bytes(b'%PDF' + bytes([i]))
+            self.documents.append((pdf_file, {
+                'nombre_archivo': pdf_file.name,
+                'num_paginas': 1,
+                'hash_contenido': compute_file_hash(pdf_file),
+                'firma_archivo': file_signature(pdf_file.stat()),
+                'paginas': [{'numero_pagina': 1, 'contenido': f'factura {i}'}]
+            }))
+    
+    def tearDown(self):
+        """Limpiar después de cada test"""
+        shutil.rmtree(self.temp_dir)
+    
+    def test_failed_branch_fails_document(self):
+        """Verifica que un documento solo se registra si todas sus ramas lo guardan"""
+        db_storage = FakeStorage(fail_on='factura_2.pdf')
+        
+        with IngestionPipeline(self.manifest, ['json', 'database'], self.json_storage, db_storage) as etapas:
+            for pdf_file, document_data in self.documents:
+                etapas.submit(pdf_file, document_data)
+        
+        self.assertEqual(etapas.resumen, {'exitosos': 5, 'fallidos': 1, 'descartados': 0})
+        self.assertEqual(db_storage.saved, [f'factura_{i}.pdf' for i in (0, 1, 3, 4, 5)])
+        self.assertEqual(len(self.json_storage.list_documents()), 6)
+        self.assertFalse(self.manifest.needs_processing(self.documents[0][0], ['json', 'database']))
+        self.assertTrue(self.manifest.needs_processing(self.documents[2][0], ['json', 'database']))
+    
+    def test_slow_backend_applies_backpressure(self):
+        """Verifica que submit espera cuando la cola de una etapa lenta está llena"""
+        gate = threading.Event()
+        etapas = IngestionPipeline(self.manifest, ['database'], db_storage=FakeStorage(gate=gate), queue_size=1)
+        
+        threading.Timer(0.3, gate.set).start()
+        with etapas:
+            for pdf_file, document_data in self.documents:
+                etapas.submit(pdf_file, document_data)
+        
+        stats = etapas.stats()
+        self.assertGreater(stats['espera_s'], 0.2)
+        self.assertEqual(stats['exitosos'], 6)
+        self.assertEqual(stats['etapas']['bd']['cola_max'], 1)
+    
+    def test_abort_discards_queued_documents(self):
+        """Verifica que un error en la extracción descarta lo encolado y detiene los hilos"""
+        gate = threading.Event()
+        etapas = IngestionPipeline(self.manifest, ['database'], db_storage=FakeStorage(gate=gate))
+        
+        threading.Timer(0.2, gate.set).start()
+        with self.assertRaises(KeyError):
+            with etapas:
+                for pdf_file, document_data in self.documents:
+                    etapas.submit(pdf_file, document_data)
+                raise KeyError('extracción interrumpida')
+        
+        self.assertFalse(any(stage.is_alive() for stage in etapas._stages))
+        self.assertEqual(etapas.resumen['exitosos'] + etapas.resumen['descartados'], 6)
+        self.assertGreater(etapas.resumen['descartados'], 0)
+    
+    def test_unexpected_error_stops_pipeline(self):
+        """Verifica que un error inesperado en una etapa detiene la ingesta"""
+        db_storage = FakeStorage(fail_on='factura_0.pdf', error=FatalError)
+        
+        with self.assertRaises(RuntimeError):
+            with IngestionPipeline(self.manifest, ['json', 'database'], self.json_storage, db_storage) as etapas:
+                for pdf_file, document_data in self.documents:
+                    time.sleep(0.05)
+                    etapas.submit(pdf_file, document_data)
+        
+        self.assertIsInstance(etapas.error, FatalError)
+        self.assertEqual(etapas.resumen['exitosos'], 0)
+        self.assertFalse(any(stage.is_alive() for stage in etapas._stages))
+
+
+class TestProfiling(unittest.TestCase):
+    """Tests para la instrumentación de la ingesta"""
+    
+    def tearDown(self):
+        profiling.disable()
+    
+    def test_disabled_is_noop(self):
+        """Verifica que sin perfil activo no se mide nada"""
+        self.assertIsNone(profiling.get_profiler())
+        self.assertIs(profiling.stage('carga'), profiling.stage('pagina'))
+        self.assertIs(profiling.track('a.pdf'), profiling.stage('carga'))
+    
+    def test_nested_stages_count_own_time(self):
+        """Verifica que cada etapa cuenta su tiempo propio y se atribuye a su PDF"""
+        profiler = profiling.Profiler()
+        profiling.enable(profiler)
+        
+        with profiling.track('a.pdf'):
+            with profiling.stage('guardado'):
+                time.sleep(0.02)
+                with profiling.stage('serializacion'):
+                    time.sleep(0.05)
+        with profiling.stage('guardado_lote'):
+            pass
+        
+        report = profiler.report()
+        self.assertEqual(report['num_archivos'], 1)
+        self.assertLess(report['etapas']['guardado']['total_s'], 0.05)
+        self.assertGreaterEqual(report['etapas']['serializacion']['total_s'], 0.05)
+        self.assertEqual(report['etapas']['guardado_lote']['mediciones'], 1)
+        
+        archivo = report['archivos'][0]
+        self.assertEqual(set(archivo['etapas_s']), {'guardado', 'serializacion'})
+        self.assertGreaterEqual(archivo['total_s'], 0.07)
+
+
+class TestFolderWatcher(unittest.TestCase):
+    """Tests para la ingesta continua (modo sondeo)"""
+    
+    def setUp(self):
+        """Preparar directorio vigilado con PDFs de muestra y uno corrupto"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.input_dir = self.temp_dir / 'pdfs'
+        self.input_dir.mkdir()
+        self.sample_pdfs = sorted(SAMPLE_PDFS_DIR.glob('*.pdf'))
+        for pdf in self.sample_pdfs[:2]:
+            shutil.copy(pdf, self.input_dir / pdf.name)
+        (self.input_dir / 'corrupto.pdf').write_bytes(b'no es un pdf')
+        self.stored = []
+    
+    def tearDown(self):
+        """Limpiar después de cada test"""
+        shutil.rmtree(self.temp_dir)
+    
+    def _watcher(self) -> FolderWatcher:
+        manifest = IngestionManifest(self.temp_dir / 'manifest.json')
+        return FolderWatcher(
+            self.input_dir, self.stored.append, manifest, ['json'],
+            debounce=0.3, poll_interval=0.05, use_notifications=False
+        )
+    
+    def test_existing_and_new_files(self):
+        """Verifica que se procesan los PDFs presentes y los que llegan, cuando terminan de escribirse"""
+        with self._watcher() as watcher:
+            self.assertTrue(watcher.wait_idle(timeout=30))
+            self.assertEqual(len(self.stored), 2)
+            
+            # Un PDF copiado en dos partes solo se procesa completo
+            data = self.sample_pdfs[2].read_bytes()
+            with open(self.input_dir / 'nuevo.pdf', 'wb') as f:
+                f.write(data[:len(data) // 2])
+                f.flush()
+                time.sleep(0.15)
+                f.write(data[len(data) // 2:])
+            (self.input_dir / 'notas.txt').write_text('no es un PDF')
+            
+            # El sondeo lo detecta y se procesa sin más intervención
+            limite = time.monotonic() + 30
+            while watcher.stats()['exitosos'] < 3 and time.monotonic() < limite:
+                time.sleep(0.05)
+            self.assertTrue(watcher.wait_idle(timeout=30))
+            stats = watcher.stats()
+        
+        self.assertEqual(len(self.stored), 3)
+        self.assertEqual(self.stored[-1]['nombre_archivo'], 'nuevo.pdf')
+        self.assertEqual((stats['exitosos'], stats['fallidos'], stats['en_cola'], stats['en_espera']), (3, 1, 0, 0))
+        self.assertEqual(stats['modo'], 'sondeo')
+        self.assertGreaterEqual(stats['latencia_p50'], 0.3)
+    
+    def test_restart_skips_recorded_files(self):
+        """Verifica que al volver a arrancar se omiten los PDFs ya guardados"""
+        with self._watcher() as watcher:
+            watcher.wait_idle(timeout=30)
+        
+        with self._watcher() as watcher:
+            self.assertTrue(watcher.wait_idle(timeout=30))
+            stats = watcher.stats()
+        
+        self.assertEqual(len(self.stored), 2)
+        self.assertEqual((stats['exitosos'], stats['omitidos'], stats['fallidos']), (0, 2, 1))
+    
+    def test_manifest_saved_in_batches(self):
+        """Verifica que el manifiesto se guarda por lotes y al detenerse, no tras cada PDF"""
+        manifest = IngestionManifest(self.temp_dir / 'manifest.json')
+        watcher = FolderWatcher(
+            self.input_dir, self.stored.append, manifest, ['json'], debounce=0.3, poll_interval=0.05,
+            use_notifications=False, manifest_save_every=10, manifest_save_interval=60
+        )
+        with mock.patch.object(manifest, 'save', wraps=manifest.save) as save:
+            with watcher:
+                self.assertTrue(watcher.wait_idle(timeout=30))
+                self.assertEqual(save.call_count, 0)
+            self.assertEqual(save.call_count, 1)
+        
+        self.assertEqual(len(IngestionManifest(self.temp_dir / 'manifest.json').archivos), 2)
+
+
+class TestPDFExtractor(unittest.TestCase):
+    """Tests para el extractor de PDF con los PDFs de muestra"""
+    
+    def setUp(self):
+        """Seleccionar un PDF de muestra"""
+        self.pdf_path = SAMPLE_PDFS_DIR / 'Naturgy_01_25.pdf'
+    
+    def test_iter_pages(self):
+        """Verifica que el generador devuelve todas las páginas en orden"""
+        extractor = PDFExtractor(self.pdf_path)
+        pages = list(extractor.iter_pages())
+        
+        self.assertEqual(len(pages), extractor.get_num_pages())
+        self.assertEqual([p['numero_pagina'] for p in pages], list(range(1, len(pages) + 1)))
+    
+    def test_extract_document_stream(self):
+        """Verifica que la extracción en streaming coincide con la completa"""
+        full = PDFExtractor(self.pdf_path).extract_full_document()
+        streamed = PDFExtractor(self.pdf_path).extract_document_stream()
+        
+        self.assertNotIsInstance(streamed['paginas'], list)
+        streamed['paginas'] = list(streamed['paginas'])
+        self.assertEqual(streamed, full)
+
+
+    def test_num_pages_without_parsing_page_tree(self):
+        """Verifica que contar páginas no recorre el árbol de páginas"""
+        with PDFExtractor(self.pdf_path) as extractor:
+            self.assertEqual(extractor.get_num_pages(), 6)
+            self.assertIsNone(extractor.reader.flattened_pages)
+    
+    def test_context_manager_closes_file(self):
+        """Verifica que el gestor de contexto libera el archivo"""
+        with PDFExtractor(self.pdf_path) as extractor:
+            self.assertIsNotNone(extractor.reader)
+        
+        self.assertIsNone(extractor.reader)
+        self.assertIsNone(extractor._file)
+    
+    def test_read_pdf_info(self):
+        """Verifica la lectura de metadatos sin extraer texto"""
+        info = read_pdf_info(self.pdf_path)
+        
+        self.assertEqual(info['nombre_archivo'], 'Naturgy_01_25.pdf')
+        self.assertEqual(info['num_paginas'], 6)
+        self.assertIsInstance(info['fecha_creacion'], datetime)
+    
+    def test_invalid_pdf_raises(self):
+        """Verifica que un archivo que no es PDF lanza ValueError"""
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as tmp:
+            tmp.write(b'no es un pdf')
+            tmp.flush()
+            with self.assertRaises(ValueError):
+                PDFExtractor(Path(tmp.name))
+
+
+class TestSyntheticPDFs(unittest.TestCase):
+    """Tests para las facturas sintéticas de los benchmarks"""
+    
+    def setUp(self):
+        """Crear directorio temporal"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+    
+    def tearDown(self):
+        """Limpiar después de cada test"""
+        shutil.rmtree(self.temp_dir)
+    
+    def test_text_variant_is_parsed(self):
+        """Verifica que la capa de texto se extrae y se reconoce como factura"""
+        document = extract_pdf(make_invoice_pdf(self.temp_dir / 'texto.pdf', 3, seed=4))
+        
+        self.assertEqual(document['num_paginas'], 3)
+        self.assertEqual(document['autor'], 'Naturgy')
+        self.assertIn('Detalle de la factura, página 3', document['paginas'][2]['contenido'])
+        
+        invoice = parse_invoice(document)
+        self.assertEqual(invoice['proveedor'], 'naturgy')
+        self.assertEqual(invoice['periodo_inicio'].month, 5)
+        self.assertIsNotNone(invoice['importe_total'])
+    
+    def test_image_variant_has_no_text(self):
+        """Verifica que las páginas escaneadas no tienen capa de texto"""
+        document = extract_pdf(make_invoice_pdf(self.temp_dir / 'imagen.pdf', 2, 'imagen'))
+        
+        self.assertEqual(document['num_paginas'], 2)
+        self.assertEqual([p['contenido'] for p in document['paginas']], ['', ''])
+    
+    def test_deterministic(self):
+        """Verifica que la misma semilla genera los mismos bytes"""
+        for variant in ('texto', 'imagen'):
+            first = make_invoice_pdf(self.temp_dir / 'a.pdf', 5, variant, seed=7).read_bytes()
+            second = make_invoice_pdf(self.temp_dir / 'b.pdf', 5, variant, seed=7).read_bytes()
+            other = make_invoice_pdf(self.temp_dir / 'c.pdf', 5, variant, seed=8).read_bytes()
+            
+            self.assertEqual(first, second)
+            self.assertNotEqual(first, other)
+
+
+class TestPageRangePool(unittest.TestCase):
+    """Tests para la extracción por rangos de páginas"""
+    
+    def setUp(self):
+        """Crear una factura sintética de 30 páginas y el pool"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.pdf_path = make_invoice_pdf(self.temp_dir / 'grande.pdf', 30)
+        self.pool = PageRangePool(2, min_pages=20, range_pages=4)
+    
+    def tearDown(self):
+        """Detener el pool y limpiar"""
+        self.pool.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_ranges_cover_all_pages(self):
+        """Verifica que los rangos cubren todas las páginas sin solaparse"""
+        self.assertFalse(self.pool.applies(19))
+        self.assertTrue(self.pool.applies(20))
+        self.assertEqual(self.pool.ranges(10), [(0, 4), (4, 8), (8, 10)])
+        self.assertEqual(PageRangePool(2).ranges(17), [(0, 3), (3, 6), (6, 9), (9, 12), (12, 15), (15, 17)])
+        self.assertFalse(PageRangePool(1, min_pages=1).applies(500))
+    
+    def test_matches_serial_extraction(self):
+        """Verifica que las páginas llegan en orden y coinciden con la extracción en serie"""
+        serial = extract_pdf(self.pdf_path)
+        
+        self.assertEqual(extract_pdf(self.pdf_path, page_pool=self.pool), serial)
+        
+        streamed = extract_pdf_stream(self.pdf_path, page_pool=self.pool)
+        streamed['paginas'] = list(streamed['paginas'])
+        self.assertEqual(streamed, serial)
+    
+    def test_profiling_merges_page_stages(self):
+        """Verifica que las páginas medidas en los procesos se atribuyen al PDF"""
+        profiler = profiling.Profiler()
+        profiling.enable(profiler)
+        try:
+            with profiling.track(self.pdf_path):
+                extract_pdf(self.pdf_path, page_pool=self.pool)
+        finally:
+            profiling.disable()
+        
+        archivo = profiler.report()['archivos'][0]
+        self.assertEqual(archivo['paginas'], 30)
+        self.assertEqual(profiler.report()['num_archivos'], 1)
+
+
+class TestOCRFallback(unittest.TestCase):
+    """Tests para el OCR de respaldo"""
+    
+    def test_only_empty_pages_are_recognized(self):
+        """Verifica que solo se aplica OCR a las páginas sin texto"""
+        pages = [
+            {'numero_pagina': 1, 'contenido': 'Texto real'},
+            {'numero_pagina': 2, 'contenido': ''},
+            {'numero_pagina': 3, 'contenido': 'Más texto'}
+        ]
+        
+        result = list(OCRFallback(FakeOCREngine()).process(Path('/tmp/x.pdf'), pages))
+        
+        self.assertEqual([p['contenido'] for p in result], ['Texto real', 'OCR página 2', 'Más texto'])
+        self.assertEqual([p['metodo_extraccion'] for p in result], ['texto', 'ocr', 'texto'])
+    
+    def test_incomplete_engine_fails_on_construction(self):
+        """Verifica que un motor sin recognize no se puede crear"""
+        class IncompleteEngine(OCREngine):
+            name = 'incompleto'
+        
+        with self.assertRaises(TypeError):
+            IncompleteEngine()
+    
+    def test_process_pool_keeps_page_order(self):
+        """Verifica que el OCR en varios procesos devuelve las páginas en orden"""
+        pages = [{'numero_pagina': i, 'contenido': '' if i % 2 else 'texto'} for i in range(1, 11)]
+        
+        with OCRFallback(FakeOCREngine(), workers=2, max_pending=3) as ocr:
+            result = list(ocr.process(Path('/tmp/x.pdf'), pages))
+        
+        self.assertEqual([p['numero_pagina'] for p in result], list(range(1, 11)))
+        self.assertEqual(result[0]['contenido'], 'OCR página 1')
+        self.assertEqual(result[1]['metodo_extraccion'], 'texto')
+    
+    def test_extractor_records_method(self):
+        """Verifica que la extracción indica el método de cada página"""
+        pdf_path = SAMPLE_PDFS_DIR / 'Naturgy_01_25.pdf'
+        
+        without_ocr = extract_pdf(pdf_path)
+        with_ocr = extract_pdf(pdf_path, OCRFallback(FakeOCREngine()))
+        
+        self.assertTrue(all(p['metodo_extraccion'] == 'vacia' for p in without_ocr['paginas']))
+        self.assertTrue(all(p['metodo_extraccion'] == 'ocr' for p in with_ocr['paginas']))
+        self.assertEqual(with_ocr['paginas'][0]['contenido'], 'OCR página 1')
+
+
+class TestExtractionCache(unittest.TestCase):
+    """Tests para la caché de extracción"""
+    
+    def setUp(self):
+        """Crear caché temporal"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        self.cache = ExtractionCache(self.temp_dir / 'cache.db')
+        self.pdf_path = SAMPLE_PDFS_DIR / 'Naturgy_01_25.pdf'
+    
+    def tearDown(self):
+        """Limpiar después de cada test"""
+        self.cache.close()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_put_and_get(self):
+        """Verifica que un documento guardado se recupera sin nombre ni ruta"""
+        document = {
+            'nombre_archivo': 'a.pdf',
+            'ruta_archivo': '/tmp/a.pdf',
+            'num_paginas': 1,
+            'paginas': [{'numero_pagina': 1, 'contenido': 'Término fijo'}]
+        }
+        key = ExtractionCache.make_key('abc', '1')
+        
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, document)
+        
+        cached = self.cache.get(key)
+        self.assertEqual(cached['paginas'], document['paginas'])
+        self.assertNotIn('ruta_archivo', cached)
+    
+    def test_key_depends_on_version_and_options(self):
+        """Verifica que la versión y las opciones forman parte de la clave"""
+        key = ExtractionCache.make_key('abc', '1')
+        
+        self.assertNotEqual(key, ExtractionCache.make_key('abc', '2'))
+        self.assertNotEqual(key, ExtractionCache.make_key('abc', '1', {'ocr': {'motor': 'tesseract'}}))
+        self.assertEqual(key, ExtractionCache.make_key('abc', '1', {}))
+    
+    def test_lru_eviction(self):
+        """Verifica que se eliminan las entradas usadas hace más tiempo"""
+        document = {'paginas': [{'numero_pagina': 1, 'contenido': os.urandom(512).hex()}]}
+        self.cache.put('a', document)
+        entry_size = self.cache.stats()['tamano']
+        self.cache.max_bytes = entry_size * 2
+        
+        self.cache.put('b', document)
+        self.cache.get('a')
+        self.cache.put('c', document)
+        
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+        self.assertLessEqual(self.cache.stats()['tamano'], self.cache.max_bytes)
+    
+    def test_extract_pdf_uses_cache(self):
+        """Verifica que la segunda extracción no analiza el PDF"""
+        first = extract_pdf(self.pdf_path, cache=self.cache)
+        
+        copy = self.temp_dir / 'copia.pdf'
+        shutil.copy(self.pdf_path, copy)
+        
+        with mock.patch('extractors.pdf_extractor.PDFExtractor', side_effect=AssertionError):
+            second = extract_pdf(copy, cache=self.cache)
+        
+        self.assertEqual(second['paginas'], first['paginas'])
+        self.assertEqual(second['hash_contenido'], first['hash_contenido'])
+        self.assertEqual(second['nombre_archivo'], 'copia.pdf')
+        self.assertEqual(second, extract_pdf(copy))
+    
+    def test_ocr_options_miss_cache(self):
+        """Verifica que activar el OCR no reutiliza la extracción sin OCR"""
+        extract_pdf(self.pdf_path, cache=self.cache)
+        document = extract_pdf(self.pdf_path, OCRFallback(FakeOCREngine()), cache=self.cache)
+        
+        self.assertEqual(document['paginas'][0]['metodo_extraccion'], 'ocr')
+        self.assertEqual(self.cache.stats()['entradas'], 2)
+
+
+@unittest.skipIf(create_app is None, 'fastapi no está instalado')
+class TestIngestionAPI(unittest.TestCase):
+    """Tests para la API HTTP de ingesta"""
+    
+    def setUp(self):
+        """Arrancar la API con una base de datos y directorio de subidas temporales"""
+        self.temp_dir = Path(tempfile.mkdtemp())
+        app = create_app(
+            database_url=f"sqlite:///{self.temp_dir / 'test.db'}",
+            upload_dir=self.temp_dir / 'uploads',
+            workers=1
+        )
+        self.client = TestClient(app)
+        self.client.__enter__()
+        self.pdf_path = SAMPLE_PDFS_DIR / 'Naturgy_01_25.pdf'
+    
+    def tearDown(self):
+        """Detener la API y limpiar"""
+        self.client.__exit__(None, None, None)
+        shutil.rmtree(self.temp_dir)
+    
+    def _upload(self, name, content):
+        return self.client.post('/api/facturas', files={'file': (name, content, 'application/pdf')})
+    
+    def _wait(self, job_id, timeout=30):
+        """Consulta el estado hasta que el trabajo termina"""
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            job = self.client.get(f'/api/facturas/{job_id}').json()
+            if job['estado'] in ('completado', 'error'):
+                return job
+            time.sleep(0.05)
+        self.fail('El trabajo no terminó a tiempo')
+    
+    def test_upload_status_and_result(self):
+        """Verifica el flujo completo: subida aceptada, estado y documento"""
+        response = self._upload('factura.pdf', self.pdf_path.read_bytes())
+        
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['estado'], 'en_cola')
+        
+        job = self._wait(response.json()['id'])
+        self.assertEqual(job['estado'], 'completado')
+        
+        result = self.client.get(f"/api/facturas/{job['id']}/resultado")
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.json()['nombre_archivo'], 'factura.pdf')
+        self.assertEqual(len(result.json()['paginas']), 6)
+        self.assertEqual(list((self.temp_dir / 'uploads').iterdir()), [])
+    
+    def test_invalid_pdf_reports_error(self):
+        """Verifica que un PDF corrupto termina en estado de error"""
+        response = self._upload('corrupto.pdf', b'no es un pdf')
+        job = self._wait(response.json()['id'])
+        
+        self.assertEqual(job['estado'], 'error')
+        self.assertEqual(self.client.get(f"/api/facturas/{job['id']}/resultado").status_code, 409)
+        self.assertEqual(list((self.temp_dir / 'uploads').iterdir()), [])
+    
+    def test_rejects_non_pdf_and_unknown_jobs(self):
+        """Verifica los códigos de error de subida y consulta"""
+        self.assertEqual(self._upload('foto.png', b'png').status_code, 415)
+        self.assertEqual(self.client.get('/api/facturas/desconocido').status_code, 404)
+    
+    def test_list_documents_paginated(self):
+        """Verifica el listado paginado por cursor de los documentos guardados"""
+        for name in ('a.pdf', 'b.pdf'):
+            self._wait(self._upload(name, self.pdf_path.read_bytes() + name.encode()).json()['id'])
+        
+        first = self.client.get('/api/documentos', params={'limit': 1}).json()
+        self.assertEqual(len(first['documentos']), 1)
+        second = self.client.get('/api/documentos', params={'limit': 1, 'cursor': first['siguiente']}).json()
+        self.assertEqual(len(second['documentos']), 1)
+        self.assertIsNone(second['siguiente'])
+        self.assertNotEqual(first['documentos'][0]['id'], second['documentos'][0]['id'])
+        
+        self.assertEqual(self.client.get('/api/documentos', params={'cursor': 'roto'}).status_code, 400)
+    
+    def test_monthly_summary(self):
+        """Verifica el resumen mensual de un hogar tras analizar sus facturas"""
+        db_storage = self.client.app.state.service.db_storage
+        doc_id = db_storage.save_document({
+            'nombre_archivo': 'luz.pdf', 'ruta_archivo': '/tmp/luz.pdf', 'num_paginas': 1,
+            'paginas': [{'numero_pagina': 1, 'contenido': NATURGY_INVOICE_TEXT}]
+        })
+        db_storage.save_invoices(parse_invoice_batch([(doc_id, NATURGY_INVOICE_TEXT)]))
+        
+        response = self.client.get('/api/resumen', params={'hogar': 'ES0021000012345678LB', 'desde': '2025-01-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{
+            'mes': '2025-01', 'num_facturas': 1, 'importe_total': 185.43, 'consumo_kwh': 1245.0,
+            'desglose': [{'categoria': 'electricidad', 'proveedor': 'naturgy', 'num_facturas': 1,
+                          'importe_total': 185.43, 'consumo_kwh': 1245.0}]
+        }])
+        self.assertEqual(self.client.get('/api/resumen', params={'desde': '2025-02-01'}).json(), [])
+        self.assertEqual(
+            self.client.get('/api/resumen', params={'desde': '2025-02-01', 'hasta': '2025-01-01'}).status_code, 400
+        )
+
+
 class TestPDFExtractorMock(unittest.TestCase):
     """Tests para el extractor de PDF (usando datos simulados)"""
     
@@ -414,7 +2274,22 @@ def run_all_tests():
     suite.addTests(loader.loadTestsFromTestCase(TestConfig))
     suite.addTests(loader.loadTestsFromTestCase(TestModels))
     suite.addTests(loader.loadTestsFromTestCase(TestJSONStorage))
+    suite.addTests(loader.loadTestsFromTestCase(TestParquetStorage))
+    suite.addTests(loader.loadTestsFromTestCase(TestJSONLStorage))
     suite.addTests(loader.loadTestsFromTestCase(TestDatabaseStorage))
+    suite.addTests(loader.loadTestsFromTestCase(TestAsyncDatabaseStorage))
+    suite.addTests(loader.loadTestsFromTestCase(TestMonthlyRollup))
+    suite.addTests(loader.loadTestsFromTestCase(TestInvoiceParser))
+    suite.addTests(loader.loadTestsFromTestCase(TestProcessDirectory))
+    suite.addTests(loader.loadTestsFromTestCase(TestIngestionPipeline))
+    suite.addTests(loader.loadTestsFromTestCase(TestProfiling))
+    suite.addTests(loader.loadTestsFromTestCase(TestFolderWatcher))
+    suite.addTests(loader.loadTestsFromTestCase(TestPDFExtractor))
+    suite.addTests(loader.loadTestsFromTestCase(TestSyntheticPDFs))
+    suite.addTests(loader.loadTestsFromTestCase(TestPageRangePool))
+    suite.addTests(loader.loadTestsFromTestCase(TestOCRFallback))
+    suite.addTests(loader.loadTestsFromTestCase(TestExtractionCache))
+    suite.addTests(loader.loadTestsFromTestCase(TestIngestionAPI))
     
     # Ejecutar
     runner = unittest.TextTestRunner(verbosity=2)
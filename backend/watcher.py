@@ -0,0 +1,403 @@
+"""
+PASO 7: Ingesta continua
+Vigila el directorio de entrada y procesa los PDFs a medida que llegan
+
+Los avisos de archivos nuevos o modificados llegan por inotify (con
+``watchdog``) o, si no está instalado, sondeando el directorio. Cada PDF
+espera a que su tamaño y fecha de modificación dejen de cambiar (así no se
+lee un archivo a medio copiar) y pasa a una cola acotada que consumen los
+procesos de extracción. Un único escritor guarda los documentos y los
+registra en el manifiesto de ingesta.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable
+
+from extractors.cache import ExtractionCache
+from extractors.ocr import OCRFallback
+from extractors.pdf_extractor import extract_pdf
+from profiling import percentile
+from storage.ingestion_manifest import IngestionManifest
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # Sin watchdog se sondea el directorio
+    FileSystemEventHandler = object
+    Observer = None
+
+# Latencias recientes con las que se calculan los percentiles
+LATENCY_WINDOW = 1000
+
+
+class _EventHandler(FileSystemEventHandler):
+    """Pasa al vigilante las rutas de los eventos de watchdog"""
+
+    def __init__(self, notice: Callable[[str], None]):
+        super().__init__()
+        self.notice = notice
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.notice(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.notice(event.src_path)
+
+    def on_closed(self, event):
+        if not event.is_directory:
+            self.notice(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.notice(event.dest_path)
+
+
+class FolderWatcher:
+    """
+    Ingesta continua de los PDFs de un directorio
+
+    Con ``workers > 1`` la extracción se reparte en un pool de procesos; con
+    1 se hace en el propio hilo consumidor. La cola admite como mucho
+    ``queue_size`` PDFs: si se llena, los archivos listos esperan a que haya
+    sitio sin perder los avisos que sigan llegando. El manifiesto se guarda
+    en disco cada ``manifest_save_every`` PDFs registrados, cada
+    ``manifest_save_interval`` segundos si hay alguno sin guardar y al
+    detenerse.
+    """
+
+    def __init__(self, input_dir: Path, store: Callable[[Dict], None], manifest: IngestionManifest,
+                 targets: Iterable[str], workers: int = 1, queue_size: int = 100, debounce: float = 1.0,
+                 poll_interval: float = 2.0, use_notifications: bool = True, force: bool = False,
+                 ocr: OCRFallback = None, cache: ExtractionCache = None, manifest_save_every: int = 50,
+                 manifest_save_interval: float = 5.0):
+        """
+        Inicializa el vigilante
+
+        Args:
+            input_dir: Directorio a vigilar
+            store: Función que guarda un documento extraído en los almacenamientos
+            manifest: Manifiesto de ingesta donde registrar los PDFs guardados
+            targets: Almacenamientos que implica el tipo de almacenamiento
+            workers: Procesos de extracción
+            queue_size: PDFs en cola como máximo
+            debounce: Segundos que un PDF debe seguir sin cambios antes de procesarlo
+            poll_interval: Segundos entre sondeos del directorio (sin notificaciones)
+            use_notifications: Usar inotify (watchdog) si está disponible
+            force: Procesar los PDFs aunque el manifiesto diga que no han cambiado
+            ocr: OCR de respaldo para páginas sin texto (opcional)
+            cache: Caché de extracción (opcional)
+            manifest_save_every: PDFs registrados entre escrituras del manifiesto
+            manifest_save_interval: Segundos como máximo que un registro queda sin escribir
+        """
+        self.input_dir = Path(input_dir)
+        self._resolved_dir = self.input_dir.resolve()
+        self.store = store
+        self.manifest = manifest
+        self.targets = list(targets)
+        self.workers = max(1, workers)
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_notifications = use_notifications and Observer is not None
+        self.force = force
+        self.ocr = ocr
+        self.cache = cache
+        self.manifest_save_every = max(1, manifest_save_every)
+        self.manifest_save_interval = manifest_save_interval
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.resumen = {'exitosos': 0, 'fallidos': 0, 'omitidos': 0}
+        self.latencias = deque(maxlen=LATENCY_WINDOW)
+
+        # Archivos avisados que aún no han dejado de cambiar
+        self._pending: Dict[Path, Dict] = {}
+        # Firma (tamaño, fecha) de cada PDF en el último sondeo
+        self._seen: Dict[Path, tuple] = {}
+        self._last_scan = None
+        self._entregando = 0
+        self._procesando = 0
+        # PDFs registrados en el manifiesto desde la última vez que se guardó
+        self._sin_guardar = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._observer = None
+        self._executor = None
+
+    @property
+    def mode(self) -> str:
+        """Origen de los avisos: 'inotify' o 'sondeo'"""
+        return 'inotify' if self.use_notifications else 'sondeo'
+
+    def start(self):
+        """Procesa los PDFs ya presentes y empieza a vigilar el directorio"""
+        if self.workers > 1:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        self._scan()
+        if self.use_notifications:
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self.notice), str(self.input_dir), recursive=False)
+            self._observer.start()
+        else:
+            self._start_thread(self._poll_loop)
+
+        self._start_thread(self._debounce_loop)
+        self._start_thread(self._save_loop)
+        for _ in range(self.workers):
+            self._start_thread(self._consume)
+
+    def stop(self):
+        """
+        Deja de vigilar y espera a que terminen los PDFs en proceso
+
+        Los que seguían en cola no se registran en el manifiesto, así que se
+        procesan en la siguiente ejecución. Los registrados se guardan en disco.
+        """
+        self._stop.set()
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._executor:
+            self._executor.shutdown(cancel_futures=True)
+        with self._write_lock:
+            self._save_manifest()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def run(self, stats_interval: float = 30):
+        """
+        Vigila hasta que se interrumpa, mostrando el estado cada cierto tiempo
+
+        Args:
+            stats_interval: Segundos entre resúmenes del estado (0 = no mostrarlos)
+        """
+        while not self._stop.wait(stats_interval or None):
+            print(self.format_stats())
+
+    def notice(self, path, desde: float = None):
+        """
+        Avisa de que un archivo del directorio se ha creado o ha cambiado
+
+        Args:
+            path: Ruta del archivo (se ignora si no es un PDF)
+            desde: Momento (time.time) desde el que puede haber cambiado,
+                p. ej. el sondeo anterior (default: ahora)
+        """
+        path = Path(path)
+        if path.suffix != '.pdf' or path.parent.resolve() != self._resolved_dir:
+            return
+        path = self.input_dir / path.name
+
+        with self._lock:
+            entry = self._pending.setdefault(path, {'visto': desde or time.time(), 'firma': None})
+            # Un aviso nuevo reinicia la espera
+            entry['estable_desde'] = time.monotonic()
+
+    def _start_thread(self, target):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _scan(self):
+        """Avisa de los PDFs nuevos o modificados desde el último sondeo"""
+        seen = {}
+        inicio = time.time()
+        for pdf_path in self.input_dir.glob('*.pdf'):
+            try:
+                stat = pdf_path.stat()
+            except FileNotFoundError:
+                continue
+            seen[pdf_path] = (stat.st_size, stat.st_mtime_ns)
+            if self._seen.get(pdf_path) != seen[pdf_path]:
+                self.notice(pdf_path, self._last_scan)
+        self._seen = seen
+        self._last_scan = inicio
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            self._scan()
+
+    def _debounce_loop(self):
+        """Pasa a la cola los PDFs que llevan ``debounce`` segundos sin cambiar"""
+        interval = min(0.25, self.debounce / 4) or 0.05
+
+        while not self._stop.wait(interval):
+            for pdf_path, entry in self._ready():
+                while not self._stop.is_set():
+                    try:
+                        self.queue.put((pdf_path, entry), timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                with self._lock:
+                    self._entregando -= 1
+
+    def _ready(self) -> list:
+        """Saca de los pendientes los PDFs estables, con sus tiempos"""
+        ready = []
+        now = time.monotonic()
+
+        with self._lock:
+            for pdf_path, entry in list(self._pending.items()):
+                try:
+                    stat = pdf_path.stat()
+                except FileNotFoundError:
+                    del self._pending[pdf_path]
+                    continue
+
+                firma = (stat.st_size, stat.st_mtime_ns)
+                if firma != entry['firma']:
+                    entry['firma'] = firma
+                    entry['estable_desde'] = now
+                elif stat.st_size and now - entry['estable_desde'] >= self.debounce:
+                    # Llegada: la última escritura, o el primer momento en que pudo
+                    # aparecer si se movió al directorio con una fecha anterior
+                    entry['llegada'] = max(entry['visto'], stat.st_mtime_ns / 1e9)
+                    entry['en_cola'] = time.time()
+                    ready.append((pdf_path, entry))
+                    del self._pending[pdf_path]
+            self._entregando += len(ready)
+
+        return ready
+
+    def _save_manifest(self):
+        """Guarda el manifiesto si hay registros sin guardar (con _write_lock)"""
+        if self._sin_guardar:
+            self.manifest.save()
+            self._sin_guardar = 0
+
+    def _save_loop(self):
+        """Guarda cada ``manifest_save_interval`` segundos los registros pendientes"""
+        while not self._stop.wait(self.manifest_save_interval):
+            with self._write_lock:
+                self._save_manifest()
+
+    def _consume(self):
+        """Consumidor de la cola: extrae el PDF y lo guarda"""
+        while not self._stop.is_set():
+            try:
+                pdf_path, entry = self.queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+
+            try:
+                self._process(pdf_path, entry)
+            finally:
+                self.queue.task_done()
+
+    def _process(self, pdf_path: Path, entry: Dict):
+        """Extrae y guarda un PDF, anotando su latencia"""
+        with self._write_lock:
+            pendiente = self.force or self.manifest.needs_processing(pdf_path, self.targets)
+        if not pendiente:
+            with self._lock:
+                self.resumen['omitidos'] += 1
+            return
+
+        with self._lock:
+            self._procesando += 1
+        inicio = time.time()
+
+        try:
+            if self._executor:
+                document_data = self._executor.submit(extract_pdf, pdf_path, self.ocr, self.cache).result()
+            else:
+                document_data = extract_pdf(pdf_path, self.ocr, self.cache)
+            extraido = time.time()
+
+            with self._write_lock:
+                self.store(document_data)
+                self.manifest.record(
+                    pdf_path, document_data.get('hash_contenido'), self.targets, document_data.get('firma_archivo')
+                )
+                self._sin_guardar += 1
+                if self._sin_guardar >= self.manifest_save_every:
+                    self._save_manifest()
+            fin = time.time()
+
+            latencia = fin - entry['llegada']
+            with self._lock:
+                self.resumen['exitosos'] += 1
+                self.latencias.append(latencia)
+            print(
+                f"  ✓ {pdf_path.name}: {document_data['num_paginas']} páginas guardadas en {latencia:.2f} s "
+                f"(espera {entry['en_cola'] - entry['llegada']:.2f} s, cola {inicio - entry['en_cola']:.2f} s, "
+                f"extracción {extraido - inicio:.2f} s, guardado {fin - extraido:.2f} s)"
+            )
+        except Exception as e:
+            with self._lock:
+                self.resumen['fallidos'] += 1
+            print(f"  ✗ {pdf_path.name}: {str(e)}")
+        finally:
+            with self._lock:
+                self._procesando -= 1
+
+    def stats(self) -> Dict:
+        """
+        Estado de la ingesta
+
+        Returns:
+            Dict con los PDFs esperando a dejar de cambiar, en cola y en
+            proceso, el recuento de resultados y los percentiles de la
+            latencia (segundos desde que el PDF terminó de llegar hasta
+            que quedó guardado) de los últimos LATENCY_WINDOW archivos
+        """
+        with self._lock:
+            latencias = list(self.latencias)
+            return {
+                'modo': self.mode,
+                'en_espera': len(self._pending) + self._entregando,
+                'en_cola': self.queue.qsize(),
+                'procesando': self._procesando,
+                **self.resumen,
+                'latencia_p50': percentile(latencias, 50) if latencias else None,
+                'latencia_p95': percentile(latencias, 95) if latencias else None,
+                'latencia_max': max(latencias, default=None)
+            }
+
+    def format_stats(self) -> str:
+        """Resumen del estado en una línea"""
+        stats = self.stats()
+        texto = (
+            f"📊 Cola: {stats['en_cola']}/{self.queue.maxsize} | esperando: {stats['en_espera']} | "
+            f"procesando: {stats['procesando']} | {stats['exitosos']} correctos, "
+            f"{stats['fallidos']} con errores, {stats['omitidos']} omitidos"
+        )
+        if stats['latencia_p50'] is not None:
+            texto += f" | latencia p50 {stats['latencia_p50']:.2f} s, p95 {stats['latencia_p95']:.2f} s"
+        return texto
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """
+        Espera a que no quede ningún PDF pendiente, en cola ni en proceso
+
+        Args:
+            timeout: Segundos como máximo (None = sin límite)
+
+        Returns:
+            bool: True si quedó inactivo antes del límite
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+
+        while limite is None or time.monotonic() < limite:
+            # unfinished_tasks cubre también los PDFs sacados de la cola y aún en proceso
+            with self._lock:
+                if not self._pending and not self._entregando and not self.queue.unfinished_tasks:
+                    return True
+            time.sleep(0.05)
+        return False